@@ -0,0 +1,179 @@
+import json
+import os
+import time
+from urllib.parse import unquote_plus
+from common.audio import (
+    TARGET_SAMPLE_RATE,
+    WAVE_FORMAT_PCM,
+    Resampler,
+    UnsupportedAudio,
+    downmix,
+    iter_frames,
+    read_wav_header,
+    to_pcm16,
+)
+from common.aws_clients import lazy_client
+from common.telemetry import info, metric, span, trace
+from streaming_upload import MiB, StreamingWavUpload
+
+REGION = os.environ.get("REGION", "ap-south-1")
+TABLE_NAME = os.environ.get("SESSION_TABLE", "cce_sessions")
+TRANSCRIBE_FUNCTION = os.environ.get("TRANSCRIBE_FUNCTION_NAME", "transcribe_audio")
+
+# Seconds of source audio decoded at a time; bounds memory for any length
+BLOCK_SECONDS = float(os.environ.get("NORMALIZE_BLOCK_SECONDS", "10"))
+PART_SIZE = int(os.environ.get("NORMALIZE_PART_SIZE", str(8 * MiB)))
+
+# Created on first use and reused across warm invocations
+s3 = lazy_client("s3")
+dynamodb = lazy_client("dynamodb")
+lambda_client = lazy_client("lambda")
+
+
+def lambda_handler(event, context):
+    """
+    S3 trigger on uploaded recordings. WAV input is rewritten as 16 kHz
+    mono 16-bit PCM next to the original; everything else passes through.
+    Either way transcribe_audio is then invoked with the object to use.
+    """
+    results = []
+    for record in event["Records"]:
+        bucket = record["s3"]["bucket"]["name"]
+        key = unquote_plus(record["s3"]["object"]["key"])
+        session_id = input_session(key)
+        if session_id is None:
+            # Our own normalized copies and transcribe_audio's chunk WAVs
+            # land under the same prefix: handing them over would start
+            # the session's transcription again
+            info("Not an uploaded recording, skipping", key=key)
+            results.append({"source": key, "skipped": "not an uploaded recording"})
+            continue
+
+        with trace("audio_normalizer", session_id):
+            result = normalize_object(bucket, key, session_id)
+            info("Normalization", **{k: v for k, v in result.items() if k != "session_id"})
+
+            start_transcription(bucket, result["transcription_input"], record["s3"]["object"])
+        results.append(result)
+
+    return {"statusCode": 200, "body": json.dumps({"results": results})}
+
+
+def input_session(key):
+    """Session id of an uploaded recording, sessions/[session-id]/input/..., else None"""
+    parts = key.split("/")
+    if len(parts) >= 4 and parts[0] == "sessions" and parts[1] and parts[2] == "input" and parts[-1]:
+        return parts[1]
+    return None
+
+
+def normalize_object(bucket, key, session_id):
+    result = {"session_id": session_id, "source": key, "transcription_input": key, "normalized": False}
+    if not key.lower().endswith(".wav"):
+        return {**result, "reason": "not a WAV file"}
+
+    started_cpu, started = time.process_time(), time.perf_counter()
+    obj = s3.get_object(Bucket=bucket, Key=key)
+    body = obj["Body"]
+    try:
+        try:
+            fmt = read_wav_header(body)
+        except UnsupportedAudio as e:
+            return {**result, "reason": str(e)}
+
+        if not needs_normalization(fmt):
+            return {**result, "reason": "already 16-bit mono at or below 16 kHz"}
+
+        normalized_key = f"sessions/{session_id}/normalized/audio.wav"
+        with span("normalize"):
+            audio_seconds, normalized_bytes = normalize_stream(body, fmt, bucket, normalized_key)
+    finally:
+        body.close()
+
+    cpu_seconds = time.process_time() - started_cpu
+    original_bytes = obj["ContentLength"]
+    metric("audio_seconds", round(audio_seconds, 3), "Seconds")
+    metric("input_bytes", original_bytes, "Bytes")
+    metric("normalized_bytes", normalized_bytes, "Bytes")
+    metric("audio_seconds_per_cpu_second", round(audio_seconds / max(cpu_seconds, 1e-6), 1))
+
+    dynamodb.update_item(
+        TableName=TABLE_NAME,
+        Key={"session_id": {"S": session_id}},
+        UpdateExpression="SET s3_normalized_path = :path, input_bytes = :input_bytes, "
+                         "normalized_bytes = :normalized_bytes, audio_seconds = :audio_seconds, "
+                         "updated_at = :updated_at ADD revision :one",
+        ExpressionAttributeValues={
+            ":path": {"S": normalized_key},
+            ":input_bytes": {"N": str(original_bytes)},
+            ":normalized_bytes": {"N": str(normalized_bytes)},
+            ":audio_seconds": {"N": f"{audio_seconds:.3f}"},
+            ":one": {"N": "1"},
+            ":updated_at": {"N": str(int(time.time()))}
+        }
+    )
+
+    return {
+        **result,
+        "normalized": True,
+        "transcription_input": normalized_key,
+        "source_format": {"channels": fmt.channels, "sample_rate": fmt.sample_rate,
+                          "bits_per_sample": fmt.bits_per_sample},
+        "audio_seconds": round(audio_seconds, 3),
+        "input_bytes": original_bytes,
+        "normalized_bytes": normalized_bytes,
+        "bytes_saved": original_bytes - normalized_bytes,
+        "cpu_seconds": round(cpu_seconds, 3),
+        "wall_seconds": round(time.perf_counter() - started, 3),
+        "audio_seconds_per_cpu_second": round(audio_seconds / max(cpu_seconds, 1e-6), 1),
+    }
+
+
+def needs_normalization(fmt):
+    # Lower rates are kept: upsampling would only add bytes
+    return (
+        fmt.channels > 1
+        or fmt.sample_rate > TARGET_SAMPLE_RATE
+        or fmt.format_tag != WAVE_FORMAT_PCM
+        or fmt.bits_per_sample != 16
+    )
+
+
+def normalize_stream(stream, fmt, bucket, key):
+    """
+    Downmix, resample and re-encode a WAV stream positioned on its first
+    sample into ``key``. Returns (source audio seconds, bytes written).
+    """
+    rate = min(fmt.sample_rate, TARGET_SAMPLE_RATE)
+    resampler = Resampler(fmt.sample_rate, rate) if rate != fmt.sample_rate else None
+    upload = StreamingWavUpload(s3, bucket, key, rate, part_size=PART_SIZE)
+
+    frames = 0
+    try:
+        for block in iter_frames(stream, fmt, max(1, int(BLOCK_SECONDS * fmt.sample_rate))):
+            frames += len(block)
+            mono = downmix(block)
+            upload.write(to_pcm16(resampler.process(mono) if resampler else mono))
+        if resampler:
+            upload.write(to_pcm16(resampler.flush()))
+        written = upload.close()
+    except Exception:
+        upload.abort()
+        raise
+
+    return frames / fmt.sample_rate, written
+
+
+def start_transcription(bucket, key, uploaded):
+    """
+    Asynchronous invoke of transcribe_audio with the S3 event shape it
+    expects. The uploaded object's sequencer and ETag go along: they tell
+    transcribe_audio a retried hand-over from a new upload.
+    """
+    identity = {name: uploaded[name] for name in ("sequencer", "eTag") if name in uploaded}
+    lambda_client.invoke(
+        FunctionName=TRANSCRIBE_FUNCTION,
+        InvocationType="Event",
+        Payload=json.dumps({"Records": [{"eventSource": "audio_normalizer",
+                                          "s3": {"bucket": {"name": bucket}, "object": {"key": key, **identity}}}]})
+    )
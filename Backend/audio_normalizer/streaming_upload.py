@@ -0,0 +1,79 @@
+"""
+Write a WAV object to S3 as it is produced, without holding it in memory.
+
+Parts are uploaded as soon as they fill up. The first part, which begins
+with the WAV header, is held back and uploaded last: only then is the data
+size known. S3 allows parts to be uploaded in any order.
+"""
+from common.audio import wav_header
+
+MiB = 1024 * 1024
+HEADER_BYTES = 44
+
+
+class StreamingWavUpload:
+    def __init__(self, s3, bucket, key, sample_rate, part_size=8 * MiB, content_type="audio/wav"):
+        if part_size < 5 * MiB:
+            raise ValueError("S3 parts other than the last must be at least 5 MiB")
+        self.s3, self.bucket, self.key = s3, bucket, key
+        self.sample_rate = sample_rate
+        self.part_size = part_size
+        self.content_type = content_type
+        self.first_part = None
+        self.pending = bytearray()
+        self.parts = []
+        self.upload_id = None
+        self.data_bytes = 0
+
+    def write(self, pcm16):
+        self.data_bytes += len(pcm16)
+        self.pending += pcm16
+        while True:
+            # The held-back first part leaves room for the header
+            size = self.part_size - HEADER_BYTES if self.first_part is None else self.part_size
+            if len(self.pending) < size:
+                return
+            chunk = bytes(self.pending[:size])
+            del self.pending[:size]
+            if self.first_part is None:
+                self.first_part = chunk
+            else:
+                self._upload_part(chunk)
+
+    def close(self):
+        """Finish the object; returns its size in bytes"""
+        header = wav_header(self.sample_rate, 1, 16, self.data_bytes)
+
+        if self.first_part is None:
+            self.s3.put_object(Bucket=self.bucket, Key=self.key, Body=header + bytes(self.pending),
+                               ContentType=self.content_type)
+            return HEADER_BYTES + self.data_bytes
+
+        if self.pending:
+            self._upload_part(bytes(self.pending))
+            self.pending = bytearray()
+        self._upload_part(header + self.first_part, number=1)
+
+        self.s3.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            MultipartUpload={"Parts": sorted(self.parts, key=lambda p: p["PartNumber"])}
+        )
+        return HEADER_BYTES + self.data_bytes
+
+    def abort(self):
+        if self.upload_id:
+            self.s3.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+            self.upload_id = None
+
+    def _upload_part(self, body, number=None):
+        if self.upload_id is None:
+            self.upload_id = self.s3.create_multipart_upload(
+                Bucket=self.bucket, Key=self.key, ContentType=self.content_type
+            )["UploadId"]
+        # Part 1 is reserved for the header part
+        number = number or len(self.parts) + 2
+        result = self.s3.upload_part(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                                     PartNumber=number, Body=body)
+        self.parts.append({"PartNumber": number, "ETag": result["ETag"]})
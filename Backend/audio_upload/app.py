@@ -1,16 +1,32 @@
 import json
-import boto3
 import os
 import time
 import shortuuid
+from common.aws_clients import lazy_client, lazy_table
+from common.telemetry import bind, error, span, trace
+from multipart import (
+    MAX_UPLOAD_BYTES,
+    PART_URL_EXPIRES_IN,
+    choose_part_size,
+    list_uploaded_parts,
+    missing_parts,
+    part_count,
+    presign_parts,
+)
 
 REGION = os.environ["REGION"]
 BUCKET_NAME = os.environ["BUCKET_NAME"]
 SESSION_TABLE = os.environ["SESSION_TABLE"]
 
-s3 = boto3.client("s3", region_name=REGION)
-dynamodb = boto3.resource("dynamodb", region_name=REGION)
-table = dynamodb.Table(SESSION_TABLE)
+# Declared sizes from this threshold up are uploaded in parts
+MULTIPART_THRESHOLD_BYTES = int(os.environ.get("MULTIPART_THRESHOLD_BYTES", str(16 * 1024 * 1024)))
+
+# Created on first use and reused across warm invocations
+s3 = lazy_client("s3")
+table = lazy_table(SESSION_TABLE)
+
+# Optional per-session override of the engine transcribe_audio picks
+SUPPORTED_ASR_ENGINES = ("transcribe", "sarvam")
 
 SUPPORTED_AUDIO_FORMATS = {
     ".mp3": "audio/mpeg",
@@ -19,77 +35,230 @@ SUPPORTED_AUDIO_FORMATS = {
 }
 
 def lambda_handler(event, context):
+    with trace("audio_upload") as current:
+        result = handle(event)
+        current.properties["status_code"] = result["statusCode"]
+        return result
+
+
+def handle(event):
     try:
-        body = json.loads(event.get("body", "{}"))
+        body = json.loads(event.get("body") or "{}")
+        action = body.get("action", "create")
+        bind(body.get("session_id"), action=action)
+
+        if action == "create":
+            return create_session(body)
+        if action in ("resume", "complete", "abort"):
+            return multipart_action(action, body.get("session_id"))
+
+        return response(400, {
+            "error": "action must be one of create, resume, complete, abort"
+        })
 
-        patient_id = body.get("patient_id")
-        patient_name = body.get("patient_name")
-        cce_id = body.get("cce_id")
-        filename = body.get("filename")
-        language_preferences = body.get("language_preferences", ["en-IN"])
+    except Exception as e:
+        error("Request failed", error=str(e))
+        return response(500, {"error": "Internal server error"})
 
-        if not all([patient_id, cce_id, filename]):
-            return response(400, {
-                "error": "patient_id, cce_id, and filename are required"
-            })
 
-        filename = os.path.basename(filename).lower()
+def create_session(body):
+    patient_id = body.get("patient_id")
+    patient_name = body.get("patient_name")
+    cce_id = body.get("cce_id")
+    filename = body.get("filename")
+    language_preferences = body.get("language_preferences", ["en-IN"])
+    file_size = body.get("file_size")
+    asr_engine = body.get("asr_engine")
 
-        extension = next(
-            (ext for ext in SUPPORTED_AUDIO_FORMATS if filename.endswith(ext)),
-            None
-        )
+    if not all([patient_id, cce_id, filename]):
+        return response(400, {
+            "error": "patient_id, cce_id, and filename are required"
+        })
 
-        if not extension:
-            return response(400, {
-                "error": f"Unsupported format. Supported: {list(SUPPORTED_AUDIO_FORMATS.keys())}"
-            })
-
-        content_type = SUPPORTED_AUDIO_FORMATS[extension]
-
-        session_id = f"session-{shortuuid.ShortUUID().random(length=8)}"
-        session_folder = f"sessions/{session_id}"
-        input_path = f"{session_folder}/input/audio{extension}"
-        output_path = f"{session_folder}/output/{session_id}.json"
-
-        presigned_url = s3.generate_presigned_url(
-            "put_object",
-            Params={
-                "Bucket": BUCKET_NAME,
-                "Key": input_path,
-                "ContentType": content_type
-            },
-            ExpiresIn=3600,
-            HttpMethod="PUT"
-        )
+    if file_size is not None and (not isinstance(file_size, int) or not 0 < file_size <= MAX_UPLOAD_BYTES):
+        return response(400, {
+            "error": f"file_size must be a byte count between 1 and {MAX_UPLOAD_BYTES}"
+        })
+
+    if asr_engine is not None and asr_engine not in SUPPORTED_ASR_ENGINES:
+        return response(400, {
+            "error": f"asr_engine must be one of {list(SUPPORTED_ASR_ENGINES)}"
+        })
+
+    filename = os.path.basename(filename).lower()
+
+    extension = next(
+        (ext for ext in SUPPORTED_AUDIO_FORMATS if filename.endswith(ext)),
+        None
+    )
+
+    if not extension:
+        return response(400, {
+            "error": f"Unsupported format. Supported: {list(SUPPORTED_AUDIO_FORMATS.keys())}"
+        })
+
+    content_type = SUPPORTED_AUDIO_FORMATS[extension]
+
+    session_id = f"session-{shortuuid.ShortUUID().random(length=8)}"
+    bind(session_id)
+    session_folder = f"sessions/{session_id}"
+    input_path = f"{session_folder}/input/audio{extension}"
+    output_path = f"{session_folder}/output/{session_id}.json"
+
+    session = {
+        "session_id": session_id,
+        "patient_id": patient_id,
+        "patient_name": patient_name,
+        "cce_id": cce_id,
+        "language_preferences": language_preferences,
+        "status": "UPLOAD_URL_GENERATED",
+        "content_type": content_type,
+        "s3_input_path": input_path,
+        "s3_output_path": output_path,
+        "created_at": int(time.time()),
+        # Added to by every later write; get_session's ETag is computed from it
+        "revision": 1
+    }
+    if asr_engine:
+        session["asr_engine"] = asr_engine
 
-        table.put_item(
-            Item={
-                "session_id": session_id,
-                "patient_id": patient_id,
-                "patient_name": patient_name,
-                "cce_id": cce_id,
-                "language_preferences": language_preferences,
-                "status": "UPLOAD_URL_GENERATED",
-                "content_type": content_type,
-                "s3_input_path": input_path,
-                "s3_output_path": output_path,
-                "created_at": int(time.time())
-            }
+    if file_size is not None and (file_size >= MULTIPART_THRESHOLD_BYTES or body.get("multipart")):
+        return create_multipart_upload(session, file_size)
+
+    presigned_url = s3.generate_presigned_url(
+        "put_object",
+        Params={
+            "Bucket": BUCKET_NAME,
+            "Key": input_path,
+            "ContentType": content_type
+        },
+        ExpiresIn=3600,
+        HttpMethod="PUT"
+    )
+
+    with span("dynamodb_write"):
+        table.put_item(Item=session)
+
+    return response(200, {
+        "session_id": session_id,
+        "presigned_url": presigned_url,
+        "expires_in": 3600,
+        "status": "UPLOAD_URL_GENERATED",
+        "s3_input_path": input_path,
+        "s3_output_path": output_path
+    })
+
+
+def create_multipart_upload(session, file_size):
+    """
+    Start an S3 multipart upload and hand out one presigned URL per part.
+    The S3 trigger fires once, when the upload is completed.
+    """
+    with span("s3_multipart_create"):
+        upload = s3.create_multipart_upload(
+            Bucket=BUCKET_NAME,
+            Key=session["s3_input_path"],
+            ContentType=session["content_type"]
         )
+    part_size = choose_part_size(file_size)
+    parts = part_count(file_size, part_size)
+
+    with span("dynamodb_write"):
+        table.put_item(Item={
+            **session,
+            "upload_id": upload["UploadId"],
+            "file_size": file_size,
+            "part_size": part_size,
+        })
+
+    return response(200, {
+        "session_id": session["session_id"],
+        "upload_mode": "multipart",
+        "upload_id": upload["UploadId"],
+        "file_size": file_size,
+        "part_size": part_size,
+        "part_count": parts,
+        "parts": presign_parts(s3, BUCKET_NAME, session["s3_input_path"], upload["UploadId"],
+                               range(1, parts + 1)),
+        "expires_in": PART_URL_EXPIRES_IN,
+        "status": "UPLOAD_URL_GENERATED",
+        "s3_input_path": session["s3_input_path"],
+        "s3_output_path": session["s3_output_path"]
+    })
+
+
+def multipart_action(action, session_id):
+    if not session_id:
+        return response(400, {"error": "session_id is required"})
 
+    session = table.get_item(Key={"session_id": session_id}).get("Item")
+    if not session:
+        return response(404, {"error": "Session not found", "session_id": session_id})
+    if "upload_id" not in session:
+        return response(409, {"error": "Session was not created as a multipart upload"})
+    if "upload_completed_at" in session:
+        return response(409, {"error": "Upload already completed", "session_id": session_id})
+
+    key, upload_id = session["s3_input_path"], session["upload_id"]
+    file_size, part_size = int(session["file_size"]), int(session["part_size"])
+
+    try:
+        if action == "abort":
+            s3.abort_multipart_upload(Bucket=BUCKET_NAME, Key=key, UploadId=upload_id)
+            table.update_item(
+                Key={"session_id": session_id},
+                UpdateExpression="SET #status = :status, updated_at = :updated_at REMOVE upload_id ADD revision :one",
+                ExpressionAttributeNames={"#status": "status"},
+                ExpressionAttributeValues={":status": "UPLOAD_ABORTED", ":updated_at": int(time.time()), ":one": 1}
+            )
+            return response(200, {"session_id": session_id, "status": "UPLOAD_ABORTED"})
+
+        uploaded = list_uploaded_parts(s3, BUCKET_NAME, key, upload_id)
+    except s3.exceptions.NoSuchUpload:
+        return response(410, {"error": "Multipart upload no longer exists", "session_id": session_id})
+
+    missing = missing_parts(file_size, part_size, uploaded)
+
+    if action == "resume":
+        # Fresh URLs for the parts S3 has not received; uploaded parts are kept
         return response(200, {
             "session_id": session_id,
-            "presigned_url": presigned_url,
-            "expires_in": 3600,
-            "status": "UPLOAD_URL_GENERATED",
-            "s3_input_path": input_path,
-            "s3_output_path": output_path
+            "upload_mode": "multipart",
+            "part_size": part_size,
+            "part_count": part_count(file_size, part_size),
+            "uploaded_parts": sorted(set(uploaded) - set(missing)),
+            "parts": presign_parts(s3, BUCKET_NAME, key, upload_id, missing),
+            "expires_in": PART_URL_EXPIRES_IN
         })
 
-    except Exception as e:
-        print("Error:", e)
-        return response(500, {"error": "Internal server error"})
+    if missing:
+        return response(409, {
+            "error": "Parts are missing; resume the upload first",
+            "missing_parts": missing
+        })
+
+    s3.complete_multipart_upload(
+        Bucket=BUCKET_NAME,
+        Key=key,
+        UploadId=upload_id,
+        MultipartUpload={"Parts": [
+            {"PartNumber": number, "ETag": uploaded[number]["ETag"]}
+            for number in range(1, part_count(file_size, part_size) + 1)
+        ]}
+    )
+    # Status is left alone: the S3 trigger may already be moving it on
+    table.update_item(
+        Key={"session_id": session_id},
+        UpdateExpression="SET upload_completed_at = :now ADD revision :one",
+        ExpressionAttributeValues={":now": int(time.time()), ":one": 1}
+    )
+
+    return response(200, {
+        "session_id": session_id,
+        "upload_mode": "multipart",
+        "status": "UPLOAD_COMPLETED",
+        "s3_input_path": key
+    })
 
 
 def response(status_code, body):
@@ -0,0 +1,78 @@
+"""
+S3 multipart upload helpers for large recordings.
+
+The client uploads the parts in parallel straight to S3 through presigned
+``upload_part`` URLs; only creating, listing and completing the upload go
+through the Lambda. Uploaded parts are read back from S3 with ListParts,
+so a resumed upload only asks for the missing parts and completion needs
+no ETags from the browser.
+"""
+import math
+import os
+
+MiB = 1024 * 1024
+
+# S3 limits: parts of 5 MiB to 5 GiB (the last may be smaller), at most
+# 10,000 parts per upload
+MIN_PART_SIZE = 5 * MiB
+MAX_PART_SIZE = 5 * 1024 * MiB
+MAX_PARTS = 10000
+
+# Aim for this many parts: enough to upload in parallel, while a dropped
+# connection loses at most one part's worth of work
+TARGET_PARTS = int(os.environ.get("MULTIPART_TARGET_PARTS", "20"))
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", str(5 * 1024 * MiB)))
+PART_URL_EXPIRES_IN = int(os.environ.get("MULTIPART_URL_EXPIRES_IN", str(6 * 3600)))
+
+
+def choose_part_size(file_size):
+    """Part size for a ``file_size`` byte upload, rounded up to whole MiB"""
+    size = max(MIN_PART_SIZE, math.ceil(file_size / TARGET_PARTS), math.ceil(file_size / MAX_PARTS))
+    return min(MAX_PART_SIZE, math.ceil(size / MiB) * MiB)
+
+
+def part_count(file_size, part_size):
+    return max(1, math.ceil(file_size / part_size))
+
+
+def expected_part_size(file_size, part_size, number):
+    """Size part ``number`` must have; the last part takes the remainder"""
+    return min(part_size, file_size - (number - 1) * part_size)
+
+
+def missing_parts(file_size, part_size, uploaded):
+    """
+    Part numbers still to upload, given ``list_uploaded_parts`` output;
+    a part of the wrong size counts as missing and is uploaded again
+    """
+    return [
+        number for number in range(1, part_count(file_size, part_size) + 1)
+        if uploaded.get(number, {}).get("Size") != expected_part_size(file_size, part_size, number)
+    ]
+
+
+def presign_parts(s3, bucket, key, upload_id, part_numbers):
+    return [
+        {
+            "part_number": number,
+            "url": s3.generate_presigned_url(
+                "upload_part",
+                Params={"Bucket": bucket, "Key": key, "UploadId": upload_id, "PartNumber": number},
+                ExpiresIn=PART_URL_EXPIRES_IN,
+                HttpMethod="PUT"
+            ),
+        }
+        for number in part_numbers
+    ]
+
+
+def list_uploaded_parts(s3, bucket, key, upload_id):
+    """{part number: {"PartNumber", "ETag", "Size"}} of the parts S3 has received"""
+    parts, marker = {}, 0
+    while True:
+        result = s3.list_parts(Bucket=bucket, Key=key, UploadId=upload_id, PartNumberMarker=marker)
+        for part in result.get("Parts", []):
+            parts[part["PartNumber"]] = part
+        if not result.get("IsTruncated"):
+            return parts
+        marker = result["NextPartNumberMarker"]
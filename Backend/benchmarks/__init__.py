@@ -0,0 +1,10 @@
+"""
+Local performance benchmarks for the Lambda handlers.
+
+Run from the Backend directory, e.g.::
+
+    python -m benchmarks.batch_processing
+"""
+from tests.fakes import configure_local_env
+
+configure_local_env()
@@ -0,0 +1,395 @@
+"""
+Replay a corpus of recordings with reference transcripts through the ASR
+engines and report latency, real-time factor, payload bytes, word error
+rate per language and estimated cost.
+
+The corpus is a directory of WAV recordings with the reference transcript
+of each next to it (visit.wav, visit.txt). Recordings under a directory
+named after a language code (hi-IN/visit.wav) are scored as that language,
+the rest as --language. Every recording is first normalized to 16 kHz mono
+the way audio_normalizer does it.
+
+Engines, given as a comma-separated list:
+
+    stub              the production Sarvam windowing against a local
+                      endpoint that answers each window with its share of
+                      the reference (every --stub-error-every'th word
+                      wrong) after --stub-rtf x the window length
+    sarvam            the SageMaker endpoint SARVAM_ENDPOINT_NAME
+    transcribe        Amazon Transcribe jobs, staged through --bucket
+    recorded:ENGINE   the responses ENGINE gave in an earlier run saved
+                      with --record, replayed with their measured timings
+
+Costs use the prices given on the command line: Transcribe per audio
+minute (15 s minimum per job), SageMaker per instance hour for the time
+the endpoint spends on calls divided by --sagemaker-concurrency. Results
+are printed as a table and, with --output, written as JSON that later runs
+can be diffed against.
+
+    python -m benchmarks.asr_engines --corpus ../asr-corpus --engines stub,recorded:sarvam --output asr.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import subprocess
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+
+import numpy as np
+
+from tests.fakes import FakeS3, FakeSageMakerRuntime
+from transcribe_audio import app
+from asr_engines import AsrRequest, TranscribeEngine
+from common.audio import TARGET_SAMPLE_RATE, Resampler, downmix, iter_frames, read_wav_header, to_pcm16, wav_header
+from common.chunk_manifest import kept_to_source
+from audio_chunker import plan_chunks
+
+BUCKET = "cloudnine-cce-bench"
+AUDIO_KEY = "benchmarks/asr/audio.wav"
+STUB_KEY_SAMPLES = 1600  # a window is recognised by its first 0.1 s
+
+
+def load_corpus(root, default_language):
+    """[(name, language, wav path, reference or None)] in name order"""
+    recordings = []
+    for directory, _, files in os.walk(root):
+        for file in sorted(files):
+            if not file.lower().endswith(".wav"):
+                continue
+            path = os.path.join(directory, file)
+            name = os.path.relpath(path, root)
+            parent = os.path.basename(os.path.dirname(name))
+            language = parent if looks_like_language(parent) else default_language
+            reference_path = os.path.splitext(path)[0] + ".txt"
+            reference = None
+            if os.path.exists(reference_path):
+                with open(reference_path, encoding="utf-8") as f:
+                    reference = f.read()
+            recordings.append((name, language, path, reference))
+    return sorted(recordings)
+
+
+def staged(wav):
+    s3 = FakeS3()
+    s3.put_object(Bucket=BUCKET, Key=AUDIO_KEY, Body=wav)
+    return s3
+
+
+def looks_like_language(name):
+    parts = name.split("-")
+    return len(parts) == 2 and len(parts[0]) == 2 and parts[0].islower() and parts[1].isupper()
+
+
+def normalized_wav(path):
+    """(16 kHz mono 16-bit WAV bytes, source seconds)"""
+    with open(path, "rb") as f:
+        fmt = read_wav_header(f)
+        rate = min(fmt.sample_rate, TARGET_SAMPLE_RATE)
+        resampler = Resampler(fmt.sample_rate, rate) if rate != fmt.sample_rate else None
+        pcm, frames = [], 0
+        for block in iter_frames(f, fmt, 10 * fmt.sample_rate):
+            frames += len(block)
+            mono = downmix(block)
+            pcm.append(to_pcm16(resampler.process(mono) if resampler else mono))
+        if resampler:
+            pcm.append(to_pcm16(resampler.flush()))
+    data = b"".join(pcm)
+    return wav_header(rate, 1, 16, len(data)) + data, frames / fmt.sample_rate
+
+
+def words(text):
+    """Case-folded words with punctuation and symbols dropped"""
+    kept = "".join(" " if unicodedata.category(c)[0] in "PSZ" else c for c in text.casefold())
+    return kept.split()
+
+
+def word_errors(reference, hypothesis):
+    """Word-level edit distance (substitutions + deletions + insertions)"""
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref in enumerate(reference, 1):
+        current = [i]
+        for j, hyp in enumerate(hypothesis, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref != hyp)))
+        previous = current
+    return previous[-1]
+
+
+class TimedRuntime:
+    """SageMaker runtime wrapper that adds up call time and request bytes"""
+
+    def __init__(self, runtime):
+        self.runtime = runtime
+        self.lock = threading.Lock()
+        self.calls, self.seconds, self.payload_bytes = 0, 0.0, 0
+
+    def invoke_endpoint(self, Body, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self.runtime.invoke_endpoint(Body=Body, **kwargs)
+        finally:
+            with self.lock:
+                self.calls += 1
+                self.seconds += time.perf_counter() - started
+                self.payload_bytes += len(Body)
+
+
+class StubModel:
+    """
+    Responder for FakeSageMakerRuntime that answers each window of a
+    recording with the reference words spoken in it, spread evenly over
+    the source time
+    """
+
+    def __init__(self, wav, reference, error_every, rtf):
+        self.error_every, self.rtf = error_every, rtf
+        plan = plan_chunks(staged(wav), BUCKET, AUDIO_KEY, app.SARVAM_WINDOW_SECONDS,
+                           10.0, app.MAX_SILENCE_SECONDS, 0.0)
+        reference_words = words(reference or "")
+        self.texts = {}
+        if plan is None:
+            return
+        starts = [kept_to_source(plan.spans, start) for start, _ in plan.windows]
+        bounds = [0.0] + starts[1:] + [plan.source_seconds]
+        pcm = wav[44:]
+        for index, start in enumerate(starts):
+            first = round(start * plan.sample_rate) * 2
+            lo = int(bounds[index] / plan.source_seconds * len(reference_words))
+            hi = int(bounds[index + 1] / plan.source_seconds * len(reference_words))
+            self.texts[pcm[first:first + STUB_KEY_SAMPLES * 2]] = " ".join(
+                "<unk>" if error_every and (k + 1) % error_every == 0 else reference_words[k] for k in range(lo, hi)
+            )
+
+    def __call__(self, samples, rate, max_new_tokens):
+        time.sleep(self.rtf * len(samples) / rate)
+        return self.texts.get(to_pcm16(samples[:STUB_KEY_SAMPLES]), "")
+
+
+def run_sarvam(runtime, name, language, wav):
+    """(text, measurements) through the production Sarvam engine"""
+    timed = TimedRuntime(runtime)
+    s3 = staged(wav)
+    app.s3, app.sagemaker = s3, timed
+    request = AsrRequest("bench", BUCKET, AUDIO_KEY, "benchmarks/asr/output/", [language])
+
+    started = time.perf_counter()
+    result = app.asr_engines()["sarvam"].start(request)
+    latency = time.perf_counter() - started
+
+    document = json.loads(s3.objects[(BUCKET, "benchmarks/asr/output/bench.json")]["Body"])
+    return document["results"]["transcripts"][0]["transcript"], {
+        "latency_seconds": latency,
+        "payload_bytes": timed.payload_bytes,
+        "calls": timed.calls,
+        "windows": result["windows"],
+        "billing": {"unit": "endpoint", "seconds": timed.seconds},
+    }
+
+
+def run_transcribe(bucket, name, language, wav):
+    """(text, measurements) of one Amazon Transcribe job on a staged copy"""
+    import boto3
+
+    s3, transcribe = boto3.client("s3"), boto3.client("transcribe")
+    job_name = f"asr-bench-{int(time.time())}-{abs(hash(name)) % 10 ** 6}"
+    key, output_key = f"benchmarks/asr/{job_name}.wav", "benchmarks/asr/output/"
+    s3.put_object(Bucket=bucket, Key=key, Body=wav)
+    engine = TranscribeEngine(transcribe)
+    try:
+        started = time.perf_counter()
+        engine.start(AsrRequest(job_name, bucket, key, output_key, [language]))
+        while True:
+            job = transcribe.get_transcription_job(TranscriptionJobName=job_name)["TranscriptionJob"]
+            if job["TranscriptionJobStatus"] in ("COMPLETED", "FAILED"):
+                break
+            time.sleep(2)
+        latency = time.perf_counter() - started
+        if job["TranscriptionJobStatus"] == "FAILED":
+            raise RuntimeError(job.get("FailureReason", "Transcription job failed"))
+        output = s3.get_object(Bucket=bucket, Key=f"{output_key}{job_name}.json")["Body"].read()
+    finally:
+        s3.delete_object(Bucket=bucket, Key=key)
+        s3.delete_object(Bucket=bucket, Key=f"{output_key}{job_name}.json")
+        with contextlib.suppress(Exception):
+            transcribe.delete_transcription_job(TranscriptionJobName=job_name)
+
+    audio_seconds = (len(wav) - 44) / 2 / TARGET_SAMPLE_RATE
+    return json.loads(output)["results"]["transcripts"][0]["transcript"], {
+        "latency_seconds": latency,
+        "payload_bytes": len(wav),
+        "calls": 1,
+        "windows": 1,
+        "billing": {"unit": "audio", "seconds": max(15.0, audio_seconds)},
+    }
+
+
+def recording_path(directory, engine, name):
+    return os.path.join(directory, engine, os.path.splitext(name)[0] + ".json")
+
+
+def run_recorded(directory, engine, name):
+    with open(recording_path(directory, engine, name), encoding="utf-8") as f:
+        recorded = json.load(f)
+    return recorded.pop("text"), recorded
+
+
+def cost(billing, args):
+    if billing["unit"] == "audio":
+        return billing["seconds"] / 60 * args.transcribe_price_per_minute
+    return billing["seconds"] / args.sagemaker_concurrency / 3600 * args.sagemaker_price_per_hour
+
+
+def run_engine(engine, name, language, wav, reference, args):
+    if engine == "stub":
+        model = StubModel(wav, reference, args.stub_error_every, args.stub_rtf)
+        return run_sarvam(FakeSageMakerRuntime(responder=model), name, language, wav)
+    if engine == "sarvam":
+        import boto3
+        return run_sarvam(boto3.client("sagemaker-runtime"), name, language, wav)
+    if engine == "transcribe":
+        if not args.bucket:
+            raise ValueError("transcribe needs --bucket to stage the audio")
+        return run_transcribe(args.bucket, name, language, wav)
+    if engine.startswith("recorded:"):
+        if not args.recordings:
+            raise ValueError("recorded engines need --recordings")
+        return run_recorded(args.recordings, engine.split(":", 1)[1], name)
+    raise ValueError(f"Unknown engine {engine}")
+
+
+def summarize(rows):
+    """Totals per (engine, language) and per engine"""
+    groups = defaultdict(list)
+    for row in rows:
+        if "error" not in row:
+            groups[(row["engine"], row["language"])].append(row)
+            groups[(row["engine"], "all")].append(row)
+
+    summary = []
+    for (engine, language), group in sorted(groups.items()):
+        audio = sum(r["audio_seconds"] for r in group)
+        scored = [r for r in group if r["reference_words"]]
+        reference_words = sum(r["reference_words"] for r in scored)
+        latencies = [r["latency_seconds"] for r in group]
+        total_cost = sum(r["cost_usd"] for r in group)
+        summary.append({
+            "engine": engine,
+            "language": language,
+            "files": len(group),
+            "audio_seconds": round(audio, 3),
+            "latency_p50_seconds": round(float(np.percentile(latencies, 50)), 3),
+            "latency_max_seconds": round(max(latencies), 3),
+            "rtf": round(sum(latencies) / audio, 4) if audio else None,
+            "payload_bytes": sum(r["payload_bytes"] for r in group),
+            "wer": round(sum(r["errors"] for r in scored) / reference_words, 4) if reference_words else None,
+            "reference_words": reference_words,
+            "cost_usd": round(total_cost, 6),
+            "cost_usd_per_audio_hour": round(total_cost / audio * 3600, 4) if audio else None,
+        })
+    return summary
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--corpus", default=".", help="Directory of WAV recordings and .txt references")
+    parser.add_argument("--engines", default="stub", help="Comma-separated engines (see above)")
+    parser.add_argument("--language", default="hi-IN", help="Language of recordings outside a language directory")
+    parser.add_argument("--bucket", help="Bucket to stage audio in for the transcribe engine")
+    parser.add_argument("--recordings", help="Directory of responses for --record and recorded:ENGINE")
+    parser.add_argument("--record", action="store_true", help="Save the responses of live engines to --recordings")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--stub-rtf", type=float, default=0.05, help="Stub seconds per second of audio")
+    parser.add_argument("--stub-error-every", type=int, default=12, help="Stub gets every Nth word wrong (0: none)")
+    parser.add_argument("--transcribe-price-per-minute", type=float, default=0.024)
+    parser.add_argument("--sagemaker-price-per-hour", type=float, default=1.41)
+    parser.add_argument("--sagemaker-concurrency", type=int, default=1, help="Calls an instance serves at once")
+    args = parser.parse_args()
+
+    if args.record and not args.recordings:
+        parser.error("--record needs --recordings")
+    engines = args.engines.split(",")
+    corpus = load_corpus(args.corpus, args.language)
+    if not corpus:
+        parser.error(f"No WAV recordings under {args.corpus}")
+
+    print(f"{'file':<28} {'engine':<16} {'lang':<6} {'audio s':>8} {'latency s':>9} {'RTF':>6} "
+          f"{'payload KB':>10} {'calls':>5} {'WER':>6} {'cost $':>9}")
+    rows = []
+    for name, language, path, reference in corpus:
+        wav, audio_seconds = normalized_wav(path)
+        reference_words = words(reference) if reference is not None else []
+        for engine in engines:
+            row = {"file": name, "engine": engine, "language": language, "audio_seconds": round(audio_seconds, 3)}
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    text, measured = run_engine(engine, name, language, wav, reference, args)
+            except Exception as e:
+                rows.append({**row, "error": f"{type(e).__name__}: {e}"})
+                print(f"{name:<28} {engine:<16} {language:<6} failed: {type(e).__name__}: {e}")
+                continue
+
+            if args.record and not engine.startswith("recorded:"):
+                path_out = recording_path(args.recordings, engine, name)
+                os.makedirs(os.path.dirname(path_out), exist_ok=True)
+                with open(path_out, "w", encoding="utf-8") as f:
+                    json.dump({"text": text, **measured}, f, ensure_ascii=False, indent=1)
+
+            errors = word_errors(reference_words, words(text)) if reference_words else None
+            row.update({
+                "latency_seconds": round(measured["latency_seconds"], 3),
+                "rtf": round(measured["latency_seconds"] / audio_seconds, 4) if audio_seconds else None,
+                "payload_bytes": measured["payload_bytes"],
+                "calls": measured["calls"],
+                "windows": measured["windows"],
+                "reference_words": len(reference_words),
+                "errors": errors,
+                "wer": round(errors / len(reference_words), 4) if reference_words else None,
+                "billed_seconds": round(measured["billing"]["seconds"], 3),
+                "cost_usd": round(cost(measured["billing"], args), 6),
+                "text": text,
+            })
+            rows.append(row)
+            wer = f"{row['wer']:.1%}" if row["wer"] is not None else "-"
+            print(f"{name:<28} {engine:<16} {language:<6} {audio_seconds:>8.1f} {row['latency_seconds']:>9.2f} "
+                  f"{row['rtf']:>6.3f} {row['payload_bytes'] / 1e3:>10.0f} {row['calls']:>5} {wer:>6} "
+                  f"{row['cost_usd']:>9.5f}")
+
+    summary = summarize(rows)
+    print(f"\n{'engine':<16} {'lang':<6} {'files':>5} {'audio s':>8} {'p50 s':>7} {'RTF':>6} "
+          f"{'payload KB':>10} {'WER':>6} {'$/audio h':>10}")
+    for s in summary:
+        wer = f"{s['wer']:.1%}" if s["wer"] is not None else "-"
+        print(f"{s['engine']:<16} {s['language']:<6} {s['files']:>5} {s['audio_seconds']:>8.1f} "
+              f"{s['latency_p50_seconds']:>7.2f} {s['rtf']:>6.3f} {s['payload_bytes'] / 1e3:>10.0f} {wer:>6} "
+              f"{s['cost_usd_per_audio_hour']:>10.4f}")
+
+    if args.output:
+        report = {
+            "revision": git_revision(),
+            "timestamp": int(time.time()),
+            "settings": {
+                "sarvam_window_seconds": app.SARVAM_WINDOW_SECONDS,
+                "sarvam_max_concurrency": app.SARVAM_MAX_CONCURRENCY,
+                "sarvam_payload_format": app.SARVAM_PAYLOAD_FORMAT,
+                **{k: v for k, v in vars(args).items() if k not in ("output", "record")},
+            },
+            "files": rows,
+            "summary": summary,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+
+
+if __name__ == "__main__":
+    main()
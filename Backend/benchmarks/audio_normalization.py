@@ -0,0 +1,117 @@
+"""
+Normalization of tablet-style recordings (44.1/48 kHz stereo WAV) into the
+16 kHz mono 16-bit object that Transcribe reads, for recordings of up to
+an hour.
+
+The source WAV is generated on the fly and the output parts are counted and
+dropped, so neither side is held in memory; the peak traced memory is the
+handler's own working set. Throughput is audio seconds per CPU second of
+the normalizing process.
+
+    python -m benchmarks.audio_normalization --minutes 1,10,60
+"""
+import argparse
+import contextlib
+import io
+import time
+import tracemalloc
+
+import numpy as np
+
+from tests.fakes import FakeDynamoDB, FakeLambda, FakeS3
+from audio_normalizer import app
+from common.audio import wav_header
+
+BUCKET = "cloudnine-cce-bench"
+
+
+class SyntheticWav(io.RawIOBase):
+    """Readable WAV of speech-like noise bursts, produced as it is read"""
+
+    def __init__(self, rate, channels, seconds, seed=5):
+        self.rate, self.channels = rate, channels
+        self.data_bytes = int(rate * seconds) * channels * 2
+        self.pending = wav_header(rate, channels, 16, self.data_bytes)
+        self.left = self.data_bytes
+        self.rng = np.random.default_rng(seed)
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while len(self.pending) < size and self.left:
+            frames = min(self.rate, self.left // (2 * self.channels))
+            envelope = np.repeat(self.rng.random(frames // 1600 + 1) > 0.4, 1600)[:frames]
+            mono = self.rng.normal(0, 0.1, frames) * envelope
+            block = np.repeat(mono[:, None], self.channels, axis=1) * 32767
+            raw = np.clip(block, -32768, 32767).astype("<i2").tobytes()
+            self.left -= len(raw)
+            self.pending += raw
+        chunk, self.pending = self.pending[:size], self.pending[size:]
+        return chunk
+
+
+class CountingS3(FakeS3):
+    """Serves one synthetic object and keeps only the size of what is written"""
+
+    def __init__(self, source):
+        super().__init__()
+        self.source = source
+        self.written = 0
+
+    def get_object(self, Bucket, Key, **kwargs):
+        self._record("get_object")
+        return {"Body": self.source, "ContentLength": 44 + self.source.data_bytes}
+
+    def put_object(self, Bucket, Key, Body=b"", **kwargs):
+        self.written += len(Body)
+        return {"ETag": '"0"'}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body=b"", **kwargs):
+        self._record("upload_part")
+        self.written += len(Body)
+        return {"ETag": f'"{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload, **kwargs):
+        self.uploads.pop(UploadId, None)
+        return {}
+
+
+def run(rate, channels, minutes):
+    source = SyntheticWav(rate, channels, minutes * 60)
+    s3 = CountingS3(source)
+    app.s3, app.dynamodb, app.lambda_client = s3, FakeDynamoDB(), FakeLambda()
+
+    key = "sessions/session-bench/input/audio.wav"
+    tracemalloc.start()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = app.normalize_object(BUCKET, key, "session-bench")
+    wall = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert result["normalized"] and result["normalized_bytes"] == s3.written
+    return result, wall, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--minutes", default="1,10,60", help="Comma-separated recording lengths")
+    parser.add_argument("--formats", default="48000x2,44100x2", help="Comma-separated RATExCHANNELS")
+    args = parser.parse_args()
+
+    print(f"{'source':<14} {'minutes':>7} {'input MB':>9} {'output MB':>10} {'saved':>6} "
+          f"{'audio s/CPU s':>14} {'wall s':>7} {'peak MB':>8}")
+    for spec in args.formats.split(","):
+        rate, channels = (int(v) for v in spec.split("x"))
+        for minutes in (float(m) for m in args.minutes.split(",")):
+            result, wall, peak = run(rate, channels, minutes)
+            saved = result["bytes_saved"] / result["input_bytes"]
+            print(f"{rate / 1000:g} kHz x{channels:<5} {minutes:>7g} {result['input_bytes'] / 1e6:>9.1f} "
+                  f"{result['normalized_bytes'] / 1e6:>10.1f} {saved:>6.0%} "
+                  f"{result['audio_seconds_per_cpu_second']:>14.0f} {wall:>7.2f} {peak / 1e6:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
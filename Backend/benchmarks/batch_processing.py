@@ -0,0 +1,97 @@
+"""
+Throughput of the SQS batch mode of transcription_processing compared with
+one EventBridge event per invocation.
+
+S3, Bedrock and DynamoDB are replaced by local stubs with fixed latencies, so
+the numbers show the effect of overlapping per-job I/O rather than real
+service performance.
+
+    python -m benchmarks.batch_processing --jobs 200 --workers 16
+"""
+import argparse
+import contextlib
+import io
+import json
+import time
+
+from tests.fakes import FakeBedrockRuntime, FakeDynamoDB, FakeS3, transcribe_output
+from transcription_processing import app
+
+TRANSCRIPT = "CCE: When is your due date? Customer: It is in March, this is my first pregnancy. " * 40
+
+
+def build_stubs(jobs, s3_latency, bedrock_latency, dynamodb_latency):
+    s3 = FakeS3(latency=s3_latency)
+    for i in range(jobs):
+        job_name = f"session-bench{i:04d}"
+        s3.put_object(
+            Bucket=app.BUCKET_NAME,
+            Key=f"sessions/{job_name}/output/{job_name}.json",
+            Body=transcribe_output(job_name, TRANSCRIPT),
+        )
+    s3.calls.clear()
+    return s3, FakeBedrockRuntime(latency=bedrock_latency), FakeDynamoDB(latency=dynamodb_latency)
+
+
+def job_event(i):
+    return {
+        "detail": {
+            "TranscriptionJobName": f"session-bench{i:04d}",
+            "TranscriptionJobStatus": "COMPLETED",
+        }
+    }
+
+
+def run_single(jobs):
+    for i in range(jobs):
+        app.lambda_handler(job_event(i), None)
+
+
+def run_batch(jobs, batch_size):
+    failures = 0
+    for start in range(0, jobs, batch_size):
+        records = [
+            {"messageId": f"msg-{i}", "body": json.dumps(job_event(i))}
+            for i in range(start, min(start + batch_size, jobs))
+        ]
+        failures += len(app.lambda_handler({"Records": records}, None)["batchItemFailures"])
+    return failures
+
+
+def measure(label, jobs, stub_args, runner):
+    app.s3, app.bedrock, app.dynamodb = build_stubs(jobs, *stub_args)
+
+    # Handler logging would dominate the timings; keep it out of the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        runner()
+        elapsed = time.perf_counter() - started
+
+    print(f"{label:<28} {elapsed:8.2f}s {jobs / elapsed:10.1f} jobs/s")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--jobs", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=10, help="SQS batch size")
+    parser.add_argument("--workers", type=int, default=app.BATCH_MAX_WORKERS)
+    parser.add_argument("--s3-latency", type=float, default=0.02)
+    parser.add_argument("--bedrock-latency", type=float, default=0.25)
+    parser.add_argument("--dynamodb-latency", type=float, default=0.01)
+    args = parser.parse_args()
+
+    app.BATCH_MAX_WORKERS = args.workers
+    stub_args = (args.s3_latency, args.bedrock_latency, args.dynamodb_latency)
+
+    print(f"{args.jobs} jobs, batch size {args.batch_size}, {args.workers} workers")
+    print(f"{'mode':<28} {'wall':>9} {'throughput':>15}")
+    single = measure("single event / invocation", args.jobs, stub_args,
+                     lambda: run_single(args.jobs))
+    batch = measure("batch", args.jobs, stub_args,
+                    lambda: run_batch(args.jobs, args.batch_size))
+    print(f"speedup: {single / batch:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
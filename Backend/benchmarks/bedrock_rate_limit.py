@@ -0,0 +1,94 @@
+"""
+Simulation of concurrent transcription_processing instances calling a
+throttling Bedrock stub, with and without the shared rate limiter.
+
+"uncoordinated" approximates the previous behaviour: every instance calls
+as fast as it can with botocore-style retries (4 retries, short exponential
+backoff) and a job fails once its retries are used up. "coordinated" gives
+each instance its own BedrockLimiter drawing from one DynamoDB-backed token
+bucket sized to the quota.
+
+    python -m benchmarks.bedrock_rate_limit --instances 16 --jobs 8 --quota 20
+"""
+import argparse
+import random
+import threading
+import time
+
+from tests.fakes import FakeDynamoDB, ThrottlingBedrockRuntime
+from rate_limiter import BedrockLimiter, DynamoTokenBucket, LocalTokenBucket, error_code
+
+LIMIT_TABLE = "bedrock_rate_limits"
+
+
+def uncoordinated_call(bedrock):
+    for attempt in range(5):
+        try:
+            return bedrock.invoke_model(modelId="stub", body="{}")
+        except Exception as e:
+            if error_code(e) != "ThrottlingException" or attempt == 4:
+                raise
+            time.sleep(random.random() * 0.05 * 2 ** attempt)
+
+
+def run(mode, args):
+    bedrock = ThrottlingBedrockRuntime(args.quota, latency=args.bedrock_latency)
+    dynamodb = FakeDynamoDB(latency=args.dynamodb_latency, key_names={LIMIT_TABLE: "bucket_id"})
+    outcomes = {"succeeded": 0, "failed": 0}
+    lock = threading.Lock()
+    limiters = []
+
+    def instance():
+        if mode == "coordinated":
+            limiter = BedrockLimiter(
+                DynamoTokenBucket(dynamodb, LIMIT_TABLE, "bedrock", args.quota * args.headroom, args.quota),
+                LocalTokenBucket(args.quota / args.instances, 1),
+                max_wait=300
+            )
+            limiters.append(limiter)
+            call = lambda: limiter.call(bedrock.invoke_model, modelId="stub", body="{}")
+        else:
+            call = lambda: uncoordinated_call(bedrock)
+
+        for _ in range(args.jobs):
+            try:
+                call()
+                outcome = "succeeded"
+            except Exception:
+                outcome = "failed"
+            with lock:
+                outcomes[outcome] += 1
+
+    threads = [threading.Thread(target=instance) for _ in range(args.instances)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    throughput = outcomes["succeeded"] / elapsed
+    print(f"{mode:<14} {outcomes['succeeded']:>9} {outcomes['failed']:>7} {bedrock.throttled:>10} "
+          f"{elapsed:8.1f}s {throughput:8.1f}/s {throughput / args.quota:8.0%} "
+          f"{dynamodb.total_calls / max(1, outcomes['succeeded']):10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--instances", type=int, default=16)
+    parser.add_argument("--jobs", type=int, default=8, help="Bedrock calls per instance")
+    parser.add_argument("--quota", type=float, default=20.0, help="Bedrock requests per second")
+    parser.add_argument("--headroom", type=float, default=0.95, help="Share of the quota the bucket refills")
+    parser.add_argument("--bedrock-latency", type=float, default=0.3)
+    parser.add_argument("--dynamodb-latency", type=float, default=0.005)
+    args = parser.parse_args()
+
+    print(f"{args.instances} instances x {args.jobs} calls, quota {args.quota:.0f} req/s")
+    print(f"{'mode':<14} {'succeeded':>9} {'failed':>7} {'throttled':>10} {'wall':>9} "
+          f"{'rate':>10} {'of quota':>8} {'ddb/call':>10}")
+    for mode in ("uncoordinated", "coordinated"):
+        run(mode, args)
+
+
+if __name__ == "__main__":
+    main()
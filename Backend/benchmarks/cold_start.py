@@ -0,0 +1,137 @@
+"""
+Cold-start cost of each Lambda handler: module import time, first
+invocation time and a warm invocation for reference, each measured in a
+fresh interpreter.
+
+AWS calls are answered in-process by replacing botocore's HTTP send, so the
+numbers cover import, client construction, request signing and response
+parsing but no network time. ``--baseline <git ref>`` measures the handlers
+as they were at that commit for a before/after comparison.
+
+    python -m benchmarks.cold_start --baseline HEAD~1 --runs 7
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+EVENTS = {
+    "audio_upload": {
+        "body": json.dumps({"patient_id": "p-1", "cce_id": "cce-1", "filename": "visit.wav"})
+    },
+    "get_session": {"pathParameters": {"session_id": "session-bench"}},
+    "transcribe_audio": {
+        "Records": [{"s3": {
+            "bucket": {"name": "cloudnine-cce"},
+            "object": {"key": "sessions/session-bench/input/audio.wav"},
+        }}]
+    },
+    "transcription_processing": {
+        "detail": {"TranscriptionJobName": "session-bench", "TranscriptionJobStatus": "FAILED"}
+    },
+}
+
+CHILD = r"""
+import contextlib, io, json, os, sys, time
+
+handler_dir, backend_dir, event = sys.argv[1], sys.argv[2], json.loads(sys.argv[3])
+os.environ.update({
+    "REGION": "ap-south-1", "BUCKET_NAME": "cloudnine-cce", "SESSION_TABLE": "cce_sessions",
+    "AWS_ACCESS_KEY_ID": "bench", "AWS_SECRET_ACCESS_KEY": "bench", "AWS_DEFAULT_REGION": "ap-south-1",
+})
+# Same layout as the Lambda image: app.py and the shared package side by side
+sys.path[:0] = [handler_dir, backend_dir]
+
+started = time.perf_counter()
+import botocore.endpoint
+from botocore.awsrequest import AWSResponse
+botocore_ms = (time.perf_counter() - started) * 1000
+
+RESPONSES = {
+    "DynamoDB_20120810.GetItem": {"Item": {"session_id": {"S": "session-bench"}, "status": {"S": "COMPLETED"},
+                                           "language_preferences": {"L": [{"S": "en-IN"}]}}},
+    "Transcribe.StartTranscriptionJob": {"TranscriptionJob": {"TranscriptionJobName": "session-bench"}},
+}
+
+class Raw:
+    def __init__(self, body):
+        self.body = body
+    def stream(self, **kwargs):
+        yield self.body
+
+def send(self, request):
+    target = request.headers.get("X-Amz-Target", b"")
+    target = target.decode() if isinstance(target, bytes) else target
+    body = json.dumps(RESPONSES.get(target, {})).encode()
+    return AWSResponse(request.url, 200, {"Content-Type": "application/x-amz-json-1.0"}, Raw(body))
+
+botocore.endpoint.Endpoint._send = send
+
+with contextlib.redirect_stdout(io.StringIO()):
+    started = time.perf_counter()
+    import app
+    import_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    app.lambda_handler(event, None)
+    first_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    app.lambda_handler(event, None)
+    warm_ms = (time.perf_counter() - started) * 1000
+
+print(json.dumps({"import_ms": import_ms, "first_ms": first_ms, "warm_ms": warm_ms, "botocore_ms": botocore_ms}))
+"""
+
+
+def measure(backend_dir, handler, runs):
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", CHILD, os.path.join(backend_dir, handler), backend_dir,
+             json.dumps(EVENTS[handler])],
+            check=True, capture_output=True, text=True
+        ).stdout
+        samples.append(json.loads(output))
+    return {key: statistics.median(s[key] for s in samples) for key in samples[0]}
+
+
+def export_tree(ref, target):
+    """Check out Backend/ at ``ref`` into ``target`` without touching the work tree"""
+    archive = subprocess.run(
+        ["git", "archive", ref, "Backend"],
+        cwd=os.path.dirname(BACKEND_DIR), check=True, capture_output=True
+    ).stdout
+    subprocess.run(["tar", "-x", "-C", target], input=archive, check=True)
+    return os.path.join(target, "Backend")
+
+
+def report(label, results):
+    print(f"\n{label}")
+    print(f"{'handler':<26} {'import':>9} {'1st call':>9} {'cold total':>11} {'warm call':>10}")
+    for handler, r in results.items():
+        print(f"{handler:<26} {r['import_ms']:7.1f}ms {r['first_ms']:7.1f}ms "
+              f"{r['import_ms'] + r['first_ms']:9.1f}ms {r['warm_ms']:8.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per handler (median)")
+    parser.add_argument("--baseline", help="Git ref to compare against, e.g. HEAD~1")
+    args = parser.parse_args()
+
+    print("Median over", args.runs, "cold starts; botocore import excluded from 'import'")
+    if args.baseline:
+        with tempfile.TemporaryDirectory() as tmp:
+            baseline_dir = export_tree(args.baseline, tmp)
+            report(f"baseline ({args.baseline})", {h: measure(baseline_dir, h, args.runs) for h in EVENTS})
+    report("current tree", {h: measure(BACKEND_DIR, h, args.runs) for h in EVENTS})
+
+
+if __name__ == "__main__":
+    main()
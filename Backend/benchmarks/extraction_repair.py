@@ -0,0 +1,156 @@
+"""
+Extractions that survive malformed model answers, and the Bedrock tokens
+they cost, with the previous handling (fences stripped, the outermost
+braces parsed, the whole call repeated when that fails or a value is off
+format) against local repair plus re-asking only the broken sections.
+
+The stub model answers correctly but, at the given rates, wraps the JSON
+in prose, leaves a trailing comma, writes Python literals, stops early
+(max_tokens), puts a value outside the format in one section or leaves a
+section out; re-asks are answered with the same faults.
+
+    python -m benchmarks.extraction_repair --extractions 500 --fault-rate 0.45
+"""
+import argparse
+import contextlib
+import io
+import json
+import random
+import re
+import statistics
+
+from benchmarks.streaming_extraction import ANSWER
+from tests.fakes import FakeBedrockRuntime
+from tests.pipeline import TRANSCRIPT
+from transcription_processing import app
+from bedrock_prompt import get_transcript_message
+from extraction_schema import SCHEMA, parse_extraction
+
+FAULTS = ["prose", "trailing_comma", "python_literals", "cut_off", "off_format_value", "missing_section"]
+
+
+def faulty_model(rng, fault_rate):
+    """Responder answering with ANSWER (or the re-asked sections of it), with faults"""
+
+    def respond(payload):
+        message = payload["messages"][0]["content"][0]["text"]
+        reask = re.search(r"lacked or got these sections wrong: (.*)\. Use only", message)
+        sections = re.findall(r"(\w+) \(", reask.group(1)) if reask else list(ANSWER)
+        answer = {name: dict(ANSWER[name]) for name in sections}
+        fault = rng.choice(FAULTS) if rng.random() < fault_rate else None
+        if fault == "off_format_value":
+            answer[sections[0]][next(iter(answer[sections[0]]))] = "not sure, maybe"
+        if fault == "missing_section" and len(sections) > 1:
+            del answer[rng.choice(sections)]
+        text = json.dumps(answer, indent=2)
+        if fault == "prose":
+            text = f"Here is the information from the transcript:\n```json\n{text}\n```\nI hope this helps."
+        elif fault == "trailing_comma":
+            text = text.replace("\n  }", ",\n  }", 1)
+        elif fault == "python_literals":
+            text = text.replace("true", "True").replace("null", "None")
+        elif fault == "cut_off":
+            text = text[:rng.randrange(len(text) // 2, len(text))]
+        return text
+
+    return respond
+
+
+def usage(bedrock):
+    """(calls, input tokens, output tokens) the way the stub bills them"""
+    outputs = [len(text) // 4 for text in bedrock.outputs]
+    inputs = [len(json.dumps(request)) // 4 for request in bedrock.requests]
+    return len(inputs), sum(inputs), sum(outputs)
+
+
+def recording(responder):
+    bedrock = FakeBedrockRuntime()
+    bedrock.outputs = []
+
+    def respond(payload):
+        text = responder(payload)
+        bedrock.outputs.append(text)
+        return text
+
+    bedrock.responder = respond
+    return bedrock
+
+
+def legacy_extract(transcript, attempts):
+    """The previous parsing, with a full retry when the answer is unusable"""
+    message = get_transcript_message(transcript)
+    for _ in range(attempts):
+        content, _ = app._invoke_bedrock(message)
+        cleaned = re.sub(r'```json\s*|\s*```', '', content).strip()
+        match = re.search(r'\{[\s\S]*\}', cleaned)
+        try:
+            answer = json.loads(match.group(0)) if match else None
+        except json.JSONDecodeError:
+            continue
+        if isinstance(answer, dict) and not parse_extraction(json.dumps(answer)).problems:
+            return answer
+    return None
+
+
+def run(name, extract, extractions, fault_rate, seed):
+    rng = random.Random(seed)
+    complete, calls, tokens, output_tokens, repaired = 0, [], [], [], 0
+    for _ in range(extractions):
+        app.bedrock = recording(faulty_model(rng, fault_rate))
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = extract()
+        complete += isinstance(result, dict) and all(name in result for name in SCHEMA)
+        count, inputs, outputs = usage(app.bedrock)
+        calls.append(count)
+        tokens.append(inputs + outputs)
+        output_tokens.append(outputs)
+        repaired += count == 1 and parse_extraction(app.bedrock.outputs[0]).repaired
+    row = {
+        "complete": complete / extractions,
+        "repaired_locally": repaired / extractions,
+        "calls_per_extraction": statistics.mean(calls),
+        "retried": sum(c > 1 for c in calls) / extractions,
+        "tokens_per_extraction": statistics.mean(tokens),
+        "output_tokens_per_extraction": statistics.mean(output_tokens),
+        "tokens_per_retried_extraction": statistics.mean([t for t, c in zip(tokens, calls) if c > 1] or [0]),
+    }
+    print(f"{name:<26} {row['complete']:>8.1%} {row['repaired_locally']:>9.1%} {row['retried']:>8.1%} "
+          f"{row['calls_per_extraction']:>6.2f} {row['tokens_per_extraction']:>8.0f} "
+          f"{row['output_tokens_per_extraction']:>7.0f} "
+          f"{row['tokens_per_retried_extraction']:>15.0f}")
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--extractions", type=int, default=400)
+    parser.add_argument("--fault-rate", type=float, default=0.3, help="Share of answers with a fault")
+    parser.add_argument("--seed", type=int, default=3)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    app.PRE_EXTRACTION_ENABLED = False
+    transcript = TRANSCRIPT * 3
+    attempts = 1 + app.EXTRACTION_REASK_ATTEMPTS
+
+    print(f"{'':<26} {'complete':>8} {'repaired':>9} {'retried':>8} {'calls':>6} {'tokens':>8} {'output':>7} "
+          f"{'tokens if retry':>15}")
+    rows = {
+        "full retry": run("full retry", lambda: legacy_extract(transcript, attempts), args.extractions,
+                          args.fault_rate, args.seed),
+        "repair + section re-ask": run("repair + section re-ask", lambda: app.extract_patient_info(transcript),
+                                       args.extractions, args.fault_rate, args.seed),
+    }
+    before, after = rows["full retry"], rows["repair + section re-ask"]
+    print(f"\nTokens per extraction -{1 - after['tokens_per_extraction'] / before['tokens_per_extraction']:.1%}, "
+          f"output tokens -{1 - after['output_tokens_per_extraction'] / before['output_tokens_per_extraction']:.1%}; "
+          f"a retried extraction costs {after['tokens_per_retried_extraction']:.0f} tokens instead of "
+          f"{before['tokens_per_retried_extraction']:.0f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"settings": vars(args), "results": rows}, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Load test of the whole session pipeline: N concurrent synthetic sessions
+through audio_upload, transcribe_audio, a Transcribe job,
+transcription_processing and get_session (see tests/pipeline.py).
+
+Every AWS service is an in-process fake with a fixed per-call latency, and
+a fraction of calls can be made to fail with --error-rate to exercise the
+retry paths. Reports p50/p95/p99 per stage and end to end, AWS calls per
+session and failed sessions; --output writes the same as JSON.
+
+    python -m benchmarks.pipeline_load --sessions 500 --concurrency 50 --error-rate 0.01
+"""
+import argparse
+import contextlib
+import io
+import json
+import time
+from collections import Counter
+
+import numpy as np
+
+from tests.pipeline import STAGES, Pipeline
+
+
+def percentiles(values):
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50": round(float(p50), 4), "p95": round(float(p95), 4), "p99": round(float(p99), 4),
+            "max": round(max(values), 4)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--s3-latency", type=float, default=0.01)
+    parser.add_argument("--dynamodb-latency", type=float, default=0.005)
+    parser.add_argument("--transcribe-latency", type=float, default=0.05)
+    parser.add_argument("--bedrock-latency", type=float, default=0.5)
+    parser.add_argument("--transcription-seconds", type=float, default=0.2, help="Time each Transcribe job takes")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of AWS calls that fail")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    pipeline = Pipeline(args.s3_latency, args.dynamodb_latency, args.transcribe_latency, args.bedrock_latency,
+                        args.transcription_seconds)
+    pipeline.install()
+    if args.error_rate:
+        for offset, service in enumerate(pipeline.services.values()):
+            service.inject_errors(args.error_rate, seed=args.seed + offset)
+
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        results = pipeline.run(args.sessions, args.concurrency)
+    wall = time.perf_counter() - started
+
+    completed = [r for r in results if r.ok]
+    stages = {name: percentiles([r.stages[name] for r in results if name in r.stages]) for name in STAGES}
+    end_to_end = percentiles([r.seconds for r in completed])
+    calls = pipeline.aws_calls()
+    retries = sum(n - 1 for r in results for n in r.attempts.values())
+    errors = Counter(r.error[:160] for r in results if not r.ok)
+
+    print(f"{args.sessions} sessions, {args.concurrency} concurrent: {len(completed)} completed in {wall:.1f} s "
+          f"({len(completed) / wall:.1f} sessions/s), {retries} retried invocations, "
+          f"{sum(s.injected_errors for s in pipeline.services.values())} injected errors")
+    print(f"\n{'stage':<26} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for name, p in list(stages.items()) + [("end to end", end_to_end)]:
+        if p["p50"] is not None:
+            print(f"{name:<26} {p['p50'] * 1e3:>8.1f} {p['p95'] * 1e3:>8.1f} {p['p99'] * 1e3:>8.1f} "
+                  f"{p['max'] * 1e3:>8.1f}")
+    print(f"\n{'AWS call':<40} {'per session':>11}")
+    for name, count in calls.items():
+        print(f"{name:<40} {count / args.sessions:>11.2f}")
+    print(f"{'total':<40} {sum(calls.values()) / args.sessions:>11.2f}")
+    for error, count in errors.most_common():
+        print(f"failed: {count} x {error}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "settings": vars(args),
+                "wall_seconds": round(wall, 3),
+                "completed": len(completed),
+                "failed": len(results) - len(completed),
+                "retried_invocations": retries,
+                "stages": stages,
+                "end_to_end": end_to_end,
+                "aws_calls_per_session": {k: round(v / args.sessions, 3) for k, v in calls.items()},
+                "failures": dict(errors),
+            }, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""
+Per-field hit rate and precision of the pre-extraction rules on labelled
+synthetic conversations in the prompt's languages, and the Bedrock tokens
+and generation time saved by asking the model only for the other fields.
+
+The conversations mix clear answers with ones the rules must leave to
+the model (a date without a year, scans still to come, vague answers, a
+competitor that is not named). The stub model answers with the labelled
+values of the fields it is not told are known; latency is modelled as
+first-token latency plus output tokens at a fixed generation rate.
+
+    python -m benchmarks.pre_extraction --conversations 500 --tokens-per-second 120
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import random
+import re
+import statistics
+import time
+
+from tests.fakes import FakeBedrockRuntime
+from transcription_processing import app
+from pre_extractor import RULES, pre_extract
+from transcript_chunking import SCAN_ORDER
+
+# Fields only the model answers: the same for every conversation
+MODEL_FIELDS = {
+    "pregnancy_related": {"first_pregnancy": True},
+    "family_personal": {"customer_location": "Bengaluru", "relatives_living_with": "parents_in_laws",
+                        "mother_occupation": "salaried", "father_occupation": "business"},
+    "cloudnine_awareness": {"how_learned_cloudnine": "friends_colleagues", "aware_of_packages": True,
+                            "booking_method": "call_centre"},
+    "cce_observations": {"transport_method": "own_vehicle", "interested_in_facilities": True,
+                         "doctor_preference": "specific_doctor", "doctor_name": "Dr. Rao", "price_inquiry": True,
+                         "accompanied_by": "parents", "brings_other_children": "no_other_children",
+                         "doctor_remark_questions": False, "going_to_native": False},
+    "additional_insights": {"conversation_summary": "First-time mother comparing packages. Interested in the "
+                                                    "signature package and asked about discounts.",
+                            "key_concerns": ["package price", "doctor availability"],
+                            "positive_signals": ["liked the facilities"], "package_interest": "signature"},
+}
+
+# Per language: yes, no, "two", and the CCE's questions
+LANGUAGES = {
+    "en": ("Yes", "No", "two", "When is your due date?", "Is it twins?",
+           "Have you downloaded the Cloudnine app?", "Do you have insurance?"),
+    "hi": ("हाँ", "नहीं", "दो", "आपकी डिलीवरी डेट कब है?", "क्या जुड़वां बच्चे हैं?",
+           "क्या आपने Cloudnine ऐप डाउनलोड किया?", "क्या आपके पास इंश्योरेंस है?"),
+    "ta": ("ஆமாம்", "இல்லை", "இரண்டு", "உங்க டெலிவரி டேட் எப்போ?", "இரட்டை குழந்தையா?",
+           "Cloudnine ஆப் டவுன்லோட் பண்ணீங்களா?", "இன்சூரன்ஸ் இருக்கா?"),
+    "te": ("అవును", "లేదు", "రెండు", "మీ డెలివరీ డేట్ ఎప్పుడు?", "కవలలు ఆ?",
+           "Cloudnine యాప్ డౌన్లోడ్ చేశారా?", "ఇన్సూరెన్స్ ఉందా?"),
+    "kn": ("ಹೌದು", "ಇಲ್ಲ", "ಎರಡು", "ನಿಮ್ಮ ಡೆಲಿವರಿ ಡೇಟ್ ಯಾವಾಗ?", "ಅವಳಿ ಮಕ್ಕಳಾ?",
+           "Cloudnine ಆಪ್ ಡೌನ್‌ಲೋಡ್ ಮಾಡಿದ್ದೀರಾ?", "ಇನ್ಶೂರೆನ್ಸ್ ಇದೆಯಾ?"),
+    "ml": ("അതെ", "ഇല്ല", "രണ്ട്", "ഡെലിവറി ഡേറ്റ് എപ്പോഴാണ്?", "ഇരട്ടക്കുട്ടികൾ ആണോ?",
+           "Cloudnine ആപ്പ് ഡൗൺലോഡ് ചെയ്തോ?", "ഇൻഷുറൻസ് ഉണ്ടോ?"),
+    "bn": ("হ্যাঁ", "না", "দুটো", "আপনার ডেলিভারি ডেট কবে?", "যমজ সন্তান?",
+           "Cloudnine অ্যাপ ডাউনলোড করেছেন?", "ইন্স্যুরেন্স আছে?"),
+    "gu": ("હા", "ના", "બે", "તમારી ડિલિવરી ડેટ ક્યારે છે?", "જોડિયા બાળકો છે?",
+           "Cloudnine એપ ડાઉનલોડ કરી છે?", "ઇન્સ્યોરન્સ છે?"),
+    "mr": ("हो", "नाही", "दोन", "तुमची डिलीवरी डेट कधी आहे?", "जुळे आहेत का?",
+           "Cloudnine app download केलं का?", "इन्शुरन्स आहे का?"),
+}
+SCAN_SPOKEN = {"EP Scan": "EP scan", "NT Scan": "NT scan", "Anomaly Scan": "anomaly scan",
+               "Growth 1": "growth scan", "Growth 2": "second growth scan"}
+VAGUE = ["I'll check with my husband and tell you.", "पता करके बताती हूँ।", "Doctor said they will confirm later."]
+COMPETITORS = ["Motherhood Hospital", "Rainbow Children's Hospital", "Apollo Cradle", "मदरहुड हॉस्पिटल", "ரெயின்போ ஹாஸ்பிடல்"]
+SMALL_TALK = [
+    ("Where are you staying currently?", "We stay in Indiranagar, Bengaluru, near the metro station."),
+    ("What does your husband do?", "He runs a small business, and I work at a software company."),
+    ("How did you come to the hospital today?", "We came in our own car, my father drove."),
+    ("Who is with you today?", "My parents came along with me."),
+    ("Any specific doctor you would like to consult?", "Yes, we would like to see Dr. Rao."),
+    ("Would you like to know about our birthing packages?", "Yes please, what is the price for signature?"),
+]
+
+
+def conversation(rng):
+    """
+    (speaker-attributed transcript, labelled values of the rule fields,
+    paths of the fields the conversation talks about)
+    """
+    yes, no, two, due_q, twins_q, app_q, insurance_q = LANGUAGES[rng.choice(list(LANGUAGES))]
+    turns, truth = [("CCE", "Good morning, welcome to Cloudnine. How are you feeling?"),
+                    ("CUSTOMER", "I am fine, thank you.")], {}
+    discussed = {"pregnancy_related.customer_edd", "pregnancy_related.scans_done"}
+
+    edd = datetime.date(2025, 1, 1) + datetime.timedelta(days=rng.randrange(540))
+    style = rng.random()
+    if style < 0.6:
+        spoken = f"{edd.day} {edd.strftime('%B')} {edd.year}"
+    elif style < 0.8:
+        spoken = edd.strftime("%d/%m/%Y")
+    else:
+        spoken = f"{edd.day} {edd.strftime('%B')}"  # no year
+    turns += [("CCE", due_q), ("CUSTOMER", spoken)]
+    truth["pregnancy_related.customer_edd"] = edd.isoformat()
+
+    latest = rng.randrange(len(SCAN_ORDER))
+    truth["pregnancy_related.scans_done"] = SCAN_ORDER[:latest + 1]
+    answer = f"{SCAN_SPOKEN[SCAN_ORDER[latest]]} is done."
+    if latest + 1 < len(SCAN_ORDER) and rng.random() < 0.25:
+        answer += f" {SCAN_SPOKEN[SCAN_ORDER[latest + 1]]} is next month."
+    turns += [("CCE", "Which scans are done so far?"), ("CUSTOMER", answer)]
+
+    for path, question, values in (
+        ("pregnancy_related.having_twins", twins_q, [("no", no)] * 8 + [("yes", yes)]),
+        ("cloudnine_awareness.downloaded_app", app_q, [(True, yes), (False, no)]),
+        ("insurance.insurance_status", insurance_q,
+         [("no", no), ("single_insurance", yes), ("dual_insurance", f"{yes}, {two}")]),
+    ):
+        if rng.random() < 0.15:
+            truth[path] = None if path == "cloudnine_awareness.downloaded_app" else "unknown"
+            continue
+        discussed.add(path)
+        value, answer = rng.choice(values)
+        if rng.random() < 0.1:
+            value, answer = "unknown" if path != "cloudnine_awareness.downloaded_app" else None, rng.choice(VAGUE)
+        turns += [("CCE", question), ("CUSTOMER", answer)]
+        truth[path] = value
+
+    style = rng.random()
+    if style < 0.3:
+        turns.append(("CUSTOMER", f"We also went to {rng.choice(COMPETITORS)} for a consultation."))
+        truth["cce_observations.mentioned_competitors"] = True
+        discussed.add("cce_observations.mentioned_competitors")
+    elif style < 0.4:
+        turns.append(("CUSTOMER", "We also checked another hospital near our house."))
+        truth["cce_observations.mentioned_competitors"] = True
+        discussed.add("cce_observations.mentioned_competitors")
+    else:
+        truth["cce_observations.mentioned_competitors"] = False
+
+    for question, answer in rng.sample(SMALL_TALK, len(SMALL_TALK)):
+        turns += [("CCE", question), ("CUSTOMER", answer)]
+    return "\n".join(f"{speaker}: {text}" for speaker, text in turns), truth, discussed
+
+
+def full_answer(truth):
+    answer = json.loads(json.dumps(MODEL_FIELDS))
+    for path, value in truth.items():
+        section, field = path.split(".")
+        answer.setdefault(section, {})[field] = value
+    return answer
+
+
+def known_paths(message):
+    """The "section.field" paths the message says are known"""
+    match = re.search(r"These fields are already known: ([\w., ]+?)\. Leave", message)
+    return set(match.group(1).split(", ")) if match else set()
+
+
+def run_extraction(transcript, truth, pre_extraction):
+    """(input tokens, output tokens, extraction)"""
+    answer = full_answer(truth)
+    outputs = []
+
+    def respond(payload):
+        known = known_paths(payload["messages"][0]["content"][0]["text"])
+        narrowed = {section: {field: value for field, value in fields.items() if f"{section}.{field}" not in known}
+                    for section, fields in answer.items()}
+        text = json.dumps({section: fields for section, fields in narrowed.items() if fields}, indent=2)
+        outputs.append(text)
+        return text
+
+    app.bedrock = FakeBedrockRuntime(responder=respond)
+    app.PRE_EXTRACTION_ENABLED = pre_extraction
+    with contextlib.redirect_stdout(io.StringIO()):
+        extracted = app.extract_patient_info(transcript, speaker_attributed=True)
+    body = json.dumps(app.bedrock.requests[0])
+    return len(body) // 4, len(outputs[0]) // 4, extracted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--conversations", type=int, default=400)
+    parser.add_argument("--tokens-per-second", type=float, default=120.0, help="Model output rate")
+    parser.add_argument("--first-token-latency", type=float, default=0.4)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus = [conversation(rng) for _ in range(args.conversations)]
+
+    stats = {path: {"discussed": 0, "filled": 0, "correct": 0} for path in RULES}
+    rule_seconds = []
+    for transcript, truth, discussed in corpus:
+        started = time.perf_counter()
+        known = pre_extract(transcript, speaker_attributed=True)
+        rule_seconds.append(time.perf_counter() - started)
+        for path in RULES:
+            section, field = path.split(".")
+            counters = stats[path]
+            counters["discussed"] += path in discussed
+            if field in known.get(section, {}):
+                counters["filled"] += 1
+                counters["correct"] += known[section][field] == truth[path]
+
+    # Hit rate: filled among the conversations that talk about the field;
+    # precision: filled with the labelled value
+    print(f"{'field':<40} {'hit rate':>9} {'precision':>10}")
+    for path, counters in stats.items():
+        counters["hit_rate"] = counters["filled"] / max(1, counters["discussed"])
+        counters["precision"] = counters["correct"] / max(1, counters["filled"])
+        print(f"{path:<40} {counters['hit_rate']:>8.1%} {counters['precision']:>10.1%}")
+
+    runs = {}
+    for name, enabled in (("all fields to the model", False), ("pre-extraction", True)):
+        tokens = [run_extraction(transcript, truth, enabled) for transcript, truth, _ in corpus]
+        latency = [args.first_token_latency + output / args.tokens_per_second for _, output, _ in tokens]
+        runs[name] = {
+            "input_tokens": statistics.mean(t[0] for t in tokens),
+            "output_tokens": statistics.mean(t[1] for t in tokens),
+            "latency_s": statistics.mean(latency),
+        }
+    runs["pre-extraction"]["rules_ms_median"] = statistics.median(rule_seconds) * 1000
+
+    print(f"\n{'':<26} {'input tokens':>13} {'output tokens':>14} {'latency':>9}")
+    for name, run in runs.items():
+        print(f"{name:<26} {run['input_tokens']:>13.0f} {run['output_tokens']:>14.0f} {run['latency_s']:>8.2f}s")
+    before, after = runs["all fields to the model"], runs["pre-extraction"]
+    print(f"\nOutput tokens -{1 - after['output_tokens'] / before['output_tokens']:.1%}, "
+          f"input tokens {after['input_tokens'] / before['input_tokens'] - 1:+.1%}, "
+          f"modelled latency -{1 - after['latency_s'] / before['latency_s']:.1%}; "
+          f"rules take {after['rules_ms_median']:.2f} ms per transcript (median)")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"settings": vars(args), "fields": stats, "runs": runs}, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
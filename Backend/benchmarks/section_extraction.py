@@ -0,0 +1,166 @@
+"""
+Extraction latency (p50/p95) and Bedrock tokens with one call for the
+whole answer against section-parallel calls (EXTRACTION_MODE=sections),
+with and without prompt caching.
+
+The stub model answers with the sections it is asked for. A call takes a
+first-token latency (with log-normal jitter) plus the prefill of its
+uncached input, then generates its output at a fixed token rate; sleeps
+are scaled by --time-scale and reported unscaled. With prompt caching it
+keeps the prefixes marked cacheable, readable once the response that
+wrote them has started, and bills cache writes at 1.25x and reads at
+0.1x of an input token. Every extraction has a transcript of its own, so
+only the system prompt is reused across extractions.
+
+    python -m benchmarks.section_extraction --extractions 200 --tokens-per-second 120
+"""
+import argparse
+import contextlib
+import io
+import json
+import random
+import re
+import statistics
+import time
+
+from benchmarks.streaming_extraction import ANSWER
+from tests.fakes import FakeBedrockRuntime
+from tests.pipeline import TRANSCRIPT
+from transcription_processing import app
+from extraction_schema import section_groups
+
+CHARS_PER_TOKEN = 4
+CHUNK_CHARS = 64
+CACHE_WRITE_COST, CACHE_READ_COST = 1.25, 0.1
+
+
+class SimulatedBedrock(FakeBedrockRuntime):
+    """FakeBedrockRuntime with modelled latency and a prompt cache"""
+
+    def __init__(self, args, rng):
+        super().__init__(responder=self.respond,
+                         stream_chunk_latency=CHUNK_CHARS / CHARS_PER_TOKEN / args.tokens_per_second * args.time_scale)
+        self.args, self.rng = args, rng
+        self.cache = set()
+        self.usage = []
+
+    def respond(self, payload):
+        blocks = payload["system"] + payload["messages"][0]["content"]
+        text = blocks[-1]["text"]
+        asked = re.findall(r'^  "(\w+)": \{', text, re.MULTILINE) if "Extract only these sections" in text else ANSWER
+        answer = json.dumps({name: ANSWER[name] for name in asked}, indent=2)
+
+        # Token counts of the prefixes ending at each cache mark
+        prefixes, key, tokens = [], "", 0
+        for block in blocks:
+            key += block["text"]
+            tokens += len(block["text"]) // CHARS_PER_TOKEN
+            if "cache_control" in block:
+                prefixes.append((key, tokens))
+        with self._lock:
+            read = max([tokens for key, tokens in prefixes if key in self.cache] or [0])
+            jitter = self.rng.lognormvariate(0, self.args.jitter)
+        written = prefixes[-1][1] - read if prefixes else 0
+        uncached = tokens - read - written
+
+        ttft = self.args.first_token_latency * jitter + (uncached + written) / self.args.prefill_tokens_per_second
+        time.sleep(ttft * self.args.time_scale)
+        with self._lock:
+            self.cache.update(key for key, _ in prefixes)
+            self.usage.append({"input": uncached, "cache_write": written, "cache_read": read,
+                               "output": len(answer) // CHARS_PER_TOKEN})
+        return answer
+
+    def invoke_model(self, modelId, body, **kwargs):
+        response = super().invoke_model(modelId, body, **kwargs)
+        raw = response["body"].read()
+        output_tokens = json.loads(raw)["usage"]["output_tokens"]
+        time.sleep(output_tokens / self.args.tokens_per_second * self.args.time_scale)
+        return {"body": io.BytesIO(raw)}
+
+    def invoke_model_with_response_stream(self, modelId, body, **kwargs):
+        return super().invoke_model_with_response_stream(modelId, body, chunk_chars=CHUNK_CHARS, **kwargs)
+
+
+def run(name, mode, cached, args):
+    bedrock = SimulatedBedrock(args, random.Random(args.seed))
+    app.bedrock = bedrock
+    app.EXTRACTION_MODE = mode
+    app.SYSTEM_BLOCKS = [{"type": "text", "text": app.SYSTEM_PROMPT,
+                          **({"cache_control": {"type": "ephemeral"}} if cached else {})}]
+
+    latencies, per_extraction = [], []
+    for i in range(args.extractions):
+        transcript = f"CCE: Session {i}.\n" + (TRANSCRIPT * (args.transcript_chars // len(TRANSCRIPT) + 1))[
+            :args.transcript_chars]
+        calls = len(bedrock.usage)
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            extracted = app.extract_patient_info(transcript)
+        latencies.append((time.perf_counter() - started) / args.time_scale)
+        assert extracted == ANSWER, extracted
+        usage = bedrock.usage[calls:]
+        per_extraction.append({key: sum(u[key] for u in usage) for key in usage[0]})
+
+    def mean(key):
+        return statistics.mean(u[key] for u in per_extraction)
+
+    cuts = statistics.quantiles(latencies, n=20)
+    row = {
+        "calls_per_extraction": len(bedrock.usage) / args.extractions,
+        "p50_seconds": statistics.median(latencies),
+        "p95_seconds": cuts[-1],
+        "input_tokens": mean("input") + mean("cache_write") + mean("cache_read"),
+        "output_tokens": mean("output"),
+        "billed_input_tokens": mean("input") + CACHE_WRITE_COST * mean("cache_write")
+                               + CACHE_READ_COST * mean("cache_read"),
+    }
+    print(f"{name:<28} {row['calls_per_extraction']:>5.1f} {row['p50_seconds']:>7.2f}s {row['p95_seconds']:>7.2f}s "
+          f"{row['input_tokens']:>7.0f} {row['billed_input_tokens']:>7.0f} {row['output_tokens']:>7.0f} "
+          f"{row['input_tokens'] + row['output_tokens']:>7.0f}")
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--extractions", type=int, default=150)
+    parser.add_argument("--transcript-chars", type=int, default=9000, help="About a ten-minute conversation")
+    parser.add_argument("--tokens-per-second", type=float, default=120.0, help="Output generation rate")
+    parser.add_argument("--prefill-tokens-per-second", type=float, default=8000.0)
+    parser.add_argument("--first-token-latency", type=float, default=0.4)
+    parser.add_argument("--jitter", type=float, default=0.3, help="Sigma of the log-normal first-token jitter")
+    parser.add_argument("--groups", default=None, help="EXTRACTION_SECTION_GROUPS (default: the deployed default)")
+    parser.add_argument("--time-scale", type=float, default=0.02, help="Real seconds slept per modelled second")
+    parser.add_argument("--seed", type=int, default=5)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    app.PRE_EXTRACTION_ENABLED = False
+    app.STREAMING_EXTRACTION_ENABLED = False
+    if args.groups:
+        app.EXTRACTION_SECTION_GROUPS = section_groups(args.groups)
+    print("Section groups:", "; ".join(", ".join(group) for group in app.EXTRACTION_SECTION_GROUPS))
+
+    print(f"\n{'':<28} {'calls':>5} {'p50':>8} {'p95':>8} {'input':>7} {'billed':>7} {'output':>7} {'total':>7}")
+    rows = {}
+    for cached in (False, True):
+        for mode in ("single", "sections"):
+            name = f"{mode}, {'prompt caching' if cached else 'no caching'}"
+            rows[name] = run(name, mode, cached, args)
+
+    print()
+    for caching in ("no caching", "prompt caching"):
+        before, after = rows[f"single, {caching}"], rows[f"sections, {caching}"]
+        print(f"{caching}: p50 -{1 - after['p50_seconds'] / before['p50_seconds']:.1%}, "
+              f"p95 -{1 - after['p95_seconds'] / before['p95_seconds']:.1%}, "
+              f"total tokens {after['input_tokens'] + after['output_tokens'] - before['input_tokens'] - before['output_tokens']:+.0f} "
+              f"({(after['input_tokens'] + after['output_tokens']) / (before['input_tokens'] + before['output_tokens']) - 1:+.1%}), "
+              f"billed input {after['billed_input_tokens'] / before['billed_input_tokens'] - 1:+.1%}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"settings": vars(args), "results": rows}, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
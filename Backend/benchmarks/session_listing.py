@@ -0,0 +1,121 @@
+"""
+Patient and CCE session listings against growing synthetic session tables,
+up to a million sessions, on the in-memory DynamoDB stand-in with the two
+listing indexes.
+
+Read units follow DynamoDB's Query billing (index item sizes summed and
+rounded up to 4 KB, eventually consistent). The Scan figure is what a
+filtered Scan of the whole table would consume instead, which was the only
+way to list sessions before the indexes.
+
+    python -m benchmarks.session_listing --sizes 10000,100000,1000000
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import random
+import statistics
+import time
+
+from tests.fakes import FakeDynamoDB, _item_size
+from get_session import app
+import session_listing as listing
+
+CCES = 200
+SESSIONS_PER_PATIENT = 5
+YEAR_SECONDS = 365 * 24 * 3600
+EXTRACTED_INFO = {"S": json.dumps({"pregnancy_related": {"customer_edd": "2025-03-14"}}) * 25}
+STATUSES = [{"S": s} for s in ("COMPLETED", "COMPLETED", "COMPLETED", "PROCESSING_FAILED")]
+LANGUAGES = {"L": [{"S": "en-IN"}, {"S": "hi-IN"}]}
+
+
+def synthetic_sessions(count, seed=11):
+    rng = random.Random(seed)
+    patients = [{"S": f"patient-{i:07d}"} for i in range(max(1, count // SESSIONS_PER_PATIENT))]
+    cces = [{"S": f"cce-{i:03d}"} for i in range(CCES)]
+    start = 1700000000
+    for i in range(count):
+        created = str(start + i * YEAR_SECONDS // count)
+        yield {
+            "session_id": {"S": f"session-{i:08d}"},
+            "patient_id": rng.choice(patients),
+            "patient_name": {"S": "Priya Sharma"},
+            "cce_id": cces[i % CCES],
+            "status": rng.choice(STATUSES),
+            "language_preferences": LANGUAGES,
+            "content_type": {"S": "audio/wav"},
+            "created_at": {"N": created},
+            "updated_at": {"N": created},
+            "extracted_info": EXTRACTED_INFO,
+        }
+
+
+def timed_page(query):
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = app.lambda_handler({"queryStringParameters": query}, None)
+    elapsed = (time.perf_counter() - started) * 1000
+    body = json.loads(result["body"])
+    assert result["statusCode"] == 200, body
+    return body, elapsed
+
+
+def run(size):
+    indexes = {
+        listing.INDEXES[key]: (key, "created_at", listing.INDEX_ATTRIBUTES)
+        for key in ("patient_id", "cce_id")
+    }
+    dynamodb = FakeDynamoDB(indexes={app.TABLE_NAME: indexes})
+    app.dynamodb = dynamodb
+
+    started = time.perf_counter()
+    dynamodb.load(app.TABLE_NAME, synthetic_sessions(size))
+    load_seconds = time.perf_counter() - started
+
+    sample = next(iter(dynamodb.items.values()))
+    scan_units = -(-_item_size(sample) * size // 4096) * 0.5
+
+    cases = {
+        "patient history": {"patient_id": sample["patient_id"]["S"]},
+        "CCE, first page": {"cce_id": "cce-000", "fields": "session_id,status,patient_name,created_at"},
+        "CCE, one day": {"cce_id": "cce-000", "created_after": "1700000000", "created_before": "1700086400"},
+    }
+    rows = []
+    for name, query in cases.items():
+        samples = [timed_page(query) for _ in range(20)]
+        body = samples[0][0]
+        rows.append((name, len(body["sessions"]), body["consumed_read_units"],
+                     statistics.median(ms for _, ms in samples)))
+
+    # Deep pagination: a late page costs the same as the first
+    cursor, query = None, {"cce_id": "cce-001", "page_size": "25"}
+    for page in range(1, 21):
+        body, elapsed = timed_page({**query, **({"cursor": cursor} if cursor else {})})
+        cursor = body["next_cursor"]
+        if not cursor:
+            break
+    rows.append((f"CCE, page {page}", len(body["sessions"]), body["consumed_read_units"], elapsed))
+
+    print(f"\n{size:,} sessions (loaded in {load_seconds:.1f}s); filtered Scan would read {scan_units:,.0f} RU")
+    print(f"{'listing':<18} {'items':>6} {'read units':>11} {'latency':>10}")
+    for name, items, units, ms in rows:
+        print(f"{name:<18} {items:>6} {units:>11.1f} {ms:>8.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", default="10000,100000,1000000",
+                        help="Comma-separated table sizes")
+    args = parser.parse_args()
+
+    print(f"Page budget {listing.PAGE_READ_UNITS:g} RU -> at most {listing.max_page_size()} sessions per page")
+    for size in (int(s) for s in args.sizes.split(",")):
+        run(size)
+        app.dynamodb = None
+        gc.collect()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Load test of session status tracking: fixed-interval polling of get_session
+against wait-for-change requests fed by the session_notifier stream
+handler.
+
+Each simulated recording moves through the pipeline statuses at random
+intervals while its client tracks it, and the session item grows with the
+partial and final extraction (``--transcript-kb`` adds an inline transcript).
+The stream is delivered to session_notifier with a fixed lag. Read units
+follow DynamoDB's billing (whole item size, 4 KB units, half price for
+eventually consistent reads).
+
+    python -m benchmarks.session_long_poll --sessions 40 --poll-interval 2
+"""
+import argparse
+import contextlib
+import io
+import json
+import queue
+import random
+import statistics
+import threading
+import time
+
+from tests.fakes import FakeDynamoDB
+from get_session import app
+from session_notifier import app as notifier_app
+
+CHANGES_TABLE = "cce_session_changes_bench"
+STAGES = ["UPLOAD_URL_GENERATED", "TRANSCRIPTION_IN_PROGRESS", "EXTRACTION_IN_PROGRESS", "COMPLETED"]
+
+
+def stage_attributes(transcript_kb):
+    """Attributes the pipeline adds when a stage is reached"""
+    extraction = '{"pregnancy_related": {"customer_edd": "2025-03-14", "first_pregnancy": true}}'
+    attributes = {
+        "EXTRACTION_IN_PROGRESS": {"partial_extracted_info": {"S": extraction * 15}},
+        "COMPLETED": {"extracted_info": {"S": extraction * 40}},
+    }
+    if transcript_kb:
+        # Not stored by the pipeline today, but get_session still serves it
+        attributes["EXTRACTION_IN_PROGRESS"]["transcription_output"] = {"S": "x" * transcript_kb * 1024}
+    return attributes
+
+
+def stream_to_notifier(dynamodb, lag):
+    """Deliver stream records to session_notifier ``lag`` seconds after the write"""
+    records = queue.Queue()
+    dynamodb.subscribe(app.TABLE_NAME, lambda record: records.put((time.monotonic() + lag, record)))
+
+    def deliver():
+        while True:
+            due, record = records.get()
+            if record is None:
+                return
+            time.sleep(max(0.0, due - time.monotonic()))
+            notifier_app.lambda_handler({"Records": [record]}, None)
+
+    thread = threading.Thread(target=deliver, daemon=True)
+    thread.start()
+    return lambda: records.put((0, None))
+
+
+def pipeline(dynamodb, session_id, stage_seconds, attributes, changed_at):
+    """Advance one session through STAGES, recording when each was written"""
+    for stage in STAGES:
+        if stage != STAGES[0]:
+            time.sleep(random.uniform(0.5, 1.5) * stage_seconds)
+        values = {":status": {"S": stage}, ":updated_at": {"N": str(int(time.time()))}}
+        sets = ["#status = :status", "updated_at = :updated_at"]
+        for i, (name, value) in enumerate(attributes.get(stage, {}).items()):
+            values[f":v{i}"] = value
+            sets.append(f"{name} = :v{i}")
+        changed_at[stage] = time.monotonic()
+        dynamodb.update_item(
+            TableName=app.TABLE_NAME,
+            Key={"session_id": {"S": session_id}},
+            UpdateExpression="SET " + ", ".join(sets),
+            ExpressionAttributeNames={"#status": "status"},
+            ExpressionAttributeValues=values,
+        )
+
+
+def call(event, totals):
+    started = time.monotonic()
+    result = app.lambda_handler(event, None)
+    with totals["lock"]:
+        totals["requests"] += 1
+        totals["lambda_seconds"] += time.monotonic() - started
+    return result
+
+
+def polling_client(session_id, interval, seen_at, totals):
+    while True:
+        result = call({"pathParameters": {"session_id": session_id}}, totals)
+        if result["statusCode"] == 200:
+            status = json.loads(result["body"])["status"]
+            seen_at.setdefault(status, time.monotonic())
+            if status == STAGES[-1]:
+                return
+        time.sleep(interval)
+
+
+def long_poll_client(session_id, wait, seen_at, totals):
+    etag = None
+    while True:
+        result = call({
+            "pathParameters": {"session_id": session_id},
+            "queryStringParameters": {"wait": str(wait)} if etag else {},
+            "headers": {"If-None-Match": etag} if etag else {},
+        }, totals)
+        if result["statusCode"] == 200:
+            etag = result["headers"]["ETag"]
+            status = json.loads(result["body"])["status"]
+            seen_at.setdefault(status, time.monotonic())
+            if status == STAGES[-1]:
+                return
+        elif result["statusCode"] == 404:
+            time.sleep(0.05)
+
+
+def run(mode, args):
+    random.seed(7)
+    dynamodb = FakeDynamoDB(latency=args.dynamodb_latency, key_names={CHANGES_TABLE: "session_id"})
+    app.dynamodb = notifier_app.dynamodb = dynamodb
+    app.CHANGES_TABLE = notifier_app.CHANGES_TABLE = CHANGES_TABLE
+    stop_stream = stream_to_notifier(dynamodb, args.stream_lag)
+
+    totals = {"lock": threading.Lock(), "requests": 0, "lambda_seconds": 0.0}
+    changed, seen = {}, {}
+    threads = []
+    for i in range(args.sessions):
+        session_id = f"session-{i:04d}"
+        changed[session_id], seen[session_id] = {}, {}
+        threads.append(threading.Thread(
+            target=pipeline, args=(dynamodb, session_id, args.stage_seconds, stage_attributes(args.transcript_kb),
+                  changed[session_id])
+        ))
+        if mode == "polling":
+            client = (polling_client, (session_id, args.poll_interval, seen[session_id], totals))
+        else:
+            client = (long_poll_client, (session_id, args.wait, seen[session_id], totals))
+        threads.append(threading.Thread(target=client[0], args=client[1]))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    stop_stream()
+
+    # A change counts as noticed when the client first sees it or a later stage
+    delays = []
+    for session_id, changes in changed.items():
+        for index, stage in enumerate(STAGES[1:], start=1):
+            noticed = min(seen[session_id].get(s, float("inf")) for s in STAGES[index:])
+            delays.append(noticed - changes[stage])
+
+    session_reads = dynamodb.calls.get("get_item", 0)
+    print(f"{mode:<16} {totals['requests']:>9} {session_reads:>9} {dynamodb.read_units:>10.1f} "
+          f"{statistics.median(delays) * 1000:>9.0f}ms {max(delays) * 1000:>9.0f}ms "
+          f"{totals['lambda_seconds']:>10.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sessions", type=int, default=40)
+    parser.add_argument("--stage-seconds", type=float, default=6.0, help="Mean time between status changes")
+    parser.add_argument("--poll-interval", type=float, default=2.0, help="Fixed polling interval")
+    parser.add_argument("--wait", type=float, default=20.0, help="Long-poll wait per request")
+    parser.add_argument("--transcript-kb", type=int, default=0,
+                        help="Also store a transcript of this size in the session item")
+    parser.add_argument("--read-budgets", type=lambda v: [float(b) for b in v.split(",")], default=[0.5, 0.25],
+                        help="Read units per second a waiting request may spend")
+    parser.add_argument("--stream-lag", type=float, default=0.2, help="Write to notifier delay")
+    parser.add_argument("--dynamodb-latency", type=float, default=0.003)
+    args = parser.parse_args()
+
+    print(f"{args.sessions} sessions, {len(STAGES) - 1} changes each, poll every {args.poll_interval}s, "
+          f"stream lag {args.stream_lag}s")
+    print(f"{'mode':<16} {'requests':>9} {'get_item':>9} {'read units':>10} "
+          f"{'notice p50':>11} {'notice max':>11} {'lambda time':>11}")
+    run("polling", args)
+    for budget in args.read_budgets:
+        app.WAIT_READ_UNITS_PER_SECOND = budget
+        run(f"long-poll {budget:g}/s", args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Session item size, read units and get_session response time in the old
+storage layout (extraction as a JSON string, transcript inline) and in
+the new one after migrations/session_results.py has rewritten the same
+sessions (extraction as native maps, transcript in a compressed S3
+object).
+
+Read units follow DynamoDB's billing: the whole item, projected or not,
+in 4 KB units, half price for eventually consistent reads.
+
+    python -m benchmarks.session_storage --sessions 500 --transcript-kb 24
+"""
+import argparse
+import contextlib
+import io
+import json
+import random
+import statistics
+import time
+
+from tests.fakes import FakeDynamoDB, FakeS3, _item_size
+from get_session import app
+from migrations import session_results
+
+EXTRACTION = {
+    "pregnancy_related": {"customer_edd": "2025-03-14", "first_pregnancy": "Yes",
+                          "scans_done": ["EP Scan", "NT Scan", "Anomaly Scan"], "having_twins": "No"},
+    "family_personal": {"customer_location": "Bengaluru", "relatives_living_with": "Parents/In-laws",
+                        "mother_occupation": "Salaried", "father_occupation": "Business"},
+    "cloudnine_awareness": {"learned_about_cloudnine": "Doctor recommendation", "aware_of_packages": "Yes",
+                            "app_downloaded": "No", "appointment_booking": "Call centre"},
+    "insurance": {"insurance_status": "Single insurance"},
+    "cce_observations": {"transport_mode": "Cab", "mentioned_competitors": "Yes", "interested": "Yes",
+                         "doctor_preference": "Specific doctor", "asked_discounts": "No",
+                         "accompanied_by": "Parents"},
+    "additional_insights": {"conversation_summary": "First pregnancy, due in March; comparing hospitals. " * 6,
+                            "key_concerns": ["cost of the birthing package", "NICU availability"]},
+}
+
+CASES = [
+    ("full session", None),
+    ("status", "status"),
+    ("extracted_data", "extracted_data"),
+    ("one section", "extracted_data.pregnancy_related"),
+]
+
+
+def legacy_sessions(count, transcript_kb, seed=5):
+    rng = random.Random(seed)
+    words = ["appointment", "scan", "doctor", "haan", "theek", "hai", "package", "delivery", "March", "insurance"]
+    for i in range(count):
+        transcript = " ".join(rng.choice(words) for _ in range(transcript_kb * 1024 // 7))
+        yield {
+            "session_id": {"S": f"session-{i:06d}"},
+            "patient_id": {"S": f"patient-{i % 97:05d}"},
+            "cce_id": {"S": f"cce-{i % 13:03d}"},
+            "status": {"S": "COMPLETED"},
+            "language_preferences": {"L": [{"S": "en-IN"}, {"S": "hi-IN"}]},
+            "transcription_job_name": {"S": f"session-{i:06d}"},
+            "created_at": {"N": str(1700000000 + i)},
+            "updated_at": {"N": str(1700000100 + i)},
+            "extracted_info": {"S": json.dumps(EXTRACTION)},
+            "transcription_output": {"S": transcript[:transcript_kb * 1024]},
+        }
+
+
+def measure(dynamodb, session_ids, fields):
+    """(median ms, read units per request, response bytes) over the sessions"""
+    units_before = dynamodb.read_units
+    timings, sizes = [], []
+    for session_id in session_ids:
+        event = {"pathParameters": {"session_id": session_id},
+                 "queryStringParameters": {"fields": fields} if fields else None}
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = app.lambda_handler(event, None)
+        timings.append((time.perf_counter() - started) * 1000)
+        assert result["statusCode"] == 200, result["body"]
+        sizes.append(len(result["body"]))
+    return statistics.median(timings), (dynamodb.read_units - units_before) / len(session_ids), \
+        statistics.mean(sizes)
+
+
+def report(title, dynamodb, session_ids, cases):
+    items = [dynamodb.items[s] for s in session_ids]
+    print(f"\n{title}: item {statistics.mean(_item_size(i) for i in items) / 1024:.1f} KB on average")
+    print(f"{'request':<22} {'latency':>10} {'read units':>11} {'response':>10}")
+    rows = {}
+    for name, fields in cases:
+        ms, units, size = measure(dynamodb, session_ids, fields)
+        rows[name] = {"ms": round(ms, 4), "read_units": units, "response_bytes": round(size)}
+        print(f"{name:<22} {ms:>8.3f}ms {units:>11.2f} {size / 1024:>8.1f}KB")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sessions", type=int, default=300)
+    parser.add_argument("--transcript-kb", type=int, default=24, help="Inline transcript size in the old layout")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    dynamodb, s3 = FakeDynamoDB(), FakeS3()
+    app.dynamodb, app.s3 = dynamodb, s3
+    dynamodb.load(app.TABLE_NAME, legacy_sessions(args.sessions, args.transcript_kb))
+    session_ids = sorted(dynamodb.items)
+
+    before = report("Old layout", dynamodb, session_ids, CASES + [("transcript", "transcription_output")])
+
+    started = time.perf_counter()
+    counters = session_results.migrate(dynamodb, s3, app.TABLE_NAME, app.BUCKET_NAME, segments=4)
+    migration_seconds = time.perf_counter() - started
+    objects = [o["Body"] for (bucket, key), o in s3.objects.items() if key.endswith(".json.gz")]
+    print(f"\nMigrated {counters['migrated']} of {counters['scanned']} sessions in {migration_seconds:.2f}s "
+          f"({counters['read_units']:.0f} RU scanned); results objects "
+          f"{statistics.mean(len(o) for o in objects) / 1024:.1f} KB compressed on average")
+
+    after = report("New layout", dynamodb, session_ids, CASES + [("transcript", "transcript")])
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"settings": vars(args), "before": before, "after": after, "migration": counters}, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Time to first published section with streaming extraction compared with
+time to the full result, against a stub Bedrock that generates output at a
+fixed token rate.
+
+    python -m benchmarks.streaming_extraction --tokens-per-second 120
+"""
+import argparse
+import contextlib
+import io
+import json
+import time
+
+from tests.fakes import FakeBedrockRuntime
+from transcription_processing import app
+
+ANSWER = {
+    "pregnancy_related": {
+        "customer_edd": "2025-03-14", "first_pregnancy": True,
+        "scans_done": ["EP Scan", "NT Scan", "Anomaly Scan"], "having_twins": "no",
+    },
+    "family_personal": {
+        "customer_location": "Bengaluru", "relatives_living_with": "parents_in_laws",
+        "mother_occupation": "salaried", "father_occupation": "business",
+    },
+    "cloudnine_awareness": {
+        "how_learned_cloudnine": "friends_colleagues", "aware_of_packages": True,
+        "downloaded_app": False, "booking_method": "call_centre",
+    },
+    "insurance": {"insurance_status": "single_insurance"},
+    "cce_observations": {
+        "transport_method": "own_vehicle", "mentioned_competitors": True,
+        "interested_in_facilities": True, "doctor_preference": "specific_doctor",
+        "doctor_name": "Dr. Rao", "price_inquiry": True, "accompanied_by": "parents",
+        "brings_other_children": "no_other_children", "doctor_remark_questions": False,
+        "going_to_native": False,
+    },
+    "additional_insights": {
+        "conversation_summary": "First-time mother at 24 weeks comparing packages with a competitor. "
+                                "Interested in the signature package and asked about discounts.",
+        "key_concerns": ["package price", "doctor availability on weekends"],
+        "positive_signals": ["liked the facilities", "family already delivered at Cloudnine"],
+        "package_interest": "signature",
+    },
+}
+
+CHARS_PER_TOKEN = 4
+CHUNK_CHARS = 12
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--tokens-per-second", type=float, default=120.0)
+    parser.add_argument("--first-token-latency", type=float, default=0.4)
+    args = parser.parse_args()
+
+    text = json.dumps(ANSWER, indent=2)
+    chunk_latency = CHUNK_CHARS / CHARS_PER_TOKEN / args.tokens_per_second
+    generation = args.first_token_latency + len(text) / CHARS_PER_TOKEN / args.tokens_per_second
+
+    blocking = FakeBedrockRuntime(latency=generation, responder=lambda payload: text)
+    streaming = FakeBedrockRuntime(latency=args.first_token_latency, responder=lambda payload: text,
+                                   stream_chunk_latency=chunk_latency)
+    streaming.invoke_model_with_response_stream = _with_chunk_size(streaming.invoke_model_with_response_stream)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        app.bedrock = blocking
+        started = time.perf_counter()
+        app.extract_patient_info("transcript")
+        blocking_total = time.perf_counter() - started
+
+        app.bedrock = streaming
+        section_times = []
+        started = time.perf_counter()
+        app.extract_patient_info(
+            "transcript",
+            on_section=lambda name, value: section_times.append((name, time.perf_counter() - started))
+        )
+        streaming_total = time.perf_counter() - started
+
+    print(f"~{len(text) // CHARS_PER_TOKEN} output tokens at {args.tokens_per_second:.0f} tokens/s")
+    print(f"{'blocking invoke_model, full result':<40} {blocking_total * 1000:8.0f}ms")
+    for name, seconds in section_times:
+        print(f"{'streaming, ' + name:<40} {seconds * 1000:8.0f}ms")
+    print(f"{'streaming, full result':<40} {streaming_total * 1000:8.0f}ms")
+    print(f"first section after {section_times[0][1] / blocking_total:.0%} of the blocking latency")
+
+
+def _with_chunk_size(invoke):
+    return lambda **kwargs: invoke(chunk_chars=CHUNK_CHARS, **kwargs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Peak RSS and parse time of the streaming Transcribe output reader compared
+with read() + json.loads on synthetic one-hour outputs, for the transcript
+alone, with the speaker segments, and with the per-word items the compact
+transcript is built from (which read_transcript cuts out of the stream one
+item at a time and parses with json.loads).
+
+Each mode runs in a fresh interpreter so that its peak RSS is not hidden by
+an earlier mode's allocations. Peak RSS includes the interpreter itself, so
+the Python heap peak measured with tracemalloc is reported alongside it.
+
+    python -m benchmarks.transcript_parsing --minutes 60
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+WORDS_PER_MINUTE = 150
+VOCABULARY = (
+    "pregnancy scan doctor delivery package insurance appointment hospital "
+    "नमस्ते हाँ डॉक्टर स्कैन due date first baby anomaly growth cab parents"
+).split()
+
+MODES = {
+    "full": "read() + json.loads",
+    "streaming": "read_transcript",
+    "streaming+segments": "read_transcript(speaker_segments=True)",
+    "items": "read_transcript(items=True)",
+}
+
+CHILD = r"""
+import json, resource, sys, time, tracemalloc
+sys.path.insert(0, sys.argv[3])
+from transcript_reader import read_transcript
+
+mode, path, trace = sys.argv[1], sys.argv[2], sys.argv[4] == "trace"
+if trace:
+    tracemalloc.start()
+started = time.perf_counter()
+with open(path, "rb") as body:
+    if mode == "full":
+        transcript = json.loads(body.read().decode("utf-8"))["results"]["transcripts"][0]["transcript"]
+    else:
+        document = read_transcript(body, speaker_segments=mode == "streaming+segments", items=mode == "items")
+        transcript = document.transcript
+elapsed = time.perf_counter() - started
+peak_alloc = tracemalloc.get_traced_memory()[1] if trace else None
+print(json.dumps({"seconds": elapsed, "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  "peak_alloc_bytes": peak_alloc, "chars": len(transcript)}))
+"""
+
+
+def synthetic_output(minutes, seed=7):
+    """Transcribe-shaped output for a two-speaker conversation of ``minutes``"""
+    rng = random.Random(seed)
+    items, segments, words = [], [], []
+    clock = 0.0
+    speaker = 0
+
+    for _ in range(minutes * WORDS_PER_MINUTE):
+        if rng.random() < 0.08:
+            speaker = 1 - speaker
+            segments.append({"start_time": f"{clock:.2f}", "end_time": f"{clock:.2f}",
+                             "speaker_label": f"spk_{speaker}", "items": []})
+        word = rng.choice(VOCABULARY)
+        start, clock = clock, clock + rng.uniform(0.2, 0.6)
+        items.append({
+            "start_time": f"{start:.2f}",
+            "end_time": f"{clock:.2f}",
+            "alternatives": [{"confidence": f"{rng.random():.4f}", "content": word}],
+            "type": "pronunciation",
+            "speaker_label": f"spk_{speaker}",
+        })
+        if segments:
+            segments[-1]["end_time"] = f"{clock:.2f}"
+            segments[-1]["items"].append({"start_time": f"{start:.2f}", "end_time": f"{clock:.2f}",
+                                          "speaker_label": f"spk_{speaker}"})
+        words.append(word)
+
+    return {
+        "jobName": "session-bench",
+        "accountId": "000000000000",
+        "results": {
+            "transcripts": [{"transcript": " ".join(words)}],
+            "speaker_labels": {"channel_label": "ch_0", "speakers": 2, "segments": segments},
+            "items": items,
+        },
+        "status": "COMPLETED",
+    }
+
+
+def run_mode(mode, path, trace=False):
+    handler_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                               "transcription_processing")
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD, mode, path, handler_dir, "trace" if trace else "time"],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--minutes", type=int, default=60)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+        f.write(json.dumps(synthetic_output(args.minutes), ensure_ascii=False).encode("utf-8"))
+        path = f.name
+
+    try:
+        size_mb = os.path.getsize(path) / 1e6
+        print(f"{args.minutes}-minute synthetic output: {size_mb:.1f} MB")
+        print(f"{'mode':<42} {'parse (best)':>12} {'peak RSS':>10} {'peak alloc':>11}")
+        for mode, label in MODES.items():
+            # tracemalloc slows parsing down, so time and trace separately
+            runs = [run_mode(mode, path) for _ in range(args.repeat)]
+            best = min(runs, key=lambda r: r["seconds"])
+            traced = run_mode(mode, path, trace=True)
+            print(f"{label:<42} {best['seconds'] * 1000:10.1f}ms "
+                  f"{best['peak_rss_kb'] / 1024:8.1f}MB {traced['peak_alloc_bytes'] / 1e6:9.2f}MB")
+    finally:
+        os.unlink(path)
+
+
+if __name__ == "__main__":
+    main()
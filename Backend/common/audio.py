@@ -0,0 +1,214 @@
+"""
+Streaming WAV decoding, downmixing and resampling with NumPy.
+
+Audio is processed in blocks of frames, so memory stays bounded whatever
+the length of the recording. The resampler carries its filter history
+from one block to the next and gives the same samples as resampling the
+whole signal at once.
+"""
+import math
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+TARGET_SAMPLE_RATE = 16000
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# Streamed recorders leave the data size at 0 or 0xFFFFFFFF until the end
+UNKNOWN_DATA_SIZES = (0, 0xFFFFFFFF)
+
+WavFormat = namedtuple("WavFormat", ["format_tag", "channels", "sample_rate", "bits_per_sample", "data_bytes"])
+
+
+class UnsupportedAudio(ValueError):
+    """The stream is not a WAV file this module can decode"""
+
+
+def read_exact(stream, size):
+    """Up to ``size`` bytes; fewer only at the end of the stream"""
+    chunks, remaining = [], size
+    while remaining > 0:
+        chunk = stream.read(remaining)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+def read_wav_header(stream):
+    """
+    Parse the RIFF header up to the start of the ``data`` chunk and leave
+    ``stream`` positioned on the first sample. ``data_bytes`` is None when
+    the writer never filled in the size.
+    """
+    riff = read_exact(stream, 12)
+    if len(riff) < 12 or riff[:4] != b"RIFF" or riff[8:12] != b"WAVE":
+        raise UnsupportedAudio("Not a RIFF/WAVE stream")
+
+    fmt = None
+    while True:
+        header = read_exact(stream, 8)
+        if len(header) < 8:
+            raise UnsupportedAudio("No data chunk")
+        chunk_id, size = header[:4], struct.unpack("<I", header[4:])[0]
+
+        if chunk_id == b"data":
+            if fmt is None:
+                raise UnsupportedAudio("data chunk before fmt chunk")
+            return fmt._replace(data_bytes=None if size in UNKNOWN_DATA_SIZES else size)
+
+        body = read_exact(stream, size + (size & 1))  # chunks are word aligned
+        if chunk_id == b"fmt ":
+            if size < 16:
+                raise UnsupportedAudio("Truncated fmt chunk")
+            tag, channels, rate, _, _, bits = struct.unpack("<HHIIHH", body[:16])
+            if tag == WAVE_FORMAT_EXTENSIBLE and size >= 26:
+                tag = struct.unpack("<H", body[24:26])[0]  # first bytes of the sub-format GUID
+            fmt = WavFormat(tag, channels, rate, bits, None)
+            check_supported(fmt)
+
+
+def check_supported(fmt):
+    if fmt.channels < 1 or fmt.sample_rate < 1:
+        raise UnsupportedAudio(f"Invalid format {fmt}")
+    if fmt.format_tag == WAVE_FORMAT_PCM and fmt.bits_per_sample in (8, 16, 24, 32):
+        return
+    if fmt.format_tag == WAVE_FORMAT_IEEE_FLOAT and fmt.bits_per_sample in (32, 64):
+        return
+    raise UnsupportedAudio(f"Unsupported WAV encoding {fmt.format_tag:#06x}/{fmt.bits_per_sample} bit")
+
+
+def frame_bytes(fmt):
+    return fmt.channels * fmt.bits_per_sample // 8
+
+
+def iter_raw(stream, fmt, frames_per_block):
+    """
+    Raw sample bytes, ``frames_per_block`` whole frames at a time, from a
+    stream positioned by ``read_wav_header``. A trailing partial frame is
+    dropped.
+    """
+    size = frame_bytes(fmt)
+    remaining = fmt.data_bytes
+    while remaining is None or remaining >= size:
+        want = frames_per_block * size
+        if remaining is not None:
+            want = min(want, remaining - remaining % size)
+        raw = read_exact(stream, want)
+        usable = len(raw) - len(raw) % size
+        if usable:
+            yield raw[:usable]
+        if remaining is not None:
+            remaining -= len(raw)
+        if len(raw) < want:
+            return
+
+
+def iter_frames(stream, fmt, frames_per_block):
+    """Like ``iter_raw``, as float32 arrays of shape (frames, channels) in [-1, 1]"""
+    for raw in iter_raw(stream, fmt, frames_per_block):
+        yield decode_samples(raw, fmt).reshape(-1, fmt.channels)
+
+
+def decode_samples(raw, fmt):
+    bits = fmt.bits_per_sample
+    if fmt.format_tag == WAVE_FORMAT_IEEE_FLOAT:
+        return np.frombuffer(raw, dtype="<f4" if bits == 32 else "<f8").astype(np.float32)
+    if bits == 8:
+        return (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128) / 128
+    if bits == 24:
+        b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        samples = b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)
+        samples -= (samples & 0x800000) << 1  # sign-extend
+        return samples.astype(np.float32) / (1 << 23)
+    dtype = "<i2" if bits == 16 else "<i4"
+    return np.frombuffer(raw, dtype=dtype).astype(np.float32) / (1 << (bits - 1))
+
+
+def downmix(frames):
+    """Average the channels of a (frames, channels) block"""
+    if frames.shape[1] == 1:
+        return frames[:, 0]
+    return frames.mean(axis=1, dtype=np.float32)
+
+
+def to_pcm16(samples):
+    """Little-endian 16-bit PCM bytes, clipped to full scale"""
+    return (np.clip(samples, -1.0, 32767 / 32768) * 32768).round().astype("<i2").tobytes()
+
+
+def wav_header(sample_rate, channels, bits_per_sample, data_bytes):
+    """44-byte canonical PCM WAV header"""
+    block_align = channels * bits_per_sample // 8
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data_bytes, b"WAVE",
+        b"fmt ", 16, WAVE_FORMAT_PCM, channels, sample_rate,
+        sample_rate * block_align, block_align, bits_per_sample,
+        b"data", data_bytes
+    )
+
+
+class Resampler:
+    """
+    Streaming rational resampler: a Kaiser-windowed sinc low-pass evaluated
+    at each output instant, with one precomputed filter row per phase.
+    ``process`` may be fed blocks of any size; ``flush`` returns the tail.
+    """
+
+    SLICE = 8192
+
+    def __init__(self, rate_in, rate_out, half_taps=16, beta=8.0, rolloff=0.92):
+        g = math.gcd(rate_in, rate_out)
+        self.up, self.down = rate_out // g, rate_in // g
+        self.half_taps = half_taps
+
+        # Input sample i contributes to output instant t = n * down / up with
+        # weight h(i - t); i runs over floor(t) - half_taps + 1 .. floor(t) + half_taps
+        cutoff = min(1.0, rate_out / rate_in) * rolloff
+        self.offsets = np.arange(-half_taps + 1, half_taps + 1)
+        distance = self.offsets[None, :] - np.arange(self.up)[:, None] / self.up
+        window = np.i0(beta * np.sqrt(np.clip(1 - (distance / half_taps) ** 2, 0, None))) / np.i0(beta)
+        table = cutoff * np.sinc(cutoff * distance) * window
+        self.table = (table / table.sum(axis=1, keepdims=True)).astype(np.float32)
+
+        # Zero history before the first sample; buffer[0] is input index self.start
+        self.buffer = np.zeros(half_taps - 1, dtype=np.float32)
+        self.start = -(half_taps - 1)
+        self.consumed = 0
+        self.produced = 0
+
+    def process(self, samples):
+        self.consumed += len(samples)
+        return self._run(np.concatenate([self.buffer, samples.astype(np.float32, copy=False)]))
+
+    def flush(self):
+        """Outputs up to the end of the input, which is padded with silence"""
+        total = -(-self.consumed * self.up // self.down)
+        tail = self._run(np.concatenate([self.buffer, np.zeros(self.half_taps, dtype=np.float32)]))
+        return tail[:max(0, total - (self.produced - len(tail)))]
+
+    def _run(self, buffer):
+        # Output n needs inputs up to floor(n * down / up) + half_taps
+        last_input = self.start + len(buffer) - 1
+        end = -(-(last_input - self.half_taps + 1) * self.up // self.down)
+        n = np.arange(self.produced, max(self.produced, end), dtype=np.int64)
+
+        # Gathered windows are len(n) x taps; build them a slice at a time
+        out = np.empty(len(n), dtype=np.float32)
+        for i in range(0, len(n), self.SLICE):
+            part = n[i:i + self.SLICE]
+            index = (part * self.down // self.up)[:, None] + self.offsets[None, :] - self.start
+            out[i:i + self.SLICE] = np.einsum("ij,ij->i", buffer[index], self.table[part * self.down % self.up])
+
+        self.produced += len(n)
+        keep_from = self.produced * self.down // self.up - self.half_taps + 1 - self.start
+        keep_from = max(0, min(keep_from, len(buffer)))
+        self.buffer = buffer[keep_from:]
+        self.start += keep_from
+        return out
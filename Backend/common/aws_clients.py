@@ -0,0 +1,121 @@
+"""
+Shared, lazily created AWS clients for the Lambda handlers.
+
+Clients are created on first use rather than at import, so an invocation
+only pays for the clients its code path needs (a FAILED Transcribe job never
+builds the S3 or Bedrock client), and are memoized per process so warm
+invocations reuse them and their pooled, kept-alive connections.
+"""
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+
+REGION = os.environ.get("REGION", "ap-south-1")
+
+# Per-service connection, timeout and retry settings. Bedrock retries are
+# left to the rate limiter in transcription_processing, so botocore makes a
+# single attempt; everything else uses the standard retry mode.
+SERVICE_CONFIGS = {
+    "dynamodb": Config(
+        connect_timeout=2,
+        read_timeout=5,
+        retries={"mode": "standard", "max_attempts": 4},
+        max_pool_connections=20,
+        tcp_keepalive=True
+    ),
+    "s3": Config(
+        connect_timeout=2,
+        read_timeout=30,
+        retries={"mode": "standard", "max_attempts": 3},
+        max_pool_connections=20,
+        tcp_keepalive=True,
+        signature_version="s3v4"
+    ),
+    "transcribe": Config(
+        connect_timeout=2,
+        read_timeout=10,
+        retries={"mode": "adaptive", "max_attempts": 5},
+        tcp_keepalive=True
+    ),
+    # Model inference on a window of audio takes seconds, not milliseconds
+    "sagemaker-runtime": Config(
+        connect_timeout=2,
+        read_timeout=60,
+        retries={"mode": "standard", "max_attempts": 3},
+        max_pool_connections=20,
+        tcp_keepalive=True
+    ),
+    "bedrock-runtime": Config(
+        connect_timeout=2,
+        read_timeout=120,
+        retries={"total_max_attempts": 1},
+        max_pool_connections=20,
+        tcp_keepalive=True
+    ),
+}
+
+_session = None
+_clients = {}
+_lock = threading.Lock()
+
+
+def _get_session():
+    global _session
+    if _session is None:
+        _session = boto3.session.Session(region_name=REGION)
+    return _session
+
+
+def client(service, region=None):
+    """Memoized low-level client for ``service``"""
+    key = ("client", service, region or REGION)
+    if key not in _clients:
+        with _lock:
+            if key not in _clients:
+                _clients[key] = _get_session().client(
+                    service,
+                    region_name=region or REGION,
+                    config=SERVICE_CONFIGS.get(service)
+                )
+    return _clients[key]
+
+
+def resource(service, region=None):
+    """Memoized resource for ``service`` (not thread-safe, like all resources)"""
+    key = ("resource", service, region or REGION)
+    if key not in _clients:
+        with _lock:
+            if key not in _clients:
+                _clients[key] = _get_session().resource(
+                    service,
+                    region_name=region or REGION,
+                    config=SERVICE_CONFIGS.get(service)
+                )
+    return _clients[key]
+
+
+class LazyClient:
+    """
+    Stand-in that builds its target on first attribute access, so handlers
+    can keep module-level names like ``s3`` without creating the client at
+    import time
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._target = None
+
+    def __getattr__(self, name):
+        if self._target is None:
+            self._target = self._factory()
+        return getattr(self._target, name)
+
+
+def lazy_client(service, region=None):
+    return LazyClient(lambda: client(service, region))
+
+
+def lazy_table(table_name, region=None):
+    return LazyClient(lambda: resource("dynamodb", region).Table(table_name))
@@ -0,0 +1,87 @@
+"""
+Naming and timeline bookkeeping shared by the chunked transcription stages.
+
+transcribe_audio cuts a recording into chunks on its "kept" timeline (the
+recording with long silences shortened) and writes a manifest describing
+the cut. transcription_processing reads the manifest back to map chunk
+timestamps to the source recording. Spans are (kept start, source start,
+length) triples in seconds, in order.
+"""
+from bisect import bisect_right
+
+# Transcribe job names allow [0-9a-zA-Z._-]; session ids never contain "."
+CHUNK_JOB_SEPARATOR = ".chunk-"
+UPLOAD_JOB_SEPARATOR = ".upload-"
+
+
+def upload_job_name(session_id, upload):
+    """Job name for the session's ``upload``-th recording (the first keeps the bare session id)"""
+    return session_id if upload <= 1 else f"{session_id}{UPLOAD_JOB_SEPARATOR}{upload}"
+
+
+def parse_upload_job(job_name):
+    """(session_id, upload number) for a job name, chunk jobs included"""
+    chunk = parse_chunk_job(job_name)
+    base = chunk[0] if chunk else job_name
+    session_id, separator, upload = base.rpartition(UPLOAD_JOB_SEPARATOR)
+    if not separator or not upload.isdigit():
+        return base, 1
+    return session_id, int(upload)
+
+
+def chunk_job_name(session_id, index):
+    return f"{session_id}{CHUNK_JOB_SEPARATOR}{index:03d}"
+
+
+def parse_chunk_job(job_name):
+    """(session_id, chunk index) for a chunk job name, else None"""
+    session_id, separator, index = job_name.rpartition(CHUNK_JOB_SEPARATOR)
+    if not separator or not index.isdigit():
+        return None
+    return session_id, int(index)
+
+
+def chunk_key(session_id, index):
+    return f"sessions/{session_id}/chunks/{index:03d}.wav"
+
+
+def chunk_output_prefix(session_id):
+    return f"sessions/{session_id}/chunks/output/"
+
+
+def manifest_key(session_id):
+    return f"sessions/{session_id}/chunks/manifest.json"
+
+
+def kept_to_source(spans, kept):
+    index = max(0, bisect_right([s[0] for s in spans], kept) - 1)
+    kept_start, source_start, length = spans[index]
+    return source_start + min(max(kept - kept_start, 0.0), length)
+
+
+def source_to_kept(spans, source):
+    """Kept time of a source time; a trimmed silence maps to its cut point"""
+    index = max(0, bisect_right([s[1] for s in spans], source) - 1)
+    kept_start, source_start, length = spans[index]
+    return kept_start + min(max(source - source_start, 0.0), length)
+
+
+def chunk_windows(cuts, overlap):
+    """
+    (start, end) on the kept timeline per chunk: every chunk after the first
+    also repeats the last ``overlap`` seconds of the one before
+    """
+    return [
+        (max(0.0, start - overlap) if i else start, end)
+        for i, (start, end) in enumerate(zip(cuts, cuts[1:]))
+    ]
+
+
+def source_pieces(spans, start, end):
+    """Source (start, end) intervals making up kept [start, end)"""
+    pieces = []
+    for kept_start, source_start, length in spans:
+        lo, hi = max(start, kept_start), min(end, kept_start + length)
+        if hi > lo:
+            pieces.append((source_start + lo - kept_start, source_start + hi - kept_start))
+    return pieces
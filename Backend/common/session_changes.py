@@ -0,0 +1,77 @@
+"""
+Small per-session change markers, fed from the session table's DynamoDB
+stream by the session_notifier handler.
+
+A marker holds only the attributes a session's ETag is computed from
+(session_id, status, created_at, updated_at, revision), so a get_session
+request waiting for a change can check it for a fraction of a read unit
+instead of re-reading the whole session item, transcript and extraction
+included.
+"""
+import random
+import time
+
+# Markers of sessions idle this long are expired by the table's TTL
+MARKER_TTL_SECONDS = 24 * 60 * 60
+MARKER_ATTRIBUTES = ("session_id", "status", "created_at", "updated_at", "revision")
+
+# BatchWriteItem accepts at most 25 requests
+WRITE_BATCH_SIZE = 25
+
+
+def markers_from_stream(records):
+    """
+    Latest marker (or None for a deleted session) per session id from
+    DynamoDB stream records, which arrive in order per key
+    """
+    markers = {}
+    for record in records:
+        change = record.get("dynamodb", {})
+        session_id = change.get("Keys", {}).get("session_id", {}).get("S")
+        if not session_id:
+            continue
+        if record.get("eventName") == "REMOVE":
+            markers[session_id] = None
+            continue
+        image = change.get("NewImage", {})
+        markers[session_id] = {a: image[a] for a in MARKER_ATTRIBUTES if a in image}
+    return markers
+
+
+def write_markers(dynamodb, table_name, markers, max_attempts=5, base_backoff=0.05):
+    """
+    Store (or delete) markers with BatchWriteItem, retrying unprocessed
+    items; returns the number of requests written
+    """
+    expires_at = {"N": str(int(time.time()) + MARKER_TTL_SECONDS)}
+    requests = [
+        {"PutRequest": {"Item": {**marker, "expires_at": expires_at}}} if marker
+        else {"DeleteRequest": {"Key": {"session_id": {"S": session_id}}}}
+        for session_id, marker in markers.items()
+    ]
+
+    for start in range(0, len(requests), WRITE_BATCH_SIZE):
+        pending = requests[start:start + WRITE_BATCH_SIZE]
+        for attempt in range(max_attempts):
+            result = dynamodb.batch_write_item(RequestItems={table_name: pending})
+            pending = (result.get("UnprocessedItems") or {}).get(table_name)
+            if not pending:
+                break
+            time.sleep(random.uniform(0, base_backoff * 2 ** attempt))
+        else:
+            raise RuntimeError(f"{len(pending)} session change markers left unprocessed")
+
+    return len(requests)
+
+
+def read_marker(dynamodb, table_name, session_id):
+    """
+    Current marker of ``session_id`` (raw attribute values, or None) and the
+    read units the check consumed
+    """
+    result = dynamodb.get_item(
+        TableName=table_name,
+        Key={"session_id": {"S": session_id}},
+        ReturnConsumedCapacity="TOTAL"
+    )
+    return result.get("Item"), result.get("ConsumedCapacity", {}).get("CapacityUnits", 0.5)
@@ -0,0 +1,58 @@
+"""
+Storage layout of a session's results.
+
+The extracted fields are small and stored on the session item as native
+DynamoDB maps (extracted_info, and partial_extracted_info while a
+streaming extraction runs), so single sections can be projected and
+filtered on. The transcript and the raw model output are large and only
+wanted on request: they go to one gzip-compressed JSON object per upload,
+whose key is the item's results_key.
+
+Items written before this layout hold the extraction as a JSON string;
+``from_attribute`` reads both, and migrations/session_results.py rewrites
+the old ones.
+"""
+import gzip
+import json
+from decimal import Decimal
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+RESULTS_CONTENT_TYPE = "application/json"
+RESULTS_CONTENT_ENCODING = "gzip"
+
+serializer = TypeSerializer()
+deserializer = TypeDeserializer()
+
+
+def results_key(session_id, upload_job):
+    return f"sessions/{session_id}/results/{upload_job}.json.gz"
+
+
+def to_attribute(value):
+    """DynamoDB attribute value of a JSON value (numbers become Decimal)"""
+    return serializer.serialize(json.loads(json.dumps(value), parse_float=Decimal))
+
+
+def from_attribute(attribute):
+    """Python value of an attribute; a JSON string (the old layout) is decoded"""
+    value = deserializer.deserialize(attribute)
+    if isinstance(value, str):
+        try:
+            return json.loads(value, parse_float=Decimal)
+        except json.JSONDecodeError:
+            return value
+    return value
+
+
+def put_results(s3, bucket, key, **results):
+    """Write the results object; returns its compressed size in bytes"""
+    body = gzip.compress(json.dumps(results, ensure_ascii=False).encode("utf-8"), compresslevel=6)
+    s3.put_object(Bucket=bucket, Key=key, Body=body, ContentType=RESULTS_CONTENT_TYPE,
+                  ContentEncoding=RESULTS_CONTENT_ENCODING)
+    return len(body)
+
+
+def read_results(s3, bucket, key):
+    body = s3.get_object(Bucket=bucket, Key=key)["Body"]
+    return json.loads(gzip.decompress(body.read()))
@@ -0,0 +1,175 @@
+"""
+Structured logs and CloudWatch embedded metrics (EMF) for the handlers.
+
+A trace is one unit of work for one session in one function:
+
+    with trace("transcription_processing", session_id):
+        with span("s3_fetch"):
+            ...
+        metric("bedrock_input_tokens", usage["input_tokens"])
+
+Every span and metric recorded inside it is collected, and when the trace
+ends one EMF document holding all of them is written to stdout, where
+CloudWatch turns it into metrics in METRICS_NAMESPACE with the function
+as the dimension. The session id travels as a property of that document
+and of every log line, so the records of all four functions for one
+session can be queried together in Logs Insights.
+
+Only METRICS_SAMPLE_RATE of the traces write their document; failed traces
+always do. ``log`` writes JSON lines at or above LOG_LEVEL. The current
+trace is held in a context variable: work handed to a thread pool has to
+be wrapped with ``propagate`` to record into it.
+"""
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "CloudnineCCE")
+METRICS_SAMPLE_RATE = float(os.environ.get("METRICS_SAMPLE_RATE", "1"))
+
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+
+# EMF accepts at most this many metrics per document and values per metric
+MAX_METRICS = 100
+MAX_VALUES = 100
+
+_current = contextvars.ContextVar("telemetry_trace", default=None)
+_cold_start = [True]
+
+
+class Trace:
+    def __init__(self, function, session_id, sampled, cold_start):
+        self.function, self.session_id = function, session_id
+        self.sampled, self.cold_start = sampled, cold_start
+        self.error = None
+        self.properties = {}
+        # name -> (unit, [values])
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def add(self, name, value, unit):
+        with self.lock:
+            values = self.metrics.setdefault(name, (unit, []))[1]
+            if len(values) < MAX_VALUES:
+                values.append(value)
+
+    def document(self):
+        with self.lock:
+            metrics = dict(list(self.metrics.items())[:MAX_METRICS])
+        return {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": METRICS_NAMESPACE,
+                    "Dimensions": [["function"]],
+                    "Metrics": [{"Name": name, "Unit": unit} for name, (unit, _) in metrics.items()],
+                }],
+            },
+            "function": self.function,
+            "session_id": self.session_id,
+            "cold_start": self.cold_start,
+            "error": self.error,
+            **self.properties,
+            **{name: values[0] if len(values) == 1 else values for name, (_, values) in metrics.items()},
+        }
+
+
+@contextmanager
+def trace(function, session_id=None, **properties):
+    """Collect the spans and metrics of one unit of work and emit them at the end"""
+    current = Trace(function, session_id, random.random() < METRICS_SAMPLE_RATE, _cold_start[0])
+    _cold_start[0] = False
+    current.properties.update(properties)
+    token = _current.set(current)
+    started = time.perf_counter()
+    try:
+        yield current
+    except Exception as e:
+        current.error = type(e).__name__
+        current.add("errors", 1, "Count")
+        raise
+    finally:
+        current.add("duration_ms", round((time.perf_counter() - started) * 1000, 2), "Milliseconds")
+        _current.reset(token)
+        if current.sampled or current.error:
+            _write(current.document())
+
+
+def bind(session_id=None, **properties):
+    """Attach the session (once known) and properties to the current trace"""
+    current = _current.get()
+    if current is None:
+        return
+    if session_id:
+        current.session_id = session_id
+    current.properties.update(properties)
+
+
+@contextmanager
+def span(name):
+    """Time a stage as ``<name>_ms``"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metric(f"{name}_ms", round((time.perf_counter() - started) * 1000, 2), "Milliseconds")
+
+
+def metric(name, value, unit="Count"):
+    current = _current.get()
+    if current is not None and value is not None:
+        current.add(name, value, unit)
+
+
+def propagate(fn):
+    """``fn`` recording into the caller's trace when run on another thread"""
+    current = _current.get()
+
+    def run(*args, **kwargs):
+        token = _current.set(current)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+
+    return run
+
+
+def enabled(level):
+    return LEVELS.get(level, 20) >= LEVELS.get(LOG_LEVEL, 20)
+
+
+def log(level, message, **fields):
+    if not enabled(level):
+        return
+    current = _current.get()
+    record = {"level": level, "message": message}
+    if current is not None:
+        record.update(function=current.function, session_id=current.session_id)
+    record.update(fields)
+    _write(record)
+
+
+def debug(message, **fields):
+    log("DEBUG", message, **fields)
+
+
+def info(message, **fields):
+    log("INFO", message, **fields)
+
+
+def warning(message, **fields):
+    log("WARNING", message, **fields)
+
+
+def error(message, **fields):
+    log("ERROR", message, **fields)
+
+
+def _write(record):
+    print(json.dumps(record, default=str))
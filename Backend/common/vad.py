@@ -0,0 +1,101 @@
+"""
+Energy-based voice activity detection and chunk planning.
+
+Frame energies are computed block by block, so a recording is never held
+in memory; the per-frame energies of an hour (120k floats) are. Speech is
+whatever rises clearly above the recording's own noise floor. Silences
+longer than ``max_silence`` are shortened, which shortens the billed audio,
+and the remaining "kept" timeline is cut at silences into bounded chunks.
+
+Times on the kept timeline are mapped back to the source recording with
+``common.chunk_manifest.kept_to_source``.
+"""
+import numpy as np
+
+from common.chunk_manifest import source_to_kept
+
+FRAME_SECONDS = 0.03
+
+
+def frame_energies(blocks, sample_rate, frame_seconds=FRAME_SECONDS):
+    """RMS energy in dBFS of consecutive frames of mono float blocks"""
+    frame = max(1, int(sample_rate * frame_seconds))
+    carry, energies = np.zeros(0, dtype=np.float32), []
+    for block in blocks:
+        data = np.concatenate([carry, block])
+        usable = len(data) // frame * frame
+        if usable:
+            frames = data[:usable].reshape(-1, frame)
+            rms = np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1))
+            energies.append(20 * np.log10(rms + 1e-10))
+        carry = data[usable:]
+    return np.concatenate(energies) if energies else np.zeros(0)
+
+
+def speech_regions(energies, frame_seconds=FRAME_SECONDS, margin_db=12.0, floor_db=-55.0,
+                   min_silence=0.3, pad=0.15):
+    """
+    [(start, end)] seconds of speech. Frames more than ``margin_db`` above
+    the noise floor (10th percentile) are speech; pauses shorter than
+    ``min_silence`` are bridged and each region is padded by ``pad``.
+    """
+    if not len(energies):
+        return []
+    threshold = max(np.percentile(energies, 10) + margin_db, floor_db)
+    active = np.concatenate([[0], (energies > threshold).astype(np.int8), [0]])
+    edges = np.flatnonzero(np.diff(active)).reshape(-1, 2) * frame_seconds
+
+    duration = len(energies) * frame_seconds
+    regions = []
+    for start, end in edges:
+        start, end = max(0.0, float(start) - pad), min(duration, float(end) + pad)
+        if regions and start - regions[-1][1] < min_silence:
+            regions[-1] = (regions[-1][0], end)
+        else:
+            regions.append((start, end))
+    return regions
+
+
+def kept_spans(regions, duration, max_silence):
+    """
+    [(kept start, source start, length)] covering the speech and at most
+    ``max_silence`` of every pause: half after the speech, half before the
+    next. Shorter pauses are kept whole.
+    """
+    half = max_silence / 2
+    intervals = []
+    for start, end in regions:
+        start, end = max(0.0, start - half), min(duration, end + half)
+        if intervals and start <= intervals[-1][1]:
+            intervals[-1][1] = max(intervals[-1][1], end)
+        else:
+            intervals.append([start, end])
+
+    spans, kept = [], 0.0
+    for start, end in intervals:
+        spans.append((round(kept, 3), round(start, 3), round(end - start, 3)))
+        kept += end - start
+    return spans
+
+
+def plan_cuts(regions, spans, max_chunk, min_chunk):
+    """
+    Chunk boundaries on the kept timeline, from 0 to its end. Each chunk is
+    at most ``max_chunk`` seconds; it ends in the longest pause of its last
+    stretch after ``min_chunk``, or mid-speech when there is no pause.
+    """
+    total = spans[-1][0] + spans[-1][2] if spans else 0.0
+    # (kept time of the pause middle, pause length in the source)
+    pauses = [
+        (source_to_kept(spans, (end + start) / 2), start - end)
+        for (_, end), (start, _) in zip(regions, regions[1:])
+    ]
+
+    cuts = [0.0]
+    while total - cuts[-1] > max_chunk:
+        low, high = cuts[-1] + min_chunk, cuts[-1] + max_chunk
+        candidates = [p for p in pauses if low <= p[0] <= high]
+        cut = max(candidates, key=lambda p: (p[1], p[0]))[0] if candidates else high
+        cuts.append(round(cut, 3))
+    cuts.append(round(total, 3))
+    return cuts
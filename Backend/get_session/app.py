@@ -1,22 +1,79 @@
+import hashlib
 import json
 import os
-import boto3
+import random
+import re
+import time
 from decimal import Decimal
 from botocore.exceptions import ClientError
 from boto3.dynamodb.types import TypeDeserializer
+from common.aws_clients import lazy_client
+from common.session_changes import read_marker
+from common.session_results import from_attribute, read_results
+from common.telemetry import bind, debug, error, span, trace, warning
+from session_listing import LIST_FIELDS, InvalidCursor, query_sessions
 
 REGION = os.environ.get("REGION", "ap-south-1")
 TABLE_NAME = os.environ.get("SESSION_TABLE", "cce_sessions")
+BUCKET_NAME = os.environ.get("BUCKET_NAME", "cloudnine-cce")
 
-dynamodb = boto3.client("dynamodb", region_name=REGION)
+# BatchGetItem accepts at most 100 keys per request
+MAX_BATCH_SIZE = 100
+BATCH_GET_MAX_ATTEMPTS = int(os.environ.get("BATCH_GET_MAX_ATTEMPTS", "5"))
+BATCH_GET_BASE_BACKOFF = float(os.environ.get("BATCH_GET_BASE_BACKOFF", "0.05"))
+
+# Wait-for-change requests (?wait=<seconds>). The cap stays under API
+# Gateway's 29 s integration timeout. Waiters check the stream-fed change
+# marker when SESSION_CHANGES_TABLE is set, else the session item itself,
+# pacing the checks to spend at most WAIT_READ_UNITS_PER_SECOND: a marker
+# or small session item (0.5 units) every second, a 30 KB item every 8 s.
+CHANGES_TABLE = os.environ.get("SESSION_CHANGES_TABLE", "")
+LONG_POLL_MAX_SECONDS = float(os.environ.get("LONG_POLL_MAX_SECONDS", "20"))
+WAIT_READ_UNITS_PER_SECOND = float(os.environ.get("WAIT_READ_UNITS_PER_SECOND", "0.5"))
+WAIT_MIN_CHECK_INTERVAL = float(os.environ.get("WAIT_MIN_CHECK_INTERVAL", "0.1"))
+
+# Response field -> session table attribute
+FIELD_ATTRIBUTES = {
+    "session_id": "session_id",
+    "status": "status",
+    "patient_id": "patient_id",
+    "patient_name": "patient_name",
+    "cce_id": "cce_id",
+    "language_preferences": "language_preferences",
+    "content_type": "content_type",
+    "s3_input_path": "s3_input_path",
+    "s3_output_path": "s3_output_path",
+    "transcription_job_name": "transcription_job_name",
+    "transcription_output": "transcription_output",
+    "extracted_data": "extracted_info",
+    # Sections published while a streaming extraction is running
+    "partial_extracted_data": "partial_extracted_info",
+    "created_at": "created_at",
+    "updated_at": "updated_at",
+    "revision": "revision",
+}
+FIELD_DEFAULTS = {"language_preferences": []}
+
+# Stored as native maps: a single section is requested as
+# fields=extracted_data.<section> and only that section is read
+MAP_FIELDS = ("extracted_data", "partial_extracted_data")
+SECTION_FIELD = re.compile(r"^(%s)\.(\w+)$" % "|".join(MAP_FIELDS))
+
+# Offloaded to the session's compressed results object (results_key) and
+# only read when requested by name, for a single session
+OFFLOADED_FIELDS = ("transcript", "model_output")
+
+# Always read: the ETag is computed from them
+ETAG_ATTRIBUTES = ("session_id", "status", "created_at", "updated_at", "revision")
+
+# Created on first use and reused across warm invocations
+dynamodb = lazy_client("dynamodb")
+s3 = lazy_client("s3")
 deserializer = TypeDeserializer()
 
 
-def deserialize_item(item):
-    """
-    Convert DynamoDB AttributeValue map to normal dict
-    """
-    return {k: deserializer.deserialize(v) for k, v in item.items()}
+class BadRequest(ValueError):
+    pass
 
 
 def decimal_to_number(obj):
@@ -28,39 +85,229 @@ def decimal_to_number(obj):
     return obj
 
 
-def response(status_code, body):
+def response(status_code, body, headers=None):
     return {
         "statusCode": status_code,
         "headers": {
             "Content-Type": "application/json",
             "Access-Control-Allow-Origin": "*",
             "Access-Control-Allow-Headers": "*",
-            "Access-Control-Allow-Methods": "GET,OPTIONS",
+            "Access-Control-Allow-Methods": "GET,POST,OPTIONS",
+            "Access-Control-Expose-Headers": "ETag",
+            **(headers or {}),
         },
-        "body": json.dumps(body, default=decimal_to_number),  # Add default handler
+        # 304 responses carry no body
+        "body": "" if body is None else json.dumps(body, default=decimal_to_number),
     }
 
 
-def lambda_handler(event, context):
-    print("Event:", json.dumps(event))
+def parse_fields(value):
+    """
+    Field selection from ``fields=status,updated_at`` (or a JSON list);
+    None selects every field
+    """
+    if not value:
+        return None
+    if isinstance(value, str):
+        value = value.split(",")
+    fields = tuple(dict.fromkeys(f.strip() for f in value if f.strip()))
+    unknown = [f for f in fields if f not in FIELD_ATTRIBUTES and f not in OFFLOADED_FIELDS
+               and not SECTION_FIELD.match(f)]
+    if unknown:
+        raise BadRequest(f"Unknown fields {unknown}. Supported: {list(FIELD_ATTRIBUTES) + list(OFFLOADED_FIELDS)}"
+                         f" and {', '.join(f + '.<section>' for f in MAP_FIELDS)}")
+    # A whole map already includes its sections
+    fields = tuple(f for f in fields if f.partition(".")[0] not in fields or "." not in f)
+    return fields or None
+
+
+def field_path(field):
+    """Document path (attribute names) a response field is read from"""
+    if field in OFFLOADED_FIELDS:
+        return ("results_key",)
+    name, _, section = field.partition(".")
+    return (FIELD_ATTRIBUTES[name], section) if section else (FIELD_ATTRIBUTES[name],)
+
 
+def projection(fields):
+    """ProjectionExpression arguments reading only ``fields`` (plus the ETag inputs)"""
+    if fields is None:
+        return {}
+    paths = dict.fromkeys([(a,) for a in ETAG_ATTRIBUTES] + [field_path(f) for f in fields])
+    placeholders = {}
+    for path in paths:
+        for name in path:
+            placeholders.setdefault(name, f"#a{len(placeholders)}")
+    return {
+        "ProjectionExpression": ", ".join(".".join(placeholders[name] for name in path) for path in paths),
+        "ExpressionAttributeNames": {placeholder: name for name, placeholder in placeholders.items()},
+    }
+
+
+def session_etag(item, fields):
+    """
+    ETag of a session representation, from the raw (still serialized) item.
+
+    Every write to a session adds one to its revision. Sessions last
+    written before there was a revision are identified by updated_at (or
+    created_at) and the status, which only tell writes a second apart.
+    """
+    def raw(attribute):
+        value = item.get(attribute)
+        return next(iter(value.values())) if value else ""
+
+    version = "|".join([
+        raw("session_id"),
+        f"r{raw('revision')}" if raw("revision") else raw("updated_at") or raw("created_at"),
+        "" if raw("revision") else raw("status"),
+        ",".join(fields or FIELD_ATTRIBUTES),
+    ])
+    return '"' + hashlib.sha1(version.encode("utf-8")).hexdigest()[:20] + '"'
+
+
+def if_none_match(event):
+    """ETags from the If-None-Match header (weak or strong), as a set"""
+    headers = {k.lower(): v for k, v in (event.get("headers") or {}).items()}
+    value = headers.get("if-none-match")
+    if not value:
+        return set()
+    return {tag.strip().removeprefix("W/") for tag in value.split(",") if tag.strip()}
+
+
+def normalize_session(item, fields=None):
+    """
+    Response body of one session, restricted to ``fields`` when given
+    (offloaded fields are filled in by read_offloaded)
+    """
+    body = {}
+    for field in fields or FIELD_ATTRIBUTES:
+        if field in OFFLOADED_FIELDS:
+            continue
+        name, _, section = field.partition(".")
+        attribute = item.get(FIELD_ATTRIBUTES[name])
+        if attribute is None:
+            value = None
+        elif name in MAP_FIELDS:
+            # Items from before the native layout hold a JSON string
+            value = from_attribute(attribute)
+        else:
+            value = deserializer.deserialize(attribute)
+        if section:
+            sections = body.setdefault(name, {})
+            if isinstance(value, dict) and section in value:
+                sections[section] = value[section]
+        else:
+            body[name] = FIELD_DEFAULTS.get(name) if value is None else value
+    return body
+
+
+def read_offloaded(item, fields):
+    """The requested offloaded fields from the session's results object"""
+    requested = [f for f in fields or () if f in OFFLOADED_FIELDS]
+    key = item.get("results_key", {}).get("S")
+    if not requested or not key:
+        return dict.fromkeys(requested)
     try:
-        # Read path param
-        path_params = event.get("pathParameters") or {}
-        session_id = path_params.get("session_id")
+        with span("s3_read"):
+            results = read_results(s3, BUCKET_NAME, key)
+    except ClientError as e:
+        warning("Results object read failed", key=key, error=str(e))
+        return dict.fromkeys(requested)
+    return {field: results.get(field) for field in requested}
 
-        if not session_id:
-            return response(400, {
-                "error": "Missing session_id path parameter"
-            })
+
+def seen_etags(event, session_id, fields):
+    """
+    ETags of the versions the client already has: If-None-Match, or the
+    since_revision / since_updated_at / since_status it last saw
+    """
+    known = if_none_match(event)
+    query = event.get("queryStringParameters") or {}
+    since = {
+        attribute: {kind: query[f"since_{attribute}"]}
+        for attribute, kind in (("revision", "N"), ("updated_at", "N"), ("status", "S"))
+        if query.get(f"since_{attribute}")
+    }
+    if not since:
+        return known
+    known.add(session_etag({"session_id": {"S": session_id}, **since}, fields))
+    if "revision" not in since:
+        # A client without since_revision is up to date while updated_at
+        # and status are what it saw (so it misses same-second writes)
+        version, _ = current_version(session_id)
+        if version and all(
+                next(iter(version.get(attribute, {}).values()), "") == value[kind]
+                for attribute, value in since.items() for kind in value):
+            known.add(session_etag(version, fields))
+    return known
+
+
+def current_version(session_id):
+    """
+    ETag inputs of the session's current version, cheapest source first.
+    Returns (raw attributes or None, read units consumed).
+    """
+    if CHANGES_TABLE:
+        try:
+            marker, units = read_marker(dynamodb, CHANGES_TABLE, session_id)
+            if marker is not None:
+                return marker, units
+        except ClientError as e:
+            warning("Change marker read failed, checking the session", error=str(e))
+
+    # No marker yet (or no notifier): read only the ETag attributes. The
+    # read is still billed for the whole item, hence the pacing below
+    result = dynamodb.get_item(
+        TableName=TABLE_NAME,
+        Key={"session_id": {"S": session_id}},
+        ReturnConsumedCapacity="TOTAL",
+        **projection(())
+    )
+    return result.get("Item"), result.get("ConsumedCapacity", {}).get("CapacityUnits", 0.5)
+
+
+def wait_for_change(session_id, fields, known, deadline):
+    """
+    Block until the session's ETag is not one of ``known`` or ``deadline``
+    (monotonic) passes. Returns the last ETag observed, or None if the
+    session disappeared.
+    """
+    while True:
+        version, units = current_version(session_id)
+        if version is None:
+            return None
+        etag = session_etag(version, fields)
+        remaining = deadline - time.monotonic()
+        if etag not in known or remaining <= 0:
+            return etag
+        interval = max(WAIT_MIN_CHECK_INTERVAL, units / WAIT_READ_UNITS_PER_SECOND)
+        time.sleep(min(interval, remaining))
+
+
+def get_session(session_id, fields, event, wait_seconds=0):
+    known = seen_etags(event, session_id, fields)
+    # Waiting only makes sense for a version the client already has
+    waiting = bool(wait_seconds > 0 and known and "*" not in known)
+    deadline = time.monotonic() + wait_seconds
+    consistent = False
+
+    while True:
+        if waiting:
+            observed = wait_for_change(session_id, fields, known, deadline)
+            if observed in known:
+                # Deadline passed without a change
+                return response(304, None, {"ETag": observed})
 
         # Fetch session from DynamoDB
-        result = dynamodb.get_item(
-            TableName=TABLE_NAME,
-            Key={
-                "session_id": {"S": session_id}
-            }
-        )
+        with span("dynamodb_read"):
+            result = dynamodb.get_item(
+                TableName=TABLE_NAME,
+                Key={
+                    "session_id": {"S": session_id}
+                },
+                ConsistentRead=consistent,
+                **projection(fields)
+            )
 
         if "Item" not in result:
             return response(404, {
@@ -68,38 +315,210 @@ def lambda_handler(event, context):
                 "session_id": session_id
             })
 
-        item = deserialize_item(result["Item"])
-
-        # Normalize output
-        session = {
-            "session_id": item.get("session_id"),
-            "status": item.get("status"),
-            "patient_id": item.get("patient_id"),
-            "patient_name": item.get("patient_name"),
-            "cce_id": item.get("cce_id"),
-            "language_preferences": item.get("language_preferences", []),
-            "content_type": item.get("content_type"),
-            "s3_input_path": item.get("s3_input_path"),
-            "s3_output_path": item.get("s3_output_path"),
-            "transcription_job_name": item.get("transcription_job_name"),
-            "transcription_output": item.get("transcription_output"),
-            "extracted_data": item.get("extracted_info"),
-            "created_at": item.get("created_at"),
-            "updated_at": item.get("updated_at"),
-        }
-
-        return response(200, session)
+        etag = session_etag(result["Item"], fields)
+        if etag in known or "*" in known:
+            if waiting and observed and time.monotonic() < deadline:
+                if not consistent:
+                    # Woken by a change this read may not reflect yet
+                    consistent = True
+                    continue
+                # The marker has not caught up with what the client saw:
+                # wait for it to move past its current version
+                known.add(observed)
+                consistent = False
+                continue
+            return response(304, None, {"ETag": etag})
+
+        body = {**normalize_session(result["Item"], fields), **read_offloaded(result["Item"], fields)}
+        return response(200, body, {"ETag": etag})
+
+
+def requested_wait(query, context):
+    """Requested wait, capped by LONG_POLL_MAX_SECONDS and the Lambda timeout"""
+    try:
+        wait = min(float(query.get("wait") or 0), LONG_POLL_MAX_SECONDS)
+    except ValueError:
+        raise BadRequest("wait must be a number of seconds")
+    if context is not None:
+        wait = min(wait, context.get_remaining_time_in_millis() / 1000.0 - 1.0)
+    return max(0.0, wait)
+
+
+def batch_get_items(session_ids, fields):
+    """
+    Read up to MAX_BATCH_SIZE sessions with BatchGetItem, retrying keys
+    DynamoDB left unprocessed with jittered exponential backoff.
+
+    Returns ({session_id: raw item}, [session ids still unprocessed]).
+    """
+    request = {
+        "Keys": [{"session_id": {"S": session_id}} for session_id in session_ids],
+        **projection(fields),
+    }
+    items = {}
+
+    for attempt in range(BATCH_GET_MAX_ATTEMPTS):
+        result = dynamodb.batch_get_item(RequestItems={TABLE_NAME: request})
+        for item in result.get("Responses", {}).get(TABLE_NAME, []):
+            items[item["session_id"]["S"]] = item
+
+        unprocessed = (result.get("UnprocessedKeys") or {}).get(TABLE_NAME)
+        if not unprocessed:
+            return items, []
+        request = unprocessed
+        if attempt < BATCH_GET_MAX_ATTEMPTS - 1:
+            time.sleep(random.uniform(0, BATCH_GET_BASE_BACKOFF * 2 ** attempt))
+
+    return items, [key["session_id"]["S"] for key in request["Keys"]]
+
+
+def batch_get_sessions(session_ids, fields, known_etags, event):
+    session_ids = list(dict.fromkeys(session_ids))
+    if not session_ids:
+        return response(400, {"error": "session_ids must not be empty"})
+    if len(session_ids) > MAX_BATCH_SIZE:
+        return response(400, {"error": f"At most {MAX_BATCH_SIZE} session_ids per request"})
+
+    items, unprocessed = batch_get_items(session_ids, fields)
+
+    etags = {session_id: session_etag(item, fields) for session_id, item in items.items()}
+    not_found = [s for s in session_ids if s not in items and s not in unprocessed]
+
+    # The whole batch is unchanged if every session is
+    batch_etag = '"' + hashlib.sha1(
+        "|".join(etags.get(s, "-") for s in session_ids).encode("utf-8")
+    ).hexdigest()[:20] + '"'
+    if not unprocessed and batch_etag in if_none_match(event):
+        return response(304, None, {"ETag": batch_etag})
+
+    sessions = []
+    for session_id in session_ids:
+        if session_id not in items:
+            continue
+        if known_etags.get(session_id) == etags[session_id]:
+            # Unchanged since the caller's copy: skip deserializing it
+            sessions.append({"session_id": session_id, "etag": etags[session_id], "not_modified": True})
+        else:
+            sessions.append({
+                "session_id": session_id,
+                **normalize_session(items[session_id], fields),
+                "etag": etags[session_id],
+            })
+
+    headers = {} if unprocessed else {"ETag": batch_etag}
+    return response(200, {
+        "sessions": sessions,
+        "not_found": not_found,
+        # Retry these: DynamoDB kept throttling them
+        "unprocessed": unprocessed,
+    }, headers)
+
+
+def integer_param(query, name):
+    value = query.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise BadRequest(f"{name} must be an integer")
+
+
+def list_sessions(query):
+    """
+    GET ?patient_id=... or ?cce_id=..., newest first, with optional fields,
+    page_size, cursor and created_after/created_before (epoch seconds)
+    """
+    keys = [k for k in ("patient_id", "cce_id") if query.get(k)]
+    if len(keys) != 1:
+        raise BadRequest("List by exactly one of patient_id or cce_id")
+
+    fields = parse_fields(query.get("fields")) or LIST_FIELDS
+    not_indexed = [f for f in fields if f not in LIST_FIELDS]
+    if not_indexed:
+        raise BadRequest(f"Fields {not_indexed} are not listed; fetch them by session_ids")
+
+    page_size = integer_param(query, "page_size")
+    if page_size is not None and page_size < 1:
+        raise BadRequest("page_size must be positive")
+
+    try:
+        items, cursor, units = query_sessions(
+            dynamodb, TABLE_NAME, keys[0], query[keys[0]],
+            fields=fields,
+            page_size=page_size,
+            cursor=query.get("cursor"),
+            created_after=integer_param(query, "created_after"),
+            created_before=integer_param(query, "created_before")
+        )
+    except InvalidCursor as e:
+        raise BadRequest(str(e))
+
+    return response(200, {
+        "sessions": [normalize_session(item, fields) for item in items],
+        "next_cursor": cursor,
+        "consumed_read_units": units,
+    })
+
+
+def lambda_handler(event, context):
+    debug("Event", event=event)
+    with trace("get_session") as current:
+        result = handle(event, context)
+        current.properties["status_code"] = result["statusCode"]
+        return result
+
+
+def handle(event, context):
+    try:
+        # Read path param
+        path_params = event.get("pathParameters") or {}
+        query = event.get("queryStringParameters") or {}
+        session_id = path_params.get("session_id")
+
+        if session_id:
+            bind(session_id)
+            return get_session(
+                session_id, parse_fields(query.get("fields")), event, requested_wait(query, context)
+            )
+
+        if query.get("patient_id") or query.get("cce_id"):
+            return list_sessions(query)
+
+        # Batch: GET ?ids=a,b&fields=status or POST {"session_ids": [...],
+        # "fields": [...], "etags": {session_id: etag}}
+        body = json.loads(event.get("body") or "{}")
+        if query.get("ids"):
+            session_ids = [s.strip() for s in query["ids"].split(",") if s.strip()]
+        else:
+            session_ids = body.get("session_ids")
+
+        if not session_ids or not isinstance(session_ids, list):
+            return response(400, {
+                "error": "Missing session_id path parameter or session_ids list"
+            })
+
+        fields = parse_fields(query.get("fields") or body.get("fields"))
+        offloaded = [f for f in fields or () if f in OFFLOADED_FIELDS]
+        if offloaded:
+            raise BadRequest(f"Fields {offloaded} are only returned for a single session")
+        return batch_get_sessions(session_ids, fields, body.get("etags") or {}, event)
+
+    except (BadRequest, json.JSONDecodeError) as e:
+        return response(400, {
+            "error": str(e)
+        })
 
     except ClientError as e:
-        print("DynamoDB error:", e)
+        error("DynamoDB error", error=str(e))
         return response(500, {
             "error": "DynamoDB error",
             "message": str(e)
         })
 
     except Exception as e:
-        print("Unhandled error:", e)
+        error("Unhandled error", error=str(e))
         return response(500, {
             "error": "Internal server error",
             "message": str(e)
-        })
\ No newline at end of file
+        })
@@ -0,0 +1,108 @@
+"""
+Paged session listings for a patient or a CCE, newest first, served from
+global secondary indexes on the session table:
+
+    patient_id-created_at-index   HASH patient_id, RANGE created_at (N)
+    cce_id-created_at-index       HASH cce_id,     RANGE created_at (N)
+
+Both use an INCLUDE projection of INDEX_ATTRIBUTES (minus their own key),
+so a page reads small index items and never the transcript or extraction.
+A page reads at most PAGE_READ_UNITS however many sessions the patient or
+CCE has, because DynamoDB bills a Query for the items it reads and Limit
+caps them.
+"""
+import base64
+import binascii
+import json
+import os
+
+INDEXES = {
+    "patient_id": os.environ.get("PATIENT_INDEX", "patient_id-created_at-index"),
+    "cce_id": os.environ.get("CCE_INDEX", "cce_id-created_at-index"),
+}
+INDEX_ATTRIBUTES = (
+    "patient_id", "cce_id", "patient_name", "status", "language_preferences", "content_type", "updated_at",
+)
+# Fields a listing can return: the projected attributes and the keys
+LIST_FIELDS = ("session_id", "created_at") + INDEX_ATTRIBUTES
+
+PAGE_READ_UNITS = float(os.environ.get("LIST_PAGE_READ_UNITS", "2"))
+# Upper bound of one index item, DynamoDB's 100 byte per-item overhead
+# included; it turns the read-unit budget into a page size
+MAX_INDEX_ITEM_BYTES = int(os.environ.get("LIST_MAX_INDEX_ITEM_BYTES", "512"))
+DEFAULT_PAGE_SIZE = 25
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def max_page_size():
+    """Largest page that fits PAGE_READ_UNITS (eventually consistent: 8 KB per unit)"""
+    return max(1, int(PAGE_READ_UNITS * 2 * 4096 // MAX_INDEX_ITEM_BYTES))
+
+
+def encode_cursor(last_evaluated_key):
+    if not last_evaluated_key:
+        return None
+    raw = json.dumps(last_evaluated_key, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, key_name, key_value):
+    """ExclusiveStartKey from a cursor issued for the same listing"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        key = json.loads(raw)
+        matches = key[key_name]["S"] == key_value and "session_id" in key and "created_at" in key
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise InvalidCursor("Malformed cursor")
+    if not matches:
+        raise InvalidCursor("Cursor belongs to a different listing")
+    return key
+
+
+def query_sessions(dynamodb, table_name, key_name, key_value, fields=None, page_size=None,
+                   cursor=None, created_after=None, created_before=None):
+    """
+    One page of sessions for ``key_name`` ("patient_id" or "cce_id"),
+    newest first, optionally within a created_at range.
+
+    Returns (raw items, next cursor or None, read units consumed).
+    """
+    limit = min(page_size or DEFAULT_PAGE_SIZE, max_page_size())
+    names = {"#k": key_name}
+    values = {":k": {"S": key_value}}
+    condition = "#k = :k"
+    if created_after is not None and created_before is not None:
+        condition += " AND #c BETWEEN :after AND :before"
+        values.update({":after": {"N": str(created_after)}, ":before": {"N": str(created_before)}})
+    elif created_after is not None:
+        condition += " AND #c >= :after"
+        values[":after"] = {"N": str(created_after)}
+    elif created_before is not None:
+        condition += " AND #c <= :before"
+        values[":before"] = {"N": str(created_before)}
+    if ":after" in values or ":before" in values:
+        names["#c"] = "created_at"
+
+    request = {
+        "TableName": table_name,
+        "IndexName": INDEXES[key_name],
+        "KeyConditionExpression": condition,
+        "ExpressionAttributeValues": values,
+        "ScanIndexForward": False,
+        "Limit": limit,
+        "ReturnConsumedCapacity": "TOTAL",
+    }
+    if fields:
+        projected = {f"#p{i}": field for i, field in enumerate(fields)}
+        names.update(projected)
+        request["ProjectionExpression"] = ", ".join(projected)
+    request["ExpressionAttributeNames"] = names
+    if cursor:
+        request["ExclusiveStartKey"] = decode_cursor(cursor, key_name, key_value)
+
+    result = dynamodb.query(**request)
+    units = result.get("ConsumedCapacity", {}).get("CapacityUnits", 0.0)
+    return result.get("Items", []), encode_cursor(result.get("LastEvaluatedKey")), units
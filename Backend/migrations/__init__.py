@@ -0,0 +1,6 @@
+"""
+One-off data migrations, run from the Backend directory against the
+deployed tables with the caller's AWS credentials, e.g.::
+
+    python -m migrations.session_results --dry-run
+"""
@@ -0,0 +1,159 @@
+"""
+Backfill of existing sessions into the results storage layout of
+common/session_results.py:
+
+- extracted_info and partial_extracted_info held as JSON strings become
+  native maps;
+- a transcript held on the item (transcription_output) moves to the
+  session's compressed results object, referenced by results_key.
+
+Items already in the new layout are skipped, so the migration can simply
+be run again after an interruption. Every rewrite is conditional on the
+item's updated_at and revision being the ones scanned, so a session a
+handler writes to meanwhile is left alone (and picked up by the next run);
+the rewrite bumps both so clients holding the old representation refetch
+it.
+
+    python -m migrations.session_results --table cce_sessions --bucket cloudnine-cce --segments 4 --dry-run
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common.aws_clients import lazy_client
+from common.session_results import put_results, results_key, to_attribute
+
+MAP_ATTRIBUTES = ("extracted_info", "partial_extracted_info")
+TRANSCRIPT_ATTRIBUTE = "transcription_output"
+
+
+def error_code(error):
+    return getattr(error, "response", {}).get("Error", {}).get("Code")
+
+
+def attribute_bytes(item):
+    """Approximate DynamoDB size of an item: names plus serialized values"""
+    return sum(len(name) + len(json.dumps(value)) for name, value in item.items())
+
+
+def migrate_item(dynamodb, s3, table, bucket, item, dry_run=False):
+    """
+    Rewrite one session in the new layout. Returns (bytes before, bytes
+    after) of the item, or None if it needed no change or changed meanwhile.
+    """
+    session_id = item["session_id"]["S"]
+    sets, removes = {}, []
+    for name in MAP_ATTRIBUTES:
+        if "S" in item.get(name, {}):
+            try:
+                sets[name] = to_attribute(json.loads(item[name]["S"]))
+            except json.JSONDecodeError:
+                # Not JSON: kept as it is, get_session returns it as a string
+                continue
+
+    transcript = item.get(TRANSCRIPT_ATTRIBUTE, {}).get("S")
+    if transcript is not None:
+        removes.append(TRANSCRIPT_ATTRIBUTE)
+        if "results_key" not in item:
+            job_name = item.get("transcription_job_name", {}).get("S", session_id)
+            sets["results_key"] = {"S": results_key(session_id, job_name)}
+
+    if not sets and not removes:
+        return None
+
+    after = {k: v for k, v in {**item, **sets}.items() if k not in removes}
+    after["updated_at"] = {"N": str(int(time.time()))}
+    if dry_run:
+        return attribute_bytes(item), attribute_bytes(after)
+
+    if "results_key" in sets:
+        put_results(s3, bucket, sets["results_key"]["S"], transcript=transcript, model_output=[])
+
+    names = {f"#s{i}": name for i, name in enumerate(sets)}
+    names.update({f"#r{i}": name for i, name in enumerate(removes)})
+    values = {f":s{i}": value for i, value in enumerate(sets.values())}
+    values[":updated_at"] = after["updated_at"]
+    values[":one"] = {"N": "1"}
+    expression = "SET " + ", ".join([f"#s{i} = :s{i}" for i in range(len(sets))] + ["updated_at = :updated_at"])
+    if removes:
+        expression += " REMOVE " + ", ".join(f"#r{i}" for i in range(len(removes)))
+    expression += " ADD revision :one"
+    conditions = []
+    for attribute in ("updated_at", "revision"):
+        if attribute in item:
+            conditions.append(f"{attribute} = :scanned_{attribute}")
+            values[f":scanned_{attribute}"] = item[attribute]
+        else:
+            conditions.append(f"attribute_not_exists({attribute})")
+    condition = " AND ".join(conditions)
+
+    try:
+        dynamodb.update_item(
+            TableName=table,
+            Key={"session_id": {"S": session_id}},
+            UpdateExpression=expression,
+            ConditionExpression=condition,
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values
+        )
+    except Exception as e:
+        if error_code(e) != "ConditionalCheckFailedException":
+            raise
+        return None
+    return attribute_bytes(item), attribute_bytes(after)
+
+
+def migrate_segment(dynamodb, s3, table, bucket, segment, segments, dry_run=False, page_size=100):
+    """Migrate one scan segment; returns its counters"""
+    counters = {"scanned": 0, "migrated": 0, "bytes_before": 0, "bytes_after": 0, "read_units": 0.0}
+    start = None
+    while True:
+        page = dynamodb.scan(
+            TableName=table,
+            Segment=segment,
+            TotalSegments=segments,
+            Limit=page_size,
+            ReturnConsumedCapacity="TOTAL",
+            **({"ExclusiveStartKey": start} if start else {})
+        )
+        counters["read_units"] += page.get("ConsumedCapacity", {}).get("CapacityUnits", 0)
+        for item in page.get("Items", []):
+            counters["scanned"] += 1
+            sizes = migrate_item(dynamodb, s3, table, bucket, item, dry_run)
+            if sizes:
+                counters["migrated"] += 1
+                counters["bytes_before"] += sizes[0]
+                counters["bytes_after"] += sizes[1]
+        start = page.get("LastEvaluatedKey")
+        if not start:
+            return counters
+
+
+def migrate(dynamodb, s3, table, bucket, segments=1, dry_run=False, page_size=100):
+    """Run every segment in parallel; returns the summed counters"""
+    with ThreadPoolExecutor(max_workers=segments) as executor:
+        results = list(executor.map(
+            lambda segment: migrate_segment(dynamodb, s3, table, bucket, segment, segments, dry_run, page_size),
+            range(segments)
+        ))
+    return {name: sum(r[name] for r in results) for name in results[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--table", default=os.environ.get("SESSION_TABLE", "cce_sessions"))
+    parser.add_argument("--bucket", default=os.environ.get("BUCKET_NAME", "cloudnine-cce"))
+    parser.add_argument("--segments", type=int, default=4, help="Parallel scan segments")
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--dry-run", action="store_true", help="Report what would change without writing")
+    args = parser.parse_args()
+
+    counters = migrate(lazy_client("dynamodb"), lazy_client("s3"), args.table, args.bucket,
+                       args.segments, args.dry_run, args.page_size)
+    print(json.dumps({"dry_run": args.dry_run, **counters}, indent=1))
+
+
+if __name__ == "__main__":
+    main()
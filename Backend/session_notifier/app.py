@@ -0,0 +1,29 @@
+import os
+from common.aws_clients import lazy_client
+from common.telemetry import metric, trace
+from common.session_changes import markers_from_stream, write_markers
+
+REGION = os.environ.get("REGION", "ap-south-1")
+# Table keyed by session_id, with TTL on expires_at
+CHANGES_TABLE = os.environ.get("SESSION_CHANGES_TABLE", "cce_session_changes")
+
+# Created on first use and reused across warm invocations
+dynamodb = lazy_client("dynamodb")
+
+
+def lambda_handler(event, context):
+    """
+    Triggered by the session table's DynamoDB stream (NEW_IMAGE view);
+    mirrors each changed session's status and updated_at into its change
+    marker, which long-polling get_session requests watch
+    """
+    with trace("session_notifier"):
+        records = event.get("Records", [])
+        markers = markers_from_stream(records)
+
+        # Errors propagate so that Lambda retries the stream batch
+        written = write_markers(dynamodb, CHANGES_TABLE, markers)
+
+        metric("stream_records", len(records))
+        metric("markers_written", written)
+    return {"records": len(records), "markers_written": written}
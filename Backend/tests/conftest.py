@@ -0,0 +1,3 @@
+from .fakes import configure_local_env
+
+configure_local_env()
@@ -0,0 +1,763 @@
+"""
+In-process stand-ins for the AWS services used by the Lambda handlers.
+
+They implement only the calls (and the response shapes) the handlers rely on,
+with optional per-call latency so that tests and benchmarks can exercise the
+handlers without an AWS account.
+"""
+import base64
+import bisect
+import io
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import zlib
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HANDLER_DIRS = (
+    "audio_normalizer",
+    "audio_upload",
+    "get_session",
+    "session_notifier",
+    "transcribe_audio",
+    "transcription_processing",
+)
+
+
+def configure_local_env():
+    """
+    Make the handler packages importable the way they are laid out inside
+    their Lambda images and provide the environment they read at import time.
+    """
+    os.environ.setdefault("REGION", "ap-south-1")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "ap-south-1")
+    os.environ.setdefault("BUCKET_NAME", "cloudnine-cce-test")
+    os.environ.setdefault("SESSION_TABLE", "cce_sessions_test")
+    # The stubs have no quota; keep the Bedrock limiter out of the way
+    os.environ.setdefault("BEDROCK_RATE_PER_SECOND", "10000")
+    os.environ.setdefault("BEDROCK_BURST", "10000")
+
+    for path in [BACKEND_DIR] + [os.path.join(BACKEND_DIR, d) for d in HANDLER_DIRS]:
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+
+class FakeClientError(Exception):
+    """Mimics botocore's ClientError closely enough for the handlers"""
+
+    def __init__(self, code, message=""):
+        super().__init__(f"An error occurred ({code}): {message}")
+        self.response = {"Error": {"Code": code, "Message": message}}
+
+
+class _Exceptions:
+    NoSuchKey = type("NoSuchKey", (FakeClientError,), {})
+    ConditionalCheckFailedException = type("ConditionalCheckFailedException", (FakeClientError,), {})
+    ThrottlingException = type("ThrottlingException", (FakeClientError,), {})
+    ConflictException = type("ConflictException", (FakeClientError,), {})
+    NoSuchUpload = type("NoSuchUpload", (FakeClientError,), {})
+
+
+class _FakeService:
+    """Shared latency and call accounting for all fakes"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = {}
+        self.exceptions = _Exceptions
+        self._lock = threading.Lock()
+        self.error_rate, self.error_operations, self.injected_errors = 0.0, None, 0
+        self._random = random.Random(0)
+
+    def inject_errors(self, rate, seed=0, operations=None):
+        """
+        Fail about ``rate`` of the calls (of ``operations``, default all)
+        from now on with a ThrottlingException, before they take effect
+        """
+        self.error_rate, self.error_operations = rate, operations
+        self._random = random.Random(seed)
+
+    def _record(self, operation):
+        with self._lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+            fail = (self.error_rate and (self.error_operations is None or operation in self.error_operations)
+                    and self._random.random() < self.error_rate)
+            if fail:
+                self.injected_errors += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            raise self.exceptions.ThrottlingException("ThrottlingException", f"Injected failure of {operation}")
+
+    @property
+    def total_calls(self):
+        return sum(self.calls.values())
+
+
+class FakeS3(_FakeService):
+    def __init__(self, latency=0.0):
+        super().__init__(latency)
+        self.objects = {}
+        # upload id -> {"Bucket", "Key", "Parts": {number: bytes}}
+        self.uploads = {}
+
+    def put_object(self, Bucket, Key, Body=b"", **kwargs):
+        self._record("put_object")
+        if isinstance(Body, str):
+            Body = Body.encode("utf-8")
+        elif hasattr(Body, "read"):
+            Body = Body.read()
+        self.objects[(Bucket, Key)] = {"Body": Body, **kwargs}
+        return {"ETag": f'"{hash(Body) & 0xffffffff:08x}"'}
+
+    def get_object(self, Bucket, Key, **kwargs):
+        self._record("get_object")
+        if (Bucket, Key) not in self.objects:
+            raise self.exceptions.NoSuchKey("NoSuchKey", Key)
+        obj = self.objects[(Bucket, Key)]
+        return {
+            "Body": io.BytesIO(obj["Body"]),
+            "ContentLength": len(obj["Body"]),
+            "ContentType": obj.get("ContentType"),
+        }
+
+    def head_object(self, Bucket, Key, **kwargs):
+        self._record("head_object")
+        if (Bucket, Key) not in self.objects:
+            raise self.exceptions.NoSuchKey("404", Key)
+        return {"ContentLength": len(self.objects[(Bucket, Key)]["Body"])}
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        self._record("create_multipart_upload")
+        with self._lock:
+            upload_id = f"upload-{len(self.uploads) + 1}"
+            self.uploads[upload_id] = {"Bucket": Bucket, "Key": Key, "Parts": {}, **kwargs}
+        return {"Bucket": Bucket, "Key": Key, "UploadId": upload_id}
+
+    def _upload(self, Bucket, Key, UploadId):
+        upload = self.uploads.get(UploadId)
+        if not upload or (upload["Bucket"], upload["Key"]) != (Bucket, Key):
+            raise self.exceptions.NoSuchUpload("NoSuchUpload", UploadId)
+        return upload
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body=b"", **kwargs):
+        """What the client's PUT to a presigned upload_part URL does"""
+        self._record("upload_part")
+        with self._lock:
+            self._upload(Bucket, Key, UploadId)["Parts"][PartNumber] = Body
+        return {"ETag": f'"{hash(Body) & 0xffffffff:08x}"'}
+
+    def list_parts(self, Bucket, Key, UploadId, PartNumberMarker=0, MaxParts=1000, **kwargs):
+        self._record("list_parts")
+        with self._lock:
+            parts = self._upload(Bucket, Key, UploadId)["Parts"]
+            numbers = sorted(n for n in parts if n > PartNumberMarker)
+        page = numbers[:MaxParts]
+        result = {
+            "Parts": [
+                {"PartNumber": n, "ETag": f'"{hash(parts[n]) & 0xffffffff:08x}"', "Size": len(parts[n])}
+                for n in page
+            ],
+            "IsTruncated": len(numbers) > MaxParts,
+        }
+        if result["IsTruncated"]:
+            result["NextPartNumberMarker"] = page[-1]
+        return result
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload, **kwargs):
+        self._record("complete_multipart_upload")
+        with self._lock:
+            upload = self._upload(Bucket, Key, UploadId)
+            numbers = [p["PartNumber"] for p in MultipartUpload["Parts"]]
+            if numbers != sorted(numbers) or any(n not in upload["Parts"] for n in numbers):
+                raise FakeClientError("InvalidPart", "One or more parts could not be found")
+            body = b"".join(upload["Parts"][n] for n in numbers)
+            del self.uploads[UploadId]
+            self.objects[(Bucket, Key)] = {"Body": body, "ContentType": upload.get("ContentType")}
+        return {"Bucket": Bucket, "Key": Key}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **kwargs):
+        self._record("abort_multipart_upload")
+        with self._lock:
+            self._upload(Bucket, Key, UploadId)
+            del self.uploads[UploadId]
+        return {}
+
+    def generate_presigned_url(self, ClientMethod, Params=None, ExpiresIn=3600, HttpMethod=None):
+        params = Params or {}
+        return f"https://{params.get('Bucket')}.s3.local/{params.get('Key')}?method={ClientMethod}"
+
+
+class FakeDynamoDB(_FakeService):
+    """
+    Low-level (client API) DynamoDB stand-in with one hash key per table.
+
+    Supports the plain ``SET a = :v, #b = :w`` update expressions the
+    handlers issue. ``items`` is the session table.
+    """
+
+    def __init__(self, latency=0.0, key_names=None, indexes=None):
+        super().__init__(latency)
+        self.key_names = {os.environ["SESSION_TABLE"]: "session_id", **(key_names or {})}
+        self.tables = {}
+        # table -> {index name: (hash attribute, range attribute,
+        # projected non-key attributes or None for ALL)}
+        self.indexes = indexes or {}
+        # (table, index) -> {hash value: sorted [(range value, item key)]}
+        self._index_entries = {}
+        # Keys served per BatchGetItem call; the rest come back unprocessed
+        self.batch_get_limit = None
+        # Read capacity units the reads would have consumed
+        self.read_units = 0.0
+        # table name -> callbacks receiving DynamoDB stream records
+        self.streams = {}
+
+    @property
+    def items(self):
+        return self.table(os.environ["SESSION_TABLE"])
+
+    def table(self, name):
+        return self.tables.setdefault(name, {})
+
+    def _key(self, TableName, Key):
+        return Key[self.key_names.get(TableName, "session_id")]["S"]
+
+    def put_item(self, TableName, Item, ConditionExpression=None,
+                 ExpressionAttributeValues=None, ExpressionAttributeNames=None, **kwargs):
+        self._record("put_item")
+        key_name = self.key_names.get(TableName, "session_id")
+        with self._lock:
+            existing = self.table(TableName).get(Item[key_name]["S"])
+            self._check(ConditionExpression, existing, ExpressionAttributeNames, ExpressionAttributeValues)
+            self.table(TableName)[Item[key_name]["S"]] = dict(Item)
+            self._reindex(TableName, Item[key_name]["S"], existing, Item)
+        self._publish(TableName, "MODIFY" if existing else "INSERT", key_name, Item)
+        return {}
+
+    def subscribe(self, table_name, callback):
+        """Deliver a NEW_IMAGE stream record to ``callback`` after every write to ``table_name``"""
+        self.streams.setdefault(table_name, []).append(callback)
+
+    def _publish(self, table_name, event_name, key_name, item):
+        # Called outside the lock: subscribers may write to the fake
+        record = {
+            "eventName": event_name,
+            "dynamodb": {"Keys": {key_name: item[key_name]}, "NewImage": dict(item)},
+        }
+        for callback in self.streams.get(table_name, []):
+            callback(record)
+
+    def _check(self, condition, item, names, values):
+        if condition and not evaluate_condition(condition, item or {}, names or {}, values or {}):
+            raise self.exceptions.ConditionalCheckFailedException(
+                "ConditionalCheckFailedException", "The conditional request failed"
+            )
+
+    def _charge_read(self, item, consistent=False):
+        """
+        DynamoDB bills reads by the size of the whole item, projected or
+        not: one unit per 4 KB, half for eventually consistent reads
+        """
+        units = max(1, -(-_item_size(item or {}) // 4096)) * (1.0 if consistent else 0.5)
+        with self._lock:
+            self.read_units += units
+        return units
+
+    def get_item(self, TableName, Key, ProjectionExpression=None, ExpressionAttributeNames=None,
+                 ConsistentRead=False, **kwargs):
+        self._record("get_item")
+        item = self.table(TableName).get(self._key(TableName, Key))
+        result = {}
+        units = self._charge_read(item, ConsistentRead)
+        if kwargs.get("ReturnConsumedCapacity", "NONE") != "NONE":
+            result["ConsumedCapacity"] = {"TableName": TableName, "CapacityUnits": units}
+        if item is not None:
+            result["Item"] = _project(item, ProjectionExpression, ExpressionAttributeNames)
+        return result
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        self._record("batch_get_item")
+        responses, unprocessed = {}, {}
+        budget = self.batch_get_limit
+        for table_name, request in RequestItems.items():
+            keys = request["Keys"]
+            if budget is not None:
+                keys, rest = keys[:budget], keys[budget:]
+                budget -= len(keys)
+                if rest:
+                    unprocessed[table_name] = {**request, "Keys": rest}
+            responses[table_name] = []
+            for key in keys:
+                item = self.table(table_name).get(self._key(table_name, key))
+                self._charge_read(item, request.get("ConsistentRead", False))
+                if item is not None:
+                    responses[table_name].append(_project(
+                        item, request.get("ProjectionExpression"), request.get("ExpressionAttributeNames")
+                    ))
+        return {"Responses": responses, "UnprocessedKeys": unprocessed}
+
+    def scan(self, TableName, ExclusiveStartKey=None, Limit=None, Segment=0, TotalSegments=1,
+             ProjectionExpression=None, ExpressionAttributeNames=None, **kwargs):
+        """Pages of the table in key order; a segment holds the keys hashing to it"""
+        self._record("scan")
+        key_name = self.key_names.get(TableName, "session_id")
+        with self._lock:
+            keys = sorted(k for k in self.table(TableName) if zlib.crc32(k.encode()) % TotalSegments == Segment)
+            if ExclusiveStartKey:
+                keys = [k for k in keys if k > self._key(TableName, ExclusiveStartKey)]
+            page = keys[:Limit] if Limit else keys
+            items = [self.table(TableName)[k] for k in page]
+        units = max(1, -(-sum(_item_size(item) for item in items) // 4096)) * 0.5
+        with self._lock:
+            self.read_units += units
+        result = {"Items": [_project(item, ProjectionExpression, ExpressionAttributeNames) for item in items],
+                  "Count": len(items)}
+        if Limit and len(keys) > Limit:
+            result["LastEvaluatedKey"] = {key_name: {"S": page[-1]}}
+        if kwargs.get("ReturnConsumedCapacity", "NONE") != "NONE":
+            result["ConsumedCapacity"] = {"TableName": TableName, "CapacityUnits": units}
+        return result
+
+    def batch_write_item(self, RequestItems, **kwargs):
+        self._record("batch_write_item")
+        with self._lock:
+            for table_name, requests in RequestItems.items():
+                key_name = self.key_names.get(table_name, "session_id")
+                for request in requests:
+                    if "PutRequest" in request:
+                        item = request["PutRequest"]["Item"]
+                        key = item[key_name]["S"]
+                        self._reindex(table_name, key, self.table(table_name).get(key), item)
+                        self.table(table_name)[key] = dict(item)
+                    else:
+                        key = self._key(table_name, request["DeleteRequest"]["Key"])
+                        self._reindex(table_name, key, self.table(table_name).pop(key, None), None)
+        return {"UnprocessedItems": {}}
+
+    def load(self, table_name, items):
+        """Bulk-insert raw items (benchmarks), keeping indexes up to date"""
+        key_name = self.key_names.get(table_name, "session_id")
+        table = self.table(table_name)
+        with self._lock:
+            for item in items:
+                key = item[key_name]["S"]
+                self._reindex(table_name, key, table.get(key), item)
+                table[key] = item
+
+    def _reindex(self, table_name, key, old, new):
+        """Move ``key`` between index entries; call with the lock held"""
+        for index_name, (hash_name, range_name, _) in self.indexes.get(table_name, {}).items():
+            partitions = self._index_entries.setdefault((table_name, index_name), {})
+            for item, add in ((old, False), (new, True)):
+                if not item or hash_name not in item or range_name not in item:
+                    continue
+                entries = partitions.setdefault(_typed(item[hash_name]), [])
+                entry = (_typed(item[range_name]), key)
+                position = bisect.bisect_left(entries, entry)
+                if add:
+                    entries.insert(position, entry)
+                elif position < len(entries) and entries[position] == entry:
+                    del entries[position]
+
+    def query(self, TableName, IndexName, KeyConditionExpression, ExpressionAttributeValues,
+              ExpressionAttributeNames=None, ScanIndexForward=True, Limit=None, ExclusiveStartKey=None,
+              ProjectionExpression=None, ReturnConsumedCapacity="NONE", **kwargs):
+        """
+        Query a global secondary index. Reads are billed on the summed size
+        of the index items read, rounded up to 4 KB, like DynamoDB's
+        """
+        self._record("query")
+        names = ExpressionAttributeNames or {}
+        values = ExpressionAttributeValues
+        hash_name, range_name, projected = self.indexes[TableName][IndexName]
+        match = KEY_CONDITION.match(KeyConditionExpression.strip())
+        if not match or names.get(match.group(1), match.group(1)) != hash_name:
+            raise NotImplementedError(f"FakeDynamoDB cannot evaluate key condition {KeyConditionExpression!r}")
+        _, hash_operand, _, between_low, between_high, operator, operand = match.groups()
+
+        low, high = float("-inf"), float("inf")
+        if between_low:
+            low, high = _typed(values[between_low]), _typed(values[between_high])
+        elif operator in (">", ">=", "="):
+            low = _typed(values[operand])
+        if operator in ("<", "<=", "="):
+            high = _typed(values[operand])
+
+        with self._lock:
+            entries = self._index_entries.get((TableName, IndexName), {}).get(_typed(values[hash_operand]), [])
+            entries = [e for e in entries[bisect.bisect_left(entries, (low,)):] if e[0] <= high]
+            entries = [e for e in entries if (operator != "<" or e[0] < high) and (operator != ">" or e[0] > low)]
+            if not ScanIndexForward:
+                entries.reverse()
+            if ExclusiveStartKey:
+                start = (_typed(ExclusiveStartKey[range_name]), self._key(TableName, ExclusiveStartKey))
+                entries = [e for e in entries if (e > start if ScanIndexForward else e < start)]
+
+            page = entries[:Limit] if Limit else entries
+            table = self.table(TableName)
+            key_name = self.key_names.get(TableName, "session_id")
+            items, size = [], 0
+            for _, key in page:
+                item = table[key]
+                if projected is not None:
+                    item = {a: v for a, v in item.items() if a in projected or a in (key_name, hash_name, range_name)}
+                size += _item_size(item) + 100
+                items.append(_project(item, ProjectionExpression, names))
+
+        units = max(1, -(-size // 4096)) * 0.5
+        with self._lock:
+            self.read_units += units
+        result = {"Items": items, "Count": len(items)}
+        if Limit and len(entries) > Limit:
+            last = table[page[-1][1]]
+            result["LastEvaluatedKey"] = {a: last[a] for a in (key_name, hash_name, range_name)}
+        if ReturnConsumedCapacity != "NONE":
+            result["ConsumedCapacity"] = {"TableName": TableName, "CapacityUnits": units}
+        return result
+
+    def update_item(self, TableName, Key, UpdateExpression, ConditionExpression=None,
+                    ExpressionAttributeValues=None, ExpressionAttributeNames=None, **kwargs):
+        self._record("update_item")
+        names = ExpressionAttributeNames or {}
+        values = ExpressionAttributeValues or {}
+        key_name = self.key_names.get(TableName, "session_id")
+        key = self._key(TableName, Key)
+
+        with self._lock:
+            existing = self.table(TableName).get(key)
+            self._check(ConditionExpression, existing, names, values)
+            before = dict(existing) if existing else None
+            item = self.table(TableName).setdefault(key, {key_name: {"S": key}})
+            for action, clauses in _parse_update_expression(UpdateExpression):
+                for clause in clauses:
+                    if action == "SET":
+                        attr, operand = (part.strip() for part in clause.split("=", 1))
+                        item[names.get(attr, attr)] = values[operand]
+                    elif action == "REMOVE":
+                        item.pop(names.get(clause, clause), None)
+                    elif action == "ADD":
+                        attr, operand = clause.split()
+                        attr, value = names.get(attr, attr), values[operand]
+                        if "N" in value:
+                            current = float(item.get(attr, {"N": "0"})["N"]) + float(value["N"])
+                            item[attr] = {"N": str(int(current) if current.is_integer() else current)}
+                        else:
+                            kind = next(iter(value))
+                            item[attr] = {kind: sorted(set(item.get(attr, {kind: []})[kind]) | set(value[kind]))}
+                    else:
+                        raise NotImplementedError(f"FakeDynamoDB does not support {action}")
+            self._reindex(TableName, key, before, item)
+            item = dict(item)
+        self._publish(TableName, "MODIFY" if existing else "INSERT", key_name, item)
+        if kwargs.get("ReturnValues") == "ALL_OLD":
+            return {"Attributes": before} if before else {}
+        return {"Attributes": item}
+
+
+KEY_CONDITION = re.compile(
+    r"^([#\w]+)\s*=\s*(:\w+)"
+    r"(?:\s+AND\s+([#\w]+)\s+(?:BETWEEN\s+(:\w+)\s+AND\s+(:\w+)|(<=|>=|<|>|=)\s*(:\w+)))?$",
+    re.IGNORECASE
+)
+
+
+def _item_size(item):
+    return sum(len(name) + len(json.dumps(value)) for name, value in item.items())
+
+
+class FakeTable:
+    """
+    boto3 resource ``Table`` over a FakeDynamoDB table, converting between
+    plain Python values and DynamoDB attribute values like the resource does
+    """
+
+    def __init__(self, dynamodb, table_name):
+        from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+        self.dynamodb = dynamodb
+        self.table_name = table_name
+        self._serialize = TypeSerializer().serialize
+        self._deserialize = TypeDeserializer().deserialize
+
+    def _typed(self, values):
+        return {k: self._serialize(v) for k, v in (values or {}).items()}
+
+    def put_item(self, Item, **kwargs):
+        return self.dynamodb.put_item(TableName=self.table_name, Item=self._typed(Item), **kwargs)
+
+    def get_item(self, Key, **kwargs):
+        result = self.dynamodb.get_item(TableName=self.table_name, Key=self._typed(Key), **kwargs)
+        if "Item" in result:
+            result["Item"] = {k: self._deserialize(v) for k, v in result["Item"].items()}
+        return result
+
+    def update_item(self, Key, ExpressionAttributeValues=None, **kwargs):
+        return self.dynamodb.update_item(
+            TableName=self.table_name,
+            Key=self._typed(Key),
+            ExpressionAttributeValues=self._typed(ExpressionAttributeValues),
+            **kwargs
+        )
+
+
+def _project(item, expression, names):
+    """Apply a ProjectionExpression of attributes and map paths (a.b)"""
+    if not expression:
+        return dict(item)
+    projected = {}
+    for path in expression.split(","):
+        parts = [(names or {}).get(p.strip(), p.strip()) for p in path.split(".")]
+        value = item.get(parts[0])
+        for part in parts[1:]:
+            value = value.get("M", {}).get(part) if value else None
+        if value is None:
+            continue
+        target = projected
+        for part in parts[:-1]:
+            target = target.setdefault(part, {"M": {}})["M"]
+        target[parts[-1]] = value
+    return projected
+
+
+CONDITION_TERM = re.compile(
+    r"^(?:(attribute_not_exists|attribute_exists)\(\s*([#\w.]+)\s*\)"
+    r"|([#\w.]+)\s*(=|<>|<=|>=|<|>)\s*(:\w+))$"
+)
+
+
+def _typed(value):
+    if value is None:
+        return None
+    if "N" in value:
+        return float(value["N"])
+    return next(iter(value.values()))
+
+
+def evaluate_condition(expression, item, names, values):
+    """
+    Evaluate a condition expression made of attribute_exists /
+    attribute_not_exists / comparison terms joined by AND and OR
+    (no parentheses; AND binds tighter)
+    """
+    for alternative in re.split(r"\s+OR\s+", expression.strip(), flags=re.IGNORECASE):
+        if all(_evaluate_term(term.strip(), item, names, values)
+               for term in re.split(r"\s+AND\s+", alternative, flags=re.IGNORECASE)):
+            return True
+    return False
+
+
+def _evaluate_term(term, item, names, values):
+    match = CONDITION_TERM.match(term)
+    if not match:
+        raise NotImplementedError(f"FakeDynamoDB cannot evaluate condition {term!r}")
+    function, function_attr, attr, operator, operand = match.groups()
+    if function:
+        exists = names.get(function_attr, function_attr) in item
+        return exists if function == "attribute_exists" else not exists
+
+    current = _typed(item.get(names.get(attr, attr)))
+    expected = _typed(values[operand])
+    if current is None:
+        return operator == "<>"
+    return {
+        "=": current == expected,
+        "<>": current != expected,
+        "<": current < expected,
+        "<=": current <= expected,
+        ">": current > expected,
+        ">=": current >= expected,
+    }[operator]
+
+
+UPDATE_ACTION = re.compile(r"\b(SET|REMOVE|ADD|DELETE)\s", re.IGNORECASE)
+
+
+def _parse_update_expression(expression):
+    """Split ``SET a = :a, b = :b REMOVE c`` into [("SET", ["a = :a", "b = :b"]), ("REMOVE", ["c"])]"""
+    actions = []
+    matches = list(UPDATE_ACTION.finditer(expression))
+    for match, following in zip(matches, matches[1:] + [None]):
+        body = expression[match.end():following.start() if following else len(expression)]
+        actions.append((match.group(1).upper(), [clause.strip() for clause in body.split(",") if clause.strip()]))
+    return actions
+
+
+def empty_extraction():
+    """A complete answer in the prompt's output format, every field null"""
+    from bedrock_prompt import OUTPUT_FORMAT
+    return {section: dict.fromkeys(fields) for section, fields in OUTPUT_FORMAT.items()}
+
+
+class FakeBedrockRuntime(_FakeService):
+    """
+    Returns a canned Claude Messages API response.
+
+    ``responder`` is called with the decoded request payload and returns the
+    text the model should "generate"; by default an empty extraction.
+    """
+
+    def __init__(self, latency=0.0, responder=None, stream_chunk_latency=0.0):
+        super().__init__(latency)
+        self.stream_chunk_latency = stream_chunk_latency
+        self.responder = responder or (lambda payload: json.dumps(empty_extraction()))
+        self.requests = []
+
+    def invoke_model(self, modelId, body, **kwargs):
+        self._record("invoke_model")
+        payload = json.loads(body)
+        with self._lock:
+            self.requests.append(payload)
+        text = self.responder(payload)
+        response_body = {
+            "content": [{"type": "text", "text": text}],
+            "usage": {
+                "input_tokens": len(body) // 4,
+                "output_tokens": len(text) // 4,
+            },
+        }
+        return {"body": io.BytesIO(json.dumps(response_body).encode("utf-8"))}
+
+    def invoke_model_with_response_stream(self, modelId, body, chunk_chars=16, chunk_latency=0.0, **kwargs):
+        """
+        Stream the responder's text as Messages API events, ``chunk_chars``
+        characters per content delta, optionally ``chunk_latency`` apart
+        """
+        self._record("invoke_model_with_response_stream")
+        payload = json.loads(body)
+        with self._lock:
+            self.requests.append(payload)
+        text = self.responder(payload)
+        chunk_latency = chunk_latency or self.stream_chunk_latency
+
+        def events():
+            yield _stream_event({"type": "message_start", "message": {"usage": {"input_tokens": len(body) // 4}}})
+            for start in range(0, len(text), chunk_chars):
+                if chunk_latency:
+                    time.sleep(chunk_latency)
+                yield _stream_event({
+                    "type": "content_block_delta", "index": 0,
+                    "delta": {"type": "text_delta", "text": text[start:start + chunk_chars]},
+                })
+            yield _stream_event({"type": "message_delta", "usage": {"output_tokens": len(text) // 4}})
+            yield _stream_event({"type": "message_stop"})
+
+        return {"body": events()}
+
+
+class ThrottlingBedrockRuntime(FakeBedrockRuntime):
+    """
+    Bedrock stub enforcing a requests-per-second quota like the account
+    limit: calls beyond it raise ThrottlingException
+    """
+
+    def __init__(self, quota_per_second, burst=None, **kwargs):
+        super().__init__(**kwargs)
+        self.quota_per_second = quota_per_second
+        self.burst = burst or quota_per_second
+        self._tokens = self.burst
+        self._refilled_at = time.monotonic()
+        self.throttled = 0
+
+    def _admit(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.quota_per_second)
+            self._refilled_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            self.throttled += 1
+        raise self.exceptions.ThrottlingException("ThrottlingException", "Too many requests")
+
+    def invoke_model(self, modelId, body, **kwargs):
+        self._admit()
+        return super().invoke_model(modelId, body, **kwargs)
+
+
+class FakeTranscribe(_FakeService):
+    """Records started jobs; a reused job name is a ConflictException"""
+
+    def __init__(self, latency=0.0):
+        super().__init__(latency)
+        self.jobs = {}
+
+    def start_transcription_job(self, TranscriptionJobName, **params):
+        self._record("start_transcription_job")
+        with self._lock:
+            if TranscriptionJobName in self.jobs:
+                raise self.exceptions.ConflictException("ConflictException", "The requested job name already exists")
+            self.jobs[TranscriptionJobName] = params
+        return {"TranscriptionJob": {"TranscriptionJobName": TranscriptionJobName,
+                                     "TranscriptionJobStatus": "IN_PROGRESS"}}
+
+
+class FakeSageMakerRuntime(_FakeService):
+    """
+    Local stand-in for a speech model endpoint. Accepts a raw WAV body or
+    the base64 JSON body of sarvam-test.py; ``responder(samples,
+    sample_rate, max_new_tokens)`` returns the text, by default a
+    placeholder naming the audio length.
+    """
+
+    def __init__(self, responder=None, latency=0.0):
+        super().__init__(latency)
+        self.responder = responder or (lambda samples, rate, tokens: f"<{len(samples) / rate:.1f}s of audio>")
+        self.requests = []
+
+    def invoke_endpoint(self, EndpointName, Body, ContentType, CustomAttributes="", **kwargs):
+        from common import audio
+
+        self._record("invoke_endpoint")
+        if ContentType == "application/json":
+            payload = json.loads(Body)
+            wav, tokens = base64.b64decode(payload["audio"]), payload.get("max_new_tokens", 256)
+        else:
+            wav = Body
+            tokens = int(dict(p.split("=", 1) for p in CustomAttributes.split(",") if "=" in p)
+                         .get("max_new_tokens", 256))
+        stream = io.BytesIO(wav)
+        fmt = audio.read_wav_header(stream)
+        frames = list(audio.iter_frames(stream, fmt, 1 << 16))
+        samples = audio.downmix(np.concatenate(frames)) if frames else np.zeros(0, dtype=np.float32)
+        with self._lock:
+            self.requests.append({"ContentType": ContentType, "bytes": len(Body), "max_new_tokens": tokens})
+        text = self.responder(samples, fmt.sample_rate, tokens)
+        return {"Body": io.BytesIO(json.dumps([{"generated_text": text}]).encode("utf-8"))}
+
+
+class FakeLambda(_FakeService):
+    """Records asynchronous invocations instead of running them"""
+
+    def __init__(self, latency=0.0):
+        super().__init__(latency)
+        self.invocations = []
+
+    def invoke(self, FunctionName, Payload=b"", InvocationType="RequestResponse", **kwargs):
+        self._record("invoke")
+        if isinstance(Payload, bytes):
+            Payload = Payload.decode("utf-8")
+        with self._lock:
+            self.invocations.append((FunctionName, InvocationType, json.loads(Payload or "{}")))
+        return {"StatusCode": 202 if InvocationType == "Event" else 200}
+
+
+def _stream_event(message):
+    return {"chunk": {"bytes": json.dumps(message).encode("utf-8")}}
+
+
+def transcribe_output(job_name, transcript):
+    """Minimal Transcribe output document for ``transcript``"""
+    return json.dumps({
+        "jobName": job_name,
+        "results": {
+            "transcripts": [{"transcript": transcript}],
+            "items": [],
+        },
+        "status": "COMPLETED",
+    }).encode("utf-8")
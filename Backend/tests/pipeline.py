@@ -0,0 +1,145 @@
+"""
+Synthetic sessions driven through the handlers the way AWS chains them,
+on the in-process fakes:
+
+    audio_upload (API) -> upload -> S3 event -> transcribe_audio
+    -> Transcribe job -> completion event -> transcription_processing
+    -> get_session (API)
+
+Events the platform delivers asynchronously (the S3 notification and the
+job completion) are retried twice on failure, as Lambda retries an
+asynchronous invocation; a 5xx from an API handler is retried the same
+number of times by the client. All handlers share one process, so module
+state (warm clients, the local Bedrock bucket) is shared as it would be by
+a single warm instance of each function.
+"""
+import json
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from .fakes import FakeBedrockRuntime, FakeDynamoDB, FakeS3, FakeTable, FakeTranscribe, transcribe_output
+from audio_upload import app as upload_app
+from get_session import app as get_session_app
+from transcribe_audio import app as transcribe_app
+from transcription_processing import app as processing_app
+
+STAGES = ("audio_upload", "transcribe_audio", "transcription_job", "transcription_processing", "get_session")
+RETRIES = 2
+
+TRANSCRIPT = ("CCE: Hello, this is Cloudnine calling about your appointment. When is your due date? "
+              "Customer: It is in March, this is my first pregnancy. ") * 8
+
+SessionResult = namedtuple("SessionResult", ["index", "session_id", "ok", "error", "seconds", "stages", "attempts"])
+
+
+class StageFailed(Exception):
+    pass
+
+
+class Pipeline:
+    """
+    Fakes for every service the handlers call, with per-service latency;
+    ``transcription_seconds`` is how long each Transcribe job takes to
+    complete. ``install(setattr)`` points the handler modules at the fakes
+    (pass monkeypatch.setattr in tests).
+    """
+
+    def __init__(self, s3_latency=0.0, dynamodb_latency=0.0, transcribe_latency=0.0, bedrock_latency=0.0,
+                 transcription_seconds=0.0, transcript=TRANSCRIPT):
+        self.s3 = FakeS3(s3_latency)
+        self.dynamodb = FakeDynamoDB(dynamodb_latency)
+        self.transcribe = FakeTranscribe(transcribe_latency)
+        self.bedrock = FakeBedrockRuntime(bedrock_latency)
+        self.transcription_seconds = transcription_seconds
+        self.transcript = transcript
+
+    @property
+    def services(self):
+        return {"s3": self.s3, "dynamodb": self.dynamodb, "transcribe": self.transcribe, "bedrock": self.bedrock}
+
+    def install(self, setattr=setattr):
+        setattr(upload_app, "s3", self.s3)
+        setattr(upload_app, "table", FakeTable(self.dynamodb, upload_app.SESSION_TABLE))
+        setattr(transcribe_app, "s3", self.s3)
+        setattr(transcribe_app, "dynamodb", self.dynamodb)
+        setattr(transcribe_app, "transcribe", self.transcribe)
+        setattr(processing_app, "s3", self.s3)
+        setattr(processing_app, "dynamodb", self.dynamodb)
+        setattr(processing_app, "bedrock", self.bedrock)
+        setattr(get_session_app, "dynamodb", self.dynamodb)
+
+    def aws_calls(self):
+        """{"service.operation": count} over all fakes"""
+        return {f"{name}.{operation}": count
+                for name, service in self.services.items() for operation, count in sorted(service.calls.items())}
+
+    def run(self, sessions, concurrency):
+        """SessionResult per session, in session order"""
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            return list(executor.map(self.run_session, range(sessions)))
+
+    def run_session(self, index):
+        stages, attempts, session_id = {}, {}, None
+        started = time.perf_counter()
+
+        def stage(name, invoke):
+            stage_started = time.perf_counter()
+            for attempt in range(1, RETRIES + 2):
+                attempts[name] = attempt
+                try:
+                    result = invoke()
+                    if isinstance(result, dict) and result.get("statusCode", 200) >= 500:
+                        raise StageFailed(f"{name} returned {result['statusCode']}: {result.get('body')}")
+                    stages[name] = time.perf_counter() - stage_started
+                    return result
+                except Exception as e:
+                    if attempt > RETRIES:
+                        raise StageFailed(f"{name} failed after {attempt} attempts: {e}") from e
+
+        try:
+            created = stage("audio_upload", lambda: upload_app.lambda_handler({"body": json.dumps({
+                "patient_id": f"patient-{index % 50}",
+                "cce_id": f"cce-{index % 10}",
+                "filename": "visit.mp3",
+                "language_preferences": ["en-IN"],
+            })}, None))
+            if created["statusCode"] != 200:
+                raise StageFailed(f"audio_upload returned {created['statusCode']}: {created['body']}")
+            body = json.loads(created["body"])
+            session_id, input_key = body["session_id"], body["s3_input_path"]
+
+            # The client's PUT to the presigned URL
+            self.s3.objects[(upload_app.BUCKET_NAME, input_key)] = {"Body": b"ID3" + bytes(4096)}
+
+            s3_event = {"Records": [{"s3": {"bucket": {"name": upload_app.BUCKET_NAME},
+                                            "object": {"key": input_key, "sequencer": f"{index + 1:016X}"}}}]}
+            stage("transcribe_audio", lambda: transcribe_app.lambda_handler(s3_event, None))
+
+            job_names = stage("transcription_job", lambda: self.complete_jobs(session_id))
+
+            for job_name in job_names:
+                detail = {"TranscriptionJobName": job_name, "TranscriptionJobStatus": "COMPLETED"}
+                stage("transcription_processing", lambda: processing_app.lambda_handler({"detail": detail}, None))
+
+            fetched = stage("get_session", lambda: get_session_app.lambda_handler(
+                {"pathParameters": {"session_id": session_id}}, None))
+            status = json.loads(fetched["body"]).get("status") if fetched["statusCode"] == 200 else None
+            if status != "COMPLETED":
+                raise StageFailed(f"Session ended {status or fetched['statusCode']}")
+        except StageFailed as e:
+            return SessionResult(index, session_id, False, str(e), time.perf_counter() - started, stages, attempts)
+        return SessionResult(index, session_id, True, None, time.perf_counter() - started, stages, attempts)
+
+    def complete_jobs(self, session_id):
+        """Let the session's Transcribe jobs finish and write their output"""
+        job_names = [name for name in list(self.transcribe.jobs) if name.split(".")[0] == session_id]
+        if not job_names:
+            raise StageFailed(f"No transcription job was started for {session_id}")
+        if self.transcription_seconds:
+            time.sleep(self.transcription_seconds)
+        for job_name in job_names:
+            params = self.transcribe.jobs[job_name]
+            self.s3.objects[(params["OutputBucketName"], f"{params['OutputKey']}{job_name}.json")] = {
+                "Body": transcribe_output(job_name, self.transcript)}
+        return job_names
@@ -0,0 +1,127 @@
+import io
+import json
+import threading
+import time
+
+import pytest
+
+from ..fakes import FakeDynamoDB, FakeLambda, FakeS3, FakeSageMakerRuntime, FakeTranscribe
+from .test_chunked_transcription import conversation, wav
+from transcribe_audio import app
+from asr_engines import SarvamEngine, choose_engine, generated_text
+
+SESSION = "session-sarvam"
+
+
+class ConcurrencyProbe:
+    """Responder that records the most calls in flight at once"""
+
+    def __init__(self, delay=0.01):
+        self.delay, self.active, self.peak = delay, 0, 0
+        self.lock = threading.Lock()
+
+    def __call__(self, samples, rate, tokens):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+        return f"{len(samples) / rate:.1f}"
+
+
+@pytest.fixture()
+def stubs(monkeypatch):
+    s3, dynamodb, transcribe, lambda_client = FakeS3(), FakeDynamoDB(), FakeTranscribe(), FakeLambda()
+    probe = ConcurrencyProbe()
+    sagemaker = FakeSageMakerRuntime(responder=probe)
+    for name, stub in (("s3", s3), ("dynamodb", dynamodb), ("transcribe", transcribe),
+                       ("sagemaker", sagemaker), ("lambda_client", lambda_client)):
+        monkeypatch.setattr(app, name, stub)
+    monkeypatch.setattr(app, "ASR_ENGINE_BY_LANGUAGE", {"hi-IN": "sarvam"})
+    monkeypatch.setattr(app, "SARVAM_MAX_CONCURRENCY", 3)
+    dynamodb.items[SESSION] = {"session_id": {"S": SESSION}, "language_preferences": {"L": [{"S": "hi-IN"}]}}
+    return s3, dynamodb, transcribe, sagemaker, lambda_client, probe
+
+
+def upload(s3, key, body):
+    s3.put_object(Bucket=app.BUCKET_NAME, Key=key, Body=body)
+    event = {"Records": [{"eventSource": "audio_normalizer",
+                          "s3": {"bucket": {"name": app.BUCKET_NAME}, "object": {"key": key}}}]}
+    [result] = json.loads(app.lambda_handler(event, None)["body"])["records"]
+    return result
+
+
+@pytest.mark.parametrize("session, languages, expected", [
+    ({}, ["hi-IN"], "sarvam"),
+    ({}, ["hi-IN", "en-IN"], "transcribe"),  # the languages disagree
+    ({"asr_engine": {"S": "transcribe"}}, ["hi-IN"], "transcribe"),
+    ({"asr_engine": {"S": "whisper"}}, ["en-IN"], "transcribe"),
+])
+def test_engine_choice(session, languages, expected):
+    assert choose_engine(session, languages, app.ASR_ENGINE_NAMES, {"hi-IN": "sarvam"}, "transcribe") == expected
+
+
+def test_response_shapes():
+    assert generated_text([{"generated_text": " namaste "}]) == "namaste"
+    assert generated_text({"transcript": "haan"}) == "haan"
+
+
+def test_sarvam_sends_the_endpoint_json_contract_by_default():
+    sent = []
+
+    class Runtime:
+        def invoke_endpoint(self, **kwargs):
+            sent.append(kwargs)
+            return {"Body": io.BytesIO(b'{"generated_text": "haan"}')}
+
+    engine = SarvamEngine(Runtime(), None, "sarvam-endpoint")
+    assert engine.invoke(b"RIFF", (0.0, 20.0)) == ("haan", len(sent[0]["Body"]))
+
+    # What sarvam-test.py sends: base64 audio and the token budget in JSON
+    [request] = sent
+    assert request["ContentType"] == "application/json" and "CustomAttributes" not in request
+    assert json.loads(request["Body"]) == {"audio": "UklGRg==", "max_new_tokens": 160}
+
+
+@pytest.mark.parametrize("payload_format, content_type", [("wav", "audio/wav"), ("json", "application/json")])
+def test_sarvam_windows_run_concurrently_and_are_stitched_in_order(stubs, monkeypatch, payload_format, content_type):
+    s3, dynamodb, transcribe, sagemaker, lambda_client, probe = stubs
+    monkeypatch.setattr(app, "SARVAM_PAYLOAD_FORMAT", payload_format)
+    samples, _ = conversation()
+
+    result = upload(s3, f"sessions/{SESSION}/normalized/audio.wav", wav(samples))
+
+    document = json.loads(s3.objects[(app.BUCKET_NAME, f"sessions/{SESSION}/output/{SESSION}.json")]["Body"])
+    segments = document["results"]["audio_segments"]
+    assert result["windows"] == len(segments) == sagemaker.calls["invoke_endpoint"] >= 5
+    assert document["results"]["transcripts"][0]["transcript"] == " ".join(s["transcript"] for s in segments)
+    # Windows are at most 25 s of kept audio, in source order
+    assert all(float(s["transcript"]) <= app.SARVAM_WINDOW_SECONDS for s in segments)
+    assert [float(s["start_time"]) for s in segments] == sorted(float(s["start_time"]) for s in segments)
+    assert 1 < probe.peak <= 3
+
+    assert {r["ContentType"] for r in sagemaker.requests} == {content_type}
+    assert all(r["max_new_tokens"] >= 64 for r in sagemaker.requests)
+    assert not transcribe.jobs
+    assert dynamodb.items[SESSION]["asr_engine"] == {"S": "sarvam"}
+    assert lambda_client.invocations == [(app.PROCESSING_FUNCTION, "Event", {
+        "detail": {"TranscriptionJobName": SESSION, "TranscriptionJobStatus": "COMPLETED"}})]
+
+    wav_bytes = len(s3.objects[(app.BUCKET_NAME, f"sessions/{SESSION}/normalized/audio.wav")]["Body"])
+    if payload_format == "wav":
+        # Raw windows: no more than the (silence-trimmed) recording itself
+        assert result["payloadBytes"] < wav_bytes
+    else:
+        assert result["payloadBytes"] > wav_bytes * 0.8 * 4 / 3
+
+
+def test_sarvam_falls_back_to_transcribe_for_compressed_audio(stubs):
+    s3, dynamodb, transcribe, sagemaker, lambda_client, _ = stubs
+
+    upload(s3, f"sessions/{SESSION}/input/audio.mp3", b"ID3" + b"\x00" * 100)
+
+    assert list(transcribe.jobs) == [SESSION]
+    assert "invoke_endpoint" not in sagemaker.calls
+    assert dynamodb.items[SESSION]["asr_engine"] == {"S": "transcribe"}
+    assert lambda_client.invocations == []
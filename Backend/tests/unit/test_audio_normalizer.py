@@ -0,0 +1,151 @@
+import io
+import json
+import struct
+
+import numpy as np
+import pytest
+
+from ..fakes import FakeDynamoDB, FakeLambda, FakeS3
+from audio_normalizer import app
+from common import audio
+from streaming_upload import MiB, StreamingWavUpload
+
+BUCKET = "cloudnine-cce-test"
+
+
+def tone(rate, seconds, channels=2, frequency=440.0):
+    t = np.arange(int(rate * seconds)) / rate
+    left = 0.5 * np.sin(2 * np.pi * frequency * t)
+    return np.stack([left, -left][:channels] if channels <= 2 else [left] * channels, axis=1)
+
+
+def wav_bytes(samples, rate, bits=16, extensible=False, extra_chunk=b""):
+    channels = samples.shape[1]
+    if bits == 16:
+        data = (samples * 32767).astype("<i2").tobytes()
+    else:  # 24-bit
+        ints = (samples * (2 ** 23 - 1)).astype("<i4").view(np.uint8).reshape(-1, 4)
+        data = ints[:, :3].tobytes()
+    block_align = channels * bits // 8
+    fmt = struct.pack("<HHIIHH", 0xFFFE if extensible else 1, channels, rate, rate * block_align, block_align, bits)
+    if extensible:
+        fmt += struct.pack("<HHI", 22, bits, 0) + struct.pack("<H", 1) + b"\x00\x00\x00\x00\x10\x00\x80\x00\x00\xaa\x00\x38\x9b\x71"
+    chunks = b"fmt " + struct.pack("<I", len(fmt)) + fmt + extra_chunk + b"data" + struct.pack("<I", len(data)) + data
+    return b"RIFF" + struct.pack("<I", 4 + len(chunks)) + b"WAVE" + chunks
+
+
+@pytest.fixture()
+def stubs(monkeypatch):
+    s3, dynamodb, lambda_client = FakeS3(), FakeDynamoDB(), FakeLambda()
+    monkeypatch.setattr(app, "s3", s3)
+    monkeypatch.setattr(app, "dynamodb", dynamodb)
+    monkeypatch.setattr(app, "lambda_client", lambda_client)
+    monkeypatch.setattr(app, "BLOCK_SECONDS", 0.37)  # many uneven blocks
+    dynamodb.items["session-1"] = {"session_id": {"S": "session-1"}, "status": {"S": "UPLOAD_URL_GENERATED"}}
+    return s3, dynamodb, lambda_client
+
+
+def upload_event(key):
+    return {"Records": [{"s3": {"bucket": {"name": BUCKET}, "object": {"key": key}}}]}
+
+
+def handover(key):
+    return {"Records": [{"eventSource": "audio_normalizer", **upload_event(key)["Records"][0]}]}
+
+
+def test_header_parsing_skips_chunks_and_reads_extensible_24_bit():
+    samples = tone(44100, 0.1)
+    stream = io.BytesIO(wav_bytes(samples, 44100, bits=24, extensible=True, extra_chunk=b"LIST\x03\x00\x00\x00abc\x00"))
+
+    fmt = audio.read_wav_header(stream)
+    decoded = np.concatenate(list(audio.iter_frames(stream, fmt, 1000)))
+
+    assert fmt[:4] == (audio.WAVE_FORMAT_PCM, 2, 44100, 24)
+    assert decoded.shape == samples.shape
+    assert np.abs(decoded - samples).max() < 1e-6
+
+
+@pytest.mark.parametrize("rate_in", [48000, 44100, 22050])
+def test_resampling_in_blocks_matches_one_pass(rate_in):
+    signal = tone(rate_in, 1.0, channels=1, frequency=1000.0)[:, 0].astype(np.float32)
+
+    whole = audio.Resampler(rate_in, 16000)
+    expected = np.concatenate([whole.process(signal), whole.flush()])
+
+    blocks, streamed = audio.Resampler(rate_in, 16000), []
+    for start in range(0, len(signal), 997):
+        streamed.append(blocks.process(signal[start:start + 997]))
+    streamed.append(blocks.flush())
+
+    assert len(expected) == 16000
+    assert np.array_equal(np.concatenate(streamed), expected)
+    ideal = 0.5 * np.sin(2 * np.pi * 1000 * np.arange(16000) / 16000)
+    assert np.abs(expected - ideal)[50:-50].max() < 1e-3
+
+
+def test_stereo_48k_wav_is_normalized_and_handed_to_transcription(stubs):
+    s3, dynamodb, lambda_client = stubs
+    key = "sessions/session-1/input/audio.wav"
+    s3.put_object(Bucket=BUCKET, Key=key, Body=wav_bytes(tone(48000, 3.0), 48000))
+
+    result = json.loads(app.lambda_handler(upload_event(key), None)["body"])["results"][0]
+
+    normalized = s3.objects[(BUCKET, "sessions/session-1/normalized/audio.wav")]["Body"]
+    stream = io.BytesIO(normalized)
+    fmt = audio.read_wav_header(stream)
+    assert fmt == audio.WavFormat(audio.WAVE_FORMAT_PCM, 1, 16000, 16, 3 * 16000 * 2)
+    # The opposite-phase channels cancel in the downmix
+    assert np.abs(np.concatenate(list(audio.iter_frames(stream, fmt, 4096)))).max() < 1e-3
+
+    assert result["normalized"] and result["audio_seconds"] == 3.0
+    assert result["bytes_saved"] == len(s3.objects[(BUCKET, key)]["Body"]) - len(normalized)
+    assert len(normalized) * 6 < len(s3.objects[(BUCKET, key)]["Body"]) + 300
+    assert dynamodb.items["session-1"]["s3_normalized_path"] == {"S": result["transcription_input"]}
+    assert lambda_client.invocations == [(app.TRANSCRIBE_FUNCTION, "Event", handover(result["transcription_input"]))]
+
+
+@pytest.mark.parametrize("key, body", [
+    ("sessions/session-1/input/audio.mp3", b"ID3" + b"\x00" * 100),
+    ("sessions/session-1/input/audio.wav", wav_bytes(tone(16000, 0.5, channels=1), 16000)),
+    ("sessions/session-1/input/audio.wav", b"not really a wav file"),
+])
+def test_other_inputs_pass_through_unchanged(stubs, key, body):
+    s3, dynamodb, lambda_client = stubs
+    s3.put_object(Bucket=BUCKET, Key=key, Body=body)
+
+    app.lambda_handler(upload_event(key), None)
+
+    assert list(s3.objects) == [(BUCKET, key)]
+    assert "s3_normalized_path" not in dynamodb.items["session-1"]
+    assert lambda_client.invocations[0][2] == handover(key)
+
+
+@pytest.mark.parametrize("key", [
+    "sessions/session-1/normalized/audio.wav",
+    "sessions/session-1/chunks/000.wav",
+    "sessions/session-1/audio.wav",
+])
+def test_objects_outside_input_are_skipped(stubs, key):
+    s3, dynamodb, lambda_client = stubs
+    s3.put_object(Bucket=BUCKET, Key=key, Body=wav_bytes(tone(48000, 0.5), 48000))
+
+    result = json.loads(app.lambda_handler(upload_event(key), None)["body"])["results"]
+
+    assert result == [{"source": key, "skipped": "not an uploaded recording"}]
+    assert list(s3.objects) == [(BUCKET, key)] and s3.calls == {"put_object": 1}
+    assert lambda_client.invocations == []
+    assert "s3_normalized_path" not in dynamodb.items["session-1"]
+
+
+def test_streaming_upload_writes_the_header_part_last():
+    s3 = FakeS3()
+    upload = StreamingWavUpload(s3, BUCKET, "out.wav", 16000, part_size=5 * MiB)
+    data = bytes(range(256)) * (48 * 1024)  # 12 MiB
+    for start in range(0, len(data), 300001):
+        upload.write(data[start:start + 300001])
+
+    assert upload.close() == 44 + len(data)
+    body = s3.objects[(BUCKET, "out.wav")]["Body"]
+    assert body[44:] == data
+    assert audio.read_wav_header(io.BytesIO(body)).data_bytes == len(data)
+    assert s3.calls["upload_part"] == 3
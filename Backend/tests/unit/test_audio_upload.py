@@ -0,0 +1,89 @@
+import json
+
+import pytest
+
+from ..fakes import FakeDynamoDB, FakeS3, FakeTable
+from audio_upload import app
+import multipart
+
+MiB = 1024 * 1024
+
+
+@pytest.fixture()
+def stubs(monkeypatch):
+    s3, dynamodb = FakeS3(), FakeDynamoDB()
+    monkeypatch.setattr(app, "s3", s3)
+    monkeypatch.setattr(app, "table", FakeTable(dynamodb, app.SESSION_TABLE))
+    return s3, dynamodb
+
+
+def call(**body):
+    result = app.lambda_handler({"body": json.dumps(body)}, None)
+    return result["statusCode"], json.loads(result["body"])
+
+
+def create(file_size, **extra):
+    return call(patient_id="p-1", cce_id="cce-1", filename="visit.wav", file_size=file_size, **extra)
+
+
+def upload(s3, session, part_numbers, data):
+    for number in part_numbers:
+        start = (number - 1) * session["part_size"]
+        s3.upload_part(Bucket=app.BUCKET_NAME, Key=session["s3_input_path"], UploadId=session["upload_id"],
+                       PartNumber=number, Body=data[start:start + session["part_size"]])
+
+
+@pytest.mark.parametrize("file_size, part_size", [
+    (20 * MiB, 5 * MiB),
+    (400 * MiB, 20 * MiB),
+    (5 * 1024 * MiB, 256 * MiB),
+])
+def test_part_size_adapts_to_the_file(file_size, part_size):
+    assert multipart.choose_part_size(file_size) == part_size
+    assert multipart.part_count(file_size, part_size) <= multipart.MAX_PARTS
+
+
+def test_small_files_keep_the_single_put_url(stubs):
+    status, body = create(2 * MiB)
+    assert status == 200
+    assert "presigned_url" in body and "upload_id" not in body
+
+
+def test_resume_only_requests_missing_parts_then_completes(stubs):
+    s3, dynamodb = stubs
+    data = bytes(range(256)) * (48 * 1024)  # 12 MiB: parts of 5, 5 and 2 MiB
+    status, session = create(len(data), multipart=True)
+    assert status == 200 and session["part_count"] == 3
+    assert [p["part_number"] for p in session["parts"]] == [1, 2, 3]
+
+    # Connection dropped after part 2; part 3 was cut short
+    upload(s3, session, [2], data)
+    s3.upload_part(Bucket=app.BUCKET_NAME, Key=session["s3_input_path"], UploadId=session["upload_id"],
+                   PartNumber=3, Body=data[-10:])
+
+    status, body = call(action="complete", session_id=session["session_id"])
+    assert status == 409 and body["missing_parts"] == [1, 3]
+
+    status, resumed = call(action="resume", session_id=session["session_id"])
+    assert resumed["uploaded_parts"] == [2]
+    assert [p["part_number"] for p in resumed["parts"]] == [1, 3]
+
+    upload(s3, session, [1, 3], data)
+    status, body = call(action="complete", session_id=session["session_id"])
+
+    assert status == 200
+    assert s3.objects[(app.BUCKET_NAME, session["s3_input_path"])]["Body"] == data
+    assert s3.calls["complete_multipart_upload"] == 1
+    assert "upload_completed_at" in dynamodb.items[session["session_id"]]
+    assert call(action="complete", session_id=session["session_id"])[0] == 409
+
+
+def test_abort_discards_the_upload(stubs):
+    s3, dynamodb = stubs
+    _, session = create(30 * MiB)
+
+    status, body = call(action="abort", session_id=session["session_id"])
+
+    assert status == 200 and body["status"] == "UPLOAD_ABORTED"
+    assert s3.uploads == {}
+    assert dynamodb.items[session["session_id"]]["status"] == {"S": "UPLOAD_ABORTED"}
@@ -0,0 +1,28 @@
+from common import aws_clients
+
+
+def test_lazy_client_builds_once_on_first_use(monkeypatch):
+    created = []
+
+    class Client:
+        def get_item(self, **kwargs):
+            return {}
+
+    monkeypatch.setattr(aws_clients, "client", lambda service, region=None: created.append(service) or Client())
+
+    dynamodb = aws_clients.lazy_client("dynamodb")
+    assert created == []
+
+    dynamodb.get_item(TableName="t")
+    dynamodb.get_item(TableName="t")
+    assert created == ["dynamodb"]
+
+
+def test_memoized_per_service_and_region(monkeypatch):
+    monkeypatch.setattr(aws_clients, "_clients", {})
+
+    first = aws_clients.client("dynamodb")
+    assert aws_clients.client("dynamodb") is first
+    assert aws_clients.client("dynamodb", region="us-east-1") is not first
+    assert first.meta.config.retries["mode"] == "standard"
+    assert aws_clients.client("bedrock-runtime").meta.config.retries["total_max_attempts"] == 1
@@ -0,0 +1,91 @@
+import json
+
+import pytest
+
+from ..fakes import FakeBedrockRuntime, FakeDynamoDB, FakeS3, transcribe_output
+from transcription_processing import app
+
+
+@pytest.fixture()
+def stubs(monkeypatch):
+    s3, bedrock, dynamodb = FakeS3(), FakeBedrockRuntime(), FakeDynamoDB()
+    monkeypatch.setattr(app, "s3", s3)
+    monkeypatch.setattr(app, "bedrock", bedrock)
+    monkeypatch.setattr(app, "dynamodb", dynamodb)
+    return s3, bedrock, dynamodb
+
+
+def sqs_record(message_id, job_name, status="COMPLETED"):
+    return {
+        "messageId": message_id,
+        "body": json.dumps({
+            "detail": {"TranscriptionJobName": job_name, "TranscriptionJobStatus": status}
+        }),
+    }
+
+
+def test_batch_reports_only_failed_records(stubs):
+    s3, bedrock, dynamodb = stubs
+    for job_name in ("session-a", "session-b"):
+        s3.put_object(
+            Bucket=app.BUCKET_NAME,
+            Key=f"sessions/{job_name}/output/{job_name}.json",
+            Body=transcribe_output(job_name, "hello"),
+        )
+
+    event = {"Records": [
+        sqs_record("m1", "session-a"),
+        sqs_record("m2", "session-missing"),
+        sqs_record("m3", "session-b"),
+        {"messageId": "m4", "body": "not json"},
+    ]}
+
+    result = app.lambda_handler(event, None)
+
+    assert result == {"batchItemFailures": [{"itemIdentifier": "m2"}, {"itemIdentifier": "m4"}]}
+    assert dynamodb.items["session-a"]["status"] == {"S": "COMPLETED"}
+    assert dynamodb.items["session-b"]["status"] == {"S": "COMPLETED"}
+    assert dynamodb.items["session-missing"]["status"] == {"S": "PROCESSING_FAILED"}
+    assert bedrock.calls["invoke_model"] == 2
+
+
+def test_single_event_mode_unchanged(stubs):
+    s3, _, dynamodb = stubs
+    s3.put_object(
+        Bucket=app.BUCKET_NAME,
+        Key="sessions/session-a/output/session-a.json",
+        Body=transcribe_output("session-a", "hello"),
+    )
+
+    result = app.lambda_handler(
+        {"detail": {"TranscriptionJobName": "session-a", "TranscriptionJobStatus": "COMPLETED"}},
+        None,
+    )
+
+    assert result["statusCode"] == 200
+    assert json.loads(result["body"])["sessionId"] == "session-a"
+    assert dynamodb.items["session-a"]["status"] == {"S": "COMPLETED"}
+
+
+def test_failed_extraction_is_retried_not_completed(stubs):
+    s3, bedrock, dynamodb = stubs
+    s3.put_object(
+        Bucket=app.BUCKET_NAME,
+        Key="sessions/session-a/output/session-a.json",
+        Body=transcribe_output("session-a", "hello"),
+    )
+
+    def unavailable(payload):
+        raise Exception("ModelNotReadyException")
+
+    bedrock.responder = unavailable
+    event = {"Records": [sqs_record("m1", "session-a")]}
+
+    assert app.lambda_handler(event, None) == {"batchItemFailures": [{"itemIdentifier": "m1"}]}
+    item = dynamodb.items["session-a"]
+    assert item["status"] == {"S": "PROCESSING_FAILED"} and "extracted_info" not in item
+    assert "ModelNotReadyException" in item["error_message"]["S"]
+
+    # The redelivery takes the session again and calls Bedrock again
+    assert app.lambda_handler(event, None) == {"batchItemFailures": [{"itemIdentifier": "m1"}]}
+    assert bedrock.calls["invoke_model"] == 2
@@ -0,0 +1,35 @@
+import json
+
+from ..fakes import FakeBedrockRuntime
+from bedrock_prompt import SYSTEM_PROMPT, get_transcript_message
+from transcription_processing import app
+
+
+def test_transcript_only_in_user_message():
+    message = get_transcript_message("CCE: hello", part=(1, 3), speaker_attributed=True)
+
+    assert "CCE: hello" in message
+    assert "part 1 of 3" in message
+    assert "{" not in message
+    assert "scan progression" in SYSTEM_PROMPT.lower()
+    assert '"pregnancy_related": {' in SYSTEM_PROMPT
+
+
+def test_request_uses_static_system_prefix(monkeypatch):
+    bedrock = FakeBedrockRuntime()
+    monkeypatch.setattr(app, "bedrock", bedrock)
+
+    for model_id, cached in (
+        ("anthropic.claude-3-haiku-20240307-v1:0", False),
+        ("apac.anthropic.claude-3-5-haiku-20241022-v1:0", True),
+    ):
+        monkeypatch.setattr(app, "MODEL_ID", model_id)
+        monkeypatch.setattr(app, "SYSTEM_BLOCKS", app._system_blocks())
+        app.extract_patient_info("first transcript")
+        app.extract_patient_info("second transcript")
+
+        first, second = bedrock.requests[-2:]
+        assert first["system"] == second["system"]
+        assert first["system"][0]["text"] == SYSTEM_PROMPT
+        assert ("cache_control" in first["system"][0]) is cached
+        assert "first transcript" in json.dumps(first["messages"])
@@ -0,0 +1,155 @@
+import io
+import json
+
+import numpy as np
+import pytest
+
+from ..fakes import FakeBedrockRuntime, FakeDynamoDB, FakeS3, FakeTranscribe
+from common import audio, vad
+from common.chunk_manifest import chunk_output_prefix, manifest_key, source_pieces, source_to_kept
+from transcribe_audio import app as transcribe_app
+from transcription_processing import app as processing_app
+
+RATE = 16000
+SESSION = "session-chunky"
+INPUT_KEY = f"sessions/{SESSION}/normalized/audio.wav"
+
+
+def conversation(seed=3):
+    """
+    Alternating turns of two "speakers" (different tones over low noise),
+    with short pauses inside turns and a few long silences. Returns the
+    samples and the words as (source start time, speaker, word).
+    """
+    rng = np.random.default_rng(seed)
+    pieces, words, t = [], [], 0.0
+
+    def add(seconds, frequency=None):
+        nonlocal t
+        n = int(seconds * RATE)
+        noise = rng.normal(0, 0.001, n)
+        if frequency:
+            noise += 0.3 * np.sin(2 * np.pi * frequency * np.arange(n) / RATE)
+        pieces.append(noise)
+        t += seconds
+
+    for turn in range(16):
+        speaker = "A" if turn % 2 == 0 else "B"
+        for _ in range(3):
+            for _ in range(4):
+                words.append((round(t + 0.05, 3), speaker, f"w{len(words)}"))
+                add(0.4, 300 if speaker == "A" else 700)
+            add(0.4)  # pause inside the turn
+        add(8.0 if turn % 5 == 4 else 0.6)  # long silence every few turns
+    return np.concatenate(pieces).astype(np.float32), words
+
+
+def wav(samples):
+    data = audio.to_pcm16(samples)
+    return audio.wav_header(RATE, 1, 16, len(data)) + data
+
+
+@pytest.fixture()
+def stubs(monkeypatch):
+    s3, dynamodb, transcribe = FakeS3(), FakeDynamoDB(), FakeTranscribe()
+    for module in (transcribe_app, processing_app):
+        monkeypatch.setattr(module, "s3", s3)
+        monkeypatch.setattr(module, "dynamodb", dynamodb)
+    monkeypatch.setattr(transcribe_app, "transcribe", transcribe)
+    monkeypatch.setattr(processing_app, "bedrock", FakeBedrockRuntime())
+    monkeypatch.setattr(transcribe_app, "CHUNK_MAX_SECONDS", 30.0)
+    monkeypatch.setattr(transcribe_app, "CHUNK_MIN_SECONDS", 15.0)
+    monkeypatch.setattr(transcribe_app, "CHUNK_OVERLAP_SECONDS", 3.0)
+    dynamodb.items[SESSION] = {"session_id": {"S": SESSION}, "language_preferences": {"L": [{"S": "en-IN"}]}}
+    return s3, dynamodb, transcribe
+
+
+def upload_completed(key):
+    event = {"Records": [{"eventSource": "audio_normalizer",
+                          "s3": {"bucket": {"name": processing_app.BUCKET_NAME}, "object": {"key": key}}}]}
+    [result] = json.loads(transcribe_app.lambda_handler(event, None)["body"])["records"]
+    return result
+
+
+def test_vad_trims_long_silences_and_cuts_in_pauses():
+    samples, _ = conversation()
+    energies = vad.frame_energies([samples[i:i + 99999] for i in range(0, len(samples), 99999)], RATE)
+    regions = vad.speech_regions(energies)
+    spans = vad.kept_spans(regions, len(samples) / RATE, max_silence=1.0)
+    cuts = vad.plan_cuts(regions, spans, max_chunk=30, min_chunk=15)
+
+    # 16 turns of speech; the three 8 s silences shrink to 1 s each
+    assert len(regions) == 16
+    assert 3 * 6.5 < len(samples) / RATE - cuts[-1] < 3 * 7.5
+    assert all(0 < b - a <= 30 for a, b in zip(cuts, cuts[1:]))
+    # Every inner cut falls between turns, never inside one
+    for cut in cuts[1:-1]:
+        assert not any(source_to_kept(spans, s) < cut < source_to_kept(spans, e) for s, e in regions)
+
+
+def test_long_recording_is_chunked_stitched_and_processed_once(stubs):
+    s3, dynamodb, transcribe = stubs
+    samples, words = conversation()
+    s3.put_object(Bucket=processing_app.BUCKET_NAME, Key=INPUT_KEY, Body=wav(samples))
+
+    result = upload_completed(INPUT_KEY)
+
+    manifest = json.loads(s3.objects[(processing_app.BUCKET_NAME, manifest_key(SESSION))]["Body"])
+    chunks = manifest["chunks"]
+    assert result["jobNames"] == [c["job_name"] for c in chunks] == sorted(transcribe.jobs)
+    assert len(chunks) >= 3
+    assert manifest["billed_seconds"] < manifest["source_seconds"] * 0.95
+    assert dynamodb.items[SESSION]["chunk_count"] == {"N": str(len(chunks))}
+    for chunk in chunks:
+        body = s3.objects[(processing_app.BUCKET_NAME, chunk["key"])]["Body"]
+        fmt = audio.read_wav_header(io.BytesIO(body))
+        assert fmt.data_bytes / 2 / RATE == pytest.approx(chunk["end"] - chunk["start"], abs=0.01)
+        assert transcribe.jobs[chunk["job_name"]]["MediaSampleRateHertz"] == RATE
+
+    # What Transcribe would return per chunk; odd chunks swap the labels
+    for index, chunk in enumerate(chunks):
+        labels = {"A": "spk_0", "B": "spk_1"} if index % 2 == 0 else {"A": "spk_1", "B": "spk_0"}
+        items = []
+        pieces = source_pieces(manifest["spans"], chunk["start"], chunk["end"])
+        for start, speaker, word in words:
+            if any(lo <= start < hi for lo, hi in pieces):
+                at = source_to_kept(manifest["spans"], start) - chunk["start"]
+                items.append({"type": "pronunciation", "start_time": f"{at:.3f}", "end_time": f"{at + 0.3:.3f}",
+                              "speaker_label": labels[speaker],
+                              "alternatives": [{"confidence": "0.99", "content": word}]})
+        document = {"jobName": chunk["job_name"], "status": "COMPLETED",
+                    "results": {"transcripts": [{"transcript": ""}], "items": items}}
+        s3.put_object(Bucket=processing_app.BUCKET_NAME,
+                      Key=f"{chunk_output_prefix(SESSION)}{chunk['job_name']}.json", Body=json.dumps(document))
+
+    # Completions arrive out of order, one of them twice
+    order = [c["job_name"] for c in chunks][::-1]
+    order.insert(1, order[0])
+    messages = [
+        processing_app.process_transcription_job({"TranscriptionJobName": name, "TranscriptionJobStatus": "COMPLETED"})
+        for name in order
+    ]
+
+    assert [m.get("sessionId") for m in messages] == [None] * (len(order) - 1) + [SESSION]
+    assert processing_app.bedrock.calls["invoke_model"] == 1
+    assert dynamodb.items[SESSION]["status"] == {"S": "COMPLETED"}
+
+    stitched = json.loads(s3.objects[(processing_app.BUCKET_NAME, f"sessions/{SESSION}/output/{SESSION}.json")]["Body"])
+    items = stitched["results"]["items"]
+    assert [i["alternatives"][0]["content"] for i in items] == [w for _, _, w in words]
+    assert [float(i["start_time"]) for i in items] == pytest.approx([s for s, _, _ in words], abs=0.002)
+    speaker_of = {speaker: set() for _, speaker, _ in words}
+    for item, (_, speaker, _) in zip(items, words):
+        speaker_of[speaker].add(item["speaker_label"])
+    assert speaker_of == {"A": {"spk_0"}, "B": {"spk_1"}}
+
+
+def test_short_recording_stays_a_single_job(stubs):
+    s3, dynamodb, transcribe = stubs
+    samples, _ = conversation()
+    s3.put_object(Bucket=processing_app.BUCKET_NAME, Key=INPUT_KEY, Body=wav(samples[:20 * RATE]))
+
+    upload_completed(INPUT_KEY)
+
+    assert list(transcribe.jobs) == [SESSION]
+    assert "chunk_count" not in dynamodb.items[SESSION]
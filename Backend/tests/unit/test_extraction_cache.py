@@ -0,0 +1,63 @@
+import time
+
+from ..fakes import FakeDynamoDB
+from extraction_cache import ExtractionCache, cache_key
+from transcription_processing import app
+
+CACHE_TABLE = "extraction_cache_test"
+
+
+def make_cache(ttl_seconds=3600):
+    dynamodb = FakeDynamoDB(key_names={CACHE_TABLE: "cache_key"})
+    return ExtractionCache(dynamodb, CACHE_TABLE, ttl_seconds), dynamodb
+
+
+def test_key_ignores_whitespace_but_not_model_or_prompt():
+    base = cache_key("Hello  there\n", "v1", "model-a", {"temperature": 0.3})
+
+    assert base == cache_key(" Hello there", "v1", "model-a", {"temperature": 0.3})
+    assert base != cache_key("Hello there", "v2", "model-a", {"temperature": 0.3})
+    assert base != cache_key("Hello there", "v1", "model-b", {"temperature": 0.3})
+    assert base != cache_key("Hello there", "v1", "model-a", {"temperature": 0.5})
+
+
+def test_hit_skips_extraction_and_bypass_refreshes():
+    cache, _ = make_cache()
+    calls = []
+
+    def extract():
+        calls.append(1)
+        return {"pregnancy_related": {"customer_edd": f"call-{len(calls)}"}}
+
+    first, hit = cache.get_or_extract("k", extract)
+    assert not hit
+    second, hit = cache.get_or_extract("k", extract)
+    assert hit and second == first
+    assert len(calls) == 1
+
+    refreshed, hit = cache.get_or_extract("k", extract, bypass=True)
+    assert not hit and len(calls) == 2
+    assert cache.get_or_extract("k", extract)[0] == refreshed
+    assert cache.stats["hits"] == 2 and cache.stats["misses"] == 1 and cache.stats["bypassed"] == 1
+
+
+def test_expired_entries_and_errors_are_not_served():
+    cache, dynamodb = make_cache(ttl_seconds=60)
+
+    cache.put("expired", {"ok": True})
+    dynamodb.table(CACHE_TABLE)["expired"]["expires_at"] = {"N": str(int(time.time()) - 1)}
+    assert cache.get("expired") is None
+
+    cache.put("failed", {"error": "Failed to extract information"})
+    assert "failed" not in dynamodb.table(CACHE_TABLE)
+
+
+def test_disabled_cache_always_extracts(monkeypatch):
+    monkeypatch.setattr(app, "extraction_cache", ExtractionCache(FakeDynamoDB(), None, 60))
+    calls = []
+    monkeypatch.setattr(app, "extract_patient_info", lambda transcript, **kwargs: calls.append(transcript) or {})
+
+    app.extract_with_cache("same transcript")
+    app.extract_with_cache("same transcript")
+
+    assert len(calls) == 2
@@ -0,0 +1,95 @@
+import json
+
+import pytest
+
+from ..fakes import FakeBedrockRuntime, FakeDynamoDB, FakeS3, empty_extraction, transcribe_output
+from extraction_cache import ExtractionCache
+from extraction_schema import parse_extraction
+from transcription_processing import app
+
+ANSWER = {
+    **empty_extraction(),
+    "pregnancy_related": {"customer_edd": "2025-03-14", "first_pregnancy": True, "scans_done": ["EP Scan", "NT Scan"],
+                          "having_twins": "no"},
+    "insurance": {"insurance_status": "single_insurance"},
+}
+TEXT = json.dumps(ANSWER, indent=2)
+
+
+@pytest.mark.parametrize("text", [
+    "Here is the extraction:\n```json\n" + TEXT + "\n```\nLet me know if you need more.",
+    TEXT.replace('"no"\n  }', '"no",\n  }'),
+    TEXT.replace("true", "True").replace("null", "None"),
+    TEXT.replace('"single_insurance"', '"Single Insurance"').replace('"NT Scan"', '"nt scan"'),
+])
+def test_slips_are_repaired_locally(text):
+    parsed = parse_extraction(text)
+
+    assert parsed.problems == {}
+    assert parsed.sections == ANSWER
+
+
+def test_cut_off_answer_keeps_its_complete_sections():
+    parsed = parse_extraction(TEXT[:TEXT.index('"insurance_status"') + 25])
+
+    assert parsed.repaired
+    assert list(parsed.sections) == ["pregnancy_related", "family_personal", "cloudnine_awareness"]
+    assert parsed.problems["insurance"] == ["cut off"]
+    assert parsed.problems["additional_insights"] == ["missing"]
+
+
+def test_only_broken_sections_are_asked_for_again(monkeypatch):
+    answers = [
+        # Off-format value in one section, the last section cut off
+        TEXT.replace('"single_insurance"', '"yes, through work"')[:TEXT.index('"additional_insights"')],
+        json.dumps({name: ANSWER[name] for name in ("insurance", "cce_observations", "additional_insights")}),
+    ]
+    bedrock = FakeBedrockRuntime(responder=lambda payload: answers[len(bedrock.requests) - 1])
+    monkeypatch.setattr(app, "bedrock", bedrock)
+
+    assert app.extract_patient_info("CCE: hello") == ANSWER
+
+    first, reask = [r["messages"][0]["content"][0]["text"] for r in bedrock.requests]
+    assert "earlier answer" not in first
+    assert ('lacked or got these sections wrong: insurance (insurance_status: "yes, through work" is not an '
+            'allowed value); cce_observations (cut off); additional_insights (missing)') in reask
+
+
+def test_sections_still_broken_after_the_reasks_are_listed_as_incomplete(monkeypatch):
+    bedrock = FakeBedrockRuntime(responder=lambda payload: TEXT.replace('"single_insurance"', '"maybe"'))
+    monkeypatch.setattr(app, "bedrock", bedrock)
+
+    extracted = app.extract_patient_info("CCE: hello")
+
+    assert "insurance" not in extracted and extracted["pregnancy_related"] == ANSWER["pregnancy_related"]
+    assert extracted[app.INCOMPLETE_SECTIONS] == ["insurance"]
+    assert bedrock.calls["invoke_model"] == 1 + app.EXTRACTION_REASK_ATTEMPTS
+
+    bedrock.responder = lambda payload: "I could not find anything."
+    assert app.extract_patient_info("CCE: hello")["error"] == "No JSON found in response"
+
+
+def test_incomplete_extraction_is_not_cached_or_completed(monkeypatch):
+    s3, dynamodb = FakeS3(), FakeDynamoDB(key_names={"extraction_cache_test": "cache_key"})
+    bedrock = FakeBedrockRuntime(responder=lambda payload: TEXT.replace('"single_insurance"', '"maybe"'))
+    monkeypatch.setattr(app, "s3", s3)
+    monkeypatch.setattr(app, "dynamodb", dynamodb)
+    monkeypatch.setattr(app, "bedrock", bedrock)
+    monkeypatch.setattr(app, "extraction_cache", ExtractionCache(dynamodb, "extraction_cache_test", 3600))
+    s3.put_object(Bucket=app.BUCKET_NAME, Key="sessions/session-a/output/session-a.json",
+                  Body=transcribe_output("session-a", "hello"))
+    job = {"TranscriptionJobName": "session-a", "TranscriptionJobStatus": "COMPLETED"}
+
+    with pytest.raises(app.IncompleteExtraction, match="insurance"):
+        app.process_transcription_job(job)
+
+    assert dynamodb.table("extraction_cache_test") == {}
+    item = dynamodb.items["session-a"]
+    assert item["status"] == {"S": "PROCESSING_FAILED"} and "extracted_info" not in item
+    assert "processing_lease" not in item
+
+    # The retry extracts again rather than reading the incomplete result back
+    bedrock.responder = lambda payload: TEXT
+    assert app.process_transcription_job(job)["message"] == "Transcription processed successfully"
+    assert dynamodb.items["session-a"]["status"] == {"S": "COMPLETED"}
+    assert len(dynamodb.table("extraction_cache_test")) == 1
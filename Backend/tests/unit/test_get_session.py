@@ -0,0 +1,301 @@
+import json
+import threading
+import time
+
+import pytest
+
+from ..fakes import FakeDynamoDB, FakeS3
+from common.session_results import from_attribute, put_results, read_results, results_key, to_attribute
+from get_session import app
+from migrations import session_results
+import session_listing as listing
+
+
+@pytest.fixture()
+def dynamodb(monkeypatch):
+    dynamodb = FakeDynamoDB()
+    monkeypatch.setattr(app, "dynamodb", dynamodb)
+    monkeypatch.setattr(app, "BATCH_GET_BASE_BACKOFF", 0)
+    for i in range(5):
+        dynamodb.items[f"session-{i}"] = {
+            "session_id": {"S": f"session-{i}"},
+            "status": {"S": "COMPLETED"},
+            "updated_at": {"N": "1700000000"},
+            "transcription_output": {"S": "a long transcript " * 100},
+        }
+    return dynamodb
+
+
+def test_single_read_projects_fields_and_honours_etag(dynamodb):
+    event = {"pathParameters": {"session_id": "session-1"}, "queryStringParameters": {"fields": "status"}}
+
+    first = app.lambda_handler(event, None)
+    assert first["statusCode"] == 200
+    assert json.loads(first["body"]) == {"status": "COMPLETED"}
+
+    etag = first["headers"]["ETag"]
+    again = app.lambda_handler({**event, "headers": {"If-None-Match": f"W/{etag}"}}, None)
+    assert again["statusCode"] == 304
+    assert again["body"] == ""
+
+    dynamodb.items["session-1"]["updated_at"] = {"N": "1700000100"}
+    changed = app.lambda_handler({**event, "headers": {"if-none-match": etag}}, None)
+    assert changed["statusCode"] == 200
+    assert changed["headers"]["ETag"] != etag
+
+
+def test_writes_in_the_same_second_change_the_etag(dynamodb):
+    from transcription_processing import app as processing
+
+    session = dynamodb.items["session-1"]
+    session.update({"status": {"S": "EXTRACTION_IN_PROGRESS"}, "revision": {"N": "3"},
+                    "processing_lease": {"S": "lease-1"}})
+    event = {"pathParameters": {"session_id": "session-1"}, "queryStringParameters": {"fields": "status,revision"}}
+    first = app.lambda_handler(event, None)
+    assert json.loads(first["body"]) == {"status": "EXTRACTION_IN_PROGRESS", "revision": 3}
+
+    # A partial-section write: same status, same updated_at second
+    publish = processing.section_publisher("session-1", 1, "lease-1")
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(processing, "dynamodb", dynamodb)
+        patch.setattr(processing.time, "time", lambda: 1700000000)
+        publish("insurance", {"insurance_status": "no"})
+    assert session["updated_at"] == {"N": "1700000000"} and session["revision"] == {"N": "4"}
+
+    changed = app.lambda_handler({**event, "headers": {"If-None-Match": first["headers"]["ETag"]}}, None)
+    assert changed["statusCode"] == 200
+    since = app.lambda_handler({"pathParameters": {"session_id": "session-1"},
+                                "queryStringParameters": {"fields": "status", "since_revision": "3"}}, None)
+    assert since["statusCode"] == 200
+    current = app.lambda_handler({"pathParameters": {"session_id": "session-1"},
+                                  "queryStringParameters": {"fields": "status", "since_revision": "4"}}, None)
+    assert current["statusCode"] == 304
+    legacy = app.lambda_handler({"pathParameters": {"session_id": "session-1"}, "queryStringParameters": {
+        "fields": "status", "since_updated_at": "1700000000", "since_status": "EXTRACTION_IN_PROGRESS"}}, None)
+    assert legacy["statusCode"] == 304
+
+
+def test_unknown_field_is_rejected(dynamodb):
+    event = {"pathParameters": {"session_id": "session-1"}, "queryStringParameters": {"fields": "password"}}
+    assert app.lambda_handler(event, None)["statusCode"] == 400
+
+
+def test_batch_read_retries_unprocessed_keys(dynamodb):
+    dynamodb.batch_get_limit = 2
+    event = {"body": json.dumps({
+        "session_ids": ["session-3", "session-0", "session-missing", "session-4", "session-3"],
+        "fields": ["status"],
+    })}
+
+    result = app.lambda_handler(event, None)
+    body = json.loads(result["body"])
+
+    assert result["statusCode"] == 200
+    assert [s["session_id"] for s in body["sessions"]] == ["session-3", "session-0", "session-4"]
+    assert body["sessions"][0]["status"] == "COMPLETED"
+    assert "transcription_output" not in body["sessions"][0]
+    assert body["not_found"] == ["session-missing"]
+    assert body["unprocessed"] == []
+    assert dynamodb.calls["batch_get_item"] == 2
+
+    # Unchanged batch: 304 for the whole response, or per session via etags
+    assert app.lambda_handler({**event, "headers": {"If-None-Match": result["headers"]["ETag"]}}, None)["statusCode"] == 304
+
+    etags = {s["session_id"]: s["etag"] for s in body["sessions"]}
+    dynamodb.items["session-0"]["updated_at"] = {"N": "1700000100"}
+    partial = json.loads(app.lambda_handler({"body": json.dumps({
+        "session_ids": ["session-3", "session-0"], "fields": ["status"], "etags": etags,
+    })}, None)["body"])
+    assert partial["sessions"][0] == {"session_id": "session-3", "etag": etags["session-3"], "not_modified": True}
+    assert partial["sessions"][1]["status"] == "COMPLETED"
+
+
+def test_batch_reports_keys_left_unprocessed(dynamodb, monkeypatch):
+    monkeypatch.setattr(app, "BATCH_GET_MAX_ATTEMPTS", 2)
+    dynamodb.batch_get_limit = 1
+
+    result = app.lambda_handler({"queryStringParameters": {"ids": "session-0,session-1,session-2"}}, None)
+    body = json.loads(result["body"])
+
+    assert [s["session_id"] for s in body["sessions"]] == ["session-0", "session-1"]
+    assert body["unprocessed"] == ["session-2"]
+    assert "ETag" not in result["headers"]
+
+
+def test_batch_size_is_capped(dynamodb):
+    ids = [f"session-{i}" for i in range(app.MAX_BATCH_SIZE + 1)]
+    assert app.lambda_handler({"body": json.dumps({"session_ids": ids})}, None)["statusCode"] == 400
+
+
+@pytest.fixture()
+def notifier(dynamodb, monkeypatch):
+    """Session table stream wired to the session_notifier handler"""
+    from session_notifier import app as notifier_app
+
+    dynamodb.key_names["cce_session_changes_test"] = "session_id"
+    monkeypatch.setattr(notifier_app, "dynamodb", dynamodb)
+    monkeypatch.setattr(notifier_app, "CHANGES_TABLE", "cce_session_changes_test")
+    monkeypatch.setattr(app, "CHANGES_TABLE", "cce_session_changes_test")
+    monkeypatch.setattr(app, "WAIT_READ_UNITS_PER_SECOND", 100.0)
+    dynamodb.subscribe(app.TABLE_NAME, lambda record: notifier_app.lambda_handler({"Records": [record]}, None))
+    return dynamodb
+
+
+def update_status_later(dynamodb, session_id, status, delay):
+    def update():
+        time.sleep(delay)
+        dynamodb.update_item(
+            TableName=app.TABLE_NAME,
+            Key={"session_id": {"S": session_id}},
+            UpdateExpression="SET #status = :status, updated_at = :updated_at",
+            ExpressionAttributeNames={"#status": "status"},
+            ExpressionAttributeValues={":status": {"S": status}, ":updated_at": {"N": "1700000100"}},
+        )
+    thread = threading.Thread(target=update)
+    thread.start()
+    return thread
+
+
+@pytest.mark.parametrize("with_notifier", [True, False])
+def test_wait_returns_once_the_session_changes(notifier, monkeypatch, with_notifier):
+    if not with_notifier:
+        monkeypatch.setattr(app, "CHANGES_TABLE", "")
+    event = {
+        "pathParameters": {"session_id": "session-2"},
+        "queryStringParameters": {"wait": "5", "since_updated_at": "1700000000", "since_status": "COMPLETED"},
+    }
+    thread = update_status_later(notifier, "session-2", "PROCESSING_FAILED", 0.05)
+
+    started = time.monotonic()
+    result = app.lambda_handler(event, None)
+    thread.join()
+
+    assert result["statusCode"] == 200
+    assert json.loads(result["body"])["status"] == "PROCESSING_FAILED"
+    assert time.monotonic() - started < 1
+
+
+def test_wait_times_out_with_not_modified(notifier):
+    etag = app.lambda_handler({"pathParameters": {"session_id": "session-3"}}, None)["headers"]["ETag"]
+    reads = notifier.calls["get_item"]
+
+    result = app.lambda_handler({
+        "pathParameters": {"session_id": "session-3"},
+        "queryStringParameters": {"wait": "0.1"},
+        "headers": {"If-None-Match": etag},
+    }, None)
+
+    assert result["statusCode"] == 304
+    assert result["headers"]["ETag"] == etag
+    # Checked repeatedly until the deadline
+    assert notifier.calls["get_item"] > reads + 1
+
+
+@pytest.fixture()
+def indexed(monkeypatch):
+    indexes = {
+        listing.INDEXES[key]: (key, "created_at", listing.INDEX_ATTRIBUTES)
+        for key in ("patient_id", "cce_id")
+    }
+    dynamodb = FakeDynamoDB(indexes={app.TABLE_NAME: indexes})
+    monkeypatch.setattr(app, "dynamodb", dynamodb)
+    dynamodb.load(app.TABLE_NAME, [{
+        "session_id": {"S": f"session-{i:03d}"},
+        "patient_id": {"S": f"patient-{i % 3}"},
+        "cce_id": {"S": "cce-1"},
+        "status": {"S": "COMPLETED"},
+        "created_at": {"N": str(1700000000 + i)},
+        "extracted_info": {"S": "{}" * 1000},
+    } for i in range(150)])
+    return dynamodb
+
+
+def list_page(**query):
+    result = app.lambda_handler({"queryStringParameters": query}, None)
+    return result["statusCode"], json.loads(result["body"])
+
+
+def test_listing_pages_newest_first_within_the_read_budget(indexed):
+    seen, cursor = [], None
+    while True:
+        status, body = list_page(patient_id="patient-1", fields="status,created_at", page_size="100",
+                                 **({"cursor": cursor} if cursor else {}))
+        assert status == 200
+        assert len(body["sessions"]) <= listing.max_page_size()
+        assert body["consumed_read_units"] <= listing.PAGE_READ_UNITS
+        seen += body["sessions"]
+        cursor = body["next_cursor"]
+        if not cursor:
+            break
+
+    assert len(seen) == 50
+    created = [s["created_at"] for s in seen]
+    assert created == sorted(created, reverse=True)
+    assert set(seen[0]) == {"status", "created_at"}
+
+
+def test_listing_by_cce_and_date_range(indexed):
+    status, body = list_page(cce_id="cce-1", created_after="1700000010", created_before="1700000019")
+    assert status == 200
+    assert [s["session_id"] for s in body["sessions"]] == [f"session-{i:03d}" for i in range(19, 9, -1)]
+    assert body["next_cursor"] is None
+
+
+def test_listing_rejects_foreign_cursor_and_unindexed_fields(indexed):
+    _, body = list_page(patient_id="patient-0", page_size="2")
+    assert list_page(patient_id="patient-2", cursor=body["next_cursor"])[0] == 400
+    assert list_page(patient_id="patient-0", cursor="not a cursor")[0] == 400
+    assert list_page(patient_id="patient-0", fields="extracted_data")[0] == 400
+
+
+EXTRACTED = {"pregnancy_related": {"customer_edd": "2025-03-14", "scans_done": ["NT Scan"]},
+             "insurance": {"insurance_status": "Single insurance"}, "cce_observations": {"score": 7.5}}
+
+
+def test_results_layout_reads_only_the_requested_parts(dynamodb, monkeypatch):
+    s3 = FakeS3()
+    monkeypatch.setattr(app, "s3", s3)
+    key = results_key("session-1", "session-1")
+    put_results(s3, app.BUCKET_NAME, key, transcript="a long transcript " * 100, model_output=["{}"])
+    item = dynamodb.items["session-1"]
+    del item["transcription_output"]
+    item.update(extracted_info=to_attribute(EXTRACTED), results_key={"S": key})
+
+    def get(fields):
+        result = app.lambda_handler({"pathParameters": {"session_id": "session-1"},
+                                     "queryStringParameters": {"fields": fields}}, None)
+        assert result["statusCode"] == 200, result["body"]
+        return json.loads(result["body"])
+
+    assert get("extracted_data") == {"extracted_data": EXTRACTED}
+    assert get("status,extracted_data.pregnancy_related,extracted_data.insurance") == {
+        "status": "COMPLETED",
+        "extracted_data": {"pregnancy_related": EXTRACTED["pregnancy_related"], "insurance": EXTRACTED["insurance"]}}
+    assert "get_object" not in s3.calls
+
+    assert get("transcript") == {"transcript": "a long transcript " * 100}
+    assert s3.calls["get_object"] == 1
+    batch = app.lambda_handler({"body": json.dumps({"session_ids": ["session-1"], "fields": ["transcript"]})}, None)
+    assert batch["statusCode"] == 400
+
+
+def test_migration_moves_sessions_to_the_results_layout(dynamodb):
+    s3 = FakeS3()
+    dynamodb.items["session-2"]["extracted_info"] = {"S": json.dumps(EXTRACTED)}
+    del dynamodb.items["session-4"]["transcription_output"]
+    before = app.lambda_handler({"pathParameters": {"session_id": "session-2"}}, None)
+
+    counters = session_results.migrate(dynamodb, s3, app.TABLE_NAME, app.BUCKET_NAME, segments=2, page_size=2)
+
+    assert counters["scanned"] == 5 and counters["migrated"] == 4
+    assert counters["bytes_after"] < counters["bytes_before"] / 4
+    item = dynamodb.items["session-2"]
+    assert "transcription_output" not in item
+    assert from_attribute(item["extracted_info"]) == EXTRACTED and "M" in item["extracted_info"]
+    assert read_results(s3, app.BUCKET_NAME, item["results_key"]["S"])["transcript"] == "a long transcript " * 100
+    # The representation changed, so the ETag does too
+    after = app.lambda_handler({"pathParameters": {"session_id": "session-2"}}, None)
+    assert after["headers"]["ETag"] != before["headers"]["ETag"]
+    assert json.loads(after["body"])["extracted_data"] == EXTRACTED
+
+    assert session_results.migrate(dynamodb, s3, app.TABLE_NAME, app.BUCKET_NAME)["migrated"] == 0
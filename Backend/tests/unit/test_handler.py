@@ -1,72 +1,40 @@
-import json
-
-import pytest
-
-from hello_world import app
-
-
-@pytest.fixture()
-def apigw_event():
-    """ Generates API GW Event"""
-
-    return {
-        "body": '{ "test": "body"}',
-        "resource": "/{proxy+}",
-        "requestContext": {
-            "resourceId": "123456",
-            "apiId": "1234567890",
-            "resourcePath": "/{proxy+}",
-            "httpMethod": "POST",
-            "requestId": "c6af9ac6-7b61-11e6-9a41-93e8deadbeef",
-            "accountId": "123456789012",
-            "identity": {
-                "apiKey": "",
-                "userArn": "",
-                "cognitoAuthenticationType": "",
-                "caller": "",
-                "userAgent": "Custom User Agent String",
-                "user": "",
-                "cognitoIdentityPoolId": "",
-                "cognitoIdentityId": "",
-                "cognitoAuthenticationProvider": "",
-                "sourceIp": "127.0.0.1",
-                "accountId": "",
-            },
-            "stage": "prod",
-        },
-        "queryStringParameters": {"foo": "bar"},
-        "headers": {
-            "Via": "1.1 08f323deadbeefa7af34d5feb414ce27.cloudfront.net (CloudFront)",
-            "Accept-Language": "en-US,en;q=0.8",
-            "CloudFront-Is-Desktop-Viewer": "true",
-            "CloudFront-Is-SmartTV-Viewer": "false",
-            "CloudFront-Is-Mobile-Viewer": "false",
-            "X-Forwarded-For": "127.0.0.1, 127.0.0.2",
-            "CloudFront-Viewer-Country": "US",
-            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-            "Upgrade-Insecure-Requests": "1",
-            "X-Forwarded-Port": "443",
-            "Host": "1234567890.execute-api.us-east-1.amazonaws.com",
-            "X-Forwarded-Proto": "https",
-            "X-Amz-Cf-Id": "aaaaaaaaaae3VYQb9jd-nvCd-de396Uhbp027Y2JvkCPNLmGJHqlaA==",
-            "CloudFront-Is-Tablet-Viewer": "false",
-            "Cache-Control": "max-age=0",
-            "User-Agent": "Custom User Agent String",
-            "CloudFront-Forwarded-Proto": "https",
-            "Accept-Encoding": "gzip, deflate, sdch",
-        },
-        "pathParameters": {"proxy": "/examplepath"},
-        "httpMethod": "POST",
-        "stageVariables": {"baz": "qux"},
-        "path": "/examplepath",
-    }
-
-
-def test_lambda_handler(apigw_event):
-
-    ret = app.lambda_handler(apigw_event, "")
-    data = json.loads(ret["body"])
-
-    assert ret["statusCode"] == 200
-    assert "message" in ret["body"]
-    assert data["message"] == "hello world"
+from ..pipeline import STAGES, Pipeline
+from audio_upload import app as upload_app
+
+
+def test_sessions_run_end_to_end_through_every_handler(monkeypatch):
+    pipeline = Pipeline()
+    pipeline.install(monkeypatch.setattr)
+
+    results = pipeline.run(sessions=12, concurrency=4)
+
+    assert [r.error for r in results] == [None] * 12
+    assert all(set(r.stages) == set(STAGES) for r in results)
+    assert len({r.session_id for r in results}) == 12
+    calls = pipeline.aws_calls()
+    assert calls["transcribe.start_transcription_job"] == 12
+    assert calls["bedrock.invoke_model"] == 12
+    for result in results:
+        item = pipeline.dynamodb.items[result.session_id]
+        assert item["status"] == {"S": "COMPLETED"}
+        assert "M" in item["extracted_info"]
+        assert (upload_app.BUCKET_NAME, item["results_key"]["S"]) in pipeline.s3.objects
+
+
+def test_failed_invocations_are_retried(monkeypatch):
+    pipeline = Pipeline()
+    pipeline.install(monkeypatch.setattr)
+    # Only transcription_processing reads objects for a non-WAV recording
+    pipeline.s3.inject_errors(0.4, seed=2, operations=("get_object",))
+
+    results = pipeline.run(sessions=10, concurrency=1)
+
+    assert pipeline.s3.injected_errors > 0
+    assert sum(r.attempts["transcription_processing"] - 1 for r in results) == pipeline.s3.injected_errors
+    for result in results:
+        status = pipeline.dynamodb.items[result.session_id]["status"]["S"]
+        if result.ok:
+            assert status == "COMPLETED"
+        else:
+            assert status == "PROCESSING_FAILED"
+            assert result.attempts["transcription_processing"] == 3
@@ -0,0 +1,104 @@
+import json
+
+import pytest
+
+from ..fakes import FakeBedrockRuntime, empty_extraction
+from bedrock_prompt import SYSTEM_PROMPT
+from pre_extractor import pre_extract
+from transcription_processing import app
+
+CONVERSATION = """CCE: Good morning! When is your due date?
+CUSTOMER: 14th March 2025.
+CCE: Which scans are done so far?
+CUSTOMER: EP scan, NT scan and the anomaly scan are done.
+CCE: Is it twins?
+CUSTOMER: No, single baby.
+CCE: Have you downloaded the Cloudnine app?
+CUSTOMER: Yes, I book through it.
+CCE: Do you have insurance?
+CUSTOMER: Yes, both from my company and my husband's, so two.
+CUSTOMER: My sister delivered at Motherhood Hospital."""
+
+
+def test_confident_fields_are_filled():
+    assert pre_extract(CONVERSATION, speaker_attributed=True) == {
+        "pregnancy_related": {"customer_edd": "2025-03-14", "scans_done": ["EP Scan", "NT Scan", "Anomaly Scan"],
+                              "having_twins": "no"},
+        "cloudnine_awareness": {"downloaded_app": True},
+        "insurance": {"insurance_status": "dual_insurance"},
+        "cce_observations": {"mentioned_competitors": True},
+    }
+
+
+@pytest.mark.parametrize("transcript, expected", [
+    ("CCE: आपकी डिलीवरी की तारीख क्या है?\nCUSTOMER: २५ मार्च २०२५", {"customer_edd": "2025-03-25"}),
+    ("CCE: Due date?\nCUSTOMER: 03/04/2025", {"customer_edd": "2025-04-03"}),
+    ("CCE: Which scans?\nCUSTOMER: ग्रोथ स्कैन दूसरा हो गया", {"scans_done": [
+        "EP Scan", "NT Scan", "Anomaly Scan", "Growth 1", "Growth 2"]}),
+    ("CCE: Twins ah?\nCUSTOMER: ஆமாம்", {"having_twins": "yes"}),
+    ("CCE: కవలలు ఆ?\nCUSTOMER: లేదు", {"having_twins": "no"}),
+    ("CCE: NT scan done?\nCUSTOMER: Haan ji", {"scans_done": ["EP Scan", "NT Scan"]}),
+])
+def test_multilingual_answers(transcript, expected):
+    assert pre_extract(transcript, speaker_attributed=True)["pregnancy_related"] == expected
+
+
+@pytest.mark.parametrize("transcript", [
+    # Scans still to come, answers that disagree, a date without a year
+    "CCE: Scans?\nCUSTOMER: NT scan done, anomaly scan next week.",
+    "CCE: Insurance?\nCUSTOMER: Yes.\nCCE: So you have insurance?\nCUSTOMER: No, not really.",
+    "CCE: When is the EDD?\nCUSTOMER: 14th March.",
+    # A statement, not a question, is not answered
+    "CCE: Our app has all your reports.\nCUSTOMER: Okay, yes.",
+])
+def test_unclear_fields_are_left_to_the_model(transcript):
+    assert pre_extract(transcript, speaker_attributed=True) == {}
+
+
+def test_flat_transcript_runs_only_the_date_and_competitor_rules():
+    flat = "My EDD is 14 March 2025. We also saw Rainbow Children's Hospital. Do you have insurance? Yes."
+    assert pre_extract(flat) == {"pregnancy_related": {"customer_edd": "2025-03-14"},
+                                 "cce_observations": {"mentioned_competitors": True}}
+
+
+@pytest.mark.parametrize("transcript, speaker_attributed", [
+    ("CUSTOMER: This is our rainbow baby after a loss.", True),
+    ("CUSTOMER: Motherhood has been tiring so far.", True),
+    ("CCE: Unlike Rainbow Hospital, our packages include the scans.\nCUSTOMER: Okay.", True),
+    # Flat: the sentence naming Apollo Cradle may be the CCE's
+    ("Unlike Apollo Cradle, we include the scans. Okay. It is our rainbow baby.", False),
+])
+def test_competitors_need_the_customer_or_a_hospital_name(transcript, speaker_attributed):
+    assert "cce_observations" not in pre_extract(transcript, speaker_attributed)
+
+
+@pytest.mark.parametrize("transcript, speaker_attributed", [
+    ("CUSTOMER: We also checked Apollo Cradle.", True),
+    ("CUSTOMER: We went to rainbow hospital last week.", True),
+    ("We went to the Rainbow Children's last week.", False),
+    ("CUSTOMER: रेनबो हॉस्पिटल गए थे", True),
+])
+def test_competitor_mentions(transcript, speaker_attributed):
+    assert pre_extract(transcript, speaker_attributed)["cce_observations"] == {"mentioned_competitors": True}
+
+
+def test_model_is_asked_only_for_the_other_fields(monkeypatch):
+    bedrock = FakeBedrockRuntime(responder=lambda payload: json.dumps({
+        **empty_extraction(),
+        "pregnancy_related": {"first_pregnancy": True, "having_twins": "yes"},
+        "insurance": {"insurance_status": "no"}}))
+    monkeypatch.setattr(app, "bedrock", bedrock)
+
+    extracted = app.extract_patient_info(CONVERSATION, speaker_attributed=True)
+
+    [request] = bedrock.requests
+    assert request["system"][0]["text"] == SYSTEM_PROMPT
+    message = request["messages"][0]["content"][0]["text"]
+    assert ("already known: pregnancy_related.customer_edd, pregnancy_related.scans_done, "
+            "pregnancy_related.having_twins, cloudnine_awareness.downloaded_app, insurance.insurance_status, "
+            "cce_observations.mentioned_competitors. Leave them") in message
+    # Rule results win over anything the model returns for them anyway
+    assert extracted["pregnancy_related"] == {"first_pregnancy": True, "having_twins": "no",
+                                              "customer_edd": "2025-03-14",
+                                              "scans_done": ["EP Scan", "NT Scan", "Anomaly Scan"]}
+    assert extracted["insurance"] == {"insurance_status": "dual_insurance"}
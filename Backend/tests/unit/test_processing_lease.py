@@ -0,0 +1,63 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from ..fakes import transcribe_output
+from ..pipeline import TRANSCRIPT, Pipeline
+from transcription_processing import app
+
+SESSION = "session-leased"
+EVENT = {"TranscriptionJobName": SESSION, "TranscriptionJobStatus": "COMPLETED"}
+WORKERS = 16
+
+
+@pytest.fixture()
+def pipeline(monkeypatch):
+    # Latency on every call keeps the duplicate invocations overlapping
+    pipeline = Pipeline(s3_latency=0.005, dynamodb_latency=0.005, bedrock_latency=0.05)
+    pipeline.install(monkeypatch.setattr)
+    pipeline.dynamodb.items[SESSION] = {"session_id": {"S": SESSION}, "transcription_uploads": {"N": "1"},
+                                        "status": {"S": "TRANSCRIPTION_IN_PROGRESS"}}
+    pipeline.s3.objects[(app.BUCKET_NAME, f"sessions/{SESSION}/output/{SESSION}.json")] = {
+        "Body": transcribe_output(SESSION, TRANSCRIPT)}
+    return pipeline
+
+
+def test_duplicate_events_at_once_call_bedrock_once(pipeline):
+    barrier = threading.Barrier(WORKERS)
+
+    def deliver(_):
+        barrier.wait()
+        return app.process_transcription_job(dict(EVENT))
+
+    with ThreadPoolExecutor(WORKERS) as executor:
+        results = list(executor.map(deliver, range(WORKERS)))
+
+    assert sum("sessionId" in r for r in results) == 1
+    assert pipeline.bedrock.calls["invoke_model"] == 1
+    assert pipeline.s3.calls["get_object"] == 1
+    item = pipeline.dynamodb.items[SESSION]
+    assert item["status"] == {"S": "COMPLETED"}
+    assert "processing_lease" not in item and "processing_lease_until" not in item
+
+    # A replay after completion stops at the lease as well
+    assert "sessionId" not in app.process_transcription_job(dict(EVENT))
+    assert pipeline.bedrock.calls["invoke_model"] == 1
+
+
+@pytest.mark.parametrize("expires_in, taken_over", [(-1, True), (300, False)])
+def test_lease_of_a_crashed_worker_is_taken_over_once_expired(pipeline, expires_in, taken_over):
+    pipeline.dynamodb.items[SESSION].update({
+        "status": {"S": "EXTRACTION_IN_PROGRESS"},
+        "processing_lease": {"S": "crashed-worker"},
+        "processing_lease_until": {"N": str(int(time.time()) + expires_in)},
+    })
+
+    result = app.process_transcription_job(dict(EVENT))
+
+    assert ("sessionId" in result) == taken_over
+    assert pipeline.bedrock.calls.get("invoke_model", 0) == int(taken_over)
+    status = pipeline.dynamodb.items[SESSION]["status"]["S"]
+    assert status == ("COMPLETED" if taken_over else "EXTRACTION_IN_PROGRESS")
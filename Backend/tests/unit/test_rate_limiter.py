@@ -0,0 +1,106 @@
+import pytest
+from botocore.exceptions import EventStreamError
+
+from ..fakes import FakeClientError, FakeDynamoDB
+from rate_limiter import BedrockLimiter, DynamoTokenBucket, LocalTokenBucket, RateLimitTimeout
+
+LIMIT_TABLE = "rate_limits_test"
+
+
+def shared_buckets(count, rate=1.0, capacity=3):
+    dynamodb = FakeDynamoDB(key_names={LIMIT_TABLE: "bucket_id"})
+    return [DynamoTokenBucket(dynamodb, LIMIT_TABLE, "bedrock", rate, capacity) for _ in range(count)], dynamodb
+
+
+def test_instances_share_one_bucket():
+    (first, second), dynamodb = shared_buckets(2, rate=0.001, capacity=3)
+
+    results = [first.reserve(), second.reserve(), first.reserve(), second.reserve()]
+
+    assert results[:3] == [0.0, 0.0, 0.0]
+    assert results[3] > 0
+    assert dynamodb.table(LIMIT_TABLE)["bedrock"]["version"] == {"N": "4"}
+
+    with pytest.raises(RateLimitTimeout):
+        first.reserve(max_wait=1.0)
+
+
+def test_lost_race_is_retried(monkeypatch):
+    (bucket,), dynamodb = shared_buckets(1)
+    bucket.reserve()
+    original_update = dynamodb.update_item
+    raced = []
+
+    def racing_update(**kwargs):
+        if not raced:
+            raced.append(1)
+            # Another instance takes a token between our read and write
+            original_update(
+                TableName=LIMIT_TABLE, Key={"bucket_id": {"S": "bedrock"}},
+                UpdateExpression="SET version = :v", ExpressionAttributeValues={":v": {"N": "99"}},
+            )
+        return original_update(**kwargs)
+
+    monkeypatch.setattr(dynamodb, "update_item", racing_update)
+
+    assert bucket.reserve() == 0.0
+    assert dynamodb.table(LIMIT_TABLE)["bedrock"]["version"] == {"N": "100"}
+
+
+def test_throttling_is_retried_with_backoff_and_raises_cost():
+    limiter = BedrockLimiter(None, LocalTokenBucket(1000, 1000), sleep=lambda seconds: None)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise FakeClientError("ThrottlingException")
+        return "ok"
+
+    assert limiter.call(flaky) == "ok"
+    assert limiter.stats["throttled"] == 2
+    assert 1.0 < limiter.cost < 4.0
+
+
+def test_other_errors_and_exhausted_retries_propagate():
+    limiter = BedrockLimiter(None, LocalTokenBucket(1000, 1000), max_attempts=2, sleep=lambda seconds: None)
+
+    with pytest.raises(FakeClientError):
+        limiter.call(lambda: (_ for _ in ()).throw(FakeClientError("ValidationException")))
+    with pytest.raises(FakeClientError):
+        limiter.call(lambda: (_ for _ in ()).throw(FakeClientError("ThrottlingException")))
+
+
+@pytest.mark.parametrize("code, retried", [
+    ("throttlingException", True),
+    ("serviceUnavailableException", True),
+    ("modelStreamErrorException", False),
+])
+def test_errors_raised_in_a_response_stream(code, retried):
+    limiter = BedrockLimiter(None, LocalTokenBucket(1000, 1000), max_attempts=2, sleep=lambda seconds: None)
+    calls = []
+
+    def read_stream():
+        calls.append(1)
+        if len(calls) == 1:
+            raise EventStreamError({"Error": {"Code": code, "Message": "stream failed"}},
+                                   "InvokeModelWithResponseStream")
+        return "content"
+
+    if retried:
+        assert limiter.call(read_stream) == "content" and len(calls) == 2
+    else:
+        with pytest.raises(EventStreamError):
+            limiter.call(read_stream)
+        assert len(calls) == 1
+
+
+def test_falls_back_to_local_bucket():
+    class BrokenBucket:
+        def reserve(self, cost=1.0, max_wait=None):
+            raise FakeClientError("ResourceNotFoundException")
+
+    limiter = BedrockLimiter(BrokenBucket(), LocalTokenBucket(1000, 1000))
+
+    assert limiter.call(lambda: "ok") == "ok"
+    assert limiter.stats["fallbacks"] == 1
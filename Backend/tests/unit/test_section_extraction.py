@@ -0,0 +1,112 @@
+import json
+import re
+
+import pytest
+
+from ..fakes import FakeBedrockRuntime, FakeDynamoDB, FakeS3, empty_extraction, transcribe_output
+from bedrock_prompt import SYSTEM_PROMPT
+from extraction_cache import ExtractionCache
+from extraction_schema import section_groups
+from transcription_processing import app
+
+ANSWER = {
+    **empty_extraction(),
+    "pregnancy_related": {"customer_edd": "2025-03-14", "first_pregnancy": True, "scans_done": ["NT Scan"],
+                          "having_twins": "no"},
+    "insurance": {"insurance_status": "no"},
+    "additional_insights": {"conversation_summary": "Asked about packages.", "key_concerns": [],
+                            "positive_signals": [], "package_interest": "signature"},
+}
+
+
+def asked_sections(payload):
+    return re.findall(r'^  "(\w+)": \{', payload["messages"][0]["content"][-1]["text"], re.MULTILINE)
+
+
+def answer_asked_sections(payload):
+    return json.dumps({name: ANSWER[name] for name in asked_sections(payload)})
+
+
+@pytest.fixture
+def section_mode(monkeypatch):
+    bedrock = FakeBedrockRuntime(responder=answer_asked_sections)
+    monkeypatch.setattr(app, "bedrock", bedrock)
+    monkeypatch.setattr(app, "EXTRACTION_MODE", "sections")
+    monkeypatch.setattr(app, "EXTRACTION_SECTION_GROUPS", section_groups("additional_insights;insurance,pregnancy_related"))
+    monkeypatch.setattr(app, "PRE_EXTRACTION_ENABLED", False)
+    return bedrock
+
+
+def test_each_group_is_asked_for_its_sections_only(section_mode):
+    extracted = app.extract_patient_info("CCE: hello")
+
+    assert extracted == ANSWER and list(extracted) == list(ANSWER)
+    asked = sorted(asked_sections(request) for request in section_mode.requests)
+    assert asked == [["additional_insights"], ["family_personal", "cloudnine_awareness", "cce_observations"],
+                     ["pregnancy_related", "insurance"]]
+    # Same system prompt and transcript part in every call, no cache marks without prompt caching
+    assert {request["system"][0]["text"] for request in section_mode.requests} == {SYSTEM_PROMPT}
+    assert len({json.dumps(request["messages"][0]["content"][0]) for request in section_mode.requests}) == 1
+    assert "cache_control" not in json.dumps([request["messages"] for request in section_mode.requests])
+
+
+def test_cached_prefix_is_written_by_the_first_group(section_mode, monkeypatch):
+    monkeypatch.setattr(app, "SYSTEM_BLOCKS", [{**app.SYSTEM_BLOCKS[0], "cache_control": {"type": "ephemeral"}}])
+
+    assert app.extract_patient_info("CCE: hello") == ANSWER
+
+    first, *others = section_mode.requests
+    assert asked_sections(first) == ["additional_insights"]
+    assert section_mode.calls == {"invoke_model_with_response_stream": 1, "invoke_model": 2}
+    transcript, sections = first["messages"][0]["content"]
+    assert "CCE: hello" in transcript["text"] and transcript["cache_control"] == {"type": "ephemeral"}
+    assert "cache_control" not in sections
+
+
+def test_known_sections_are_not_asked_for_and_failed_groups_listed_as_incomplete(section_mode, monkeypatch):
+    def responder(payload):
+        if "additional_insights" in asked_sections(payload):
+            raise Exception("ModelTimeoutException")
+        return answer_asked_sections(payload)
+
+    section_mode.responder = responder
+    monkeypatch.setattr(app, "PRE_EXTRACTION_ENABLED", True)
+
+    extracted = app.extract_patient_info("CCE: Is it twins?\nCUSTOMER: No.\nCCE: Insurance?\nCUSTOMER: No.",
+                                         speaker_attributed=True)
+
+    assert "additional_insights" not in extracted
+    assert extracted[app.INCOMPLETE_SECTIONS] == ["additional_insights"]
+    assert extracted["insurance"] == {"insurance_status": "no"}
+    assert ["pregnancy_related"] in [asked_sections(request) for request in section_mode.requests]
+
+
+def test_failed_group_is_not_cached_and_fails_the_job(section_mode, monkeypatch):
+    s3, dynamodb = FakeS3(), FakeDynamoDB(key_names={"extraction_cache_test": "cache_key"})
+    monkeypatch.setattr(app, "s3", s3)
+    monkeypatch.setattr(app, "dynamodb", dynamodb)
+    monkeypatch.setattr(app, "extraction_cache", ExtractionCache(dynamodb, "extraction_cache_test", 3600))
+    s3.put_object(Bucket=app.BUCKET_NAME, Key="sessions/session-a/output/session-a.json",
+                  Body=transcribe_output("session-a", "hello"))
+
+    def responder(payload):
+        if "pregnancy_related" in asked_sections(payload):
+            raise Exception("ModelTimeoutException")
+        return answer_asked_sections(payload)
+
+    section_mode.responder = responder
+
+    with pytest.raises(app.IncompleteExtraction, match="pregnancy_related, insurance"):
+        app.process_transcription_job({"TranscriptionJobName": "session-a", "TranscriptionJobStatus": "COMPLETED"})
+
+    assert dynamodb.table("extraction_cache_test") == {}
+    assert dynamodb.items["session-a"]["status"] == {"S": "PROCESSING_FAILED"}
+
+
+def test_section_groups():
+    assert section_groups("insurance; ;pregnancy_related,family_personal")[:2] == [
+        ["insurance"], ["pregnancy_related", "family_personal"]]
+    assert section_groups("insurance")[1] == ["pregnancy_related", "family_personal", "cloudnine_awareness",
+                                              "cce_observations", "additional_insights"]
+    with pytest.raises(ValueError):
+        section_groups("insurance,pregnancy")
@@ -0,0 +1,42 @@
+from ..fakes import FakeDynamoDB
+from common.session_changes import markers_from_stream
+from session_notifier import app
+
+
+def stream_record(event_name, session_id, **attributes):
+    image = {"session_id": {"S": session_id}, **{k: {"S": v} for k, v in attributes.items()}}
+    return {
+        "eventName": event_name,
+        "dynamodb": {"Keys": {"session_id": {"S": session_id}}, "NewImage": image},
+    }
+
+
+def test_latest_change_per_session_wins():
+    markers = markers_from_stream([
+        stream_record("INSERT", "session-a", status="UPLOAD_URL_GENERATED"),
+        stream_record("MODIFY", "session-a", status="TRANSCRIPTION_IN_PROGRESS", transcription_output="long"),
+        stream_record("MODIFY", "session-b", status="COMPLETED"),
+        {"eventName": "REMOVE", "dynamodb": {"Keys": {"session_id": {"S": "session-b"}}}},
+    ])
+
+    assert markers == {
+        "session-a": {"session_id": {"S": "session-a"}, "status": {"S": "TRANSCRIPTION_IN_PROGRESS"}},
+        "session-b": None,
+    }
+
+
+def test_handler_writes_and_deletes_markers(monkeypatch):
+    dynamodb = FakeDynamoDB()
+    monkeypatch.setattr(app, "dynamodb", dynamodb)
+    markers = dynamodb.table(app.CHANGES_TABLE)
+    markers["session-old"] = {"session_id": {"S": "session-old"}}
+
+    result = app.lambda_handler({"Records": [
+        stream_record("MODIFY", "session-a", status="COMPLETED"),
+        {"eventName": "REMOVE", "dynamodb": {"Keys": {"session_id": {"S": "session-old"}}}},
+    ]}, None)
+
+    assert result == {"records": 2, "markers_written": 2}
+    assert markers["session-a"]["status"] == {"S": "COMPLETED"}
+    assert "expires_at" in markers["session-a"]
+    assert "session-old" not in markers
@@ -0,0 +1,97 @@
+import copy
+import json
+import os
+
+import pytest
+
+from ..fakes import FakeDynamoDB, FakeS3
+from common.session_results import from_attribute, read_results, results_key
+from migrations.session_results import migrate_item
+
+TABLE, BUCKET = os.environ["SESSION_TABLE"], "cloudnine-cce"
+EXTRACTED = {"pregnancy_related": {"customer_edd": "2025-03-14", "scans_done": ["NT Scan"]},
+             "insurance": {"insurance_status": "no"}, "cce_observations": {"score": 7.5}}
+TRANSCRIPT = "CCE: When is the due date?\nCUSTOMER: March.\n" * 50
+
+
+@pytest.fixture()
+def stores():
+    dynamodb, s3 = FakeDynamoDB(), FakeS3()
+    dynamodb.items["session-1"] = {
+        "session_id": {"S": "session-1"},
+        "status": {"S": "COMPLETED"},
+        "updated_at": {"N": "1700000000"},
+        "transcription_job_name": {"S": "session-1-2"},
+        "extracted_info": {"S": json.dumps(EXTRACTED)},
+        "partial_extracted_info": {"S": "not json"},
+        "transcription_output": {"S": TRANSCRIPT},
+    }
+    return dynamodb, s3
+
+
+def scanned(dynamodb):
+    return copy.deepcopy(dynamodb.items["session-1"])
+
+
+def test_json_strings_become_native_maps(stores):
+    dynamodb, s3 = stores
+
+    before, after = migrate_item(dynamodb, s3, TABLE, BUCKET, scanned(dynamodb))
+
+    item = dynamodb.items["session-1"]
+    assert "M" in item["extracted_info"] and from_attribute(item["extracted_info"]) == EXTRACTED
+    # Not JSON: left as the string it was
+    assert item["partial_extracted_info"] == {"S": "not json"}
+    assert item["revision"] == {"N": "1"} and after < before
+
+
+def test_transcript_moves_to_the_results_object(stores):
+    dynamodb, s3 = stores
+
+    migrate_item(dynamodb, s3, TABLE, BUCKET, scanned(dynamodb))
+
+    item = dynamodb.items["session-1"]
+    assert "transcription_output" not in item
+    assert item["results_key"] == {"S": results_key("session-1", "session-1-2")}
+    results = read_results(s3, BUCKET, item["results_key"]["S"])
+    assert results["transcript"] == TRANSCRIPT and results["model_output"] == []
+
+
+def test_session_written_since_the_scan_is_left_alone(stores):
+    dynamodb, s3 = stores
+    item = scanned(dynamodb)
+    # A handler writes the session between the scan and the rewrite
+    dynamodb.items["session-1"].update({"updated_at": {"N": "1700000060"}, "revision": {"N": "1"},
+                                        "extracted_info": {"S": json.dumps({"insurance": {}})}})
+    written = copy.deepcopy(dynamodb.items["session-1"])
+
+    assert migrate_item(dynamodb, s3, TABLE, BUCKET, item) is None
+    assert dynamodb.items["session-1"] == written
+
+    # Same second, but a later revision: still the handler's write
+    item = scanned(dynamodb)
+    dynamodb.items["session-1"]["revision"] = {"N": "2"}
+    assert migrate_item(dynamodb, s3, TABLE, BUCKET, item) is None
+    assert dynamodb.items["session-1"]["extracted_info"] == written["extracted_info"]
+
+
+def test_running_again_changes_nothing(stores):
+    dynamodb, s3 = stores
+    assert migrate_item(dynamodb, s3, TABLE, BUCKET, scanned(dynamodb))
+    migrated, objects = scanned(dynamodb), dict(s3.objects)
+    updates = dynamodb.calls["update_item"]
+
+    assert migrate_item(dynamodb, s3, TABLE, BUCKET, scanned(dynamodb)) is None
+    assert dynamodb.items["session-1"] == migrated and s3.objects == objects
+    assert dynamodb.calls["update_item"] == updates
+
+
+def test_dry_run_writes_nothing(stores):
+    dynamodb, s3 = stores
+    item = scanned(dynamodb)
+
+    before, after = migrate_item(dynamodb, s3, TABLE, BUCKET, item, dry_run=True)
+
+    assert after < before
+    assert dynamodb.items["session-1"] == item and s3.objects == {}
+    assert "update_item" not in dynamodb.calls
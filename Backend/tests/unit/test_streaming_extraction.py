@@ -0,0 +1,114 @@
+import json
+
+import pytest
+from botocore.exceptions import EventStreamError
+
+from ..fakes import FakeBedrockRuntime, FakeDynamoDB, FakeS3, empty_extraction, transcribe_output
+from common.session_results import from_attribute
+from section_stream import SectionStreamParser
+from transcription_processing import app
+
+ANSWER = {
+    **empty_extraction(),
+    "pregnancy_related": {"customer_edd": "2025-03-01", "scans_done": ["NT Scan"]},
+    "insurance": {"insurance_status": "no"},
+    "additional_insights": {"conversation_summary": "Braces } and \"quotes\" {", "key_concerns": []},
+}
+
+
+@pytest.mark.parametrize("step", [1, 5, 10000])
+def test_parser_emits_sections_as_they_close(step):
+    text = "```json\n" + json.dumps(ANSWER, indent=2) + "\n```"
+    parser = SectionStreamParser()
+
+    seen = []
+    for start in range(0, len(text), step):
+        seen.extend(parser.feed(text[start:start + step]))
+
+    assert seen == list(ANSWER.items())
+
+
+def test_streaming_publishes_partial_sections(monkeypatch):
+    s3, dynamodb = FakeS3(), FakeDynamoDB()
+    bedrock = FakeBedrockRuntime(responder=lambda payload: json.dumps(ANSWER))
+    monkeypatch.setattr(app, "s3", s3)
+    monkeypatch.setattr(app, "dynamodb", dynamodb)
+    monkeypatch.setattr(app, "bedrock", bedrock)
+    monkeypatch.setattr(app, "STREAMING_EXTRACTION_ENABLED", True)
+    s3.put_object(
+        Bucket=app.BUCKET_NAME,
+        Key="sessions/session-a/output/session-a.json",
+        Body=transcribe_output("session-a", "hello"),
+    )
+
+    published = []
+    original_update = dynamodb.update_item
+
+    def recording_update(**kwargs):
+        published.append(kwargs["ExpressionAttributeValues"].get(":partial"))
+        return original_update(**kwargs)
+
+    monkeypatch.setattr(dynamodb, "update_item", recording_update)
+
+    app.process_transcription_job({"TranscriptionJobName": "session-a", "TranscriptionJobStatus": "COMPLETED"})
+
+    partials = [from_attribute(p) for p in published if p]
+    assert [list(p) for p in partials] == [list(ANSWER)[:i + 1] for i in range(len(ANSWER))]
+    item = dynamodb.items["session-a"]
+    assert item["status"] == {"S": "COMPLETED"}
+    assert from_attribute(item["extracted_info"]) == ANSWER
+    assert "partial_extracted_info" not in item
+    assert bedrock.calls == {"invoke_model_with_response_stream": 1}
+
+
+def stream_failure(code):
+    """A response stream that fails like botocore's on an error event"""
+    yield from ()
+    raise EventStreamError({"Error": {"Code": code, "Message": "Too many tokens"}}, "InvokeModelWithResponseStream")
+
+
+def test_throttled_stream_is_retried(monkeypatch):
+    bedrock = FakeBedrockRuntime(responder=lambda payload: json.dumps(ANSWER))
+    stream = bedrock.invoke_model_with_response_stream
+
+    def throttled_once(**kwargs):
+        if bedrock.calls.get("invoke_model_with_response_stream"):
+            return stream(**kwargs)
+        bedrock._record("invoke_model_with_response_stream")
+        return {"body": stream_failure("throttlingException")}
+
+    monkeypatch.setattr(bedrock, "invoke_model_with_response_stream", throttled_once)
+    monkeypatch.setattr(app, "bedrock", bedrock)
+    monkeypatch.setattr(app.bedrock_limiter, "sleep", lambda seconds: None)
+    monkeypatch.setattr(app, "PRE_EXTRACTION_ENABLED", False)
+
+    published = []
+    assert app.extract_patient_info("CCE: hello", on_section=lambda name, value: published.append(name)) == ANSWER
+    assert bedrock.calls == {"invoke_model_with_response_stream": 2}
+    assert published == list(ANSWER)
+
+
+def test_publishing_stops_once_the_lease_is_lost(monkeypatch):
+    dynamodb = FakeDynamoDB()
+    monkeypatch.setattr(app, "dynamodb", dynamodb)
+    dynamodb.items["session-a"] = {"session_id": {"S": "session-a"}, "processing_lease": {"S": "lease-1"},
+                                   "transcription_uploads": {"N": "2"}}
+    calls = dynamodb.calls
+    publish = app.section_publisher("session-a", 2, "lease-1")
+
+    publish("insurance", {"insurance_status": "no"})
+    assert from_attribute(dynamodb.items["session-a"]["partial_extracted_info"]) == {
+        "insurance": {"insurance_status": "no"}}
+
+    # Another invocation took the session over
+    dynamodb.items["session-a"]["processing_lease"] = {"S": "lease-2"}
+    publish("pregnancy_related", {"scans_done": []})
+    publish("additional_insights", {"key_concerns": []})
+    assert list(from_attribute(dynamodb.items["session-a"]["partial_extracted_info"])) == ["insurance"]
+    assert calls["update_item"] == 2
+
+    # Nor does a job of an earlier upload publish
+    stale = app.section_publisher("session-a", 1, "lease-2")
+    stale("insurance", {"insurance_status": "yes"})
+    assert from_attribute(dynamodb.items["session-a"]["partial_extracted_info"]) == {
+        "insurance": {"insurance_status": "no"}}
@@ -0,0 +1,73 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from ..pipeline import Pipeline
+from common import telemetry
+
+
+def records(capsys):
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith("{")]
+
+
+def metric_documents(capsys):
+    return [r for r in records(capsys) if "_aws" in r]
+
+
+def test_trace_emits_one_embedded_metrics_document(capsys):
+    with telemetry.trace("transcription_processing", "session-a", job_name="session-a"):
+        with telemetry.span("s3_fetch"):
+            pass
+        telemetry.metric("bedrock_input_tokens", 1200)
+        with ThreadPoolExecutor(2) as executor:
+            list(executor.map(telemetry.propagate(lambda n: telemetry.metric("bedrock_input_tokens", n)), [5, 7]))
+
+    [document] = metric_documents(capsys)
+    definition = document["_aws"]["CloudWatchMetrics"][0]
+    assert definition["Dimensions"] == [["function"]]
+    assert {m["Name"]: m["Unit"] for m in definition["Metrics"]} == {
+        "s3_fetch_ms": "Milliseconds", "bedrock_input_tokens": "Count", "duration_ms": "Milliseconds"}
+    assert sorted(document["bedrock_input_tokens"]) == [5, 7, 1200]
+    assert document["function"] == "transcription_processing"
+    assert document["session_id"] == "session-a" and document["job_name"] == "session-a"
+
+
+def test_unsampled_traces_are_silent_unless_they_fail(capsys, monkeypatch):
+    monkeypatch.setattr(telemetry, "METRICS_SAMPLE_RATE", 0.0)
+    with telemetry.trace("get_session", "session-a"):
+        telemetry.metric("reads", 1)
+    assert metric_documents(capsys) == []
+
+    with pytest.raises(KeyError):
+        with telemetry.trace("get_session", "session-b"):
+            raise KeyError("boom")
+    [document] = metric_documents(capsys)
+    assert document["error"] == "KeyError" and document["errors"] == 1
+
+
+def test_log_level_and_session_context(capsys, monkeypatch):
+    monkeypatch.setattr(telemetry, "LOG_LEVEL", "INFO")
+    with telemetry.trace("transcribe_audio"):
+        telemetry.bind("session-c")
+        telemetry.debug("Event", event={"large": "x" * 1000})
+        telemetry.info("Transcription job started", job_name="session-c")
+
+    logs = [r for r in records(capsys) if "_aws" not in r]
+    assert logs == [{"level": "INFO", "message": "Transcription job started", "function": "transcribe_audio",
+                     "session_id": "session-c", "job_name": "session-c"}]
+
+
+def test_every_function_reports_its_stages_for_the_session(capsys, monkeypatch):
+    pipeline = Pipeline()
+    pipeline.install(monkeypatch.setattr)
+
+    [result] = pipeline.run(sessions=1, concurrency=1)
+
+    documents = {d["function"]: d for d in metric_documents(capsys) if d["session_id"] == result.session_id}
+    assert set(documents) == {"audio_upload", "transcribe_audio", "transcription_processing", "get_session"}
+    processing = documents["transcription_processing"]
+    for name in ("s3_fetch_ms", "parse_ms", "prompt_build_ms", "bedrock_call_ms", "dynamodb_write_ms",
+                 "bedrock_input_tokens", "bedrock_output_tokens", "bedrock_request_bytes"):
+        assert name in processing
+    assert "asr_start_ms" in documents["transcribe_audio"]
@@ -0,0 +1,116 @@
+import json
+
+import pytest
+
+from ..fakes import transcribe_output
+from ..pipeline import TRANSCRIPT, Pipeline
+from transcribe_audio import app
+from transcription_processing import app as processing_app
+
+
+@pytest.fixture()
+def pipeline(monkeypatch):
+    pipeline = Pipeline()
+    pipeline.install(monkeypatch.setattr)
+    return pipeline
+
+
+def session(pipeline, session_id, *languages):
+    pipeline.dynamodb.items[session_id] = {"session_id": {"S": session_id}, "status": {"S": "UPLOADING"},
+                                           "language_preferences": {"L": [{"S": l} for l in languages]}}
+    key = f"sessions/{session_id}/input/audio.mp3"
+    pipeline.s3.objects[(app.BUCKET_NAME, key)] = {"Body": b"ID3" + bytes(64)}
+    return key
+
+
+def record(key, sequencer="0A"):
+    return {"s3": {"bucket": {"name": app.BUCKET_NAME}, "object": {"key": key, "sequencer": sequencer}}}
+
+
+def handle(*records):
+    return json.loads(app.lambda_handler({"Records": list(records)}, None)["body"])["records"]
+
+
+def complete(pipeline, job_name):
+    params = pipeline.transcribe.jobs[job_name]
+    pipeline.s3.objects[(params["OutputBucketName"], f"{params['OutputKey']}{job_name}.json")] = {
+        "Body": transcribe_output(job_name, TRANSCRIPT)}
+    return processing_app.process_transcription_job({"TranscriptionJobName": job_name,
+                                                     "TranscriptionJobStatus": "COMPLETED"})
+
+
+def test_every_record_is_started_from_one_batched_read(pipeline):
+    keys = [session(pipeline, "session-a", "en-IN"), session(pipeline, "session-b", "hi-IN"),
+            session(pipeline, "session-c", "ta-IN", "en-IN")]
+
+    results = handle(*map(record, keys), record(keys[0]))
+
+    assert [(r["sessionId"], r["status"]) for r in results] == [
+        ("session-a", "started"), ("session-b", "started"), ("session-c", "started")]
+    assert pipeline.dynamodb.calls["batch_get_item"] == 1
+    assert "get_item" not in pipeline.dynamodb.calls
+    jobs = pipeline.transcribe.jobs
+    assert sorted(jobs) == ["session-a", "session-b", "session-c"]
+    assert jobs["session-b"]["LanguageCode"] == "hi-IN"
+    assert jobs["session-c"]["LanguageOptions"] == ["ta-IN", "en-IN"]
+    assert all(pipeline.dynamodb.items[s]["status"] == {"S": "TRANSCRIPTION_IN_PROGRESS"} for s in jobs)
+
+
+def test_redelivered_event_does_not_start_again_or_fail(pipeline):
+    keys = [session(pipeline, "session-a", "en-IN"), session(pipeline, "session-b", "en-IN")]
+    pipeline.transcribe.inject_errors(1.0, operations=("start_transcription_job",))
+
+    with pytest.raises(app.RecordsFailed, match="2 of 2 records failed"):
+        handle(*map(record, keys))
+    pipeline.transcribe.inject_errors(0.0)
+
+    # The retry starts the jobs the failed attempt claimed but did not start
+    assert [r["status"] for r in handle(*map(record, keys))] == ["already_started"] * 2
+    assert sorted(pipeline.transcribe.jobs) == ["session-a", "session-b"]
+    # A job that exists already counts as started
+    assert [r["status"] for r in handle(*map(record, keys))] == ["already_started"] * 2
+    assert pipeline.transcribe.calls["start_transcription_job"] == 6
+
+    complete(pipeline, "session-a")
+    [result] = handle(record(keys[0]))
+    assert result["status"] == "already_started" and result["sessionStatus"] == "COMPLETED"
+    assert pipeline.transcribe.calls["start_transcription_job"] == 6
+
+
+def test_reupload_gets_a_new_job_and_stale_results_are_ignored(pipeline):
+    key = session(pipeline, "session-a", "en-IN")
+    handle(record(key, "01"))
+    item = pipeline.dynamodb.items["session-a"]
+    item["status"] = {"S": "PROCESSING_FAILED"}
+
+    [result] = handle(record(key, "02"))
+
+    assert result["status"] == "started" and result["jobName"] == "session-a.upload-2"
+    assert item["transcription_job_name"] == {"S": "session-a.upload-2"}
+    assert item["status"] == {"S": "TRANSCRIPTION_IN_PROGRESS"} and "error_message" not in item
+
+    # The first upload's job finishing late does not touch the session
+    assert "sessionId" not in complete(pipeline, "session-a")
+    assert item["status"] == {"S": "TRANSCRIPTION_IN_PROGRESS"}
+    assert "invoke_model" not in pipeline.bedrock.calls
+
+    assert complete(pipeline, "session-a.upload-2")["sessionId"] == "session-a"
+    assert item["status"] == {"S": "COMPLETED"}
+    assert (app.BUCKET_NAME, "sessions/session-a/output/session-a.upload-2.json") in pipeline.s3.objects
+
+
+def test_only_uploads_and_normalizer_hand_overs_start_a_session(pipeline):
+    key = session(pipeline, "session-a", "en-IN")
+    chunk, normalized = "sessions/session-a/chunks/000.wav", "sessions/session-a/normalized/audio.wav"
+    for other in (chunk, normalized):
+        pipeline.s3.objects[(app.BUCKET_NAME, other)] = {"Body": b"RIFF" + bytes(64)}
+
+    body = json.loads(app.lambda_handler({"Records": [record(chunk), record(normalized)]}, None)["body"])
+    assert body == {"records": [], "skipped": [chunk, normalized]}
+    assert pipeline.transcribe.jobs == {}
+
+    handover = {"eventSource": "audio_normalizer", **record(chunk)}
+    assert handle(handover) == [] and pipeline.transcribe.jobs == {}
+
+    [result] = handle(record(key))
+    assert result["status"] == "started" and list(pipeline.transcribe.jobs) == ["session-a"]
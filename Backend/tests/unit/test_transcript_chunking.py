@@ -0,0 +1,67 @@
+from transcript_chunking import chunk_transcript, merge_extractions
+from transcription_processing import app
+
+
+def test_windows_overlap_and_respect_turns():
+    transcript = "\n".join(f"spk_{i % 2}: turn number {i} of the session." for i in range(40))
+
+    windows = chunk_transcript(transcript, max_chars=200, overlap_turns=2)
+
+    assert len(windows) > 1
+    assert all(len(window) <= 200 for window in windows)
+    for previous, current in zip(windows, windows[1:]):
+        assert previous.splitlines()[-2:] == current.splitlines()[:2]
+    joined = "\n".join(windows)
+    assert all(f"turn number {i} " in joined for i in range(40))
+
+
+def test_flat_transcript_splits_on_sentences():
+    transcript = "This is a sentence. " * 50
+
+    windows = chunk_transcript(transcript, max_chars=100, overlap_turns=1)
+
+    assert all(window.endswith(".") for window in windows)
+
+
+def test_merge_rules():
+    partials = [
+        {
+            "pregnancy_related": {"customer_edd": "2025-03-01", "scans_done": ["NT Scan"], "first_pregnancy": None},
+            "cce_observations": {"mentioned_competitors": True, "transport_method": "unknown"},
+            "additional_insights": {"conversation_summary": "Asked about dates.", "key_concerns": ["cost"]},
+        },
+        {
+            "pregnancy_related": {"customer_edd": None, "scans_done": ["Anomaly Scan"], "first_pregnancy": True},
+            "cce_observations": {"mentioned_competitors": False, "transport_method": "cab"},
+            "additional_insights": {"conversation_summary": "Discussed packages.", "key_concerns": ["Cost", "parking"]},
+        },
+        {
+            "pregnancy_related": {"scans_done": []},
+        },
+    ]
+
+    merged = merge_extractions(partials)
+
+    assert merged["pregnancy_related"] == {
+        "customer_edd": "2025-03-01",
+        "scans_done": ["EP Scan", "NT Scan", "Anomaly Scan"],
+        "first_pregnancy": True,
+    }
+    assert merged["cce_observations"] == {"mentioned_competitors": True, "transport_method": "cab"}
+    assert merged["additional_insights"]["conversation_summary"] == "Asked about dates. Discussed packages."
+    assert merged["additional_insights"]["key_concerns"] == ["cost", "parking"]
+
+
+def test_short_transcripts_use_single_call(monkeypatch):
+    prompts = []
+    monkeypatch.setattr(app, "_extract_from_prompt", lambda message, *args, **kwargs: prompts.append(message()) or {})
+    monkeypatch.setattr(app, "CHUNKED_EXTRACTION_MIN_CHARS", 1000)
+    monkeypatch.setattr(app, "CHUNK_MAX_CHARS", 400)
+
+    app.extract_patient_info("Short conversation.")
+    assert len(prompts) == 1
+
+    prompts.clear()
+    app.extract_patient_info("A longer sentence about the pregnancy. " * 60)
+    assert len(prompts) > 1
+    assert all("part " in prompt for prompt in prompts)
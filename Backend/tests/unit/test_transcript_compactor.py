@@ -0,0 +1,40 @@
+from transcript_compactor import compact_transcript
+from transcript_reader import TranscriptItem
+
+
+def words(speaker, text):
+    items = []
+    for token in text.split():
+        punctuation = token[-1] if token[-1] in ".?," else ""
+        items.append(TranscriptItem("pronunciation", token.rstrip(".?,"), 0.0, speaker))
+        if punctuation:
+            items.append(TranscriptItem("punctuation", punctuation, None, speaker))
+    return items
+
+
+def test_turns_are_merged_labelled_and_cleaned():
+    items = (
+        words("spk_1", "Hello madam.")
+        + words("spk_1", "What is your due date?")
+        + words("spk_0", "Um it is it is in March.")
+        + words("spk_0", "I I think uh the 10th.")
+        + words("spk_1", "Is this your first pregnancy?")
+        + words("spk_0", "Yes.")
+    )
+    flat = "Hello madam. What is your due date? Um it is it is in March. I I think uh the 10th. Is this your first pregnancy? Yes."
+
+    compact = compact_transcript(items, flat)
+
+    assert compact.text.splitlines() == [
+        "CCE: Hello madam. What is your due date?",
+        "CUSTOMER: it is in March. I think the 10th.",
+        "CCE: Is this your first pregnancy?",
+        "CUSTOMER: Yes.",
+    ]
+    assert compact.turns == 4
+    assert compact.original_tokens > 0 and compact.compact_tokens > 0
+
+
+def test_unlabelled_items_fall_back_to_flat_transcript():
+    assert compact_transcript(words(None, "Hello there."), "Hello there.") is None
+    assert compact_transcript([], "") is None
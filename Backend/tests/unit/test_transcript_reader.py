@@ -0,0 +1,123 @@
+import io
+import json
+
+import pytest
+
+from transcript_reader import TranscriptFormatError, read_transcript
+
+
+def transcribe_document(transcript, words=50):
+    items = [
+        {
+            "start_time": str(i), "end_time": str(i + 0.5), "type": "pronunciation",
+            "alternatives": [{"confidence": "0.99", "content": "w{o}rd [x] \"q\""}],
+            "speaker_label": f"spk_{i % 2}",
+        }
+        for i in range(words)
+    ]
+    return {
+        "jobName": "session-a",
+        "accountId": "123",
+        "results": {
+            "transcripts": [{"transcript": transcript}],
+            "speaker_labels": {
+                "channel_label": "ch_0", "speakers": 2,
+                "segments": [{"start_time": "0.0", "end_time": "1.0", "speaker_label": "spk_0", "items": []}],
+            },
+            "items": items,
+        },
+        "status": "COMPLETED",
+    }
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64 * 1024])
+def test_matches_full_parse(chunk_size):
+    document = transcribe_document("नमस्ते, \"due\" date is {March} \\ [ok]")
+    raw = json.dumps(document, ensure_ascii=False).encode("utf-8")
+
+    result = read_transcript(io.BytesIO(raw), speaker_segments=True, chunk_size=chunk_size)
+
+    assert result.transcript == document["results"]["transcripts"][0]["transcript"]
+    assert result.speaker_segments == document["results"]["speaker_labels"]["segments"]
+
+
+def test_items_after_transcript_are_never_read():
+    document = transcribe_document("hello", words=5000)
+    raw = json.dumps(document).encode("utf-8")
+    body = io.BytesIO(raw)
+
+    assert read_transcript(body, chunk_size=1024).transcript == "hello"
+    assert body.tell() < len(raw) // 10
+
+
+def test_items_before_transcript_are_skipped():
+    document = transcribe_document("hello")
+    results = document["results"]
+    document["results"] = {"items": results["items"], "transcripts": results["transcripts"]}
+
+    assert read_transcript(io.BytesIO(json.dumps(document).encode()), chunk_size=13).transcript == "hello"
+
+
+@pytest.mark.parametrize("items", [False, True])
+def test_missing_transcript_raises(items):
+    with pytest.raises(TranscriptFormatError):
+        read_transcript(io.BytesIO(b'{"results": {"items": []}}'), items=items)
+    with pytest.raises(TranscriptFormatError):
+        read_transcript(io.BytesIO(b'{"results": {"transcripts": [{"transcript": "cut'), items=items)
+
+
+def test_items_resolve_speakers_from_segments():
+    document = {
+        "results": {
+            "transcripts": [{"transcript": "Hello. Hi"}],
+            "speaker_labels": {"segments": [
+                {"start_time": "0.0", "end_time": "1.0", "speaker_label": "spk_0", "items": []},
+                {"start_time": "1.0", "end_time": "2.0", "speaker_label": "spk_1", "items": []},
+            ]},
+            "items": [
+                {"start_time": "0.1", "type": "pronunciation", "alternatives": [{"content": "Hello"}]},
+                {"type": "punctuation", "alternatives": [{"content": "."}]},
+                {"start_time": "1.2", "type": "pronunciation", "alternatives": [{"content": "Hi"}]},
+            ],
+        }
+    }
+
+    result = read_transcript(io.BytesIO(json.dumps(document).encode()), items=True, chunk_size=16)
+
+    assert [(item.content, item.speaker) for item in result.items] == [
+        ("Hello", "spk_0"), (".", "spk_0"), ("Hi", "spk_1"),
+    ]
+    assert result.speaker_segments is None
+
+
+@pytest.mark.parametrize("chunk_size", [7, 64, 64 * 1024])
+def test_items_with_segments_match_full_parse(chunk_size):
+    document = transcribe_document("hello", words=20)
+    document["results"]["items"][3]["alternatives"][0]["content"] = 'say "हाँ" {or} [no]\\'
+    raw = json.dumps(document).encode("utf-8")
+
+    result = read_transcript(io.BytesIO(raw), speaker_segments=True, items=True, chunk_size=chunk_size)
+
+    assert result.transcript == "hello"
+    assert result.speaker_segments == document["results"]["speaker_labels"]["segments"]
+    assert [(item.content, item.start_time, item.speaker) for item in result.items] == [
+        (item["alternatives"][0]["content"], float(item["start_time"]), item["speaker_label"])
+        for item in document["results"]["items"]
+    ]
+
+
+def test_items_are_read_in_chunks():
+    raw = json.dumps(transcribe_document("hello", words=5000)).encode("utf-8")
+
+    class Body(io.BytesIO):
+        reads = []
+
+        def read(self, size=-1):
+            self.reads.append(size)
+            return super().read(size)
+
+    body = Body(raw)
+    result = read_transcript(body, items=True, chunk_size=4096)
+
+    assert len(result.items) == 5000
+    assert len(body.reads) > len(raw) // 4096 and all(0 < size <= 4096 for size in body.reads)
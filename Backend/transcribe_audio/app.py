@@ -1,119 +1,445 @@
 import json
 import os
-import boto3
+import random
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import unquote_plus
-from botocore.exceptions import ClientError
+from common.aws_clients import lazy_client
+from common.chunk_manifest import chunk_job_name, chunk_key, chunk_output_prefix, manifest_key, upload_job_name
+from common.telemetry import bind, debug, error, info, metric, span, trace, warning
+from audio_chunker import UnsupportedAudio, map_chunks, plan_chunks
+from asr_engines import AsrRequest, SarvamEngine, TranscribeEngine, choose_engine
 
 REGION = os.environ.get("REGION", "ap-south-1")
 TABLE_NAME = os.environ.get("SESSION_TABLE", "cce_sessions")
 BUCKET_NAME = os.environ.get("BUCKET_NAME", "cloudnine-cce")
 
-dynamodb = boto3.client("dynamodb", region_name=REGION)
-transcribe = boto3.client("transcribe", region_name=REGION)
+# Records of one event are started concurrently, their sessions read
+# together with BatchGetItem (at most 100 keys per call)
+RECORD_MAX_WORKERS = int(os.environ.get("RECORD_MAX_WORKERS", "8"))
+BATCH_GET_SIZE = 100
+BATCH_GET_MAX_ATTEMPTS = int(os.environ.get("BATCH_GET_MAX_ATTEMPTS", "4"))
+BATCH_GET_BASE_BACKOFF = float(os.environ.get("BATCH_GET_BASE_BACKOFF", "0.05"))
+
+# eventSource of audio_normalizer's hand-over records: only those may
+# start a session from its normalized/ copy
+HANDOVER_SOURCE = "audio_normalizer"
+
+# Normalized WAV recordings are cut at silences and transcribed as
+# concurrent chunk jobs; silences over MAX_SILENCE_SECONDS are shortened.
+# A recording that fits one chunk stays a single job unless trimming
+# saves at least MIN_TRIM_FRACTION of it.
+CHUNKED_TRANSCRIPTION_ENABLED = os.environ.get("CHUNKED_TRANSCRIPTION_ENABLED", "true").lower() == "true"
+CHUNK_MAX_SECONDS = float(os.environ.get("CHUNK_MAX_SECONDS", "300"))
+CHUNK_MIN_SECONDS = float(os.environ.get("CHUNK_MIN_SECONDS", "180"))
+CHUNK_OVERLAP_SECONDS = float(os.environ.get("CHUNK_OVERLAP_SECONDS", "6"))
+MAX_SILENCE_SECONDS = float(os.environ.get("MAX_SILENCE_SECONDS", "1.0"))
+MIN_TRIM_FRACTION = float(os.environ.get("MIN_TRIM_FRACTION", "0.1"))
+CHUNK_MAX_WORKERS = int(os.environ.get("CHUNK_MAX_WORKERS", "4"))
+
+# ASR engine per session: the session's asr_engine attribute, else the
+# engine mapped to its languages (JSON, e.g. {"hi-IN": "sarvam"}), else
+# the default. Sarvam runs synchronously here and then starts
+# transcription_processing itself.
+ASR_ENGINE_NAMES = ("transcribe", "sarvam")
+ASR_DEFAULT_ENGINE = os.environ.get("ASR_DEFAULT_ENGINE", "transcribe")
+ASR_ENGINE_BY_LANGUAGE = json.loads(os.environ.get("ASR_ENGINE_BY_LANGUAGE", "{}"))
+PROCESSING_FUNCTION = os.environ.get("PROCESSING_FUNCTION_NAME", "transcription_processing")
+
+SARVAM_ENDPOINT_NAME = os.environ.get("SARVAM_ENDPOINT_NAME", "sarvam-ai-shukass")
+SARVAM_WINDOW_SECONDS = float(os.environ.get("SARVAM_WINDOW_SECONDS", "25"))
+SARVAM_MAX_CONCURRENCY = int(os.environ.get("SARVAM_MAX_CONCURRENCY", "4"))
+# "json" is the base64 body the endpoint is known to take (sarvam-test.py);
+# "wav" sends raw WAV bytes, only for a container that accepts audio/wav
+# with max_new_tokens in the CustomAttributes header
+SARVAM_PAYLOAD_FORMAT = os.environ.get("SARVAM_PAYLOAD_FORMAT", "json")
+SARVAM_TOKENS_PER_SECOND = float(os.environ.get("SARVAM_TOKENS_PER_SECOND", "8"))
+
+# Created on first use and reused across warm invocations
+s3 = lazy_client("s3")
+dynamodb = lazy_client("dynamodb")
+transcribe = lazy_client("transcribe")
+sagemaker = lazy_client("sagemaker-runtime")
+lambda_client = lazy_client("lambda")
+
+UploadRecord = namedtuple("UploadRecord", ["bucket", "key", "session_id", "source"])
 
 
 def lambda_handler(event, context):
-    print("Event:", json.dumps(event))
-    
-    try:
-        # Get S3 event details
-        record = event["Records"][0]
-        bucket = record["s3"]["bucket"]["name"]
-        key = unquote_plus(record["s3"]["object"]["key"])
-        
-        print(f"Processing file: s3://{bucket}/{key}")
-        
-        # Extract session ID from path
-        # Format: sessions/session-{id}/input/audio.mp3
-        path_parts = key.split("/")
-        session_id = path_parts[1]  # sessions/[session-id]/input/audio.mp3
-        
-        print(f"Session ID: {session_id}")
-        
-        # Get session from DynamoDB to retrieve language preferences
+    """
+    S3 notification (or audio_normalizer hand-over) with one or more
+    uploaded recordings. The sessions are read in one batch and the records
+    started concurrently; the body reports each record's outcome.
+
+    Starting is idempotent per upload, so when any record fails the whole
+    event is raised for Lambda to retry without restarting the others.
+    """
+    debug("Event", event=event)
+    parsed = [(r, parse_record(r)) for r in event.get("Records", [])]
+    skipped = [r["s3"]["object"]["key"] for r, record in parsed if record is None]
+    if skipped:
+        info("Not an uploaded recording, skipping", keys=skipped)
+    records = list(dict.fromkeys(record for _, record in parsed if record is not None))
+    sessions = read_sessions([r.session_id for r in records])
+
+    workers = max(1, min(RECORD_MAX_WORKERS, len(records)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(lambda record: start_record(record, sessions), records))
+
+    failed = [r for r in results if r["status"] == "failed"]
+    if failed:
+        raise RecordsFailed(f"{len(failed)} of {len(records)} records failed: {json.dumps(failed)}")
+    return {"statusCode": 200, "body": json.dumps({"records": results, "skipped": skipped})}
+
+
+class RecordsFailed(Exception):
+    pass
+
+
+def parse_record(record):
+    """
+    An S3 event record as an UploadRecord, None when it is not an uploaded
+    recording. The upload is identified by the event's sequencer (else the
+    ETag): a redelivered event carries the same one, an upload that
+    overwrites the object a new one.
+    """
+    bucket = record["s3"]["bucket"]["name"]
+    obj = record["s3"]["object"]
+    key = unquote_plus(obj["key"])
+    # Format: sessions/session-{id}/input/audio.mp3, or the 16 kHz copy
+    # audio_normalizer hands over: sessions/session-{id}/normalized/audio.wav.
+    # Chunk WAVs (and a normalized copy in an S3 notification) are never
+    # uploads: starting them would transcribe the session again
+    parts = key.split("/")
+    areas = ("input", "normalized") if record.get("eventSource") == HANDOVER_SOURCE else ("input",)
+    if len(parts) < 4 or parts[0] != "sessions" or not parts[1] or parts[2] not in areas or not parts[-1]:
+        return None
+    session_id = parts[1]
+    return UploadRecord(bucket, key, session_id, obj.get("sequencer") or obj.get("eTag") or key)
+
+
+def read_sessions(session_ids):
+    """
+    {session_id: item} for the given sessions ({} when there is none) from
+    BatchGetItem, retrying unprocessed keys with jittered backoff. Sessions
+    that could not be read are left out, to be read one by one.
+    """
+    session_ids = list(dict.fromkeys(session_ids))
+    sessions = {}
+    for offset in range(0, len(session_ids), BATCH_GET_SIZE):
+        batch = session_ids[offset:offset + BATCH_GET_SIZE]
+        request = {
+            "Keys": [{"session_id": {"S": session_id}} for session_id in batch],
+            "ProjectionExpression": "session_id, language_preferences, asr_engine",
+        }
         try:
-            session_response = dynamodb.get_item(
-                TableName=TABLE_NAME,
-                Key={"session_id": {"S": session_id}}
-            )
-            
-            if "Item" not in session_response:
-                print("Session not found in DynamoDB, using default language")
-                language_preferences = ["en-IN"]
-            else:
-                # Extract language preferences from DynamoDB list format
-                lang_prefs_raw = session_response["Item"].get("language_preferences", {})
-                if "L" in lang_prefs_raw:
-                    language_preferences = [lang["S"] for lang in lang_prefs_raw["L"]]
-                else:
-                    language_preferences = ["en-IN"]
-                    
-        except ClientError as e:
-            print(f"DynamoDB error: {e}")
+            for attempt in range(BATCH_GET_MAX_ATTEMPTS):
+                result = dynamodb.batch_get_item(RequestItems={TABLE_NAME: request})
+                for item in result.get("Responses", {}).get(TABLE_NAME, []):
+                    sessions[item["session_id"]["S"]] = item
+                unprocessed = (result.get("UnprocessedKeys") or {}).get(TABLE_NAME)
+                if not unprocessed:
+                    sessions.update((session_id, sessions.get(session_id, {})) for session_id in batch)
+                    break
+                request = unprocessed
+                if attempt < BATCH_GET_MAX_ATTEMPTS - 1:
+                    time.sleep(random.uniform(0, BATCH_GET_BASE_BACKOFF * 2 ** attempt))
+        except Exception as e:
+            warning("Batched session read failed", sessions=len(batch), error=str(e))
+    return sessions
+
+
+def read_session(session_id):
+    try:
+        return dynamodb.get_item(TableName=TABLE_NAME, Key={"session_id": {"S": session_id}}).get("Item", {})
+    except Exception as e:
+        warning("Session read failed, using default language", error=str(e))
+        return {}
+
+
+def start_record(record, sessions):
+    """Start one record in its own trace; the outcome is reported, not raised"""
+    try:
+        with trace("transcribe_audio", record.session_id, key=record.key):
+            result = _start_transcription(record, sessions)
+    except Exception as e:
+        return {"status": "failed", "sessionId": record.session_id, "key": record.key, "error": str(e)}
+    return {"key": record.key, **result}
+
+
+def _start_transcription(record, sessions):
+    try:
+        bucket, key, session_id = record.bucket, record.key, record.session_id
+
+        # Get the session to retrieve language preferences
+        if session_id in sessions:
+            session = sessions[session_id]
+        else:
+            with span("session_read"):
+                session = read_session(session_id)
+
+        # Extract language preferences from DynamoDB list format
+        lang_prefs_raw = session.get("language_preferences", {})
+        if "L" in lang_prefs_raw:
+            language_preferences = [lang["S"] for lang in lang_prefs_raw["L"]]
+        else:
+            if not session:
+                warning("Session not found in DynamoDB, using default language")
             language_preferences = ["en-IN"]
-        
-        print(f"Language preferences: {language_preferences}")
-        
+
+        engine = asr_engines()[choose_engine(session, language_preferences, ASR_ENGINE_NAMES,
+                                             ASR_ENGINE_BY_LANGUAGE, ASR_DEFAULT_ENGINE)]
+        bind(asr_engine=engine.name, languages=language_preferences)
+
+        with span("dynamodb_write"):
+            job_name, claimed_status = claim_upload(record, engine.name)
+        bind(job_name=job_name)
+        if claimed_status not in (None, "TRANSCRIPTION_IN_PROGRESS"):
+            info("Upload already transcribed", status=claimed_status)
+            return {"status": "already_started", "sessionId": session_id, "jobName": job_name,
+                    "sessionStatus": claimed_status}
+        status = "started" if claimed_status is None else "already_started"
+
+        if not engine.asynchronous:
+            try:
+                result = run_synchronous_engine(engine, bucket, key, session_id, job_name, language_preferences)
+                return {"status": status, **result}
+            except UnsupportedAudio as e:
+                info("Falling back to Transcribe", engine=engine.name, reason=str(e))
+                engine = asr_engines()["transcribe"]
+                bind(asr_engine=engine.name)
+                set_engine(session_id, engine.name)
+
+        if CHUNKED_TRANSCRIPTION_ENABLED and key.lower().endswith(".wav"):
+            chunked = start_chunked_transcription(engine, bucket, key, session_id, job_name, language_preferences)
+            if chunked:
+                return {"status": status, **chunked}
+
         # Start Transcribe job
         output_key = f"sessions/{session_id}/output/"
-        
-        transcribe_params = {
-            "TranscriptionJobName": session_id,
-            "Media": {"MediaFileUri": f"s3://{bucket}/{key}"},
-            "OutputBucketName": bucket,
-            "OutputKey": output_key,
-            "Settings": {
-                "ShowSpeakerLabels": True,
-                "MaxSpeakerLabels": 2
-            }
+
+        with span("asr_start"):
+            start_job(engine, AsrRequest(job_name, bucket, key, output_key, language_preferences))
+        info("Transcription job started", job_name=job_name)
+
+        return {
+            "status": status,
+            "message": "Transcription job started successfully",
+            "sessionId": session_id,
+            "jobName": job_name,
+            "languageMode": "multi-language" if len(language_preferences) > 1 else "single-language",
+            "languages": language_preferences
         }
-        
-        # Handle multi-language scenarios (code-switching support)
-        if len(language_preferences) > 1:
-            # Use IdentifyMultipleLanguages for multi-language in same audio
-            transcribe_params["IdentifyMultipleLanguages"] = True
-            transcribe_params["LanguageOptions"] = language_preferences
-            print(f"Multi-language mode enabled with languages: {language_preferences}")
-        else:
-            # Single language mode
-            transcribe_params["LanguageCode"] = language_preferences[0]
-            print(f"Single language mode: {language_preferences[0]}")
-        
-        print("Starting transcription job:", json.dumps(transcribe_params))
-        
-        transcribe_response = transcribe.start_transcription_job(**transcribe_params)
-        
-        job_name = transcribe_response["TranscriptionJob"]["TranscriptionJobName"]
-        print(f"Transcription job started: {job_name}")
-        
-        # Update DynamoDB with transcription status
-        from datetime import datetime
-        
-        dynamodb.update_item(
+
+    except Exception as e:
+        error("Starting transcription failed", error=str(e))
+        raise e
+
+
+def claim_upload(record, engine_name):
+    """
+    Make this upload the session's transcription source, numbering the
+    session's uploads: the jobs of upload n are named after it (see
+    upload_job_name) and transcription_processing only lets the session's
+    current upload write results. Returns (job name, None) for a new upload.
+
+    For an upload already claimed (a redelivered event) nothing changes and
+    the session's current job name and status are returned instead: a
+    session still TRANSCRIPTION_IN_PROGRESS has its jobs started again,
+    idempotently, in case the earlier attempt failed part way.
+    """
+    try:
+        claimed = dynamodb.update_item(
             TableName=TABLE_NAME,
-            Key={"session_id": {"S": session_id}},
-            UpdateExpression="SET #status = :status, transcription_job_name = :job_name, updated_at = :updated_at",
-            ExpressionAttributeNames={
-                "#status": "status"  # 'status' is a reserved word in DynamoDB
-            },
+            Key={"session_id": {"S": record.session_id}},
+            UpdateExpression="SET transcription_source = :source, #status = :status, asr_engine = :engine, "
+                             "updated_at = :updated_at ADD transcription_uploads :one, revision :one "
+                             "REMOVE chunks_done, chunk_count, error_message, processing_lease, processing_lease_until",
+            ConditionExpression="attribute_not_exists(transcription_source) OR transcription_source <> :source",
+            ExpressionAttributeNames={"#status": "status"},
             ExpressionAttributeValues={
+                ":source": {"S": record.source},
                 ":status": {"S": "TRANSCRIPTION_IN_PROGRESS"},
-                ":job_name": {"S": session_id},
-                ":updated_at": {"N": str(int(datetime.now().timestamp()))}
-            }
+                ":engine": {"S": engine_name},
+                ":one": {"N": "1"},
+                ":updated_at": {"N": str(int(time.time()))}
+            },
+            ReturnValues="UPDATED_NEW"
+        )["Attributes"]
+    except Exception as e:
+        if error_code(e) != "ConditionalCheckFailedException":
+            raise
+        session = dynamodb.get_item(
+            TableName=TABLE_NAME,
+            Key={"session_id": {"S": record.session_id}},
+            ProjectionExpression="transcription_uploads, #status",
+            ExpressionAttributeNames={"#status": "status"},
+            ConsistentRead=True
+        ).get("Item", {})
+        upload = int(session.get("transcription_uploads", {}).get("N", "1"))
+        status = session.get("status", {}).get("S", "")
+    else:
+        upload, status = int(claimed["transcription_uploads"]["N"]), None
+
+    job_name = upload_job_name(record.session_id, upload)
+    if status in (None, "TRANSCRIPTION_IN_PROGRESS"):
+        dynamodb.update_item(
+            TableName=TABLE_NAME,
+            Key={"session_id": {"S": record.session_id}},
+            UpdateExpression="SET transcription_job_name = :job_name ADD revision :one",
+            ExpressionAttributeValues={":job_name": {"S": job_name}, ":one": {"N": "1"}}
         )
-        
-        return {
-            "statusCode": 200,
-            "body": json.dumps({
-                "message": "Transcription job started successfully",
-                "sessionId": session_id,
-                "jobName": session_id,
-                "languageMode": "multi-language" if len(language_preferences) > 1 else "single-language",
-                "languages": language_preferences
-            })
-        }
-        
+    return job_name, status
+
+
+def set_engine(session_id, engine_name):
+    dynamodb.update_item(
+        TableName=TABLE_NAME,
+        Key={"session_id": {"S": session_id}},
+        UpdateExpression="SET asr_engine = :engine ADD revision :one",
+        ExpressionAttributeValues={":engine": {"S": engine_name}, ":one": {"N": "1"}}
+    )
+
+
+def start_job(engine, request, **extra):
+    """Start an ASR job; a job of that name already existing counts as started"""
+    try:
+        return engine.start(request, **extra)
     except Exception as e:
-        print(f"Error: {e}")
-        raise e
\ No newline at end of file
+        if error_code(e) != "ConflictException":
+            raise
+        info("Transcription job already exists", job_name=request.job_name)
+        return {"engine": engine.name, "jobName": request.job_name}
+
+
+def error_code(error):
+    """AWS error code of a botocore ClientError (or lookalike), else None"""
+    return getattr(error, "response", {}).get("Error", {}).get("Code")
+
+
+def asr_engines():
+    """Engines over the current clients (cheap: the clients are lazy)"""
+    return {
+        "transcribe": TranscribeEngine(transcribe),
+        "sarvam": SarvamEngine(
+            sagemaker, s3, SARVAM_ENDPOINT_NAME,
+            window_seconds=SARVAM_WINDOW_SECONDS,
+            max_silence=MAX_SILENCE_SECONDS,
+            max_concurrency=SARVAM_MAX_CONCURRENCY,
+            payload_format=SARVAM_PAYLOAD_FORMAT,
+            tokens_per_second=SARVAM_TOKENS_PER_SECOND
+        ),
+    }
+
+
+def run_synchronous_engine(engine, bucket, key, session_id, job_name, language_preferences):
+    """
+    Transcribe with an engine that returns the text itself, then start
+    transcription_processing the way a completed Transcribe job would
+    """
+    with span("asr"):
+        result = engine.start(AsrRequest(job_name, bucket, key, f"sessions/{session_id}/output/",
+                                         language_preferences))
+    metric("asr_windows", result.get("windows"))
+    metric("asr_payload_bytes", result.get("payloadBytes"), "Bytes")
+    metric("source_audio_seconds", result.get("sourceSeconds"), "Seconds")
+    info("ASR finished", engine=engine.name, windows=result.get("windows"))
+
+    lambda_client.invoke(
+        FunctionName=PROCESSING_FUNCTION,
+        InvocationType="Event",
+        Payload=json.dumps({"detail": {"TranscriptionJobName": job_name, "TranscriptionJobStatus": "COMPLETED"}})
+    )
+    return {**result, "message": "Transcription completed", "sessionId": session_id,
+            "languages": language_preferences}
+
+
+def start_chunked_transcription(engine, bucket, key, session_id, job_name, language_preferences):
+    """
+    Cut a normalized WAV at silences into chunks of at most
+    CHUNK_MAX_SECONDS, with long silences trimmed, and start one Transcribe
+    job per chunk. transcription_processing stitches the outputs together
+    once the last chunk job completes.
+
+    Returns None when the recording is better sent as a single job: not
+    16-bit mono PCM, or one chunk that trimming barely shortens.
+    """
+    try:
+        with span("chunk_plan"):
+            plan = plan_chunks(s3, bucket, key, CHUNK_MAX_SECONDS, CHUNK_MIN_SECONDS,
+                               MAX_SILENCE_SECONDS, CHUNK_OVERLAP_SECONDS)
+    except UnsupportedAudio as e:
+        info("Not chunking", reason=str(e))
+        return None
+    if plan is None:
+        info("No speech found; transcribing as a single job")
+        return None
+
+    kept_seconds = plan.cuts[-1]
+    if len(plan.windows) == 1 and kept_seconds > plan.source_seconds * (1 - MIN_TRIM_FRACTION):
+        return None
+
+    chunks = [
+        {"index": i, "job_name": chunk_job_name(job_name, i), "key": chunk_key(session_id, i),
+         "start": start, "end": end}
+        for i, (start, end) in enumerate(plan.windows)
+    ]
+    # Transcribe bills at least 15 seconds per job
+    billed = sum(max(15.0, c["end"] - c["start"]) for c in chunks)
+    manifest = {
+        "session_id": session_id,
+        "source_key": key,
+        "source_seconds": round(plan.source_seconds, 3),
+        "kept_seconds": kept_seconds,
+        "billed_seconds": round(billed, 3),
+        "overlap_seconds": CHUNK_OVERLAP_SECONDS,
+        "spans": plan.spans,
+        "cuts": plan.cuts,
+        "chunks": chunks
+    }
+    metric("chunk_count", len(chunks))
+    metric("source_audio_seconds", manifest["source_seconds"], "Seconds")
+    metric("billed_audio_seconds", manifest["billed_seconds"], "Seconds")
+    debug("Chunk plan", **{k: v for k, v in manifest.items() if k not in ("spans", "chunks")})
+
+    # The manifest and chunk count exist before any chunk job can finish
+    # (chunks_done was reset when the upload was claimed, and is kept when
+    # a retried event starts the chunk jobs again)
+    s3.put_object(Bucket=bucket, Key=manifest_key(session_id), Body=json.dumps(manifest),
+                  ContentType="application/json")
+    dynamodb.update_item(
+        TableName=TABLE_NAME,
+        Key={"session_id": {"S": session_id}},
+        UpdateExpression="SET chunk_count = :chunks, source_audio_seconds = :source, billed_audio_seconds = :billed, "
+                         "updated_at = :updated_at ADD revision :one",
+        ExpressionAttributeValues={
+            ":chunks": {"N": str(len(chunks))},
+            ":source": {"N": str(manifest["source_seconds"])},
+            ":billed": {"N": str(manifest["billed_seconds"])},
+            ":one": {"N": "1"},
+            ":updated_at": {"N": str(int(time.time()))}
+        }
+    )
+
+    def upload_and_start(index, data):
+        chunk = chunks[index]
+        s3.put_object(Bucket=bucket, Key=chunk["key"], Body=data, ContentType="audio/wav")
+        start_job(engine, AsrRequest(chunk["job_name"], bucket, chunk["key"], chunk_output_prefix(session_id),
+                                     language_preferences),
+                  MediaFormat="wav", MediaSampleRateHertz=plan.sample_rate)
+
+    # Chunks are uploaded and their jobs started while later chunks are
+    # still being cut
+    with span("chunk_jobs"):
+        map_chunks(s3, bucket, key, plan, upload_and_start, CHUNK_MAX_WORKERS)
+
+    info("Chunk jobs started", chunks=len(chunks))
+    return {
+        "message": "Chunked transcription jobs started successfully",
+        "sessionId": session_id,
+        "jobNames": [c["job_name"] for c in chunks],
+        "sourceSeconds": manifest["source_seconds"],
+        "billedSeconds": manifest["billed_seconds"],
+        "languages": language_preferences
+    }
\ No newline at end of file
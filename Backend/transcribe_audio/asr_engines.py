@@ -0,0 +1,187 @@
+"""
+Speech recognition engines behind transcribe_audio.
+
+An engine takes an ``AsrRequest`` and leaves a Transcribe-shaped output
+document at ``{output_key}{job_name}.json``, which transcription_processing
+reads. Amazon Transcribe does that itself, asynchronously, and announces
+completion with a job state-change event. The Sarvam model on SageMaker is
+called synchronously; the caller announces completion instead.
+"""
+import base64
+import json
+import time
+from collections import namedtuple
+
+from common.chunk_manifest import kept_to_source
+from common.telemetry import debug
+from audio_chunker import map_chunks, plan_chunks
+
+AsrRequest = namedtuple("AsrRequest", ["job_name", "bucket", "key", "output_key", "language_preferences"])
+
+
+class TranscribeEngine:
+    name = "transcribe"
+    asynchronous = True
+
+    def __init__(self, client):
+        self.client = client
+
+    def params(self, request):
+        params = {
+            "TranscriptionJobName": request.job_name,
+            "Media": {"MediaFileUri": f"s3://{request.bucket}/{request.key}"},
+            "OutputBucketName": request.bucket,
+            "OutputKey": request.output_key,
+            "Settings": {
+                "ShowSpeakerLabels": True,
+                "MaxSpeakerLabels": 2
+            }
+        }
+
+        # Handle multi-language scenarios (code-switching support)
+        if len(request.language_preferences) > 1:
+            # Use IdentifyMultipleLanguages for multi-language in same audio
+            params["IdentifyMultipleLanguages"] = True
+            params["LanguageOptions"] = request.language_preferences
+        else:
+            params["LanguageCode"] = request.language_preferences[0]
+        return params
+
+    def start(self, request, **extra):
+        params = {**self.params(request), **extra}
+        debug("Starting transcription job", params=params)
+        job = self.client.start_transcription_job(**params)["TranscriptionJob"]
+        return {"engine": self.name, "jobName": job["TranscriptionJobName"]}
+
+
+class SarvamEngine:
+    """
+    Sarvam speech model on a SageMaker endpoint. The recording is cut at
+    silences into windows the model can take in one call, the windows are
+    sent with at most ``max_concurrency`` calls in flight, and the texts
+    are joined in order.
+
+    Windows are sent in the endpoint's base64-in-JSON body
+    (``payload_format="json"``); ``"wav"`` sends raw WAV bytes with the
+    token budget in CustomAttributes, a third fewer bytes per call, for a
+    container that accepts audio/wav.
+    """
+    name = "sarvam"
+    asynchronous = False
+
+    def __init__(self, runtime, s3, endpoint_name, window_seconds=25.0, min_window_seconds=10.0,
+                 max_silence=1.0, max_concurrency=4, payload_format="json", tokens_per_second=8.0,
+                 min_new_tokens=64, max_attempts=3, base_backoff=0.5):
+        self.runtime, self.s3 = runtime, s3
+        self.endpoint_name = endpoint_name
+        self.window_seconds, self.min_window_seconds = window_seconds, min_window_seconds
+        self.max_silence = max_silence
+        self.max_concurrency = max_concurrency
+        self.payload_format = payload_format
+        self.tokens_per_second, self.min_new_tokens = tokens_per_second, min_new_tokens
+        self.max_attempts, self.base_backoff = max_attempts, base_backoff
+
+    def start(self, request):
+        started = time.perf_counter()
+        plan = plan_chunks(self.s3, request.bucket, request.key, self.window_seconds,
+                           self.min_window_seconds, self.max_silence, 0.0)
+        if plan is None:
+            texts, payload_bytes = [], 0
+        else:
+            calls = map_chunks(self.s3, request.bucket, request.key, plan,
+                               lambda index, wav: self.invoke(wav, plan.windows[index]),
+                               self.max_concurrency)
+            texts = [text for text, _ in calls]
+            payload_bytes = sum(size for _, size in calls)
+
+        segments = [
+            {
+                "id": index,
+                "transcript": text,
+                "start_time": f"{kept_to_source(plan.spans, start):.3f}",
+                "end_time": f"{kept_to_source(plan.spans, end):.3f}",
+                "items": []
+            }
+            for index, (text, (start, end)) in enumerate(zip(texts, plan.windows if plan else []))
+        ]
+        document = {
+            "jobName": request.job_name,
+            "results": {
+                "transcripts": [{"transcript": " ".join(t for t in texts if t)}],
+                "items": [],
+                "audio_segments": segments,
+            },
+            "status": "COMPLETED",
+        }
+        self.s3.put_object(Bucket=request.bucket, Key=f"{request.output_key}{request.job_name}.json",
+                           Body=json.dumps(document, ensure_ascii=False).encode("utf-8"),
+                           ContentType="application/json")
+
+        return {
+            "engine": self.name,
+            "jobName": request.job_name,
+            "windows": len(segments),
+            "sourceSeconds": round(plan.source_seconds, 3) if plan else 0,
+            "payloadBytes": payload_bytes,
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+
+    def invoke(self, wav, window):
+        """(text, payload bytes) for one window"""
+        max_new_tokens = max(self.min_new_tokens, int((window[1] - window[0]) * self.tokens_per_second))
+        if self.payload_format == "json":
+            request = {
+                "ContentType": "application/json",
+                "Body": json.dumps({"audio": base64.b64encode(wav).decode("ascii"),
+                                    "max_new_tokens": max_new_tokens}),
+            }
+        else:
+            request = {
+                "ContentType": "audio/wav",
+                "Body": wav,
+                "CustomAttributes": f"max_new_tokens={max_new_tokens}",
+            }
+
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                response = self.runtime.invoke_endpoint(EndpointName=self.endpoint_name, Accept="application/json",
+                                                        **request)
+                break
+            except Exception as e:
+                # Throttling and 5xx are retried by botocore; a scaling
+                # endpoint answers ModelNotReadyException, which is not
+                code = getattr(e, "response", {}).get("Error", {}).get("Code", "")
+                if attempt == self.max_attempts or code != "ModelNotReadyException":
+                    raise
+                time.sleep(self.base_backoff * 2 ** (attempt - 1))
+
+        return generated_text(json.loads(response["Body"].read())), len(request["Body"])
+
+
+def generated_text(result):
+    """Text from the shapes the model containers return"""
+    if isinstance(result, list):
+        return " ".join(generated_text(r) for r in result).strip()
+    if isinstance(result, dict):
+        for field in ("generated_text", "transcript", "text"):
+            if field in result:
+                return str(result[field]).strip()
+    if isinstance(result, str):
+        return result.strip()
+    raise ValueError(f"Unrecognised model response: {str(result)[:200]}")
+
+
+def choose_engine(session, language_preferences, engines, by_language, default):
+    """
+    Engine name for a session: its ``asr_engine`` attribute when set and
+    known, else the engine configured for its languages when they all
+    agree, else ``default``
+    """
+    requested = session.get("asr_engine", {}).get("S")
+    if requested in engines:
+        return requested
+    chosen = {by_language.get(language, default) for language in language_preferences}
+    if len(chosen) == 1 and chosen <= set(engines):
+        return chosen.pop()
+    return default
+
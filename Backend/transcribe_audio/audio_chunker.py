@@ -0,0 +1,120 @@
+"""
+Split a 16-bit mono WAV on S3 into silence-trimmed chunks.
+
+Two streaming passes over the object: the first measures frame energies
+and plans the cut, the second copies the kept samples of each chunk into
+its own WAV. Only the chunks being assembled are held in memory; with
+overlapping chunks that is at most two.
+"""
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from common.audio import WAVE_FORMAT_PCM, UnsupportedAudio, iter_frames, iter_raw, read_wav_header, wav_header
+from common.chunk_manifest import chunk_windows, source_pieces
+from common.vad import FRAME_SECONDS, frame_energies, kept_spans, plan_cuts, speech_regions
+
+BLOCK_SECONDS = 10
+
+ChunkPlan = namedtuple("ChunkPlan", ["sample_rate", "source_seconds", "spans", "cuts", "windows"])
+
+
+def open_wav(s3, bucket, key):
+    """(body, format) of a 16-bit mono PCM WAV; raises UnsupportedAudio otherwise"""
+    body = s3.get_object(Bucket=bucket, Key=key)["Body"]
+    try:
+        fmt = read_wav_header(body)
+        if fmt.format_tag != WAVE_FORMAT_PCM or fmt.bits_per_sample != 16 or fmt.channels != 1:
+            raise UnsupportedAudio("Chunking expects 16-bit mono PCM (see audio_normalizer)")
+    except Exception:
+        body.close()
+        raise
+    return body, fmt
+
+
+def plan_chunks(s3, bucket, key, max_chunk, min_chunk, max_silence, overlap):
+    body, fmt = open_wav(s3, bucket, key)
+    try:
+        blocks = (block[:, 0] for block in iter_frames(body, fmt, BLOCK_SECONDS * fmt.sample_rate))
+        energies = frame_energies(blocks, fmt.sample_rate)
+    finally:
+        body.close()
+
+    source_seconds = len(energies) * FRAME_SECONDS
+    regions = speech_regions(energies)
+    spans = kept_spans(regions, source_seconds, max_silence)
+    if not spans:
+        return None
+    cuts = plan_cuts(regions, spans, max_chunk, min_chunk)
+    return ChunkPlan(fmt.sample_rate, source_seconds, spans, cuts, chunk_windows(cuts, overlap))
+
+
+def write_chunks(s3, bucket, key, plan, on_chunk):
+    """
+    Stream the source again and call ``on_chunk(index, wav_bytes)`` as soon
+    as each chunk is complete, in order
+    """
+    rate = plan.sample_rate
+    # (first sample, end sample, chunk) for every source piece of every chunk
+    pieces = sorted(
+        (round(start * rate), round(end * rate), index)
+        for index, (start, end) in enumerate(plan.windows)
+        for start, end in source_pieces(plan.spans, start, end)
+    )
+    last_sample = {}
+    for start, end, index in pieces:
+        last_sample[index] = max(last_sample.get(index, 0), end)
+
+    body, fmt = open_wav(s3, bucket, key)
+    buffers, done, first, position = {}, set(), 0, 0
+    try:
+        for raw in iter_raw(body, fmt, BLOCK_SECONDS * rate):
+            block_start, position = position, position + len(raw) // 2
+            while first < len(pieces) and pieces[first][1] <= block_start:
+                first += 1
+            for start, end, index in pieces[first:]:
+                if start >= position:
+                    break
+                lo, hi = max(start, block_start), min(end, position)
+                if hi > lo:
+                    buffers.setdefault(index, bytearray()).extend(raw[(lo - block_start) * 2:(hi - block_start) * 2])
+            finish_chunks(buffers, done, last_sample, position, on_chunk, rate)
+    finally:
+        body.close()
+    # Anything planned past the end of the data (rounding) ends here
+    finish_chunks(buffers, done, last_sample, float("inf"), on_chunk, rate)
+
+
+def finish_chunks(buffers, done, last_sample, position, on_chunk, rate):
+    for index in sorted(last_sample):
+        if index in done or last_sample[index] > position:
+            continue
+        data = bytes(buffers.pop(index, b""))
+        done.add(index)
+        on_chunk(index, wav_header(rate, 1, 16, len(data)) + data)
+
+
+def map_chunks(s3, bucket, key, plan, fn, max_workers):
+    """
+    ``fn(index, wav_bytes)`` for every chunk of ``plan`` on a pool of
+    ``max_workers``, started while later chunks are still being cut;
+    returns the results in chunk order. At most ``max_workers`` chunks are
+    held in memory.
+    """
+    in_flight = threading.Semaphore(max_workers)
+
+    def run(index, data):
+        try:
+            return fn(index, data)
+        finally:
+            in_flight.release()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = []
+
+        def submit(index, data):
+            in_flight.acquire()
+            futures.append(executor.submit(run, index, data))
+
+        write_chunks(s3, bucket, key, plan, submit)
+        return [future.result() for future in futures]
@@ -1,202 +1,927 @@
 import json
 import os
-import boto3
-import re
-from botocore.exceptions import ClientError
-from datetime import datetime
-from bedrock_prompt import get_extraction_prompt
+import threading
+import time
+import uuid
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from common.aws_clients import lazy_client
+from common.chunk_manifest import chunk_output_prefix, manifest_key, parse_upload_job, upload_job_name
+from common.session_results import put_results, results_key, to_attribute
+from common.telemetry import debug, error, info, metric, propagate, span, trace, warning
+from bedrock_prompt import FIELD_PATHS, PROMPT_VERSION, SYSTEM_PROMPT, get_section_message, get_transcript_message
+from chunk_stitching import stitch
+from extraction_cache import ExtractionCache, cache_key
+from extraction_schema import SCHEMA, expected_sections, parse_extraction, section_groups, validate_section
+from pre_extractor import RULES_VERSION, fill, known_paths, pre_extract
+from rate_limiter import BedrockLimiter, DynamoTokenBucket, LocalTokenBucket, error_code
+from section_stream import SectionStreamParser
+from transcript_compactor import compact_transcript
+from transcript_reader import read_transcript
+from transcript_chunking import chunk_transcript, merge_extractions
 
 REGION = os.environ.get("REGION", "ap-south-1")
 TABLE_NAME = os.environ.get("SESSION_TABLE", "cce_sessions")
 BUCKET_NAME = os.environ.get("BUCKET_NAME", "cloudnine-cce")
 
-s3 = boto3.client("s3", region_name=REGION)
-dynamodb = boto3.client("dynamodb", region_name=REGION)
-bedrock = boto3.client("bedrock-runtime", region_name=REGION)
+# Results of a job only land on the session while its upload is the
+# session's latest; sessions from before uploads were numbered have none.
+# Conditions are built as alternatives of these (no parentheses).
+CURRENT_UPLOAD = ("attribute_not_exists(transcription_uploads)", "transcription_uploads = :upload")
+
+# One invocation at a time processes a session: it holds a lease, taken
+# by moving the session to EXTRACTION_IN_PROGRESS. The lease expires after
+# PROCESSING_LEASE_SECONDS (keep it above the function timeout) so that a
+# worker that crashed without releasing it is taken over on redelivery.
+PROCESSING_LEASE_SECONDS = int(os.environ.get("PROCESSING_LEASE_SECONDS", "960"))
+
+# Upper bound on jobs processed concurrently by one batch invocation
+BATCH_MAX_WORKERS = int(os.environ.get("BATCH_MAX_WORKERS", "8"))
+
+# Long transcripts are extracted window by window and merged (map-reduce);
+# anything up to CHUNKED_EXTRACTION_MIN_CHARS stays a single Bedrock call
+CHUNKED_EXTRACTION_ENABLED = os.environ.get("CHUNKED_EXTRACTION_ENABLED", "true").lower() == "true"
+CHUNKED_EXTRACTION_MIN_CHARS = int(os.environ.get("CHUNKED_EXTRACTION_MIN_CHARS", "24000"))
+CHUNK_MAX_CHARS = int(os.environ.get("CHUNK_MAX_CHARS", "12000"))
+CHUNK_OVERLAP_TURNS = int(os.environ.get("CHUNK_OVERLAP_TURNS", "2"))
+CHUNK_MAX_WORKERS = int(os.environ.get("CHUNK_MAX_WORKERS", "4"))
+
+# Send Bedrock a CCE/CUSTOMER turn-by-turn transcript built from the speaker
+# labels instead of the flat transcript string
+COMPACT_TRANSCRIPT_ENABLED = os.environ.get("COMPACT_TRANSCRIPT_ENABLED", "true").lower() == "true"
+
+# Fill the fields keyword rules settle (EDD, scans, twins, app, insurance,
+# competitors) locally and ask Bedrock only for the others
+PRE_EXTRACTION_ENABLED = os.environ.get("PRE_EXTRACTION_ENABLED", "true").lower() == "true"
+
+# Sections of an answer that are missing or fail validation against the
+# output format are asked for again on their own, up to this many times
+EXTRACTION_REASK_ATTEMPTS = int(os.environ.get("EXTRACTION_REASK_ATTEMPTS", "2"))
+# Sections still missing after that are listed under this key of the
+# result: it is not cached, and the job fails so that it is retried
+INCOMPLETE_SECTIONS = "incomplete_sections"
+
+# "single" asks for every section in one Bedrock call; "sections" asks for
+# each group of EXTRACTION_SECTION_GROUPS ("a,b;c", sections left out form
+# one more group) in its own concurrent call with a focused format, so no
+# call generates the whole answer. Long (chunked) transcripts stay single.
+EXTRACTION_MODE = os.environ.get("EXTRACTION_MODE", "single").lower()
+EXTRACTION_SECTION_GROUPS = section_groups(os.environ.get(
+    "EXTRACTION_SECTION_GROUPS",
+    "additional_insights;cce_observations;family_personal,cloudnine_awareness;pregnancy_related,insurance"
+))
+
+# Use Claude Haiku for extraction
+MODEL_ID = os.environ.get("BEDROCK_MODEL_ID", "anthropic.claude-3-haiku-20240307-v1:0")
+INFERENCE_PARAMS = {
+    "max_tokens": 2000,
+    "temperature": 0.3,
+    "top_p": 0.9
+}
+
+# Mark the static system prompt as a cacheable prefix: "auto" enables it for
+# model families that support Bedrock prompt caching, "on"/"off" force it
+PROMPT_CACHING = os.environ.get("PROMPT_CACHING", "auto").lower()
+PROMPT_CACHING_MODELS = ("claude-3-5-haiku", "claude-3-7-sonnet", "claude-haiku-4", "claude-sonnet-4", "claude-opus-4")
+
+# Stream the Bedrock response and publish each top-level section to the
+# session as soon as it is complete (single-call extraction only)
+STREAMING_EXTRACTION_ENABLED = os.environ.get("STREAMING_EXTRACTION_ENABLED", "false").lower() == "true"
+
+# Bedrock calls across all instances share one token bucket in
+# RATE_LIMIT_TABLE (partition key bucket_id); without it, or when the table
+# is unreachable, each instance uses a local bucket at the fallback rate
+RATE_LIMIT_TABLE = os.environ.get("RATE_LIMIT_TABLE")
+BEDROCK_RATE_PER_SECOND = float(os.environ.get("BEDROCK_RATE_PER_SECOND", "5"))
+BEDROCK_BURST = float(os.environ.get("BEDROCK_BURST", "10"))
+BEDROCK_FALLBACK_RATE_PER_SECOND = float(os.environ.get("BEDROCK_FALLBACK_RATE_PER_SECOND", str(BEDROCK_RATE_PER_SECOND)))
+BEDROCK_MAX_ATTEMPTS = int(os.environ.get("BEDROCK_MAX_ATTEMPTS", "6"))
+BEDROCK_MAX_WAIT_SECONDS = float(os.environ.get("BEDROCK_MAX_WAIT_SECONDS", "60"))
+
+# Extraction results are cached by transcript/prompt/model; unset disables
+EXTRACTION_CACHE_TABLE = os.environ.get("EXTRACTION_CACHE_TABLE")
+EXTRACTION_CACHE_TTL_SECONDS = int(os.environ.get("EXTRACTION_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+
+# Created on first use and reused across warm invocations: a FAILED job
+# only ever builds the DynamoDB client. Throttling retries for Bedrock are
+# handled by the rate limiter, not botocore (see common.aws_clients).
+s3 = lazy_client("s3")
+dynamodb = lazy_client("dynamodb")
+bedrock = lazy_client("bedrock-runtime")
+
+extraction_cache = ExtractionCache(dynamodb, EXTRACTION_CACHE_TABLE, EXTRACTION_CACHE_TTL_SECONDS)
+
+bedrock_limiter = BedrockLimiter(
+    shared_bucket=DynamoTokenBucket(
+        dynamodb, RATE_LIMIT_TABLE, f"bedrock:{MODEL_ID}", BEDROCK_RATE_PER_SECOND, BEDROCK_BURST
+    ) if RATE_LIMIT_TABLE else None,
+    local_bucket=LocalTokenBucket(BEDROCK_FALLBACK_RATE_PER_SECOND, BEDROCK_BURST),
+    max_attempts=BEDROCK_MAX_ATTEMPTS,
+    max_wait=BEDROCK_MAX_WAIT_SECONDS
+)
+
+
+def _system_blocks():
+    block = {"type": "text", "text": SYSTEM_PROMPT}
+    caching = PROMPT_CACHING == "on" or (
+        PROMPT_CACHING == "auto" and any(family in MODEL_ID for family in PROMPT_CACHING_MODELS)
+    )
+    if caching:
+        block["cache_control"] = {"type": "ephemeral"}
+    return [block]
+
+
+# The static prefix is the same for every request: build it once per process
+SYSTEM_BLOCKS = _system_blocks()
 
 
 def lambda_handler(event, context):
-    print("Event:", json.dumps(event))
+    # SQS-buffered delivery: many Transcribe job events per invocation
+    if "Records" in event:
+        return batch_handler(event, context)
+
+    debug("Event", event=event)
     
+    result = process_transcription_job(event["detail"])
+
+    return {
+        "statusCode": 200,
+        "body": json.dumps(result)
+    }
+
+
+def batch_handler(event, context):
+    """
+    Process a batch of SQS messages, each wrapping one Transcribe job state
+    change event, on a bounded worker pool.
+
+    Returns the SQS partial batch response so that only the failed messages
+    are made visible again and retried (requires ReportBatchItemFailures on
+    the event source mapping).
+    """
+    records = event.get("Records", [])
+    info("Processing batch", records=len(records))
+
+    if not records:
+        return {"batchItemFailures": []}
+
+    workers = max(1, min(BATCH_MAX_WORKERS, len(records)))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        outcomes = list(executor.map(_process_batch_record, records))
+
+    failures = [
+        {"itemIdentifier": record["messageId"]}
+        for record, ok in zip(records, outcomes)
+        if not ok
+    ]
+
+    info("Batch finished", succeeded=len(records) - len(failures), failed=len(failures))
+
+    return {"batchItemFailures": failures}
+
+
+def _process_batch_record(record):
+    """Process one SQS record; returns False if it should be retried"""
+    try:
+        message = json.loads(record["body"])
+        # Accept both the full EventBridge envelope and a bare detail object
+        detail = message.get("detail", message)
+        process_transcription_job(detail)
+        return True
+    except Exception as e:
+        warning("Batch record failed", message_id=record.get("messageId"), error=str(e))
+        return False
+
+
+def process_transcription_job(detail):
+    """
+    Fetch the transcript for one Transcribe job, extract patient information
+    and store the result on the session.
+
+    Raises on failure after marking the session PROCESSING_FAILED.
+    """
+    job_name = detail.get("TranscriptionJobName", "")
+    with trace("transcription_processing", job_session_id(job_name), job_name=job_name):
+        return _process_transcription_job(detail)
+
+
+def _process_transcription_job(detail):
+    lease = None
     try:
-        detail = event["detail"]
         job_name = detail["TranscriptionJobName"]
         status = detail["TranscriptionJobStatus"]
+        session_id, upload = parse_upload_job(job_name)
+        # The job of the whole upload, for a chunk job the one it is part of
+        upload_job = upload_job_name(session_id, upload)
         
-        print(f"Processing transcription job: {job_name}, Status: {status}")
+        info("Processing transcription job", status=status)
         
         if status != "COMPLETED":
-            print(f"Job status is {status}, skipping processing")
+            info("Job did not complete, skipping processing", status=status)
             
             # Update status to FAILED if transcription failed
             if status == "FAILED":
-                dynamodb.update_item(
-                    TableName=TABLE_NAME,
-                    Key={"session_id": {"S": job_name}},
-                    UpdateExpression="SET #status = :status, updated_at = :updated_at",
-                    ExpressionAttributeNames={
-                        "#status": "status"
-                    },
-                    ExpressionAttributeValues={
+                update_current_upload(
+                    session_id, upload,
+                    "SET #status = :status, updated_at = :updated_at",
+                    {
                         ":status": {"S": "TRANSCRIPTION_FAILED"},
-                        ":updated_at": {"N": str(int(datetime.now().timestamp()))}
+                        ":updated_at": {"N": str(int(time.time()))}
                     }
                 )
             
-            return {
-                "statusCode": 200,
-                "body": json.dumps({"message": f"Job status: {status}"})
-            }
+            return {"message": f"Job status: {status}"}
+        
+        # A chunked session is processed once the last chunk finishes, from
+        # the stitched output of all chunks
+        if upload_job != job_name and not record_chunk_completion(session_id, job_name, upload):
+            return {"message": f"Chunk {job_name} completed; waiting for the remaining chunks"}
+
+        # Duplicate deliveries of the event stop here, before any S3 read
+        # or Bedrock call
+        with span("lease"):
+            lease = claim_processing(session_id, upload, force=bool(detail.get("force_reextract")))
+        if lease is None:
+            return {"message": f"Job {job_name} is already processed or being processed"}
+
+        if upload_job != job_name:
+            with span("stitch"):
+                stitch_chunk_outputs(session_id, upload_job)
         
         # Get transcription result from S3
         # AWS Transcribe outputs to: {OutputKey}/{job_name}.json
-        key = f"sessions/{job_name}/output/{job_name}.json"
-        
-        print(f"Fetching transcription from s3://{BUCKET_NAME}/{key}")
+        key = f"sessions/{session_id}/output/{upload_job}.json"
         
         try:
-            s3_response = s3.get_object(Bucket=BUCKET_NAME, Key=key)
-            transcription_data = json.loads(s3_response["Body"].read().decode("utf-8"))
-            transcript = transcription_data["results"]["transcripts"][0]["transcript"]
+            with span("s3_fetch"):
+                s3_response = s3.get_object(Bucket=BUCKET_NAME, Key=key)
+            # Stream the transcript out of the body instead of loading the
+            # whole per-word items array into memory (so this includes the
+            # download of the body)
+            with span("parse"):
+                document = read_transcript(s3_response["Body"], items=COMPACT_TRANSCRIPT_ENABLED)
+            transcript = document.transcript
             
-            print(f"Transcript length: {len(transcript)} characters")
-            print(f"Transcript preview: {transcript[:200]}...")
+            metric("transcript_bytes", s3_response.get("ContentLength"), "Bytes")
+            metric("transcript_chars", len(transcript))
+            debug("Transcript", key=key, preview=transcript[:200])
             
         except s3.exceptions.NoSuchKey:
-            print(f"Transcription file not found at {key}")
             raise Exception(f"Transcription output file not found: {key}")
         
-        # Extract patient information using Bedrock
-        extracted_info = extract_patient_info(transcript)
+        with span("compact"):
+            compact = compact_transcript(document.items, transcript) if document.items else None
+        compaction_stats = None
+        if compact:
+            compaction_stats = {
+                "turns": compact.turns,
+                "originalTokens": compact.original_tokens,
+                "compactTokens": compact.compact_tokens,
+                "tokensSaved": compact.original_tokens - compact.compact_tokens
+            }
+            metric("transcript_tokens", compact.original_tokens)
+            metric("compact_tokens", compact.compact_tokens)
         
-        print("Extracted info:", json.dumps(extracted_info, indent=2))
+        # Extract patient information using Bedrock, unless this transcript
+        # was already analysed with the same prompt and model.
+        # "force_reextract" in the event detail skips the cache lookup.
+        model_outputs = []
+        with span("extraction"):
+            extracted_info = extract_with_cache(
+                compact.text if compact else transcript,
+                speaker_attributed=bool(compact),
+                bypass=bool(detail.get("force_reextract")),
+                on_section=section_publisher(session_id, upload, lease) if STREAMING_EXTRACTION_ENABLED else None,
+                on_output=model_outputs.append
+            )
         
-        # Update DynamoDB with results
-        dynamodb.update_item(
-            TableName=TABLE_NAME,
-            Key={"session_id": {"S": job_name}},
-            UpdateExpression="SET #status = :status, extracted_info = :info, updated_at = :updated_at",
-            ExpressionAttributeNames={
-                "#status": "status"
-            },
-            ExpressionAttributeValues={
-                ":status": {"S": "COMPLETED"},
-                # ":transcript": {"S": transcript},
-                ":info": {"S": json.dumps(extracted_info)},
-                ":updated_at": {"N": str(int(datetime.now().timestamp()))}
-            }
-        )
+        debug("Extracted info", extracted_info=extracted_info)
+        # A failed or incomplete extraction fails the job: the session is
+        # not completed and the event is retried
+        if "error" in extracted_info:
+            raise ExtractionFailed(f"{extracted_info['error']}: "
+                                   f"{extracted_info.get('message', extracted_info.get('raw_content', ''))}")
+        if INCOMPLETE_SECTIONS in extracted_info:
+            raise IncompleteExtraction(
+                f"Sections missing from the extraction: {', '.join(extracted_info[INCOMPLETE_SECTIONS])}")
         
-        print("DynamoDB updated successfully")
+        # The transcript and model output go to a compressed object, the
+        # extracted fields onto the session as a map (common/session_results.py)
+        with span("s3_offload"):
+            results = results_key(session_id, upload_job)
+            stored = put_results(s3, BUCKET_NAME, results, transcript=transcript, model_output=model_outputs)
+        metric("results_object_bytes", stored, "Bytes")
+        
+        # Update DynamoDB with results
+        with span("dynamodb_write"):
+            current = update_current_upload(
+                session_id, upload,
+                "SET #status = :status, extracted_info = :info, results_key = :results, updated_at = :updated_at "
+                "REMOVE partial_extracted_info, processing_lease, processing_lease_until",
+                {
+                    ":status": {"S": "COMPLETED"},
+                    ":info": to_attribute(extracted_info),
+                    ":results": {"S": results},
+                    ":updated_at": {"N": str(int(time.time()))}
+                },
+                lease
+            )
+        if not current:
+            return {"message": f"Job {job_name} was superseded by a later upload", "sessionId": session_id}
         
         return {
-            "statusCode": 200,
-            "body": json.dumps({
-                "message": "Transcription processed successfully",
-                "sessionId": job_name,
-                "transcriptLength": len(transcript),
-                "extractedInfo": json.dumps(extracted_info)
-            })
+            "message": "Transcription processed successfully",
+            "sessionId": session_id,
+            "transcriptLength": len(transcript),
+            "compaction": compaction_stats,
+            "extractedInfo": json.dumps(extracted_info)
         }
         
     except Exception as e:
-        print(f"Error: {str(e)}")
         import traceback
-        traceback.print_exc()
+        error("Processing failed", error=str(e), traceback=traceback.format_exc())
         
         # Try to update DynamoDB with error status
         try:
-            job_name = event["detail"]["TranscriptionJobName"]
-            dynamodb.update_item(
-                TableName=TABLE_NAME,
-                Key={"session_id": {"S": job_name}},
-                UpdateExpression="SET #status = :status, error_message = :error, updated_at = :updated_at",
-                ExpressionAttributeNames={
-                    "#status": "status"
-                },
-                ExpressionAttributeValues={
+            session_id, upload = parse_upload_job(detail["TranscriptionJobName"])
+            update_current_upload(
+                session_id, upload,
+                "SET #status = :status, error_message = :error, updated_at = :updated_at "
+                "REMOVE processing_lease, processing_lease_until",
+                {
                     ":status": {"S": "PROCESSING_FAILED"},
                     ":error": {"S": str(e)},
-                    ":updated_at": {"N": str(int(datetime.now().timestamp()))}
-                }
+                    ":updated_at": {"N": str(int(time.time()))}
+                },
+                lease
             )
         except Exception as update_error:
-            print(f"Failed to update error status: {update_error}")
+            error("Failed to update error status", error=str(update_error))
         
         raise e
 
 
-def extract_patient_info(transcript):
-    """Extract patient information from transcript using Amazon Bedrock"""
-    
+class ExtractionFailed(Exception):
+    pass
+
+
+class IncompleteExtraction(ExtractionFailed):
+    pass
+
+
+def job_session_id(job_name):
+    """Jobs are named after their session; later uploads and chunk jobs carry a suffix"""
+    return parse_upload_job(job_name)[0]
+
+
+def current_upload_and(*alternatives):
+    """Condition that the job's upload is current and one of ``alternatives`` holds"""
+    return " OR ".join(f"{upload} AND {alternative}" for upload in CURRENT_UPLOAD for alternative in alternatives)
+
+
+def claim_processing(session_id, upload, force=False):
+    """
+    Take the session's processing lease: only one invocation can move the
+    session to EXTRACTION_IN_PROGRESS, and another only once the lease has
+    expired. A completed session is not taken again unless ``force``.
+
+    Returns the lease token, or None if the lease was not taken.
+    """
+    lease = uuid.uuid4().hex
+    now = int(time.time())
+    free = "#status <> :extracting" if force else "#status <> :extracting AND #status <> :completed"
+    try:
+        dynamodb.update_item(
+            TableName=TABLE_NAME,
+            Key={"session_id": {"S": session_id}},
+            UpdateExpression="SET #status = :extracting, processing_lease = :lease, "
+                             "processing_lease_until = :until, updated_at = :now ADD revision :one",
+            ConditionExpression=current_upload_and(free, "#status = :extracting AND processing_lease_until < :now"),
+            ExpressionAttributeNames={"#status": "status"},
+            ExpressionAttributeValues={
+                ":extracting": {"S": "EXTRACTION_IN_PROGRESS"},
+                ":lease": {"S": lease},
+                ":until": {"N": str(now + PROCESSING_LEASE_SECONDS)},
+                ":now": {"N": str(now)},
+                ":one": {"N": "1"},
+                ":upload": {"N": str(upload)},
+                **({} if force else {":completed": {"S": "COMPLETED"}})
+            }
+        )
+        return lease
+    except Exception as e:
+        if error_code(e) != "ConditionalCheckFailedException":
+            raise
+        metric("lease_conflicts", 1)
+        info("Session already processed or being processed", upload=upload)
+        return None
+
+
+def update_current_upload(session_id, upload, update_expression, values, lease=None):
+    """
+    Update the session unless a later upload has replaced the one this job
+    transcribed (transcribe_audio numbers the uploads), or the processing
+    lease is no longer ``lease``; without a lease, unless another
+    invocation holds one or has completed the session. False if not updated.
+    """
+    if lease:
+        guard, extra = "processing_lease = :lease", {":lease": {"S": lease}}
+    else:
+        guard, extra = "attribute_not_exists(processing_lease) AND #status <> :completed", \
+            {":completed": {"S": "COMPLETED"}}
+    try:
+        dynamodb.update_item(
+            TableName=TABLE_NAME,
+            Key={"session_id": {"S": session_id}},
+            # Every write moves the session's revision (get_session's ETag)
+            UpdateExpression=f"{update_expression} ADD revision :one",
+            ConditionExpression=current_upload_and(guard),
+            ExpressionAttributeNames={"#status": "status"},
+            ExpressionAttributeValues={**values, **extra, ":one": {"N": "1"}, ":upload": {"N": str(upload)}}
+        )
+        return True
+    except Exception as e:
+        if error_code(e) != "ConditionalCheckFailedException":
+            raise
+        info("Superseded by a later upload or another invocation", upload=upload)
+        return False
+
+
+def record_chunk_completion(session_id, job_name, upload):
+    """
+    Add the chunk to the session's completed set; True once the set is
+    complete (the processing lease then picks the one caller that goes on,
+    so a redelivered last chunk can take over from a crashed worker). A
+    chunk of a superseded upload changes nothing and returns False.
+    """
     try:
+        old = dynamodb.update_item(
+            TableName=TABLE_NAME,
+            Key={"session_id": {"S": session_id}},
+            UpdateExpression="ADD chunks_done :chunk, revision :one",
+            ConditionExpression=" OR ".join(CURRENT_UPLOAD),
+            ExpressionAttributeValues={":chunk": {"SS": [job_name]}, ":one": {"N": "1"}, ":upload": {"N": str(upload)}},
+            ReturnValues="ALL_OLD"
+        ).get("Attributes", {})
+    except Exception as e:
+        if error_code(e) != "ConditionalCheckFailedException":
+            raise
+        info("Chunk of a superseded upload", upload=upload)
+        return False
+    done = set(old.get("chunks_done", {}).get("SS", []))
+    chunk_count = int(old.get("chunk_count", {}).get("N", "0"))
+    info("Chunk completed", chunks_done=len(done | {job_name}), chunk_count=chunk_count)
+    return len(done | {job_name}) == chunk_count
+
+
+def stitch_chunk_outputs(session_id, upload_job):
+    """Write the stitched chunk outputs where a single job's output would be"""
+    manifest = json.load(s3.get_object(Bucket=BUCKET_NAME, Key=manifest_key(session_id))["Body"])
+
+    def read_output(chunk):
+        key = f"{chunk_output_prefix(session_id)}{chunk['job_name']}.json"
+        return json.load(s3.get_object(Bucket=BUCKET_NAME, Key=key)["Body"])
+
+    with ThreadPoolExecutor(max_workers=CHUNK_MAX_WORKERS) as executor:
+        outputs = list(executor.map(read_output, manifest["chunks"]))
+
+    document = stitch(manifest, outputs)
+    s3.put_object(
+        Bucket=BUCKET_NAME,
+        Key=f"sessions/{session_id}/output/{upload_job}.json",
+        Body=json.dumps(document),
+        ContentType="application/json"
+    )
+    info("Stitched chunks", chunks=len(outputs), source_seconds=manifest["source_seconds"],
+         billed_seconds=manifest["billed_seconds"])
+
+
+def section_publisher(session_id, upload, lease):
+    """
+    Callback for streaming extraction that writes the sections completed so
+    far to the session, so get_session can show them before the full result.
+    Writes under the same conditions as update_current_upload; once one is
+    refused (a later upload, or the lease was taken over) it stops publishing.
+    """
+    sections = {}
+    stopped = False
+    # Section-parallel calls publish concurrently: one write at a time, so
+    # a write with fewer sections never lands after one with more
+    lock = threading.Lock()
+    
+    def publish(name, value):
+        nonlocal stopped
+        with lock:
+            if stopped:
+                return
+            sections[name] = value
+            stopped = not update_current_upload(
+                session_id, upload,
+                "SET #status = :status, partial_extracted_info = :partial, updated_at = :updated_at",
+                {
+                    ":status": {"S": "EXTRACTION_IN_PROGRESS"},
+                    ":partial": to_attribute(sections),
+                    ":updated_at": {"N": str(int(time.time()))}
+                },
+                lease=lease
+            )
+        debug("Published section", section=name, sections=len(sections), stopped=stopped)
+    
+    return publish
+
+
+def extract_with_cache(transcript, speaker_attributed=False, bypass=False, on_section=None, on_output=None):
+    """Extract patient information, reusing a cached result when possible"""
+    
+    key = cache_key(transcript, PROMPT_VERSION, MODEL_ID, {
+        **INFERENCE_PARAMS,
+        # Chunking changes the prompts sent, so it is part of the key
+        "chunked": CHUNKED_EXTRACTION_ENABLED and len(transcript) > CHUNKED_EXTRACTION_MIN_CHARS,
+        "chunk_max_chars": CHUNK_MAX_CHARS,
+        "chunk_overlap_turns": CHUNK_OVERLAP_TURNS,
+        "speaker_attributed": speaker_attributed,
+        # So do the pre-extraction rules and the section groups
+        "pre_extraction": RULES_VERSION if PRE_EXTRACTION_ENABLED else None,
+        "section_groups": EXTRACTION_SECTION_GROUPS if EXTRACTION_MODE == "sections" else None
+    })
+    
+    extracted_info, hit = extraction_cache.get_or_extract(
+        key,
+        lambda: extract_patient_info(transcript, speaker_attributed=speaker_attributed, on_section=on_section,
+                                     on_output=on_output),
+        bypass=bypass
+    )
+    
+    metric("extraction_cache_hits", int(hit))
+    debug("Extraction cache", hit=hit, stats=extraction_cache.stats)
+    
+    return extracted_info
+
+
+def extract_patient_info(transcript, speaker_attributed=False, on_section=None, on_output=None):
+    """
+    Extract patient information from transcript using Amazon Bedrock.
+    
+    Fields the pre-extraction rules settle are left out of the request and
+    set on the model's answer. ``on_section(name, value)`` is called for
+    each top-level section as soon as the model has generated it
+    (not for chunked transcripts), ``on_output(text)`` with the raw text of
+    every model response.
+    """
+    
+    known, omit = {}, None
+    if PRE_EXTRACTION_ENABLED:
+        with span("pre_extraction"):
+            known = pre_extract(transcript, speaker_attributed=speaker_attributed)
+        filled = known_paths(known)
+        metric("pre_extracted_fields", len(filled))
+        debug("Pre-extracted fields", fields=sorted(filled))
+        omit = [path for path in FIELD_PATHS if path in filled]
+    
+    if known and on_section is not None:
+        # The sections the rules filled are shown before the model answers
+        for name, value in known.items():
+            try:
+                on_section(name, value)
+            except Exception as e:
+                warning("Failed to publish section", section=name, error=str(e))
+        publish = on_section
+        on_section = lambda name, value: publish(name, fill({name: value}, known)[name])
+    
+    if CHUNKED_EXTRACTION_ENABLED and len(transcript) > CHUNKED_EXTRACTION_MIN_CHARS:
+        extracted = extract_patient_info_chunked(transcript, speaker_attributed, on_output, omit)
+    elif EXTRACTION_MODE == "sections":
+        extracted = extract_patient_info_sections(transcript, speaker_attributed, on_section, on_output, omit)
+    else:
         # Get prompt from separate file
-        prompt = get_extraction_prompt(transcript)
-        
-        # Use Claude Haiku for extraction
-        model_id = "anthropic.claude-3-haiku-20240307-v1:0"
-        
-        # Claude API format (Messages API)
+        extracted = _extract_from_prompt(
+            partial(get_transcript_message, transcript, speaker_attributed=speaker_attributed, known=omit),
+            expected_sections(omit or ()),
+            on_section=on_section,
+            on_output=on_output
+        )
+    
+    if "error" in extracted:
+        return extracted
+    return fill(extracted, known)
+
+
+def extract_patient_info_chunked(transcript, speaker_attributed=False, on_output=None, known=None):
+    """
+    Map-reduce extraction for long transcripts: extract from overlapping
+    windows in parallel, then merge the partial results field by field.
+    """
+    windows = chunk_transcript(
+        transcript,
+        max_chars=CHUNK_MAX_CHARS,
+        overlap_turns=CHUNK_OVERLAP_TURNS
+    )
+    
+    info("Chunked extraction", chars=len(transcript), windows=len(windows))
+    metric("extraction_windows", len(windows))
+    
+    messages = [
+        partial(get_transcript_message, window, part=(i + 1, len(windows)), speaker_attributed=speaker_attributed,
+                known=known)
+        for i, window in enumerate(windows)
+    ]
+    expected = expected_sections(known or ())
+    
+    workers = max(1, min(CHUNK_MAX_WORKERS, len(messages)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        partials = list(executor.map(
+            propagate(lambda message: _extract_from_prompt(message, expected, on_output=on_output)),
+            messages
+        ))
+    
+    succeeded = [p for p in partials if "error" not in p]
+    if not succeeded:
+        return partials[0]
+    
+    if len(succeeded) < len(partials):
+        warning("Windows failed extraction", failed=len(partials) - len(succeeded), windows=len(partials))
+    
+    merged = merge_extractions([{name: value for name, value in p.items() if name != INCOMPLETE_SECTIONS}
+                                for p in succeeded])
+    return with_incomplete(merged, expected)
+
+
+def extract_patient_info_sections(transcript, speaker_attributed=False, on_section=None, on_output=None,
+                                  known=None):
+    """
+    Section-parallel extraction: one concurrent Bedrock call per group of
+    EXTRACTION_SECTION_GROUPS, each asking for only its sections, with the
+    results assembled in the output format's section order.
+    
+    The transcript is a part of its own in every call, so with prompt
+    caching the system prompt and transcript are a prefix the calls share.
+    A cache entry can be read only once the response writing it has
+    started, so then the first group is sent alone and the others when its
+    response starts. Sections of groups that failed are listed under
+    INCOMPLETE_SECTIONS.
+    """
+    expected = expected_sections(known or ())
+    groups = [[name for name in group if name in expected] for group in EXTRACTION_SECTION_GROUPS]
+    groups = [group for group in groups if group]
+    
+    info("Section-parallel extraction", groups=len(groups))
+    metric("extraction_section_calls", len(groups))
+    
+    def extract(group, on_start=None):
+        message = partial(
+            get_section_message, transcript, group, speaker_attributed=speaker_attributed,
+            known=[path for path in known or () if path.split(".")[0] in group]
+        )
+        try:
+            return _extract_from_prompt(message, group, on_section=on_section, on_output=on_output,
+                                        on_start=on_start)
+        finally:
+            if on_start is not None:
+                # A failed first call does not hold back the others
+                on_start()
+    
+    with ThreadPoolExecutor(max_workers=len(groups)) as executor:
+        if _prompt_cached() and len(groups) > 1:
+            started = threading.Event()
+            first = executor.submit(propagate(extract), groups[0], started.set)
+            with span("cache_warmup"):
+                started.wait()
+            partials = [first] + [executor.submit(propagate(extract), group) for group in groups[1:]]
+        else:
+            partials = [executor.submit(propagate(extract), group) for group in groups]
+        partials = [result.result() for result in partials]
+    
+    succeeded = [p for p in partials if "error" not in p]
+    if not succeeded:
+        return partials[0]
+    
+    if len(succeeded) < len(partials):
+        warning("Section groups failed extraction", failed=len(partials) - len(succeeded), groups=len(partials))
+        metric("extraction_failed_groups", len(partials) - len(succeeded))
+    
+    # The sections of failed groups are listed as incomplete along with
+    # those left unresolved
+    sections = {name: value for p in succeeded for name, value in p.items() if name != INCOMPLETE_SECTIONS}
+    return with_incomplete(sections, expected)
+
+
+def _extract_from_prompt(message, expected=None, on_section=None, on_output=None, on_start=None):
+    """
+    Run a transcript message through Bedrock and parse the JSON answer.
+    
+    ``message(reask=None)`` builds the user message. Sections of the answer
+    that are missing or fail validation against the output format
+    (extraction_schema.py) are asked for again with
+    ``message(reask={section: [problems]})`` instead of repeating the whole
+    extraction. ``on_start()`` is called when the response to the first
+    call starts. Returns the valid ``expected`` sections (default: all),
+    listing any still missing under INCOMPLETE_SECTIONS, or an error result
+    if there are none.
+    """
+    expected = list(SCHEMA) if expected is None else expected
+    publish = on_section
+    if publish is not None:
+        def on_section(name, value):
+            # Only sections that pass validation are shown
+            if name in expected:
+                fields, problems = validate_section(name, value)
+                if not problems:
+                    publish(name, fields)
+    
+    try:
+        content, usage = _invoke_bedrock(message(), on_section, on_start)
+    except Exception as e:
+        import traceback
+        error("Bedrock call failed", error=str(e), traceback=traceback.format_exc())
+        return {
+            "error": "Failed to extract information",
+            "message": str(e)
+        }
+    if on_output is not None:
+        on_output(content)
+    first_content = content
+    
+    with span("validate"):
+        parsed = parse_extraction(content, expected)
+    sections, problems = dict(parsed.sections), parsed.problems
+    metric("extraction_repaired", int(parsed.repaired))
+    metric("extraction_invalid_sections", len(problems))
+    
+    # What repeating the whole call would have cost
+    full_call_tokens = usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
+    for attempt in range(EXTRACTION_REASK_ATTEMPTS):
+        if not problems:
+            break
+        info("Asking again for sections", sections=sorted(problems), attempt=attempt + 1)
+        try:
+            with span("reask"):
+                content, usage = _invoke_bedrock(message(reask=problems))
+        except Exception as e:
+            warning("Re-ask failed", error=str(e))
+            break
+        if on_output is not None:
+            on_output(content)
+        answer = parse_extraction(content, list(problems))
+        sections.update(answer.sections)
+        problems = answer.problems
+        if on_section is not None:
+            for name, fields in answer.sections.items():
+                on_section(name, fields)
+        metric("extraction_reasks", 1)
+        metric("reask_tokens_saved", full_call_tokens - usage.get("input_tokens", 0) - usage.get("output_tokens", 0))
+    
+    if problems:
+        warning("Sections missing from the extraction", problems=problems)
+        metric("extraction_unresolved_sections", len(problems))
+    
+    if not sections:
+        if not parsed.found_json:
+            warning("No JSON found in Bedrock response", preview=first_content[:200])
+            return {
+                "error": "No JSON found in response",
+                "raw_content": first_content[:500]
+            }
+        return {
+            "error": "Invalid JSON in response",
+            "message": "; ".join(f"{name}: {', '.join(found)}" for name, found in problems.items())
+        }
+    
+    return with_incomplete(sections, expected)
+
+
+def with_incomplete(sections, expected):
+    """The ``expected`` sections in order, those missing listed under INCOMPLETE_SECTIONS"""
+    result = {name: sections[name] for name in expected if name in sections}
+    missing = [name for name in expected if name not in sections]
+    if missing:
+        result[INCOMPLETE_SECTIONS] = missing
+    return result
+
+
+def _prompt_cached():
+    return "cache_control" in SYSTEM_BLOCKS[0]
+
+
+def _invoke_bedrock(message, on_section=None, on_start=None):
+    """
+    Send one user message after the static system prompt; returns (text,
+    usage). A message given as a list of text parts has all parts but the
+    last marked as a cacheable prefix, when the system prompt is.
+    """
+    
+    # Claude API format (Messages API); the static instructions go in the
+    # system prompt so they form a reusable prefix
+    with span("prompt_build"):
+        parts = [message] if isinstance(message, str) else message
+        content = [{"type": "text", "text": part} for part in parts]
+        if _prompt_cached():
+            for block in content[:-1]:
+                block["cache_control"] = {"type": "ephemeral"}
         payload = {
             "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 2000,
-            "temperature": 0.3,
-            "top_p": 0.9,
+            **INFERENCE_PARAMS,
+            "system": SYSTEM_BLOCKS,
             "messages": [
                 {
                     "role": "user",
-                    "content": prompt
+                    "content": content
                 }
             ]
         }
+        body = json.dumps(payload)
+    metric("bedrock_request_bytes", len(body), "Bytes")
+    
+    if on_section is not None or on_start is not None:
+        content, usage = _stream_bedrock_content(body, on_section, on_start)
+    else:
+        started = time.perf_counter()
+        with span("bedrock_call"):
+            response = bedrock_limiter.call(
+                bedrock.invoke_model,
+                modelId=MODEL_ID,
+                body=body
+            )
+            raw = response["body"].read()
         
-        print("Calling Bedrock with model:", model_id)
-        
-        response = bedrock.invoke_model(
-            modelId=model_id,
-            body=json.dumps(payload)
-        )
-        
-        response_body = json.loads(response["body"].read().decode("utf-8"))
+        response_body = json.loads(raw.decode("utf-8"))
+        metric("bedrock_response_bytes", len(raw), "Bytes")
         
-        print("Bedrock response structure:", json.dumps({
-            k: type(v).__name__ for k, v in response_body.items()
-        }))
+        usage = response_body.get("usage", {})
+        record_bedrock_usage(usage, time.perf_counter() - started)
         
-        # Extract JSON from Claude response
         # Claude response format: { "content": [{"type": "text", "text": "..."}], ... }
         content = response_body["content"][0]["text"]
+    
+    debug("Bedrock content", preview=content[:500])
+    return content, usage
+
+
+def _stream_bedrock_content(body, on_section, on_start=None):
+    """
+    Call Bedrock with the streaming response API, handing each completed
+    top-level section to ``on_section`` (if given) and calling
+    ``on_start()`` once the response starts; returns the full generated
+    text and the token usage
+    """
+    started = time.perf_counter()
+    
+    def read_stream():
+        # Opened and read within one limiter call, so an error event in the
+        # stream is retried like a throttled invoke, from the start
+        response = bedrock.invoke_model_with_response_stream(modelId=MODEL_ID, body=body)
+        parser = SectionStreamParser()
+        parts = []
+        usage = {}
+        first_section_seconds = None
+        sections = 0
         
-        print(f"Bedrock content preview: {content[:500]}...")
-        
-        # Try to extract JSON from response (remove markdown code blocks if present)
-        content_cleaned = re.sub(r'```json\s*|\s*```', '', content).strip()
-        
-        # Try to find JSON object
-        json_match = re.search(r'\{[\s\S]*\}', content_cleaned)
-        
-        if json_match:
-            extracted = json.loads(json_match.group(0))
-            print("Successfully extracted JSON from Bedrock response")
-            return extracted
-        else:
-            print("No JSON found in Bedrock response")
-            return {
-                "error": "No JSON found in response",
-                "raw_content": content[:500]
-            }
+        # An error event in the stream raises botocore's EventStreamError
+        for event in response["body"]:
+            if "chunk" not in event:
+                continue
+            
+            message = json.loads(event["chunk"]["bytes"])
+            if message["type"] == "message_start":
+                usage.update(message["message"].get("usage", {}))
+                if on_start is not None:
+                    on_start()
+            elif message["type"] == "message_delta":
+                usage.update(message.get("usage", {}))
+            elif message["type"] == "content_block_delta":
+                text = message["delta"].get("text", "")
+                parts.append(text)
+                if on_section is None:
+                    continue
+                for name, value in parser.feed(text):
+                    if first_section_seconds is None:
+                        first_section_seconds = time.perf_counter() - started
+                    sections += 1
+                    try:
+                        on_section(name, value)
+                    except Exception as e:
+                        # Partial results are best effort; the full result still lands
+                        warning("Failed to publish section", section=name, error=str(e))
         
-    except json.JSONDecodeError as e:
-        print(f"JSON decode error: {e}")
-        return {
-            "error": "Invalid JSON in response",
-            "message": str(e)
-        }
-    except Exception as e:
-        print(f"Error calling Bedrock: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return {
-            "error": "Failed to extract information",
-            "message": str(e)
-        }
\ No newline at end of file
+        return "".join(parts), usage, sections, first_section_seconds
+    
+    content, usage, sections, first_section_seconds = bedrock_limiter.call(read_stream)
+    
+    elapsed = time.perf_counter() - started
+    record_bedrock_usage(usage, elapsed)
+    metric("streamed_sections", sections)
+    if first_section_seconds is not None:
+        metric("first_section_ms", round(first_section_seconds * 1000), "Milliseconds")
+    metric("bedrock_call_ms", round(elapsed * 1000), "Milliseconds")
+    
+    return content, usage
+
+
+def record_bedrock_usage(usage, latency_seconds):
+    """Token usage, prompt cache usage and latency of one Bedrock call"""
+    metric("bedrock_input_tokens", usage.get("input_tokens"))
+    metric("bedrock_output_tokens", usage.get("output_tokens"))
+    metric("bedrock_cache_read_tokens", usage.get("cache_read_input_tokens", 0))
+    metric("bedrock_cache_write_tokens", usage.get("cache_creation_input_tokens", 0))
+    debug("Bedrock usage", model_id=MODEL_ID, prompt_cached=_prompt_cached(),
+          usage=usage, latency_ms=round(latency_seconds * 1000))
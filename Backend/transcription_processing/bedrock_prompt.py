@@ -1,18 +1,73 @@
 """
 Bedrock prompt template for extracting patient information from transcripts
+
+The prompt is split into a static system prompt (instructions, field list,
+output format and rules), built once per process and identical for every
+request, and a short user message carrying the transcript. Keeping the
+static part first lets Bedrock reuse it as a cached prefix across requests
+on models that support prompt caching.
 """
+import hashlib
+
+# The output format, section by section: field -> the values the model may
+# return, as shown to it
+OUTPUT_FORMAT = {
+    "pregnancy_related": {
+        "customer_edd": '"YYYY-MM-DD or null"',
+        "first_pregnancy": 'true | false | null',
+        "scans_done": '["EP Scan", "NT Scan", "Anomaly Scan", "Growth 1", "Growth 2", "Other"] or []',
+        "having_twins": '"yes" | "no" | "more_than_2" | "unknown"',
+    },
+    "family_personal": {
+        "customer_location": '"string or null"',
+        "relatives_living_with": '"no" | "parents_in_laws" | "siblings" | "others" | "unknown"',
+        "mother_occupation": '"salaried" | "business" | "housemate" | "other" | "unknown"',
+        "father_occupation": '"salaried" | "business" | "housemate" | "other" | "unknown"',
+    },
+    "cloudnine_awareness": {
+        "how_learned_cloudnine": '"family_relatives" | "friends_colleagues" | "online_search" | "past_customer_fertility" | "past_customer_gynecology" | "past_customer_maternity" | "social_media" | "physical_presence" | "doctor_recommendation" | "unknown"',
+        "aware_of_packages": 'true | false | null',
+        "downloaded_app": 'true | false | null',
+        "booking_method": '"walk_in" | "app" | "call_centre" | "call_to_cce" | "practo" | "chatbot" | "unknown"',
+    },
+    "insurance": {
+        "insurance_status": '"single_insurance" | "dual_insurance" | "no" | "unknown"',
+    },
+    "cce_observations": {
+        "transport_method": '"own_vehicle" | "own_vehicle_with_driver" | "cab" | "auto" | "bus" | "walking" | "unknown"',
+        "mentioned_competitors": 'true | false | null',
+        "interested_in_facilities": 'true | false | null',
+        "doctor_preference": '"specific_doctor" | "fine_with_anyone" | "unknown"',
+        "doctor_name": '"string or null"',
+        "price_inquiry": 'true | false | null',
+        "accompanied_by": '"parents" | "siblings" | "friends" | "no_one" | "unknown"',
+        "brings_other_children": '"no_other_children" | "no" | "yes" | "unknown"',
+        "doctor_remark_questions": 'true | false | null',
+        "going_to_native": 'true | false | null',
+    },
+    "additional_insights": {
+        "conversation_summary": '"2-3 sentence summary"',
+        "key_concerns": '["list of concerns"]',
+        "positive_signals": '["list of positive signals"]',
+        "package_interest": '"luxury" | "signature" | "apartment" | "presidential" | "none" | "unknown"',
+    },
+}
+
+# "section.field" of every field, in prompt order
+FIELD_PATHS = [f"{section}.{field}" for section, fields in OUTPUT_FORMAT.items() for field in fields]
+
+
+def format_schema(sections=None):
+    """The JSON skeleton of the output format, or of just ``sections`` of it"""
+    sections = [
+        f'  "{section}": {{\n' + ",\n".join(f'    "{field}": {spec}' for field, spec in specs.items()) + "\n  }"
+        for section, specs in OUTPUT_FORMAT.items()
+        if sections is None or section in sections
+    ]
+    return "{\n" + ",\n".join(sections) + "\n}"
 
-def get_extraction_prompt(transcript):
-    """
-    Generate the prompt for extracting patient information from a transcript.
-    
-    Args:
-        transcript (str): The conversation transcript to analyze
-        
-    Returns:
-        str: The formatted prompt for Bedrock
-    """
-    return f"""You are an AI assistant helping to extract patient information from a Cloud9 Hospital customer care conversation transcript.
+
+SYSTEM_PROMPT = """You are an AI assistant helping to extract patient information from a Cloud9 Hospital customer care conversation transcript.
 
 The conversation may be in English, Hindi, Tamil, Telugu, Kannada, Malayalam, Marathi, Bengali, Gujarati, or a mix of these languages.
 
@@ -65,53 +120,10 @@ CCE OBSERVATIONS:
 - Did doctor remark about customer asking lots of questions? (Yes/No)
 - Has customer mentioned going to native place to deliver? (Yes/No)
 
-Transcript:
-{transcript}
-
-Return ONLY a valid JSON object with the extracted information. Use null for fields not found. Use "unknown" for unclear answers.
+Return ONLY a valid JSON object with the information extracted from the transcript in the user message. Use null for fields not found. Use "unknown" for unclear answers.
 
 Format:
-{{
-  "pregnancy_related": {{
-    "customer_edd": "YYYY-MM-DD or null",
-    "first_pregnancy": true | false | null,
-    "scans_done": ["EP Scan", "NT Scan", "Anomaly Scan", "Growth 1", "Growth 2", "Other"] or [],
-    "having_twins": "yes" | "no" | "more_than_2" | "unknown"
-  }},
-  "family_personal": {{
-    "customer_location": "string or null",
-    "relatives_living_with": "no" | "parents_in_laws" | "siblings" | "others" | "unknown",
-    "mother_occupation": "salaried" | "business" | "housemate" | "other" | "unknown",
-    "father_occupation": "salaried" | "business" | "housemate" | "other" | "unknown"
-  }},
-  "cloudnine_awareness": {{
-    "how_learned_cloudnine": "family_relatives" | "friends_colleagues" | "online_search" | "past_customer_fertility" | "past_customer_gynecology" | "past_customer_maternity" | "social_media" | "physical_presence" | "doctor_recommendation" | "unknown",
-    "aware_of_packages": true | false | null,
-    "downloaded_app": true | false | null,
-    "booking_method": "walk_in" | "app" | "call_centre" | "call_to_cce" | "practo" | "chatbot" | "unknown"
-  }},
-  "insurance": {{
-    "insurance_status": "single_insurance" | "dual_insurance" | "no" | "unknown"
-  }},
-  "cce_observations": {{
-    "transport_method": "own_vehicle" | "own_vehicle_with_driver" | "cab" | "auto" | "bus" | "walking" | "unknown",
-    "mentioned_competitors": true | false | null,
-    "interested_in_facilities": true | false | null,
-    "doctor_preference": "specific_doctor" | "fine_with_anyone" | "unknown",
-    "doctor_name": "string or null",
-    "price_inquiry": true | false | null,
-    "accompanied_by": "parents" | "siblings" | "friends" | "no_one" | "unknown",
-    "brings_other_children": "no_other_children" | "no" | "yes" | "unknown",
-    "doctor_remark_questions": true | false | null,
-    "going_to_native": true | false | null
-  }},
-  "additional_insights": {{
-    "conversation_summary": "2-3 sentence summary",
-    "key_concerns": ["list of concerns"],
-    "positive_signals": ["list of positive signals"],
-    "package_interest": "luxury" | "signature" | "apartment" | "presidential" | "none" | "unknown"
-  }}
-}}
+""" + format_schema() + """
 
 IMPORTANT RULES:
 1. Return ONLY valid JSON, no markdown code blocks
@@ -121,4 +133,93 @@ IMPORTANT RULES:
 5. For dates, use YYYY-MM-DD format
 6. For boolean fields, use true/false/null
 7. Extract doctor name if mentioned specifically
-8. Apply the scan progression logic strictly - infer all completed scans based on the latest scan mentioned"""
\ No newline at end of file
+8. Apply the scan progression logic strictly - infer all completed scans based on the latest scan mentioned"""
+
+
+def get_transcript_message(transcript, part=None, speaker_attributed=False, known=None, reask=None):
+    """
+    Generate the user message carrying the transcript to analyze.
+    
+    Args:
+        transcript (str): The conversation transcript to analyze
+        part (tuple): Optional (index, total) when the transcript is one
+            window of a longer conversation
+        speaker_attributed (bool): The transcript has one "CCE:"/"CUSTOMER:"
+            prefixed line per speaker turn
+        known (list): Optional "section.field" paths of fields already
+            known, which the answer should leave out
+        reask (dict): Optional {section: [problems]} of the sections an
+            earlier answer lacked or got wrong, to ask for only those
+        
+    Returns:
+        str: The user message for Bedrock; SYSTEM_PROMPT holds the instructions
+    """
+    return _transcript_part(transcript, part, speaker_attributed) + _answer_note(
+        known, reask, "Return ONLY the JSON object.")
+
+
+def get_section_message(transcript, sections, speaker_attributed=False, known=None, reask=None):
+    """
+    Generate the user message asking for only some sections of the output
+    format, as two parts: the transcript, the same for every group of
+    sections and so a cacheable prefix, and the focused format of
+    ``sections``. ``known`` and ``reask`` are as for get_transcript_message.
+    
+    Returns:
+        list: The text parts of the user message
+    """
+    if reask:
+        sections = [section for section in sections if section in reask]
+    return [
+        _transcript_part(transcript, None, speaker_attributed),
+        f"""Extract only these sections of the output format:
+{format_schema(sections)}
+
+""" + _answer_note(known, reask, "Return ONLY a JSON object with just these sections.")
+    ]
+
+
+def _transcript_part(transcript, part, speaker_attributed):
+    part_note = ""
+    if part:
+        part_note = f"""This transcript is part {part[0]} of {part[1]} of a longer conversation (consecutive parts overlap slightly). Extract only what is stated in this part and use null for everything else.
+
+"""
+    
+    transcript_note = ""
+    if speaker_attributed:
+        transcript_note = """Each line is one speaker turn: "CCE:" is the Cloudnine customer care executive, "CUSTOMER:" is the customer or someone accompanying them. Take answers about the customer from the CUSTOMER lines.
+"""
+    
+    return f"""{part_note}Transcript:
+{transcript_note}{transcript}
+
+"""
+
+
+def _answer_note(known, reask, answer_note):
+    if reask:
+        problems = "; ".join(f"{section} ({', '.join(found)})" for section, found in reask.items())
+        answer_note = f"""An earlier answer lacked or got these sections wrong: {problems}. Use only the values the format allows.
+
+Return ONLY a JSON object with just these sections."""
+    if known:
+        # Named here rather than cut from the format so that SYSTEM_PROMPT
+        # stays the same for every request
+        answer_note = f"""These fields are already known: {", ".join(known)}. Leave them, and sections left empty, out of the JSON object.
+
+{answer_note}"""
+    return answer_note
+
+
+# Identifies the prompt text; changes whenever the prompt is edited, which
+# invalidates cached extraction results produced with an older prompt
+PROMPT_VERSION = hashlib.sha256(
+    (
+        SYSTEM_PROMPT
+        + get_transcript_message("{transcript}")
+        + get_transcript_message("{transcript}", part=(0, 0), speaker_attributed=True)
+        + get_transcript_message("{transcript}", known=FIELD_PATHS[:1], reask={"{section}": ["{problem}"]})
+        + "".join(get_section_message("{transcript}", list(OUTPUT_FORMAT)[:1]))
+    ).encode("utf-8")
+).hexdigest()[:16]
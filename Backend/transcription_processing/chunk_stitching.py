@@ -0,0 +1,159 @@
+"""
+Stitch the Transcribe outputs of a chunked session into one document.
+
+Chunk timestamps are relative to the chunk audio, which starts on the kept
+(silence-trimmed) timeline and may repeat the end of the previous chunk.
+Every word is mapped back to the source recording, words in an overlap
+are taken from the chunk where they sit further from the edge, and the
+speaker labels of each chunk are renamed after the labels of the previous
+chunk for the same words in the overlap. The result has the shape of a
+Transcribe output document, so the rest of the pipeline reads it unchanged.
+"""
+from bisect import bisect_right
+from collections import Counter
+
+from common.chunk_manifest import kept_to_source
+
+# A word in the overlap matches a word of the previous chunk within this
+MATCH_TOLERANCE_SECONDS = 0.3
+
+
+def item_speakers(results):
+    """Speaker label per item, falling back to the speaker segments"""
+    segments = (results.get("speaker_labels") or {}).get("segments") or []
+    starts = [float(s["start_time"]) for s in segments]
+    speakers, speaker = [], None
+    for item in results.get("items", []):
+        if item.get("speaker_label"):
+            speaker = item["speaker_label"]
+        elif "start_time" in item and segments:
+            index = bisect_right(starts, float(item["start_time"])) - 1
+            if index >= 0:
+                speaker = segments[index]["speaker_label"]
+        speakers.append(speaker)
+    return speakers
+
+
+def map_speakers(labels_in_overlap, previous_words):
+    """
+    {chunk label: session label}: each label takes the session label it
+    most often coincides with in the overlap; others get unused labels
+    """
+    votes = Counter()
+    previous_starts = [start for start, _ in previous_words]
+    for start, label in labels_in_overlap:
+        index = bisect_right(previous_starts, start)
+        near = [i for i in (index - 1, index) if 0 <= i < len(previous_words)]
+        best = min(near, key=lambda i: abs(previous_starts[i] - start), default=None)
+        if best is not None and abs(previous_starts[best] - start) <= MATCH_TOLERANCE_SECONDS:
+            votes[(label, previous_words[best][1])] += 1
+
+    mapping, taken = {}, set()
+    for (label, session_label), _ in votes.most_common():
+        if label not in mapping and session_label not in taken:
+            mapping[label] = session_label
+            taken.add(session_label)
+    return mapping
+
+
+def free_label(used, taken):
+    """A session label not yet taken in this chunk, preferring known ones"""
+    free = sorted(used - taken)
+    if free:
+        return free[0]
+    n = 0
+    while f"spk_{n}" in taken:
+        n += 1
+    return f"spk_{n}"
+
+
+def stitch(manifest, outputs):
+    """
+    One Transcribe-style document from the chunk ``outputs`` (parsed
+    documents, in chunk order) described by ``manifest``
+    """
+    spans, cuts, overlap = manifest["spans"], manifest["cuts"], manifest["overlap_seconds"]
+    items, used, previous_words = [], set(), []
+    language_codes = []
+
+    for index, (chunk, output) in enumerate(zip(manifest["chunks"], outputs)):
+        results = output["results"]
+        offset = chunk["start"]
+        # Each side of an overlap keeps the half away from its own edge
+        keep_from = cuts[index] - overlap / 2 if index else float("-inf")
+        keep_to = cuts[index + 1] - overlap / 2 if index + 1 < len(manifest["chunks"]) else float("inf")
+
+        raw = results.get("items", [])
+        speakers = item_speakers(results)
+        overlap_words = [
+            (offset + float(item["start_time"]), label)
+            for item, label in zip(raw, speakers)
+            if "start_time" in item and label and offset + float(item["start_time"]) < cuts[index]
+        ]
+        mapping = map_speakers(overlap_words, previous_words) if index else {}
+        for label in dict.fromkeys(label for label in speakers if label):
+            if label not in mapping:
+                mapping[label] = label if index == 0 else free_label(used, set(mapping.values()))
+        used |= set(mapping.values())
+
+        keep, words = False, []
+        for item, label in zip(raw, speakers):
+            item = dict(item)
+            if "start_time" in item:
+                start, end = offset + float(item["start_time"]), offset + float(item["end_time"])
+                keep = keep_from <= start < keep_to
+                words.append((start, mapping.get(label)))
+                item["start_time"] = f"{kept_to_source(spans, start):.3f}"
+                item["end_time"] = f"{kept_to_source(spans, end):.3f}"
+            # Punctuation follows the word before it
+            if keep:
+                if label:
+                    item["speaker_label"] = mapping[label]
+                items.append(item)
+
+        previous_words = words
+        if results.get("language_code"):
+            language_codes.append(results["language_code"])
+
+    for number, item in enumerate(items):
+        item["id"] = number
+
+    document = {
+        "jobName": manifest["session_id"],
+        "results": {
+            "transcripts": [{"transcript": transcript_text(items)}],
+            "speaker_labels": {"speakers": len(used), "segments": speaker_segments(items)},
+            "items": items,
+        },
+        "status": "COMPLETED",
+    }
+    if language_codes:
+        document["results"]["language_code"] = Counter(language_codes).most_common(1)[0][0]
+    return document
+
+
+def transcript_text(items):
+    parts = []
+    for item in items:
+        content = item["alternatives"][0]["content"]
+        if item.get("type") == "punctuation" or not parts:
+            parts.append(content)
+        else:
+            parts.append(" " + content)
+    return "".join(parts)
+
+
+def speaker_segments(items):
+    """Runs of consecutive words by the same speaker"""
+    segments = []
+    for item in items:
+        if "start_time" not in item or "speaker_label" not in item:
+            continue
+        word = {"speaker_label": item["speaker_label"], "start_time": item["start_time"],
+                "end_time": item["end_time"]}
+        if segments and segments[-1]["speaker_label"] == item["speaker_label"]:
+            segments[-1]["end_time"] = item["end_time"]
+            segments[-1]["items"].append(word)
+        else:
+            segments.append({**word, "items": [word]})
+    return segments
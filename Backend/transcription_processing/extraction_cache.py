@@ -0,0 +1,126 @@
+"""
+Content-addressed cache of Bedrock extraction results.
+
+Entries live in a DynamoDB table (partition key ``cache_key``) so they
+survive across invocations and Lambda instances. Expiry uses the table's TTL
+attribute ``expires_at``; since DynamoDB deletes expired items lazily, reads
+also treat an entry past its expiry as a miss.
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+import unicodedata
+
+from common.telemetry import warning
+
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_transcript(transcript):
+    """Canonical form of a transcript for hashing: NFC, collapsed whitespace"""
+    return WHITESPACE.sub(" ", unicodedata.normalize("NFC", transcript)).strip()
+
+
+def cache_key(transcript, prompt_version, model_id, params):
+    """
+    Hash of everything that determines the extraction result: the normalized
+    transcript, the prompt template version, the model and its parameters.
+    """
+    digest = hashlib.sha256()
+    for part in (
+        normalize_transcript(transcript),
+        prompt_version,
+        model_id,
+        json.dumps(params, sort_keys=True),
+    ):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """
+    Read-through cache for extraction results.
+
+    ``table_name`` of None disables the cache: every lookup is a miss and
+    nothing is stored. Counters are per process and reset on cold start.
+    """
+
+    def __init__(self, dynamodb, table_name, ttl_seconds):
+        self.dynamodb = dynamodb
+        self.table_name = table_name
+        self.ttl_seconds = ttl_seconds
+        self.stats = {"hits": 0, "misses": 0, "bypassed": 0, "stores": 0, "errors": 0}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.table_name)
+
+    def _count(self, counter):
+        with self._lock:
+            self.stats[counter] += 1
+
+    def get(self, key):
+        """Return the cached extraction for ``key`` or None"""
+        if not self.enabled:
+            return None
+
+        try:
+            result = self.dynamodb.get_item(
+                TableName=self.table_name,
+                Key={"cache_key": {"S": key}}
+            )
+        except Exception as e:
+            # The cache must never fail an extraction
+            warning("Extraction cache read failed", error=str(e))
+            self._count("errors")
+            return None
+
+        item = result.get("Item")
+        if not item or int(item["expires_at"]["N"]) <= time.time():
+            self._count("misses")
+            return None
+
+        self._count("hits")
+        return json.loads(item["extracted_info"]["S"])
+
+    def put(self, key, extracted_info):
+        """Store a successful extraction; error and incomplete results are never cached"""
+        if not self.enabled or "error" in extracted_info or "incomplete_sections" in extracted_info:
+            return
+
+        now = int(time.time())
+        try:
+            self.dynamodb.put_item(
+                TableName=self.table_name,
+                Item={
+                    "cache_key": {"S": key},
+                    "extracted_info": {"S": json.dumps(extracted_info)},
+                    "created_at": {"N": str(now)},
+                    "expires_at": {"N": str(now + self.ttl_seconds)},
+                }
+            )
+            self._count("stores")
+        except Exception as e:
+            warning("Extraction cache write failed", error=str(e))
+            self._count("errors")
+
+    def get_or_extract(self, key, extract, bypass=False):
+        """
+        Return the cached result for ``key``, calling ``extract()`` and
+        storing its result on a miss. ``bypass`` forces a fresh extraction
+        and overwrites the cached entry.
+        """
+        if bypass:
+            self._count("bypassed")
+        else:
+            cached = self.get(key)
+            if cached is not None:
+                return cached, True
+
+        extracted_info = extract()
+        self.put(key, extracted_info)
+        return extracted_info, False
@@ -0,0 +1,253 @@
+"""
+Output schema of the extraction, derived from the output format in
+bedrock_prompt.py, and a tolerant parser for the model's answers:
+
+- the JSON object is taken from the text around it (code fences, prose)
+  and common slips are repaired: trailing commas, Python literals, raw
+  newlines in strings, an answer cut off before its end;
+- when the object still does not parse, the sections that are complete
+  on their own are kept;
+- values are checked against the format's enums and types after
+  normalizing case and spacing ("Single Insurance" -> "single_insurance").
+
+Sections that are missing, malformed or hold a value outside the format
+are reported per section, so that only those are asked for again.
+"""
+import datetime
+import json
+import re
+from collections import namedtuple
+
+from bedrock_prompt import OUTPUT_FORMAT
+from section_stream import SectionStreamParser
+
+Field = namedtuple("Field", ["kind", "values"])
+ParsedExtraction = namedtuple("ParsedExtraction", ["sections", "problems", "repaired", "found_json"])
+
+NULL_STRINGS = ("", "null", "none", "n/a", "unknown")
+PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+def _field(spec):
+    """Field of a format spec such as '"yes" | "no"' or 'true | false | null'"""
+    quoted = re.findall(r'"([^"]+)"', spec)
+    if spec.startswith("["):
+        return Field("enum_list", quoted) if len(quoted) > 1 else Field("string_list", None)
+    if spec.startswith("true"):
+        return Field("boolean", None)
+    if len(quoted) > 1:
+        return Field("enum", quoted)
+    if "YYYY-MM-DD" in spec:
+        return Field("date", None)
+    return Field("string", None)
+
+
+SCHEMA = {section: {name: _field(spec) for name, spec in fields.items()} for section, fields in OUTPUT_FORMAT.items()}
+
+
+def _key(value):
+    return re.sub(r"[\s/-]+", "_", str(value).strip().lower())
+
+
+def normalize_value(field, value):
+    """(valid, value) with the value in the format's spelling"""
+    if value is None:
+        return True, None
+    # "unknown" is a value of the enums and the model's null elsewhere
+    if isinstance(value, str) and value.strip().lower() in NULL_STRINGS and (
+            field.kind != "enum" or value.strip().lower() != "unknown"):
+        return True, None
+
+    if field.kind == "boolean":
+        if isinstance(value, bool):
+            return True, value
+        word = _key(value)
+        if word in ("true", "yes"):
+            return True, True
+        if word in ("false", "no"):
+            return True, False
+        return False, value
+
+    if field.kind == "enum":
+        if isinstance(value, bool):
+            value = "yes" if value else "no"
+        matches = [allowed for allowed in field.values if _key(allowed) == _key(value)]
+        return (True, matches[0]) if matches else (False, value)
+
+    if field.kind == "date":
+        if isinstance(value, str) and DATE.match(value.strip()):
+            try:
+                datetime.date.fromisoformat(value.strip())
+                return True, value.strip()
+            except ValueError:
+                pass
+        return False, value
+
+    if field.kind == "string":
+        if isinstance(value, (str, int, float)) and not isinstance(value, bool):
+            return True, str(value)
+        return False, value
+
+    items = value if isinstance(value, list) else [value]
+    if field.kind == "string_list":
+        if all(isinstance(item, (str, int, float)) for item in items):
+            return True, [str(item) for item in items]
+        return False, value
+    normalized = []
+    for item in items:
+        matches = [allowed for allowed in field.values if _key(allowed) == _key(item)]
+        if not matches:
+            return False, value
+        normalized.append(matches[0])
+    return True, normalized
+
+
+def validate_section(name, value):
+    """
+    (section in the format's spelling, problems). Fields the format does
+    not have are dropped; fields the answer leaves out stay out.
+    """
+    if not isinstance(value, dict):
+        return None, ["not a JSON object"]
+    fields, problems = {}, []
+    for field_name, field_value in value.items():
+        field = SCHEMA[name].get(field_name)
+        if field is None:
+            continue
+        valid, normalized = normalize_value(field, field_value)
+        if valid:
+            fields[field_name] = normalized
+        else:
+            problems.append(f"{field_name}: {json.dumps(field_value, ensure_ascii=False)} is not an allowed value")
+    return fields, problems
+
+
+def repair_json(text):
+    """
+    Best-effort fix of a JSON object: from its first "{", with trailing
+    commas removed, Python literals, raw newlines in strings and
+    mismatched brackets replaced, and an unterminated string, member or
+    object closed at the end. Returns (text, whether it was cut off), or
+    None without an object.
+    """
+    start = text.find("{")
+    if start < 0:
+        return None
+    out, stack, word = [], [], []
+    in_string = escaped = False
+
+    def flush_word():
+        if word:
+            token = "".join(word)
+            out.append(PYTHON_LITERALS.get(token, token))
+            word.clear()
+
+    for char in text[start:]:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            elif char == "\n":
+                char = "\\n"
+            out.append(char)
+            continue
+        if char.isalnum() or char in "_.+-":
+            word.append(char)
+            continue
+        flush_word()
+        if char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]":
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+            if stack:
+                # A mismatched closer becomes the one that is due
+                char = stack.pop()
+        out.append(char)
+        if not stack:
+            break
+    flush_word()
+
+    if stack:
+        # Cut off: close what is open, dropping a member without a value
+        if in_string:
+            out.append('"')
+        repaired = "".join(out).rstrip()
+        repaired = re.sub(r',\s*"[^"]*"\s*$', "", repaired)
+        repaired = re.sub(r":\s*$", ": null", repaired).rstrip(",").rstrip()
+        return repaired + "".join(reversed(stack)), True
+    return "".join(out), False
+
+
+def parse_extraction(text, expected=None):
+    """
+    ParsedExtraction of a model answer: the valid ``expected`` sections
+    (default: all), {section: [problems]} for the others, whether the JSON
+    needed repairing, and whether any JSON object was found at all
+    """
+    expected = list(SCHEMA) if expected is None else expected
+    cleaned = re.sub(r"```(?:json)?", "", text)
+    answer, repaired, cut_off_section = None, False, None
+    match = re.search(r"\{[\s\S]*\}", cleaned)
+    if match:
+        try:
+            answer = json.loads(match.group(0))
+        except json.JSONDecodeError:
+            pass
+    if not isinstance(answer, dict):
+        fixed = repair_json(cleaned)
+        if fixed is None:
+            return ParsedExtraction({}, {name: ["missing"] for name in expected}, False, False)
+        fixed, cut_off = fixed
+        repaired = True
+        try:
+            answer = json.loads(fixed)
+        except json.JSONDecodeError:
+            # Keep the sections that are complete on their own
+            answer = dict(SectionStreamParser().feed(fixed))
+        if not isinstance(answer, dict):
+            answer = {}
+        if cut_off and answer:
+            # The section being written when the answer stopped is incomplete
+            cut_off_section = list(answer)[-1]
+
+    sections, problems = {}, {}
+    for name in expected:
+        if name not in answer or name == cut_off_section:
+            problems[name] = ["missing" if name not in answer else "cut off"]
+            continue
+        fields, section_problems = validate_section(name, answer[name])
+        if section_problems:
+            problems[name] = section_problems
+        else:
+            sections[name] = fields
+    return ParsedExtraction(sections, problems, repaired, True)
+
+
+def expected_sections(known=()):
+    """Sections an answer must hold when the fields at ``known`` paths are left out"""
+    return [section for section, fields in SCHEMA.items()
+            if any(f"{section}.{field}" not in known for field in fields)]
+
+
+def section_groups(spec):
+    """
+    Groups of sections from a spec such as "a,b;c": the groups in order,
+    then one more with the sections the spec leaves out
+    """
+    groups = [[name.strip() for name in group.split(",") if name.strip()] for group in spec.split(";")]
+    groups = [group for group in groups if group]
+    listed = [name for group in groups for name in group]
+    unknown = [name for name in listed if name not in SCHEMA]
+    if unknown:
+        raise ValueError(f"Unknown sections in section groups: {', '.join(unknown)}")
+    rest = [name for name in SCHEMA if name not in listed]
+    return groups + [rest] if rest else groups
@@ -0,0 +1,376 @@
+"""
+Rule-based pass over the transcript that fills the fields keywords answer
+reliably, before Bedrock is asked for the rest:
+
+- pregnancy_related.customer_edd: a full date (with year) said around
+  "EDD"/"due date"
+- pregnancy_related.scans_done: the scans the customer reports, completed
+  by the scan progression rule
+- pregnancy_related.having_twins, cloudnine_awareness.downloaded_app,
+  insurance.insurance_status: the customer's yes/no answer to the CCE's
+  question
+- cce_observations.mentioned_competitors: a competitor named by the customer
+  (names that are also common words only with "hospital" or the like)
+
+The rules are conservative: a field is only filled when the transcript
+states it plainly, and answers that disagree leave it to the model. The
+answer and scan rules need the speaker-attributed transcript (one
+"CCE:"/"CUSTOMER:" line per turn); on a flat transcript only the date and
+competitor rules run, the latter on hospital names alone. Lexicons cover English and the Indian languages the
+prompt lists, both romanized and in their own scripts.
+"""
+import datetime
+import hashlib
+import re
+import unicodedata
+from collections import namedtuple
+
+from transcript_chunking import SCAN_ORDER, split_turns
+from transcript_compactor import CCE_LABEL, CUSTOMER_LABEL
+
+# Identifies the rules; part of the extraction cache key
+with open(__file__, "rb") as _source:
+    RULES_VERSION = hashlib.sha256(_source.read()).hexdigest()[:16]
+
+# Words are split on whitespace and punctuation, not \b, which breaks
+# inside words of the Indic scripts (vowel signs are not \w)
+WORD = re.compile(r"[^\s.,!?।॥;:\"'“”‘’()\[\]/-]+")
+
+Turn = namedtuple("Turn", ["speaker", "text", "words", "padded"])
+
+
+def normalize(text):
+    return unicodedata.normalize("NFC", text).casefold()
+
+
+def _lexicon(*phrases):
+    return frozenset(" ".join(WORD.findall(normalize(phrase))) for phrase in phrases)
+
+
+YES = _lexicon(
+    "yes", "yeah", "yep", "yup", "yea", "sure", "of course", "already",
+    "haan", "haa", "haanji", "हाँ", "हां", "हो",
+    "aama", "aamaa", "aamam", "ஆமா", "ஆமாம்", "இருக்கு",
+    "avunu", "అవును", "ఉంది",
+    "haudu", "ಹೌದು", "ಇದೆ",
+    "athe", "അതെ", "ഉണ്ട്",
+    "হ্যাঁ", "হাঁ", "আছে",
+    "હા", "હાં", "છે",
+)
+NO = _lexicon(
+    "no", "not", "nope", "never", "don't", "didn't", "haven't", "hasn't", "doesn't", "not yet",
+    "nahi", "nahin", "nai", "nhi", "नहीं", "नही", "नाही",
+    "illa", "illai", "இல்லை", "இல்ல",
+    "ledu", "లేదు",
+    "ಇಲ್ಲ", "ಇಲ್ಲಾ",
+    "ഇല്ല",
+    "না", "নেই",
+    "nathi", "નથી", "ના",
+)
+# Turns that talk about something still to happen
+FUTURE = _lexicon(
+    "will", "next", "going to", "yet to", "have to", "need to", "pending", "upcoming", "planned",
+    "baaki", "bacha", "बाकी", "अगला", "अगले", "होगा", "करना है", "पुढच्या", "करायचे",
+    "அடுத்த", "பண்ணணும்", "తర్వాత", "చేయించాలి", "ಮುಂದಿನ", "ಮಾಡಿಸಬೇಕು", "അടുത്ത", "ചെയ്യണം",
+    "পরের", "করতে হবে", "આવતા", "કરાવવાનું",
+)
+
+EDD = _lexicon(
+    "edd", "due date", "due on", "delivery date", "expected date", "date of delivery",
+    "डिलीवरी", "ड्यू डेट", "प्रसूति", "प्रसूतीची", "டியூ டேட்", "பிரசவ", "டெலிவரி",
+    "డ్యూ డేట్", "డెలివరీ", "ಡ್ಯೂ ಡೇಟ್", "ಡೆಲಿವರಿ", "ഡ്യൂ ഡേറ്റ്", "ഡെലിവറി",
+    "ডিউ ডেট", "ডেলিভারি", "ડ્યુ ડેટ", "ડિલિવરી",
+)
+TWINS = _lexicon(
+    "twins", "twin", "judwa", "judwaa", "जुड़वां", "जुड़वा", "जुळे", "இரட்டை",
+    "కవలలు", "కవల", "ಅವಳಿ", "ഇരട്ട", "ഇരട്ടക്കുട്ടികൾ", "যমজ", "જોડિયા",
+)
+TRIPLETS = _lexicon("triplets", "three babies", "quadruplets", "तीन बच्चे")
+SINGLE_BABY = _lexicon(
+    "single", "singleton", "one baby", "only one", "just one", "ek hi", "एक ही", "ஒரு குழந்தை",
+    "ఒక్కరే", "ಒಂದೇ ಮಗು", "ഒരു കുട്ടി", "একটাই", "એક જ",
+)
+APP = _lexicon("app", "application", "ऐप", "एप", "ஆப்", "యాప్", "ಆ್ಯಪ್", "ಆಪ್", "ആപ്പ്", "অ্যাপ", "એપ")
+APP_YES = _lexicon("downloaded", "installed", "using it", "download kiya", "डाउनलोड किया", "डाउनलोड केले")
+INSURANCE = _lexicon(
+    "insurance", "insured", "mediclaim", "इंश्योरेंस", "इन्शुरन्स", "बीमा", "विमा",
+    "இன்சூரன்ஸ்", "காப்பீடு", "ఇన్సూరెన్స్", "బీమా", "ಇನ್ಶೂರೆನ್ಸ್", "ವಿಮೆ", "ഇൻഷുറൻസ്",
+    "ইন্স্যুরেন্স", "বীমা", "ઇન્સ્યોરન્સ", "વીમો",
+)
+DUAL = _lexicon(
+    "two", "both", "dual", "double", "dono", "दो", "दोनों", "दोन", "दोन्ही", "இரண்டு", "రెండు", "ಎರಡು", "രണ്ട്", "দুটো", "দুই", "બે",
+)
+COMPETITORS = _lexicon(
+    "apollo cradle", "fortis la femme", "la femme", "milann", "ankura", "birthright", "manipal hospital",
+    "kauvery",
+)
+# Names that are also common words ("rainbow baby", "motherhood"): only a
+# competitor when followed by a word naming the hospital
+COMMON_WORD_COMPETITORS = (
+    "motherhood", "rainbow", "manipal",
+    "मदरहुड", "मदरहूड", "रेनबो", "மதர்ஹுட்", "ரெயின்போ", "మదర్‌హుడ్", "రెయిన్‌బో",
+    "ಮದರ್‌ಹುಡ್", "ರೇನ್‌ಬೋ", "മദർഹുഡ്", "റെയിൻബോ", "মাদারহুড", "রেইনবো", "મધરહુડ", "રેઈનબો",
+)
+HOSPITAL_WORDS = (
+    "hospital", "hospitals", "children's", "childrens", "clinic", "maternity",
+    "हॉस्पिटल", "अस्पताल", "ஹாஸ்பிடல்", "மருத்துவமனை", "హాస్పిటల్", "ఆసుపత్రి", "ಹಾಸ್ಪಿಟಲ್", "ಆಸ್ಪತ್ರೆ",
+    "ഹോസ്പിറ്റൽ", "ആശുപത്രി", "হাসপাতাল", "হসপিটাল", "હોસ્પિટલ",
+)
+COMPETITOR_HOSPITALS = _lexicon(*(f"{name} {word}" for name in COMPETITORS | set(COMMON_WORD_COMPETITORS)
+                                  for word in HOSPITAL_WORDS))
+
+SCAN_WORDS = _lexicon(
+    "scan", "scans", "sonography", "ultrasound", "स्कैन", "स्कॅन", "सोनोग्राफी", "ஸ்கேன்", "స్కాన్",
+    "ಸ್ಕ್ಯಾನ್", "സ്കാൻ", "স্ক্যান", "સ્કેન",
+)
+# Names that are a scan on their own, and ones that only are before a scan word
+SCAN_NAMES = {
+    "NT Scan": _lexicon("nt", "nuchal", "nuchal translucency", "एनटी", "என்டி", "ఎన్టీ", "ಎನ್‌ಟಿ", "എൻടി",
+                        "এনটি", "એનટી"),
+    "Anomaly Scan": _lexicon("anomaly", "level 2", "level ii", "level two", "tiffa", "target scan", "एनॉमली",
+                             "अनोमली", "அனாமலி", "అనామలీ", "ಅನಾಮಲಿ", "അനോമലി", "অ্যানোমালি", "એનોમલી"),
+}
+SCAN_PREFIXES = {
+    "EP Scan": _lexicon("ep", "early pregnancy", "viability", "dating", "ईपी", "ஈபி", "ఈపీ", "ಇಪಿ", "ഇപി",
+                        "ইপি", "ઇપી"),
+}
+GROWTH = _lexicon("growth", "ग्रोथ", "க்ரோத்", "గ్రోత్", "ಗ್ರೋತ್", "ഗ്രോത്ത്", "গ্রোথ", "ગ્રોથ")
+ORDINALS = {
+    "Growth 1": _lexicon("1", "one", "first", "पहला", "पहली", "पहिला", "முதல்", "మొదటి", "ಮೊದಲ", "ಮೊದಲನೇ",
+                         "ആദ്യ", "ആദ്യത്തെ", "প্রথম", "પહેલું", "પહેલો"),
+    "Growth 2": _lexicon("2", "two", "second", "ii", "दूसरा", "दूसरी", "दुसरा", "இரண்டாவது",
+                         "రెండవ", "ಎರಡನೇ", "രണ്ടാം", "দ্বিতীয়", "બીજું", "બીજો"),
+}
+
+MONTHS = {
+    1: ("january", "jan", "जनवरी", "जानेवारी", "ஜனவரி", "జనవరి", "ಜನವರಿ", "ജനുവരി", "জানুয়ারি", "જાન્યુઆરી"),
+    2: ("february", "feb", "फरवरी", "फ़रवरी", "फेब्रुवारी", "பிப்ரவரி", "ఫిబ్రవరి", "ಫೆಬ್ರವರಿ", "ഫെബ്രുവരി",
+        "ফেব্রুয়ারি", "ફેબ્રુઆરી"),
+    3: ("march", "mar", "मार्च", "மார்ச்", "మార్చి", "ಮಾರ್ಚ್", "മാർച്ച്", "মার্চ", "માર્ચ"),
+    4: ("april", "apr", "अप्रैल", "एप्रिल", "ஏப்ரல்", "ఏప్రిల్", "ಏಪ್ರಿಲ್", "ഏപ്രിൽ", "এপ্রিল", "એપ્રિલ"),
+    5: ("may", "मई", "मे", "மே", "మే", "ಮೇ", "മേയ്", "মে", "મે"),
+    6: ("june", "jun", "जून", "ஜூன்", "జూన్", "ಜೂನ್", "ജൂൺ", "জুন", "જૂન"),
+    7: ("july", "jul", "जुलाई", "जुलै", "ஜூலை", "జూలై", "ಜುಲೈ", "ജൂലൈ", "জুলাই", "જુલાઈ"),
+    8: ("august", "aug", "अगस्त", "ऑगस्ट", "ஆகஸ்ட்", "ఆగస్టు", "ಆಗಸ್ಟ್", "ഓഗസ്റ്റ്", "আগস্ট", "ઓગસ્ટ"),
+    9: ("september", "sept", "sep", "सितंबर", "सितम्बर", "सप्टेंबर", "செப்டம்பர்", "సెప్టెంబర్", "ಸೆಪ್ಟೆಂಬರ್",
+        "സെപ്റ്റംബർ", "সেপ্টেম্বর", "સપ્ટેમ્બર"),
+    10: ("october", "oct", "अक्टूबर", "अक्तूबर", "ऑक्टोबर", "அக்டோபர்", "అక్టోబర్", "ಅಕ್ಟೋಬರ್", "ഒക്ടോബർ",
+         "অক্টোবর", "ઓક્ટોબર"),
+    11: ("november", "nov", "नवंबर", "नवम्बर", "नोव्हेंबर", "நவம்பர்", "నవంబర్", "ನವೆಂಬರ್", "നവംബർ", "নভেম্বর",
+         "નવેમ્બર"),
+    12: ("december", "dec", "दिसंबर", "दिसम्बर", "डिसेंबर", "டிசம்பர்", "డిసెంబర్", "ಡಿಸೆಂಬರ್", "ഡിസംബർ",
+         "ডিসেম্বর", "ડિસેમ્બર"),
+}
+MONTH_NUMBERS = {normalize(name): number for number, names in MONTHS.items() for name in names}
+_MONTH = "|".join(re.escape(name) for name in sorted(MONTH_NUMBERS, key=len, reverse=True))
+_DAY = r"(?<!\d)(\d{1,2})(?:st|nd|rd|th)?"
+_YEAR = r",?\s+(\d{4})(?!\d)"
+# (pattern, order of the day/month/year groups); numeric dates are day first
+DATE_PATTERNS = [
+    (re.compile(r"(?<!\d)(\d{4})-(\d{1,2})-(\d{1,2})(?!\d)"), "ymd"),
+    (re.compile(r"(?<!\d)(\d{1,2})[/.-](\d{1,2})[/.-](\d{4})(?!\d)"), "dmy"),
+    (re.compile(_DAY + rf"\s+(?:of\s+)?({_MONTH})\.?" + _YEAR), "dmy"),
+    (re.compile(rf"(?<!\w)({_MONTH})\.?\s+" + _DAY + _YEAR), "mdy"),
+]
+
+
+def parse_turns(transcript, speaker_attributed=False):
+    """Turns of the transcript; the speaker is None on a flat transcript"""
+    if speaker_attributed:
+        lines = []
+        for line in transcript.splitlines():
+            label, separator, text = line.partition(": ")
+            if separator and label in (CCE_LABEL, CUSTOMER_LABEL):
+                lines.append((label, text))
+            elif line.strip():
+                lines.append((None, line))
+    else:
+        lines = [(None, sentence) for sentence in split_turns(transcript)]
+    turns = []
+    for speaker, text in lines:
+        words = WORD.findall(normalize(text))
+        turns.append(Turn(speaker, text, words, f" {' '.join(words)} "))
+    return turns
+
+
+def mentions(turn, lexicon):
+    return any(f" {phrase} " in turn.padded for phrase in lexicon)
+
+
+def polarity(turn, yes=frozenset()):
+    """True/False for a plain yes/no in the turn, None if neither or both"""
+    said_yes, said_no = mentions(turn, YES | yes), mentions(turn, NO)
+    return said_yes if said_yes != said_no else None
+
+
+def answers(turns, topic, topics):
+    """
+    Customer turns about ``topic``: answers to a CCE question about it (and
+    no other of ``topics``), and customer turns naming it themselves
+    """
+    for i, turn in enumerate(turns):
+        if turn.speaker == CUSTOMER_LABEL and mentions(turn, topic):
+            yield turn
+        elif (turn.speaker == CCE_LABEL and "?" in turn.text and mentions(turn, topic)
+              and sum(mentions(turn, other) for other in topics) == 1
+              and i + 1 < len(turns) and turns[i + 1].speaker == CUSTOMER_LABEL):
+            yield turns[i + 1]
+
+
+def agreed(values):
+    """The one value all answers agree on; None if there is none or they disagree"""
+    values = set(values)
+    if None in values or len(values) != 1:
+        return None
+    return values.pop()
+
+
+def dates(text):
+    found = set()
+    text = normalize(text)
+    for pattern, order in DATE_PATTERNS:
+        for match in pattern.finditer(text):
+            parts = dict(zip(order, match.groups()))
+            month = int(parts["m"]) if parts["m"].isdigit() else MONTH_NUMBERS[parts["m"]]
+            try:
+                date = datetime.date(int(parts["y"]), month, int(parts["d"]))
+            except ValueError:
+                continue
+            if 2000 <= date.year <= 2100:
+                found.add(date.isoformat())
+    return found
+
+
+def customer_edd(turns):
+    found = set()
+    for i, turn in enumerate(turns):
+        asked = turn.speaker == CUSTOMER_LABEL and i > 0 and turns[i - 1].speaker == CCE_LABEL \
+            and mentions(turns[i - 1], EDD)
+        if asked or mentions(turn, EDD):
+            found |= dates(turn.text)
+    return found.pop() if len(found) == 1 else None
+
+
+def reported_scans(turn):
+    """Indexes in SCAN_ORDER of the scans named in the turn"""
+    found = {SCAN_ORDER.index(scan) for scan, names in SCAN_NAMES.items() if mentions(turn, names)}
+    for scan, prefixes in SCAN_PREFIXES.items():
+        if any(f" {prefix} {word} " in turn.padded for prefix in prefixes for word in SCAN_WORDS):
+            found.add(SCAN_ORDER.index(scan))
+    for i, word in enumerate(turn.words):
+        if word in GROWTH:
+            nearby = f" {' '.join(turn.words[max(0, i - 1):i + 3])} "
+            second = any(f" {ordinal} " in nearby for ordinal in ORDINALS["Growth 2"])
+            found.add(SCAN_ORDER.index("Growth 2" if second else "Growth 1"))
+    return found
+
+
+def scans_done(turns):
+    """
+    The scan progression up to the latest scan the customer reports done,
+    or confirms when the CCE asks about it. A report of a scan that is
+    still to come, denied or asked about leaves the field to the model.
+    """
+    latest = None
+    for i, turn in enumerate(turns):
+        if turn.speaker == CUSTOMER_LABEL:
+            found = reported_scans(turn)
+            if not found:
+                continue
+            if "?" in turn.text or mentions(turn, NO) or mentions(turn, FUTURE):
+                return None
+        elif turn.speaker == CCE_LABEL and "?" in turn.text and i + 1 < len(turns) \
+                and turns[i + 1].speaker == CUSTOMER_LABEL and not reported_scans(turns[i + 1]):
+            found = reported_scans(turn)
+            if len(found) != 1:
+                continue
+            answer = polarity(turns[i + 1])
+            if answer is None:
+                continue
+            if not answer:
+                return None
+        else:
+            continue
+        latest = max(found if latest is None else found | {latest})
+    return SCAN_ORDER[:latest + 1] if latest is not None else None
+
+
+ANSWER_TOPICS = (TWINS, APP, INSURANCE)
+
+
+def having_twins(turns):
+    def value(turn):
+        if mentions(turn, TRIPLETS):
+            return "more_than_2"
+        if mentions(turn, SINGLE_BABY):
+            return "no"
+        return {True: "yes", False: "no"}.get(polarity(turn))
+    return agreed(value(turn) for turn in answers(turns, TWINS, ANSWER_TOPICS))
+
+
+def downloaded_app(turns):
+    return agreed(polarity(turn, APP_YES) for turn in answers(turns, APP, ANSWER_TOPICS))
+
+
+def insurance_status(turns):
+    def value(turn):
+        answer = polarity(turn)
+        if answer is None:
+            return None
+        if not answer:
+            return "no"
+        return "dual_insurance" if mentions(turn, DUAL) else "single_insurance"
+    return agreed(value(turn) for turn in answers(turns, INSURANCE, ANSWER_TOPICS))
+
+
+def mentioned_competitors(turns):
+    # Only a mention is conclusive; not naming one is left to the model.
+    # A flat transcript's sentence may be the CCE's, so there only a
+    # hospital's full name counts
+    for turn in turns:
+        if turn.speaker == CCE_LABEL:
+            continue
+        if mentions(turn, COMPETITOR_HOSPITALS) or (turn.speaker == CUSTOMER_LABEL and mentions(turn, COMPETITORS)):
+            return True
+    return None
+
+
+# "section.field" -> rule, and whether it needs speaker attribution
+RULES = {
+    "pregnancy_related.customer_edd": (customer_edd, False),
+    "pregnancy_related.scans_done": (scans_done, True),
+    "pregnancy_related.having_twins": (having_twins, True),
+    "cloudnine_awareness.downloaded_app": (downloaded_app, True),
+    "insurance.insurance_status": (insurance_status, True),
+    "cce_observations.mentioned_competitors": (mentioned_competitors, False),
+}
+
+
+def pre_extract(transcript, speaker_attributed=False):
+    """
+    The fields the rules settle, as {section: {field: value}} in the
+    extraction's format
+    """
+    turns = parse_turns(transcript, speaker_attributed)
+    known = {}
+    for path, (rule, needs_speakers) in RULES.items():
+        if needs_speakers and not speaker_attributed:
+            continue
+        value = rule(turns)
+        if value is not None:
+            section, field = path.split(".")
+            known.setdefault(section, {})[field] = value
+    return known
+
+
+def known_paths(known):
+    return {f"{section}.{field}" for section, fields in known.items() for field in fields}
+
+
+def fill(extracted, known):
+    """The extraction with the pre-extracted fields set over it"""
+    filled = dict(extracted)
+    for section, fields in known.items():
+        target = filled.get(section)
+        filled[section] = {**(target if isinstance(target, dict) else {}), **fields}
+    return filled
@@ -0,0 +1,210 @@
+"""
+Coordinated rate limiting and adaptive retry for Bedrock calls.
+
+All concurrent transcription_processing instances draw from one token bucket
+stored as a DynamoDB item, updated with optimistic (conditional) writes, so
+the fleet as a whole stays near the account quota instead of bursting into
+throttling together. If the table is not configured or cannot be reached,
+each instance falls back to an in-process bucket.
+
+On throttling responses the limiter backs off with full jitter and, per
+instance, raises the number of tokens each call costs (halving its share of
+the bucket); successes slowly bring the cost back to one token.
+"""
+import random
+import threading
+import time
+
+from common.telemetry import metric, warning
+
+# Response streams raise EventStreamError with the event member's name as
+# the code ("throttlingException"); throttled() compares them capitalized
+THROTTLING_ERROR_CODES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceUnavailableException",
+    "ModelNotReadyException",
+}
+
+
+class RateLimitTimeout(Exception):
+    pass
+
+
+def error_code(error):
+    """AWS error code of a botocore ClientError (or lookalike), else None"""
+    return getattr(error, "response", {}).get("Error", {}).get("Code")
+
+
+def throttled(error):
+    """Whether the error is a throttling response, of a call or in a stream"""
+    code = error_code(error) or ""
+    return code[:1].upper() + code[1:] in THROTTLING_ERROR_CODES
+
+
+class LocalTokenBucket:
+    """
+    Thread-safe token bucket for one process.
+
+    Like the shared bucket, it hands out reservations: the balance may go
+    negative, and the caller sleeps until its tokens have been refilled.
+    Waiting callers therefore never poll the bucket.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._refilled_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, cost=1.0, max_wait=None):
+        """Take ``cost`` tokens; returns the seconds to wait before using them"""
+        with self._lock:
+            now = time.monotonic()
+            tokens = min(self.capacity, self._tokens + (now - self._refilled_at) * self.rate)
+            wait = max(0.0, (cost - tokens) / self.rate)
+            if max_wait is not None and wait > max_wait:
+                raise RateLimitTimeout(f"Bedrock capacity is booked for more than {max_wait}s")
+            self._tokens = tokens - cost
+            self._refilled_at = now
+            return wait
+
+
+class DynamoTokenBucket:
+    """
+    Token bucket shared by all instances, kept in one item of ``table_name``
+    (partition key ``bucket_id``). Each reservation is a consistent read
+    followed by a write conditioned on the item's version, retried when
+    another instance won the race, so it costs two requests regardless of
+    how long the caller then has to wait.
+    """
+
+    def __init__(self, dynamodb, table_name, bucket_id, rate, capacity):
+        self.dynamodb = dynamodb
+        self.table_name = table_name
+        self.bucket_id = bucket_id
+        self.rate = rate
+        self.capacity = capacity
+
+    def reserve(self, cost=1.0, max_wait=None):
+        """Take ``cost`` tokens; returns the seconds to wait before using them"""
+        while True:
+            now_ms = int(time.time() * 1000)
+            result = self.dynamodb.get_item(
+                TableName=self.table_name,
+                Key={"bucket_id": {"S": self.bucket_id}},
+                ConsistentRead=True
+            )
+            item = result.get("Item")
+
+            if item is None:
+                tokens, version, refilled_ms = self.capacity, None, now_ms
+            else:
+                version = item["version"]["N"]
+                refilled_ms = int(item["refilled_at"]["N"])
+                elapsed = max(0, now_ms - refilled_ms) / 1000.0
+                tokens = min(self.capacity, float(item["tokens"]["N"]) + elapsed * self.rate)
+
+            wait = max(0.0, (cost - tokens) / self.rate)
+            if max_wait is not None and wait > max_wait:
+                raise RateLimitTimeout(f"Bedrock capacity is booked for more than {max_wait}s")
+
+            if self._write(tokens - cost, now_ms, version):
+                return wait
+            # Lost the race to another instance: re-read and try again
+
+    def _write(self, tokens, now_ms, version):
+        values = {
+            ":tokens": {"N": f"{tokens:.4f}"},
+            ":now": {"N": str(now_ms)},
+            ":next": {"N": str(int(version) + 1 if version else 1)},
+        }
+        if version is None:
+            condition = "attribute_not_exists(bucket_id)"
+        else:
+            condition = "version = :version"
+            values[":version"] = {"N": version}
+
+        try:
+            self.dynamodb.update_item(
+                TableName=self.table_name,
+                Key={"bucket_id": {"S": self.bucket_id}},
+                UpdateExpression="SET tokens = :tokens, refilled_at = :now, version = :next",
+                ConditionExpression=condition,
+                ExpressionAttributeValues=values
+            )
+            return True
+        except Exception as e:
+            if error_code(e) == "ConditionalCheckFailedException":
+                return False
+            raise
+
+
+class BedrockLimiter:
+    """
+    Wraps Bedrock calls with shared rate limiting and adaptive, jittered
+    retries on throttling.
+    """
+
+    def __init__(self, shared_bucket, local_bucket, max_attempts=6,
+                 base_backoff=0.5, max_backoff=20.0, max_wait=60.0, sleep=time.sleep):
+        self.shared_bucket = shared_bucket
+        self.local_bucket = local_bucket
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.max_wait = max_wait
+        self.sleep = sleep
+        # Tokens one call costs this instance; doubled on throttling
+        self.cost = 1.0
+        self.stats = {"calls": 0, "throttled": 0, "retries": 0, "waited_seconds": 0.0, "fallbacks": 0}
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        bucket = self.shared_bucket or self.local_bucket
+        try:
+            wait = bucket.reserve(self.cost, self.max_wait)
+        except RateLimitTimeout:
+            raise
+        except Exception as e:
+            # Shared bucket unavailable: keep going on the local one
+            warning("Shared rate limiter unavailable, using local bucket", error=str(e))
+            with self._lock:
+                self.stats["fallbacks"] += 1
+            wait = self.local_bucket.reserve(self.cost, self.max_wait)
+
+        if wait:
+            with self._lock:
+                self.stats["waited_seconds"] += wait
+            metric("bedrock_rate_limit_wait_ms", round(wait * 1000, 2), "Milliseconds")
+            self.sleep(wait)
+
+    def _on_throttled(self):
+        with self._lock:
+            self.stats["throttled"] += 1
+            self.cost = min(self.cost * 2, 16.0)
+
+    def _on_success(self):
+        with self._lock:
+            self.stats["calls"] += 1
+            self.cost = max(1.0, self.cost * 0.9)
+
+    def call(self, fn, *args, **kwargs):
+        """Call ``fn`` once capacity is available, retrying throttled calls"""
+        for attempt in range(self.max_attempts):
+            self._acquire()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if not throttled(e) or attempt == self.max_attempts - 1:
+                    raise
+                self._on_throttled()
+                with self._lock:
+                    self.stats["retries"] += 1
+                metric("bedrock_throttles", 1)
+                # Full jitter: spreads retries of instances throttled together
+                self.sleep(random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempt)))
+                continue
+            self._on_success()
+            return result
@@ -0,0 +1,102 @@
+"""
+Incremental detection of completed top-level sections in a streamed JSON
+answer, e.g. ``"pregnancy_related": {...}`` as soon as its closing brace
+has been generated.
+"""
+import json
+
+
+class SectionStreamParser:
+    """
+    Feed text deltas as they arrive; ``feed`` returns the (name, value) pairs
+    of the top-level members completed by that delta. Text before the first
+    "{" (such as a code fence) is ignored.
+    """
+
+    def __init__(self):
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._started = False
+        self._finished = False
+        self._key = None
+        self._key_chars = None
+        self._value_chars = None
+
+    def feed(self, text):
+        completed = []
+        for char in text:
+            if self._finished:
+                break
+            section = self._consume(char)
+            if section:
+                completed.append(section)
+        return completed
+
+    def _consume(self, char):
+        if not self._started:
+            if char == "{":
+                self._started = True
+                self._depth = 1
+            return None
+
+        if self._value_chars is not None:
+            self._value_chars.append(char)
+
+        if self._in_string:
+            if self._escaped:
+                self._escaped = False
+            elif char == "\\":
+                self._escaped = True
+            elif char == '"':
+                self._in_string = False
+                if self._key_chars is not None and self._depth == 1 and self._value_chars is None:
+                    self._key = "".join(self._key_chars)
+                    self._key_chars = None
+            elif self._key_chars is not None and self._value_chars is None:
+                self._key_chars.append(char)
+            return None
+
+        if char == '"':
+            self._in_string = True
+            if self._depth == 1 and self._value_chars is None and self._key is None:
+                self._key_chars = []
+            return None
+
+        if self._depth == 1 and self._value_chars is None:
+            if char == ":" and self._key is not None:
+                self._value_chars = []
+            elif char == "}":
+                self._finished = True
+            return None
+
+        if char in "{[":
+            self._depth += 1
+        elif char in "}]":
+            if self._depth == 1:
+                # Closing brace of the whole object ends a scalar last member
+                self._finished = True
+                self._value_chars.pop()
+                return self._complete()
+            self._depth -= 1
+            if self._depth == 1:
+                # A nested object/array value just closed
+                return self._complete()
+        elif char == "," and self._depth == 1:
+            # End of a scalar value
+            self._value_chars.pop()
+            return self._complete()
+
+        return None
+
+    def _complete(self):
+        key, raw = self._key, "".join(self._value_chars).strip()
+        self._key = None
+        self._value_chars = None
+        if not raw:
+            return None
+        try:
+            return key, json.loads(raw)
+        except json.JSONDecodeError:
+            # Malformed section: leave it to the full-response parser
+            return None
@@ -0,0 +1,158 @@
+"""
+Splitting long transcripts into overlapping windows and merging the
+per-window extraction results back into a single record
+"""
+import re
+
+# Sentence ends, including the Devanagari danda used in Hindi/Marathi
+SENTENCE_END = re.compile(r'(?<=[.?!।])\s+')
+
+SCAN_ORDER = ["EP Scan", "NT Scan", "Anomaly Scan", "Growth 1", "Growth 2"]
+
+UNKNOWN_VALUES = (None, "", "unknown", "null")
+
+# Boolean fields that record whether something was mentioned or asked at
+# any point in the conversation: a single window saying yes is enough
+ANY_TRUE_FIELDS = {
+    "mentioned_competitors",
+    "interested_in_facilities",
+    "price_inquiry",
+    "doctor_remark_questions",
+    "going_to_native",
+    "aware_of_packages",
+    "downloaded_app",
+}
+
+
+def split_turns(transcript):
+    """
+    Split a transcript into speaker turns.
+
+    Speaker-attributed transcripts carry one turn per line; a flat
+    Transcribe transcript has no turn markers, so sentences are used instead.
+    """
+    if "\n" in transcript.strip():
+        turns = transcript.splitlines()
+    else:
+        turns = SENTENCE_END.split(transcript)
+    return [turn.strip() for turn in turns if turn.strip()]
+
+
+def chunk_transcript(transcript, max_chars, overlap_turns=2):
+    """
+    Pack turns into windows of at most ``max_chars`` characters, each window
+    repeating the last ``overlap_turns`` turns of the previous one so that a
+    question and its answer are never separated by a window boundary.
+    """
+    turns = []
+    for turn in split_turns(transcript):
+        turns.extend(_split_oversized(turn, max_chars))
+
+    windows = []
+    current = []
+    size = 0
+    new_turns = 0
+
+    for turn in turns:
+        if current and size + len(turn) + 1 > max_chars:
+            windows.append("\n".join(current))
+            current = current[-overlap_turns:] if overlap_turns else []
+            # Never let the overlap alone fill the next window
+            while current and sum(len(t) + 1 for t in current) + len(turn) + 1 > max_chars:
+                current.pop(0)
+            size = sum(len(t) + 1 for t in current)
+            new_turns = 0
+        current.append(turn)
+        size += len(turn) + 1
+        new_turns += 1
+
+    if new_turns:
+        windows.append("\n".join(current))
+
+    return windows
+
+
+def _split_oversized(turn, max_chars):
+    """Hard-split a single turn longer than a window at word boundaries"""
+    if len(turn) <= max_chars:
+        return [turn]
+
+    pieces = []
+    current = ""
+    for word in turn.split():
+        if current and len(current) + len(word) + 1 > max_chars:
+            pieces.append(current)
+            current = ""
+        current = f"{current} {word}" if current else word
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def merge_extractions(partials):
+    """
+    Merge per-window extraction results, given in transcript order.
+
+    - ``scans_done``: the latest window that mentions scans wins (scan
+      progression makes the latest mention the most complete answer)
+    - "was it mentioned" booleans: true in any window wins
+    - other scalars: a known value beats null/"unknown"; among known values
+      the later window wins
+    - lists of concerns/signals: de-duplicated union in order of appearance
+    - ``conversation_summary``: the window summaries are concatenated
+    """
+    merged = {}
+    for partial in partials:
+        for section, fields in partial.items():
+            if not isinstance(fields, dict):
+                if fields not in UNKNOWN_VALUES:
+                    merged[section] = fields
+                continue
+            target = merged.setdefault(section, {})
+            for field, value in fields.items():
+                target[field] = _merge_field(field, target.get(field), value)
+
+    scans = merged.get("pregnancy_related", {}).get("scans_done")
+    if scans:
+        merged["pregnancy_related"]["scans_done"] = _complete_scan_progression(scans)
+
+    return merged
+
+
+def _merge_field(field, current, value):
+    if field == "scans_done":
+        return value if value else current
+
+    if field == "conversation_summary":
+        if value in UNKNOWN_VALUES:
+            return current
+        if current in UNKNOWN_VALUES:
+            return value
+        return f"{current} {value}"
+
+    if isinstance(value, list) or isinstance(current, list):
+        combined = list(current or [])
+        seen = {str(item).strip().lower() for item in combined}
+        for item in value or []:
+            if str(item).strip().lower() not in seen:
+                seen.add(str(item).strip().lower())
+                combined.append(item)
+        return combined
+
+    if value in UNKNOWN_VALUES:
+        return current if current is not None else value
+
+    if field in ANY_TRUE_FIELDS and current is True:
+        return True
+
+    return value
+
+
+def _complete_scan_progression(scans):
+    """Apply the prompt's scan progression rule to the merged scan list"""
+    known = [scan for scan in scans if scan in SCAN_ORDER]
+    others = [scan for scan in scans if scan not in SCAN_ORDER]
+    if not known:
+        return scans
+    latest = max(SCAN_ORDER.index(scan) for scan in known)
+    return SCAN_ORDER[:latest + 1] + others
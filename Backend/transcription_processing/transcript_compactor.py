@@ -0,0 +1,110 @@
+"""
+Speaker-attributed, token-lean transcript for the extraction prompt.
+
+Transcribe is run with two speaker labels, but its flat ``transcript`` string
+loses who said what. This module rebuilds turns from the per-word items,
+labels them CCE/CUSTOMER, merges consecutive turns of the same speaker and
+drops hesitation fillers and stuttered repeats, which both cuts input tokens
+and lets the model attribute answers to the customer.
+"""
+from collections import Counter, namedtuple
+
+CCE_LABEL = "CCE"
+CUSTOMER_LABEL = "CUSTOMER"
+
+# Hesitation sounds in English and the Indian languages the prompt lists,
+# as Transcribe spells them
+FILLERS = {
+    "um", "umm", "uh", "uhh", "uh-huh", "hmm", "hm", "mm", "mmm", "ah", "er", "erm",
+    "अं", "उम्म", "हम्म", "ஆ", "ம்ம்", "అ", "ಅ", "ഉം", "অ", "અ",
+}
+
+CompactTranscript = namedtuple(
+    "CompactTranscript",
+    ["text", "turns", "original_tokens", "compact_tokens"]
+)
+
+
+def estimate_tokens(text):
+    """Rough Claude token count (about 4 characters per token)"""
+    return (len(text) + 3) // 4
+
+
+def _is_filler(word):
+    return word.strip(".,?!।").lower() in FILLERS
+
+
+def build_turns(items):
+    """
+    Group TranscriptItems into [speaker, words] turns, merging consecutive
+    segments of the same speaker and dropping fillers and immediate
+    word or two-word repetitions ("I I I think" -> "I think").
+    """
+    turns = []
+    for item in items:
+        if item.type == "punctuation":
+            if turns and turns[-1][1]:
+                turns[-1][1][-1] += item.content
+            continue
+
+        if not item.content or _is_filler(item.content):
+            continue
+
+        if not turns or turns[-1][0] != item.speaker:
+            turns.append([item.speaker, []])
+
+        words = turns[-1][1]
+        if words and words[-1].lower() == item.content.lower():
+            continue
+        words.append(item.content)
+        # Repeated two-word phrases ("it is it is")
+        if len(words) >= 4 and [w.lower() for w in words[-2:]] == [w.lower() for w in words[-4:-2]]:
+            del words[-2:]
+
+    return [(speaker, words) for speaker, words in turns if words]
+
+
+def identify_cce(turns):
+    """
+    Pick the speaker label of the CCE: the speaker asking the most questions,
+    falling back to whoever speaks first (the CCE opens the conversation).
+    """
+    speakers = [speaker for speaker, _ in turns]
+    if not speakers:
+        return None
+
+    questions = Counter(
+        speaker for speaker, words in turns
+        for word in words if word.endswith("?")
+    )
+    ranked = questions.most_common(2)
+    if len(ranked) == 1 or (len(ranked) == 2 and ranked[0][1] > ranked[1][1]):
+        return ranked[0][0]
+    return speakers[0]
+
+
+def compact_transcript(items, original_transcript=""):
+    """
+    Build the speaker-attributed transcript, one line per turn.
+
+    Returns None when the items carry no speaker labels, in which case the
+    flat transcript should be used as before.
+    """
+    if not items or not any(item.speaker for item in items):
+        return None
+
+    turns = build_turns(items)
+    cce = identify_cce(turns)
+
+    lines = [
+        f"{CCE_LABEL if speaker == cce else CUSTOMER_LABEL}: {' '.join(words)}"
+        for speaker, words in turns
+    ]
+    text = "\n".join(lines)
+
+    return CompactTranscript(
+        text=text,
+        turns=len(lines),
+        original_tokens=estimate_tokens(original_transcript),
+        compact_tokens=estimate_tokens(text)
+    )
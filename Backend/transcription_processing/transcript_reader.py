@@ -0,0 +1,327 @@
+"""
+Streaming reader for Amazon Transcribe output documents.
+
+The output JSON is dominated by the per-word ``results.items`` array, while
+the handler mostly needs ``results.transcripts[0].transcript`` (and sometimes
+the speaker segments or a compact word list). The reader tokenizes the S3 body chunk
+by chunk, materializes only the requested values, skips everything else
+without building it, and stops reading as soon as the requested values have
+been found. Memory is bounded by the chunk size plus the requested values.
+
+The per-word items are the bulk of the document, so when they are
+requested nothing is left to skip. They are still read in chunks: each
+item is cut out of the buffer by the bracket scan and parsed with
+json.loads (much faster than tokenizing it in Python), and only its compact
+TranscriptItem is kept, so memory grows with the compact list rather than
+with the document.
+"""
+import codecs
+import json
+import re
+from bisect import bisect_right
+from collections import namedtuple
+
+CHUNK_SIZE = 64 * 1024
+
+TranscriptDocument = namedtuple("TranscriptDocument", ["transcript", "speaker_segments", "items"])
+
+TranscriptItem = namedtuple("TranscriptItem", ["type", "content", "start_time", "speaker"])
+
+# Strings use the unrolled [^"\\]*(?:\\.[^"\\]*)* form: an alternation inside
+# a repeat keeps backtracking state per character, which for a long
+# transcript costs far more memory than the string itself.
+TOKEN = re.compile(
+    r'\s*(?:([\[\]{}:,])'
+    r'|"([^"\\]*(?:\\.[^"\\]*)*)"'
+    r'|(-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?|true|false|null))'
+)
+
+# While skipping: whole strings (so brackets inside them are ignored) or
+# brackets. Group 1 is empty when the string is cut off by the buffer end.
+SKIP = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*("?)|[\[\]{}]')
+
+LITERALS = {"true": True, "false": False, "null": None}
+
+
+class TranscriptFormatError(ValueError):
+    pass
+
+
+class _Scanner:
+    """Pull tokenizer over a file-like object of UTF-8 JSON"""
+
+    def __init__(self, body, chunk_size):
+        self._body = body
+        self._chunk_size = chunk_size
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+        self.bytes_read = 0
+
+    def _fill(self):
+        if self._eof:
+            raise TranscriptFormatError("Unexpected end of Transcribe output")
+        chunk = self._body.read(self._chunk_size)
+        self.bytes_read += len(chunk)
+        if not chunk:
+            self._eof = True
+        self._buf = self._buf[self._pos:] + self._decoder.decode(chunk, final=not chunk)
+        self._pos = 0
+
+    def next_token(self):
+        """
+        Return the next token as (kind, value): kind is one of the structural
+        characters, "str" (raw, still escaped), or "scalar"; None at the end.
+        """
+        while True:
+            match = TOKEN.match(self._buf, self._pos)
+            # A token touching the end of the buffer may continue in the next chunk
+            if match and (match.end() < len(self._buf) or self._eof):
+                self._pos = match.end()
+                if match.group(1):
+                    return match.group(1), None
+                if match.group(2) is not None:
+                    return "str", match.group(2)
+                return "scalar", match.group(3)
+            if not match and self._eof:
+                if self._buf[self._pos:].strip():
+                    raise TranscriptFormatError(f"Invalid JSON near: {self._buf[self._pos:self._pos + 40]!r}")
+                return None
+            self._fill()
+
+    def skip_container(self, keep=False):
+        """
+        Skip to the end of the object/array whose opening token was just
+        read; with ``keep``, return its text (opening token included)
+        """
+        depth = 1
+        start, parts = self._pos - 1, []
+
+        def fill():
+            nonlocal start
+            if keep:
+                parts.append(self._buf[start:self._pos])
+                start = 0
+            self._fill()
+
+        while depth:
+            match = SKIP.search(self._buf, self._pos)
+            if match is None:
+                self._pos = len(self._buf)
+                fill()
+                continue
+            if match.group(0).startswith('"'):
+                if not match.group(1):
+                    # String continues in the next chunk: rescan it from its start
+                    self._pos = match.start()
+                    fill()
+                    continue
+            elif match.group(0) in "[{":
+                depth += 1
+            else:
+                depth -= 1
+            self._pos = match.end()
+        if keep:
+            parts.append(self._buf[start:self._pos])
+            return "".join(parts)
+
+
+def _decode_string(raw):
+    return json.loads(f'"{raw}"') if "\\" in raw else raw
+
+
+def _expect(token, kind):
+    if token is None or token[0] != kind:
+        raise TranscriptFormatError(f"Expected {kind!r}, found {token!r}")
+
+
+def _skip_value(scanner, token):
+    if token is None:
+        raise TranscriptFormatError("Unexpected end of Transcribe output")
+    if token[0] in "[{":
+        scanner.skip_container()
+
+
+def _parse_value(scanner, token):
+    """Fully materialize the value starting at ``token``"""
+    kind, raw = token
+    if kind == "str":
+        return _decode_string(raw)
+    if kind == "scalar":
+        return LITERALS[raw] if raw in LITERALS else json.loads(raw)
+    if kind == "{":
+        return {key: _parse_value(scanner, value) for key, value in _members(scanner)}
+    if kind == "[":
+        return [_parse_value(scanner, value) for value in _elements(scanner)]
+    raise TranscriptFormatError(f"Unexpected token {kind!r}")
+
+
+def _members(scanner):
+    """
+    Yield (key, first value token) for the object whose "{" was just read.
+    The caller must consume each value before resuming the generator.
+    """
+    token = scanner.next_token()
+    if token and token[0] == "}":
+        return
+    while True:
+        _expect(token, "str")
+        key = _decode_string(token[1])
+        _expect(scanner.next_token(), ":")
+        yield key, scanner.next_token()
+        token = scanner.next_token()
+        if token and token[0] == "}":
+            return
+        _expect(token, ",")
+        token = scanner.next_token()
+
+
+def _elements(scanner):
+    """Yield the first token of each element of the array whose "[" was just read"""
+    token = scanner.next_token()
+    if token and token[0] == "]":
+        return
+    while True:
+        yield token
+        token = scanner.next_token()
+        if token and token[0] == "]":
+            return
+        _expect(token, ",")
+        token = scanner.next_token()
+
+
+def _read_first_transcript(scanner, token):
+    """Return results.transcripts[0].transcript, skipping the rest of the array"""
+    _expect(token, "[")
+    transcript = None
+    for element in _elements(scanner):
+        if transcript is None and element[0] == "{":
+            for key, value in _members(scanner):
+                if key == "transcript" and value[0] == "str":
+                    transcript = _decode_string(value[1])
+                else:
+                    _skip_value(scanner, value)
+        else:
+            _skip_value(scanner, element)
+    return transcript
+
+
+def _parse_container(scanner):
+    """
+    The object/array whose opening token was just read, cut out of the
+    stream and parsed with json.loads
+    """
+    try:
+        return json.loads(scanner.skip_container(keep=True))
+    except ValueError as e:
+        raise TranscriptFormatError(f"Invalid Transcribe output: {e}")
+
+
+def _read_items(scanner, token):
+    """Compact TranscriptItem of each entry of results.items, one entry at a time"""
+    _expect(token, "[")
+    items = []
+    for element in _elements(scanner):
+        if element[0] == "{":
+            items.append(_item(_parse_container(scanner)))
+        else:
+            _skip_value(scanner, element)
+    return items
+
+
+def _item(item):
+    """Compact TranscriptItem of one entry of results.items"""
+    alternatives = item.get("alternatives") or [{}]
+    start_time = item.get("start_time")
+    return TranscriptItem(
+        item.get("type", "pronunciation"),
+        alternatives[0].get("content", ""),
+        float(start_time) if start_time is not None else None,
+        item.get("speaker_label")
+    )
+
+
+def _spans(segments):
+    return [
+        (float(seg.get("start_time", 0)), float(seg.get("end_time", 0)), seg.get("speaker_label"))
+        for seg in segments
+    ]
+
+
+def _label_items(items, spans):
+    """Fill in missing item speakers from the speaker segment time spans"""
+    if not spans:
+        return items
+    spans.sort()
+    starts = [span[0] for span in spans]
+    labelled = []
+    speaker = None
+    for item in items:
+        if item.speaker:
+            speaker = item.speaker
+        elif item.start_time is not None:
+            index = bisect_right(starts, item.start_time) - 1
+            if index >= 0:
+                speaker = spans[index][2]
+        # Punctuation has no timing and belongs to the preceding word's speaker
+        labelled.append(item._replace(speaker=item.speaker or speaker))
+    return labelled
+
+
+def read_transcript(body, speaker_segments=False, items=False, chunk_size=CHUNK_SIZE):
+    """
+    Read the transcript (and optionally the speaker segments or the
+    per-word items) from a Transcribe output document.
+
+    Args:
+        body: File-like object, e.g. the StreamingBody of an S3 get_object
+        speaker_segments (bool): Also return results.speaker_labels.segments
+        items (bool): Also return results.items as compact TranscriptItem
+            tuples, with speakers resolved from the speaker segments
+        chunk_size (int): Bytes read from ``body`` per call
+
+    Returns:
+        TranscriptDocument: ``speaker_segments``/``items`` are None when not
+        requested or not present in the output
+    """
+    scanner = _Scanner(body, chunk_size)
+    transcript = None
+    segments = None
+    word_items = None
+
+    def complete():
+        # The items need the segments to resolve their speakers, wherever
+        # in the document those come
+        return transcript is not None and (segments is not None or not (speaker_segments or items)) \
+            and (word_items is not None or not items)
+
+    _expect(scanner.next_token(), "{")
+    for key, value in _members(scanner):
+        if key != "results":
+            _skip_value(scanner, value)
+            continue
+
+        _expect(value, "{")
+        for result_key, result_value in _members(scanner):
+            if result_key == "transcripts":
+                transcript = _read_first_transcript(scanner, result_value)
+            elif result_key == "speaker_labels" and (speaker_segments or items) and result_value[0] == "{":
+                labels = _parse_container(scanner)
+                segments = labels.get("segments", [])
+            elif result_key == "items" and items and result_value[0] == "[":
+                word_items = _read_items(scanner, result_value)
+            else:
+                _skip_value(scanner, result_value)
+
+            # Everything requested has been found: leave the rest unread
+            if complete():
+                break
+        break
+
+    if transcript is None:
+        raise TranscriptFormatError("No transcript found in Transcribe output")
+
+    if word_items is not None:
+        word_items = _label_items(word_items, _spans(segments or []))
+    return TranscriptDocument(transcript, segments if speaker_segments else None, word_items)